@@ -0,0 +1,175 @@
+__filename__ = "accountsettings.py"
+__author__ = "Bob Mottram"
+__license__ = "AGPL3+"
+__version__ = "1.4.0"
+__maintainer__ = "Bob Mottram"
+__email__ = "bob@libreserver.org"
+__status__ = "Production"
+__module_group__ = "Core"
+
+# Snapshot of the settings of each account which are stored as flag
+# files or small text files within the account directory, such as
+# whether the like button is hidden or the timezone of the account.
+# Rendering a timeline would otherwise check for each of these files
+# for every post shown.
+# The snapshot of an account is read with a single scan of its
+# directory and is not changed after it has been created. It is replaced
+# when the account directory or its small files are modified, which is
+# checked at most every few seconds, or straight away when the running
+# instance changes the settings of the account.
+# Small json files within the account, such as the edit history of a
+# post, are also cached and only read again when they are modified.
+
+import os
+import json
+import time
+import threading
+from collections import OrderedDict
+from types import MappingProxyType
+
+# flag files within the account directory
+ACCOUNT_SETTINGS_FLAGS = (
+    '.hideLikeButton', '.hideReactionButton', '.boldReading',
+    '.followDMs', '.removeTwitter', '.notifyLikes', '.notifyReactions',
+    '.nofeatures', '.notminimal'
+)
+
+# number of seconds between checks for changes to the account directory
+ACCOUNT_SETTINGS_CHECK_SEC = 2
+
+# maximum number of json files held in memory
+ACCOUNT_SETTINGS_MAX_JSON_FILES = 256
+
+_ACCOUNT_SETTINGS = {
+    'lock': threading.Lock(),
+    # account directory -> {'snapshot', 'modified', 'checked'}
+    'accounts': {},
+    # filename -> (modification time and size, json)
+    'json_files': OrderedDict()
+}
+
+
+def _account_settings_modified(account_dir: str) -> tuple:
+    """Returns the modification times of the account directory and of
+    the small files within it which may be rewritten in place
+    """
+    modified = []
+    for filename in ('', '/timezone.txt', '/snoozed.txt'):
+        try:
+            modified.append(os.stat(account_dir + filename).st_mtime_ns)
+        except OSError:
+            modified.append(0)
+    return tuple(modified)
+
+
+def _account_settings_read_text(filename: str) -> str:
+    """Returns the text within a small settings file
+    """
+    try:
+        with open(filename, 'r', encoding='utf-8') as fp_settings:
+            return fp_settings.read()
+    except OSError:
+        print('EX: _account_settings_read_text unable to read ' + filename)
+    return ''
+
+
+def _account_settings_load(account_dir: str) -> {}:
+    """Reads the settings of an account from its directory
+    """
+    settings = {}
+    for flag_filename in ACCOUNT_SETTINGS_FLAGS:
+        settings[flag_filename[1:]] = False
+    settings['timezone'] = None
+    settings['snoozed'] = frozenset()
+    try:
+        entries = os.listdir(account_dir)
+    except OSError:
+        return settings
+    for entry in entries:
+        if entry in ACCOUNT_SETTINGS_FLAGS:
+            settings[entry[1:]] = True
+        elif entry == 'timezone.txt':
+            timezone = \
+                _account_settings_read_text(account_dir + '/' + entry).strip()
+            if timezone:
+                settings['timezone'] = timezone
+        elif entry == 'snoozed.txt':
+            snoozed = set()
+            snoozed_str = \
+                _account_settings_read_text(account_dir + '/' + entry)
+            for line in snoozed_str.splitlines():
+                if ' ' in line:
+                    snoozed.add(line.split(' ')[0])
+            settings['snoozed'] = frozenset(snoozed)
+    return settings
+
+
+def get_account_settings(account_dir: str) -> {}:
+    """Returns a snapshot of the settings of an account, which
+    should not be changed
+    """
+    curr_time = time.time()
+    with _ACCOUNT_SETTINGS['lock']:
+        account = _ACCOUNT_SETTINGS['accounts'].get(account_dir)
+        if account and \
+           curr_time - account['checked'] < ACCOUNT_SETTINGS_CHECK_SEC:
+            return account['snapshot']
+    modified = _account_settings_modified(account_dir)
+    if account and account['modified'] == modified:
+        account['checked'] = curr_time
+        return account['snapshot']
+    snapshot = MappingProxyType(_account_settings_load(account_dir))
+    if not modified[0]:
+        # the account does not exist
+        return snapshot
+    account = {
+        'snapshot': snapshot,
+        'modified': modified,
+        'checked': curr_time
+    }
+    with _ACCOUNT_SETTINGS['lock']:
+        _ACCOUNT_SETTINGS['accounts'][account_dir] = account
+    return snapshot
+
+
+def get_account_settings_json(filename: str) -> {}:
+    """Returns the json within a small file of an account, which is only
+    read again when the file is modified. The json should not be changed.
+    Returns None if there is no such file
+    """
+    json_files = _ACCOUNT_SETTINGS['json_files']
+    try:
+        file_stat = os.stat(filename)
+    except OSError:
+        with _ACCOUNT_SETTINGS['lock']:
+            json_files.pop(filename, None)
+        return None
+    modified = (file_stat.st_mtime_ns, file_stat.st_size)
+    with _ACCOUNT_SETTINGS['lock']:
+        cached = json_files.get(filename)
+        if cached and cached[0] == modified:
+            json_files.move_to_end(filename)
+            return cached[1]
+    try:
+        with open(filename, 'r', encoding='utf-8') as fp_json:
+            json_object = json.loads(fp_json.read())
+    except OSError:
+        print('EX: get_account_settings_json unable to read ' + filename)
+        return None
+    except ValueError:
+        print('WARN: get_account_settings_json unable to load ' + filename)
+        return None
+    with _ACCOUNT_SETTINGS['lock']:
+        json_files[filename] = (modified, json_object)
+        json_files.move_to_end(filename)
+        while len(json_files) > ACCOUNT_SETTINGS_MAX_JSON_FILES:
+            json_files.popitem(last=False)
+    return json_object
+
+
+def account_settings_changed(account_dir: str) -> None:
+    """Called after the settings of an account have been changed, so
+    that its snapshot is read again when next needed
+    """
+    with _ACCOUNT_SETTINGS['lock']:
+        _ACCOUNT_SETTINGS['accounts'].pop(account_dir, None)
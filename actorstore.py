@@ -0,0 +1,338 @@
+__filename__ = "actorstore.py"
+__author__ = "Bob Mottram"
+__license__ = "AGPL3+"
+__version__ = "1.4.0"
+__maintainer__ = "Bob Mottram"
+__email__ = "bob@libreserver.org"
+__status__ = "Production"
+__module_group__ = "Core"
+
+# Storage of the actors within the cache.
+# On disk each actor is stored within cache/actors/<shard>/, where the
+# shard is taken from a hash of the actor url, so that no single
+# directory contains every known actor. Older versions stored all
+# actors directly within cache/actors, and those files are still read
+# until they have been migrated.
+# In memory each actor has a record containing a small projection of
+# the actor, such as its keys, inboxes, display name, avatar and flags,
+# together with an integer timestamp of when it was last used.
+# The full actor is also held for recently used actors, up to a budget
+# of bytes, after which the least recently used are dropped and loaded
+# again from file when next needed.
+
+import os
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+# default maximum number of bytes of full actors held in memory
+ACTOR_STORE_MAX_BYTES = 32 * 1024 * 1024
+
+_ACTOR_STORE = {
+    'lock': threading.Lock(),
+    # actor url -> record, in order of use
+    'lru': OrderedDict(),
+    'bytes': 0,
+    'max_bytes': ACTOR_STORE_MAX_BYTES,
+    'loads': 0,
+    'evictions': 0
+}
+
+
+def _actor_store_dir(base_dir: str) -> str:
+    """Returns the directory containing cached actors
+    """
+    return base_dir + '/cache/actors'
+
+
+def _actor_store_shard(actor_url: str) -> str:
+    """Returns the name of the subdirectory for an actor
+    """
+    return hashlib.sha1(actor_url.encode('utf-8')).hexdigest()[:2]
+
+
+def actor_store_filename(base_dir: str, actor_url: str) -> str:
+    """Returns the filename used to store an actor within the cache
+    """
+    return _actor_store_dir(base_dir) + '/' + \
+        _actor_store_shard(actor_url) + '/' + \
+        actor_url.replace('/', '#') + '.json'
+
+
+def _actor_store_legacy_filename(base_dir: str, actor_url: str) -> str:
+    """Returns the filename used by older versions to store an actor
+    """
+    return _actor_store_dir(base_dir) + '/' + \
+        actor_url.replace('/', '#') + '.json'
+
+
+def actor_store_locate(base_dir: str, actor_url: str) -> str:
+    """Returns the filename of a cached actor, or None if it
+    has not been stored
+    """
+    possible_urls = [actor_url]
+    if actor_url != actor_url.lower():
+        possible_urls.append(actor_url.lower())
+    for possible_url in possible_urls:
+        actor_filename = actor_store_filename(base_dir, possible_url)
+        if os.path.isfile(actor_filename):
+            return actor_filename
+        actor_filename = _actor_store_legacy_filename(base_dir, possible_url)
+        if os.path.isfile(actor_filename):
+            return actor_filename
+    return None
+
+
+def actor_store_load(base_dir: str, actor_url: str) -> {}:
+    """Loads a cached actor from file
+    """
+    actor_filename = actor_store_locate(base_dir, actor_url)
+    if not actor_filename:
+        return None
+    try:
+        with open(actor_filename, 'r', encoding='utf-8') as fp_actor:
+            actor_json = json.loads(fp_actor.read())
+    except (OSError, ValueError):
+        print('EX: actor_store_load unable to load ' + actor_filename)
+        return None
+    if not isinstance(actor_json, dict):
+        return None
+    return actor_json
+
+
+def actor_store_save(base_dir: str, actor_url: str, actor_json: {}) -> bool:
+    """Saves an actor to the cache on file
+    """
+    actor_filename = actor_store_filename(base_dir, actor_url)
+    shard_dir = os.path.dirname(actor_filename)
+    try:
+        if not os.path.isdir(shard_dir):
+            os.makedirs(shard_dir, exist_ok=True)
+        with open(actor_filename, 'w+', encoding='utf-8') as fp_actor:
+            fp_actor.write(json.dumps(actor_json))
+    except OSError:
+        print('EX: actor_store_save unable to save ' + actor_filename)
+        return False
+    # remove any copy stored by older versions
+    legacy_filename = _actor_store_legacy_filename(base_dir, actor_url)
+    if os.path.isfile(legacy_filename):
+        try:
+            os.remove(legacy_filename)
+        except OSError:
+            print('EX: actor_store_save unable to remove ' + legacy_filename)
+    return True
+
+
+def actor_store_remove(base_dir: str, actor_url: str) -> None:
+    """Removes an actor from the cache on file
+    """
+    for actor_filename in (actor_store_filename(base_dir, actor_url),
+                           _actor_store_legacy_filename(base_dir, actor_url)):
+        if not os.path.isfile(actor_filename):
+            continue
+        try:
+            os.remove(actor_filename)
+        except OSError:
+            print('EX: unable to delete cached actor ' + actor_filename)
+
+
+def actor_store_files(base_dir: str) -> []:
+    """Returns a list of (actor url, filename) for all actors
+    within the cache on file
+    """
+    actors_dir = _actor_store_dir(base_dir)
+    if not os.path.isdir(actors_dir):
+        return []
+    actor_files = []
+    for entry in os.scandir(actors_dir):
+        if entry.is_dir():
+            for shard_entry in os.scandir(entry.path):
+                if shard_entry.name.endswith('.json'):
+                    actor_url = shard_entry.name[:-5].replace('#', '/')
+                    actor_files.append((actor_url, shard_entry.path))
+        elif entry.name.endswith('.json'):
+            actor_url = entry.name[:-5].replace('#', '/')
+            actor_files.append((actor_url, entry.path))
+    return actor_files
+
+
+def migrate_actor_store(base_dir: str) -> int:
+    """Moves cached actors stored by older versions into the
+    subdirectories used by the current version.
+    Returns the number of actors moved
+    """
+    actors_dir = _actor_store_dir(base_dir)
+    if not os.path.isdir(actors_dir):
+        return 0
+    ctr = 0
+    for entry in os.scandir(actors_dir):
+        if not entry.is_file() or not entry.name.endswith('.json'):
+            continue
+        actor_url = entry.name[:-5].replace('#', '/')
+        actor_filename = actor_store_filename(base_dir, actor_url)
+        try:
+            shard_dir = os.path.dirname(actor_filename)
+            if not os.path.isdir(shard_dir):
+                os.makedirs(shard_dir, exist_ok=True)
+            os.replace(entry.path, actor_filename)
+        except OSError:
+            print('EX: migrate_actor_store unable to move ' + entry.path)
+            continue
+        ctr += 1
+    return ctr
+
+
+def _actor_projection(actor_json: {}) -> {}:
+    """Returns the parts of an actor which are held in memory
+    """
+    compact = {}
+    for field in ('id', 'type', 'name', 'preferredUsername', 'inbox',
+                  'movedTo'):
+        if isinstance(actor_json.get(field), str):
+            compact[field] = actor_json[field]
+    for field in ('manuallyApprovesFollowers', 'discoverable', 'indexable'):
+        if isinstance(actor_json.get(field), bool):
+            compact[field] = actor_json[field]
+    if isinstance(actor_json.get('endpoints'), dict):
+        if isinstance(actor_json['endpoints'].get('sharedInbox'), str):
+            compact['sharedInbox'] = actor_json['endpoints']['sharedInbox']
+    if isinstance(actor_json.get('icon'), dict):
+        if isinstance(actor_json['icon'].get('url'), str):
+            compact['icon'] = actor_json['icon']['url']
+    if isinstance(actor_json.get('publicKey'), dict):
+        public_key = actor_json['publicKey']
+        if isinstance(public_key.get('id'), str):
+            compact['publicKeyId'] = public_key['id']
+        if isinstance(public_key.get('publicKeyPem'), str):
+            compact['publicKeyPem'] = public_key['publicKeyPem']
+    elif isinstance(actor_json.get('publicKeyPem'), str):
+        compact['publicKeyPem'] = actor_json['publicKeyPem']
+    return compact
+
+
+def _actor_store_use(actor_url: str, record: {}) -> None:
+    """Records the use of the full actor within a record, dropping
+    the full actor from the least recently used records if the
+    budget is exceeded.
+    This must be called while holding the lock
+    """
+    lru = _ACTOR_STORE['lru']
+    previous = lru.get(actor_url)
+    if previous is not None:
+        if previous is record:
+            lru.move_to_end(actor_url)
+            return
+        _ACTOR_STORE['bytes'] -= previous['size']
+        previous['actor'] = None
+    lru[actor_url] = record
+    _ACTOR_STORE['bytes'] += record['size']
+    while _ACTOR_STORE['bytes'] > _ACTOR_STORE['max_bytes'] and \
+            len(lru) > 1:
+        _, oldest = lru.popitem(last=False)
+        _ACTOR_STORE['bytes'] -= oldest['size']
+        _ACTOR_STORE['evictions'] += 1
+        if oldest['persisted']:
+            oldest['actor'] = None
+
+
+def actor_store_record(actor_url: str, actor_json: {},
+                       persisted: bool, size: int) -> {}:
+    """Returns the record held in memory for an actor.
+    If the actor is persisted then it can be loaded again from file
+    after it has been dropped from memory
+    """
+    actor_str = json.dumps(actor_json, sort_keys=True)
+    if not size:
+        size = len(actor_str)
+    record = {
+        'timestamp': int(time.time()),
+        'compact': _actor_projection(actor_json),
+        'actor': actor_json,
+        'size': size,
+        'persisted': persisted,
+        # used to find out whether the actor has changed without
+        # loading it from file
+        'digest': hashlib.sha1(actor_str.encode('utf-8')).hexdigest()
+    }
+    with _ACTOR_STORE['lock']:
+        _actor_store_use(actor_url, record)
+    return record
+
+
+def actor_store_unchanged(record: {}, actor_json: {}) -> bool:
+    """Returns true if the given actor is the same as the one stored
+    on file for a record
+    """
+    if not record or not record.get('persisted'):
+        return False
+    if not record.get('digest'):
+        return False
+    actor_str = json.dumps(actor_json, sort_keys=True)
+    digest = hashlib.sha1(actor_str.encode('utf-8')).hexdigest()
+    return digest == record['digest']
+
+
+def actor_store_projection(record: {}) -> {}:
+    """Returns the compact form of an actor from its record
+    """
+    if not record:
+        return {}
+    if record.get('compact') is None:
+        record['compact'] = _actor_projection(record.get('actor', {}))
+    return record['compact']
+
+
+def actor_store_full(base_dir: str, actor_url: str, record: {}) -> {}:
+    """Returns the full actor for a record, loading it from file
+    if it is not held in memory
+    """
+    if not record:
+        return None
+    record['timestamp'] = int(time.time())
+    actor_json = record.get('actor')
+    if actor_json is None:
+        actor_json = actor_store_load(base_dir, actor_url)
+        if not actor_json:
+            return None
+        record['actor'] = actor_json
+        with _ACTOR_STORE['lock']:
+            _ACTOR_STORE['loads'] += 1
+    if 'size' in record:
+        with _ACTOR_STORE['lock']:
+            _actor_store_use(actor_url, record)
+    return actor_json
+
+
+def actor_store_forget(actor_url: str, record: {}) -> None:
+    """Stops accounting for the full actor of a record which is
+    no longer held within the cache
+    """
+    with _ACTOR_STORE['lock']:
+        lru = _ACTOR_STORE['lru']
+        if lru.get(actor_url) is record:
+            del lru[actor_url]
+            _ACTOR_STORE['bytes'] -= record['size']
+
+
+def set_actor_store_budget(max_bytes: int) -> None:
+    """Sets the maximum number of bytes of full actors held in memory
+    """
+    if not max_bytes or max_bytes <= 0:
+        return
+    with _ACTOR_STORE['lock']:
+        _ACTOR_STORE['max_bytes'] = max_bytes
+
+
+def actor_store_metrics() -> {}:
+    """Returns the current state of the actors held in memory
+    """
+    with _ACTOR_STORE['lock']:
+        return {
+            'fullActors': len(_ACTOR_STORE['lru']),
+            'bytes': _ACTOR_STORE['bytes'],
+            'maxBytes': _ACTOR_STORE['max_bytes'],
+            'loads': _ACTOR_STORE['loads'],
+            'evictions': _ACTOR_STORE['evictions']
+        }
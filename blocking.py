@@ -8,10 +8,10 @@ __status__ = "Production"
 __module_group__ = "Core"
 
 import os
-import json
 import time
 from datetime import datetime
 from utils import remove_eol
+from utils import remove_id_from_recent_posts_cache
 from utils import has_object_string
 from utils import has_object_string_object
 from utils import has_object_string_type
@@ -481,6 +481,133 @@ def remove_block(base_dir: str, nickname: str, domain: str,
     return False
 
 
+# Compiled block and allow lists, indexed by filename.
+# Each contains sets of blocked handles and hashtags, together with a
+# suffix trie of domains stored with their labels reversed, so that
+# a domain can be checked against the list with a few dictionary
+# lookups rather than by scanning the file or the cached lines.
+# They are recompiled only when the file modification time or
+# size changes.
+_BLOCKLISTS = {}
+
+# key within a trie node indicating that the domain ending at
+# that node is present within the list
+BLOCKLIST_TRIE_END = '.'
+
+
+def _compile_blocklist(lines: []) -> {}:
+    """Compiles the lines of a block or allow list
+    """
+    compiled = {
+        'mtime': 0,
+        'size': 0,
+        'handles': set(),
+        'domains': set(),
+        'hashtags': set(),
+        'trie': {}
+    }
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        if line.startswith('#'):
+            compiled['hashtags'].add(line)
+            continue
+        if line.startswith('*@'):
+            domain = line[2:]
+        elif '@' in line:
+            compiled['handles'].add(line)
+            continue
+        else:
+            domain = line
+        domain = domain.lower()
+        if '.' not in domain or domain in compiled['domains']:
+            continue
+        compiled['domains'].add(domain)
+        node = compiled['trie']
+        for label in reversed(domain.split('.')):
+            if not node.get(label):
+                node[label] = {}
+            node = node[label]
+        node[BLOCKLIST_TRIE_END] = True
+    return compiled
+
+
+def _load_blocklist(blocklist_filename: str) -> {}:
+    """Returns the compiled version of a block or allow list,
+    recompiling it if the file has changed.
+    Returns None if the file does not exist
+    """
+    try:
+        file_stat = os.stat(blocklist_filename)
+    except OSError:
+        if _BLOCKLISTS.get(blocklist_filename):
+            del _BLOCKLISTS[blocklist_filename]
+        return None
+    compiled = _BLOCKLISTS.get(blocklist_filename)
+    if compiled:
+        if compiled['mtime'] == file_stat.st_mtime_ns and \
+           compiled['size'] == file_stat.st_size:
+            return compiled
+    lines = []
+    try:
+        with open(blocklist_filename, 'r', encoding='utf-8') as fp_blocked:
+            lines = fp_blocked.read().split('\n')
+    except OSError as ex:
+        print('EX: unable to read blocklist ' + blocklist_filename +
+              ' ' + str(ex))
+        return compiled
+    compiled = _compile_blocklist(lines)
+    compiled['mtime'] = file_stat.st_mtime_ns
+    compiled['size'] = file_stat.st_size
+    _BLOCKLISTS[blocklist_filename] = compiled
+    return compiled
+
+
+def _global_blocklist(base_dir: str, blocked_cache: []) -> {}:
+    """Returns the compiled instance level block list.
+    If the cache of blocked lines is being used then the file
+    is only checked for changes by update_blocked_cache
+    """
+    global_blocking_filename = base_dir + '/accounts/blocking.txt'
+    if not blocked_cache:
+        return _load_blocklist(global_blocking_filename)
+    compiled = _BLOCKLISTS.get(global_blocking_filename)
+    if not compiled:
+        compiled = _compile_blocklist(blocked_cache)
+        _BLOCKLISTS[global_blocking_filename] = compiled
+    return compiled
+
+
+def _blocklist_domain_match(compiled: {}, domain: str) -> bool:
+    """Is the given domain, or one of its parent domains,
+    within the compiled list?
+    Top level domains on their own are not matched
+    """
+    node = compiled['trie']
+    depth = 0
+    for label in reversed(domain.lower().split('.')):
+        node = node.get(label)
+        if not node:
+            return False
+        depth += 1
+        if depth > 1 and node.get(BLOCKLIST_TRIE_END):
+            return True
+    return False
+
+
+def _blocklist_domain_known(compiled: {}, domain: str) -> bool:
+    """Is the given domain, or any of its subdomains,
+    within the compiled list?
+    """
+    node = compiled['trie']
+    for label in reversed(domain.lower().split('.')):
+        node = node.get(label)
+        if not node:
+            return False
+    return True
+
+
 def is_blocked_hashtag(base_dir: str, hashtag: str) -> bool:
     """Is the given hashtag blocked?
     """
@@ -488,11 +615,12 @@ def is_blocked_hashtag(base_dir: str, hashtag: str) -> bool:
     if len(hashtag) > 32:
         return True
     global_blocking_filename = base_dir + '/accounts/blocking.txt'
-    if os.path.isfile(global_blocking_filename):
+    compiled = _load_blocklist(global_blocking_filename)
+    if compiled:
         hashtag = hashtag.strip('\n').strip('\r')
         if not hashtag.startswith('#'):
             hashtag = '#' + hashtag
-        if text_in_file(hashtag + '\n', global_blocking_filename):
+        if hashtag in compiled['hashtags']:
             return True
     return False
 
@@ -533,8 +661,13 @@ def update_blocked_cache(base_dir: str,
     if seconds_since_last_update < blocked_cache_update_secs:
         return blocked_cache_last_updated
     global_blocking_filename = base_dir + '/accounts/blocking.txt'
-    if not os.path.isfile(global_blocking_filename):
+    prev_compiled = _BLOCKLISTS.get(global_blocking_filename)
+    compiled = _load_blocklist(global_blocking_filename)
+    if not compiled:
         return blocked_cache_last_updated
+    if compiled is prev_compiled and blocked_cache:
+        # the file has not changed since it was last loaded
+        return curr_time
     try:
         with open(global_blocking_filename, 'r',
                   encoding='utf-8') as fp_blocked:
@@ -562,6 +695,20 @@ def _get_short_domain(domain: str) -> str:
     return None
 
 
+def _instance_allows_domain(base_dir: str, domain: str) -> bool:
+    """When broch mode is active is the given domain within
+    the instance allow list?
+    """
+    allow_filename = base_dir + '/accounts/allowedinstances.txt'
+    compiled = _load_blocklist(allow_filename)
+    if not compiled:
+        return False
+    short_domain = _get_short_domain(domain)
+    if short_domain:
+        domain = short_domain
+    return _blocklist_domain_known(compiled, domain)
+
+
 def is_blocked_domain(base_dir: str, domain: str,
                       blocked_cache: [] = None) -> bool:
     """Is the given domain blocked?
@@ -572,41 +719,16 @@ def is_blocked_domain(base_dir: str, domain: str,
     if is_evil(domain):
         return True
 
-    short_domain = _get_short_domain(domain)
-
     if not broch_mode_is_active(base_dir):
-        if blocked_cache:
-            for blocked_str in blocked_cache:
-                if blocked_str == '*@' + domain:
-                    return True
-                if short_domain:
-                    if blocked_str == '*@' + short_domain:
-                        return True
-        else:
-            # instance block list
-            global_blocking_filename = base_dir + '/accounts/blocking.txt'
-            if os.path.isfile(global_blocking_filename):
-                try:
-                    with open(global_blocking_filename, 'r',
-                              encoding='utf-8') as fp_blocked:
-                        blocked_str = fp_blocked.read()
-                        if '*@' + domain + '\n' in blocked_str:
-                            return True
-                        if short_domain:
-                            if '*@' + short_domain + '\n' in blocked_str:
-                                return True
-                except OSError as ex:
-                    print('EX: unable to read ' + global_blocking_filename +
-                          ' ' + str(ex))
+        # instance block list
+        compiled = _global_blocklist(base_dir, blocked_cache)
+        if compiled:
+            if _blocklist_domain_match(compiled, domain):
+                return True
     else:
-        allow_filename = base_dir + '/accounts/allowedinstances.txt'
         # instance allow list
-        if not short_domain:
-            if not text_in_file(domain, allow_filename):
-                return True
-        else:
-            if not text_in_file(short_domain, allow_filename):
-                return True
+        if not _instance_allows_domain(base_dir, domain):
+            return True
 
     return False
 
@@ -625,47 +747,34 @@ def is_blocked(base_dir: str, nickname: str, domain: str,
 
     if not broch_mode_is_active(base_dir):
         # instance level block list
-        if blocked_cache:
-            for blocked_str in blocked_cache:
-                if '*@' + domain in blocked_str:
+        compiled = _global_blocklist(base_dir, blocked_cache)
+        if compiled:
+            if block_domain:
+                if _blocklist_domain_match(compiled, block_domain):
                     return True
-                if block_handle:
-                    if blocked_str == block_handle:
-                        return True
-        else:
-            global_blocks_filename = base_dir + '/accounts/blocking.txt'
-            if os.path.isfile(global_blocks_filename):
-                if text_in_file('*@' + block_domain, global_blocks_filename):
+            if block_handle:
+                if block_handle in compiled['handles']:
                     return True
-                if block_handle:
-                    block_str = block_handle + '\n'
-                    if text_in_file(block_str, global_blocks_filename):
-                        return True
     else:
         # instance allow list
-        allow_filename = base_dir + '/accounts/allowedinstances.txt'
-        short_domain = _get_short_domain(block_domain)
-        if not short_domain:
-            if not text_in_file(block_domain + '\n', allow_filename):
-                return True
-        else:
-            if not text_in_file(short_domain + '\n', allow_filename):
-                return True
+        if not _instance_allows_domain(base_dir, block_domain):
+            return True
 
     # account level allow list
     account_dir = acct_dir(base_dir, nickname, domain)
-    allow_filename = account_dir + '/allowedinstances.txt'
-    if os.path.isfile(allow_filename):
-        if not text_in_file(block_domain + '\n', allow_filename):
+    compiled = _load_blocklist(account_dir + '/allowedinstances.txt')
+    if compiled:
+        if not _blocklist_domain_match(compiled, block_domain):
             return True
 
     # account level block list
-    blocking_filename = account_dir + '/blocking.txt'
-    if os.path.isfile(blocking_filename):
-        if text_in_file('*@' + block_domain + '\n', blocking_filename):
-            return True
+    compiled = _load_blocklist(account_dir + '/blocking.txt')
+    if compiled:
+        if block_domain:
+            if _blocklist_domain_match(compiled, block_domain):
+                return True
         if block_handle:
-            if text_in_file(block_handle + '\n', blocking_filename):
+            if block_handle in compiled['handles']:
                 return True
     return False
 
@@ -976,7 +1085,7 @@ def mute_post(base_dir: str, nickname: str, domain: str, port: int,
     # remove cached post so that the muted version gets recreated
     # without its content text and/or image
     cached_post_filename = \
-        get_cached_post_filename(base_dir, nickname, domain, post_json_object)
+        get_cached_post_filename(base_dir, post_json_object)
     if cached_post_filename:
         if os.path.isfile(cached_post_filename):
             try:
@@ -997,20 +1106,14 @@ def mute_post(base_dir: str, nickname: str, domain: str, port: int,
         return
     print('MUTE: ' + post_filename + '.muted file added')
 
-    # if the post is in the recent posts cache then mark it as muted
+    # if the post is in the recent posts cache then remove it, so that
+    # it is loaded again with its new state
     if recent_posts_cache.get('index'):
         post_id = \
             remove_id_ending(post_json_object['id']).replace('/', '#')
         if post_id in recent_posts_cache['index']:
-            print('MUTE: ' + post_id + ' is in recent posts cache')
-        if recent_posts_cache.get('json'):
-            recent_posts_cache['json'][post_id] = json.dumps(post_json_object)
-            print('MUTE: ' + post_id +
-                  ' marked as muted in recent posts memory cache')
-        if recent_posts_cache.get('html'):
-            if recent_posts_cache['html'].get(post_id):
-                del recent_posts_cache['html'][post_id]
-                print('MUTE: ' + post_id + ' removed cached html')
+            remove_id_from_recent_posts_cache(recent_posts_cache, post_id)
+            print('MUTE: ' + post_id + ' removed from recent posts cache')
 
     if also_update_post_id:
         post_filename = locate_post(base_dir, nickname, domain,
@@ -1018,8 +1121,7 @@ def mute_post(base_dir: str, nickname: str, domain: str, port: int,
         if os.path.isfile(post_filename):
             post_json_obj = load_json(post_filename)
             cached_post_filename = \
-                get_cached_post_filename(base_dir, nickname, domain,
-                                         post_json_obj)
+                get_cached_post_filename(base_dir, post_json_obj)
             if cached_post_filename:
                 if os.path.isfile(cached_post_filename):
                     try:
@@ -1031,16 +1133,12 @@ def mute_post(base_dir: str, nickname: str, domain: str, port: int,
                               'MUTE cached referenced post not removed ' +
                               cached_post_filename)
 
-        if recent_posts_cache.get('json'):
-            if recent_posts_cache['json'].get(also_update_post_id):
-                del recent_posts_cache['json'][also_update_post_id]
-                print('MUTE: ' + also_update_post_id +
-                      ' removed referenced json')
-        if recent_posts_cache.get('html'):
-            if recent_posts_cache['html'].get(also_update_post_id):
-                del recent_posts_cache['html'][also_update_post_id]
+        if recent_posts_cache.get('index'):
+            if also_update_post_id in recent_posts_cache['index']:
+                remove_id_from_recent_posts_cache(recent_posts_cache,
+                                                  also_update_post_id)
                 print('MUTE: ' + also_update_post_id +
-                      ' removed referenced html')
+                      ' removed referenced post from recent posts cache')
 
 
 def unmute_post(base_dir: str, nickname: str, domain: str, port: int,
@@ -1107,7 +1205,7 @@ def unmute_post(base_dir: str, nickname: str, domain: str, port: int,
     # remove cached post so that the muted version gets recreated
     # with its content text and/or image
     cached_post_filename = \
-        get_cached_post_filename(base_dir, nickname, domain, post_json_object)
+        get_cached_post_filename(base_dir, post_json_object)
     if cached_post_filename:
         if os.path.isfile(cached_post_filename):
             try:
@@ -1117,28 +1215,21 @@ def unmute_post(base_dir: str, nickname: str, domain: str, port: int,
                     print('EX: unmute_post cached post not deleted ' +
                           str(cached_post_filename))
 
-    # if the post is in the recent posts cache then mark it as unmuted
+    # if the post is in the recent posts cache then remove it, so that
+    # it is loaded again with its new state
     if recent_posts_cache.get('index'):
         post_id = \
             remove_id_ending(post_json_object['id']).replace('/', '#')
         if post_id in recent_posts_cache['index']:
-            print('UNMUTE: ' + post_id + ' is in recent posts cache')
-        if recent_posts_cache.get('json'):
-            recent_posts_cache['json'][post_id] = json.dumps(post_json_object)
-            print('UNMUTE: ' + post_id +
-                  ' marked as unmuted in recent posts cache')
-        if recent_posts_cache.get('html'):
-            if recent_posts_cache['html'].get(post_id):
-                del recent_posts_cache['html'][post_id]
-                print('UNMUTE: ' + post_id + ' removed cached html')
+            remove_id_from_recent_posts_cache(recent_posts_cache, post_id)
+            print('UNMUTE: ' + post_id + ' removed from recent posts cache')
     if also_update_post_id:
         post_filename = locate_post(base_dir, nickname, domain,
                                     also_update_post_id)
         if os.path.isfile(post_filename):
             post_json_obj = load_json(post_filename)
             cached_post_filename = \
-                get_cached_post_filename(base_dir, nickname, domain,
-                                         post_json_obj)
+                get_cached_post_filename(base_dir, post_json_obj)
             if cached_post_filename:
                 if os.path.isfile(cached_post_filename):
                     try:
@@ -1151,16 +1242,12 @@ def unmute_post(base_dir: str, nickname: str, domain: str, port: int,
                                   'unmute_post cached ref post not removed ' +
                                   str(cached_post_filename))
 
-        if recent_posts_cache.get('json'):
-            if recent_posts_cache['json'].get(also_update_post_id):
-                del recent_posts_cache['json'][also_update_post_id]
-                print('UNMUTE: ' +
-                      also_update_post_id + ' removed referenced json')
-        if recent_posts_cache.get('html'):
-            if recent_posts_cache['html'].get(also_update_post_id):
-                del recent_posts_cache['html'][also_update_post_id]
-                print('UNMUTE: ' +
-                      also_update_post_id + ' removed referenced html')
+        if recent_posts_cache.get('index'):
+            if also_update_post_id in recent_posts_cache['index']:
+                remove_id_from_recent_posts_cache(recent_posts_cache,
+                                                  also_update_post_id)
+                print('UNMUTE: ' + also_update_post_id +
+                      ' removed referenced post from recent posts cache')
 
 
 def outbox_mute(base_dir: str, http_prefix: str,
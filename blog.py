@@ -11,6 +11,7 @@ import os
 from datetime import datetime
 
 from content import replace_emoji_from_tags
+from posthtmlcache import post_html_cache_filename
 from webapp_utils import html_header_with_external_style
 from webapp_utils import html_header_with_blog_markup
 from webapp_utils import html_footer
@@ -137,9 +138,8 @@ def _get_blog_replies(base_dir: str, http_prefix: str, translate: {},
                 acct_dir(base_dir, nickname, domain) + '/' + post_box + '/' + \
                 post_id.replace('/', '#') + '.json'
             if os.path.isfile(post_filename):
-                post_filename = acct_dir(base_dir, nickname, domain) + \
-                    '/postcache/' + \
-                    post_id.replace('/', '#') + '.html'
+                post_filename = \
+                    post_html_cache_filename(base_dir, post_id)
                 if os.path.isfile(post_filename):
                     try:
                         with open(post_filename, 'r',
@@ -162,9 +162,8 @@ def _get_blog_replies(base_dir: str, http_prefix: str, translate: {},
             reply_post_id = remove_eol(reply_post_id)
             reply_post_id = reply_post_id.replace('.json', '')
             reply_post_id = reply_post_id.replace('.replies', '')
-            post_filename = acct_dir(base_dir, nickname, domain) + \
-                '/postcache/' + \
-                reply_post_id.replace('/', '#') + '.html'
+            post_filename = \
+                post_html_cache_filename(base_dir, reply_post_id)
             if not os.path.isfile(post_filename):
                 continue
             try:
@@ -32,6 +32,8 @@ from utils import text_in_file
 from utils import remove_eol
 from posts import get_person_box
 from session import post_json
+from boxindex import box_index_append
+from boxindex import box_index_remove
 
 
 def undo_bookmarks_collection_entry(recent_posts_cache: {},
@@ -50,8 +52,7 @@ def undo_bookmarks_collection_entry(recent_posts_cache: {},
     if not nickname:
         return
     cached_post_filename = \
-        get_cached_post_filename(base_dir, nickname,
-                                 domain, post_json_object)
+        get_cached_post_filename(base_dir, post_json_object)
     if cached_post_filename:
         if os.path.isfile(cached_post_filename):
             try:
@@ -75,21 +76,7 @@ def undo_bookmarks_collection_entry(recent_posts_cache: {},
     bookmark_index = remove_eol(bookmark_index)
     if not text_in_file(bookmark_index, bookmarks_index_filename):
         return
-    index_str = ''
-    try:
-        with open(bookmarks_index_filename, 'r',
-                  encoding='utf-8') as index_file:
-            index_str = index_file.read().replace(bookmark_index + '\n', '')
-    except OSError:
-        print('EX: unable to read ' + bookmarks_index_filename)
-    if index_str:
-        try:
-            with open(bookmarks_index_filename, 'w+',
-                      encoding='utf-8') as bmi_file:
-                bmi_file.write(index_str)
-        except OSError:
-            print('EX: unable to write bookmarks index ' +
-                  bookmarks_index_filename)
+    box_index_remove(bookmarks_index_filename, bookmark_index)
     if not post_json_object.get('type'):
         return
     if post_json_object['type'] != 'Create':
@@ -176,8 +163,7 @@ def update_bookmarks_collection(recent_posts_cache: {},
     if not nickname:
         return
     cached_post_filename = \
-        get_cached_post_filename(base_dir, nickname,
-                                 domain, post_json_object)
+        get_cached_post_filename(base_dir, post_json_object)
     if cached_post_filename:
         if os.path.isfile(cached_post_filename):
             try:
@@ -234,32 +220,19 @@ def update_bookmarks_collection(recent_posts_cache: {},
 
     save_json(post_json_object, post_filename)
 
-    # prepend to the index
+    # append to the index
     bookmarks_index_filename = \
         acct_dir(base_dir, nickname, domain) + '/bookmarks.index'
     bookmark_index = post_filename.split('/')[-1]
     if os.path.isfile(bookmarks_index_filename):
-        if not text_in_file(bookmark_index, bookmarks_index_filename):
-            try:
-                with open(bookmarks_index_filename, 'r+',
-                          encoding='utf-8') as bmi_file:
-                    content = bmi_file.read()
-                    if bookmark_index + '\n' not in content:
-                        bmi_file.seek(0, 0)
-                        bmi_file.write(bookmark_index + '\n' + content)
-                        if debug:
-                            print('DEBUG: bookmark added to index')
-            except OSError as ex:
-                print('WARN: Failed to write entry to bookmarks index ' +
-                      bookmarks_index_filename + ' ' + str(ex))
+        if text_in_file(bookmark_index, bookmarks_index_filename):
+            return
+    if box_index_append(bookmarks_index_filename, bookmark_index):
+        if debug:
+            print('DEBUG: bookmark added to index')
     else:
-        try:
-            with open(bookmarks_index_filename, 'w+',
-                      encoding='utf-8') as bm_file:
-                bm_file.write(bookmark_index + '\n')
-        except OSError:
-            print('EX: unable to write bookmarks index ' +
-                  bookmarks_index_filename)
+        print('WARN: Failed to write entry to bookmarks index ' +
+              bookmarks_index_filename)
 
 
 def bookmark_post(recent_posts_cache: {},
@@ -0,0 +1,138 @@
+__filename__ = "boxevents.py"
+__author__ = "Bob Mottram"
+__license__ = "AGPL3+"
+__version__ = "1.4.0"
+__maintainer__ = "Bob Mottram"
+__email__ = "bob@libreserver.org"
+__status__ = "Production"
+__module_group__ = "Timeline"
+
+# Recent events for each account, such as posts being added to its
+# timelines or notifications of likes, replies, DMs and follow requests.
+# C2S clients can ask for the events after a cursor, waiting until an
+# event arrives, rather than repeatedly downloading whole timelines to
+# find out whether anything has changed.
+# Event ids are derived from the time in milliseconds and always
+# increase, so that a cursor obtained before the server restarted is
+# still earlier than any new event. If events after a cursor may have
+# been missed, because the server restarted or because more events
+# arrived than are retained, then the client is told to reset and
+# download its timelines again.
+
+import time
+import threading
+from collections import deque
+
+# maximum number of events retained for each account
+BOX_EVENTS_MAX = 256
+
+# maximum number of seconds that a client may wait for events
+BOX_EVENTS_MAX_WAIT_SEC = 30
+
+_BOX_EVENTS = {
+    'changed': threading.Condition(),
+    # id of the most recent event
+    'last_id': 0,
+    # events before this id happened before the server started
+    'start_id': int(time.time() * 1000),
+    # handle -> {'events': deque of events, 'dropped_id': int}
+    'accounts': {}
+}
+
+
+def _box_events_handle(handle: str) -> str:
+    """Returns the handle used to store events for an account
+    """
+    if ':' in handle:
+        handle = handle.split(':')[0]
+    return handle
+
+
+def box_event_add(handle: str, event_type: str,
+                  box_name: str, url: str) -> int:
+    """Adds an event for the given account and wakes any clients waiting
+    for events. event_type is 'post' when a post is added to the box
+    with the given name, otherwise the type of notification, such as
+    'dm', 'reply', 'like', 'reaction', 'notify' or 'follow'.
+    Returns the id of the event
+    """
+    handle = _box_events_handle(handle)
+    with _BOX_EVENTS['changed']:
+        event_id = max(_BOX_EVENTS['last_id'] + 1, int(time.time() * 1000))
+        _BOX_EVENTS['last_id'] = event_id
+        account = _BOX_EVENTS['accounts'].get(handle)
+        if not account:
+            account = {
+                'events': deque(),
+                'dropped_id': _BOX_EVENTS['start_id']
+            }
+            _BOX_EVENTS['accounts'][handle] = account
+        account['events'].append({
+            'id': event_id,
+            'type': event_type,
+            'box': box_name,
+            'url': url
+        })
+        while len(account['events']) > BOX_EVENTS_MAX:
+            dropped_event = account['events'].popleft()
+            account['dropped_id'] = dropped_event['id']
+        _BOX_EVENTS['changed'].notify_all()
+    return event_id
+
+
+def _box_events_after(account: {}, since: int) -> []:
+    """Returns the events of an account after the given cursor.
+    This must be called while holding the lock
+    """
+    events = []
+    if not account:
+        return events
+    for event in reversed(account['events']):
+        if event['id'] <= since:
+            break
+        events.append(event)
+    events.reverse()
+    return events
+
+
+def box_events_since(handle: str, since: int, wait_sec: int) -> {}:
+    """Returns the events for an account after the given cursor,
+    waiting for up to the given number of seconds if there are none.
+    The returned 'cursor' should be given when next asking for events.
+    If 'reset' is true then events may have been missed and the
+    timelines should be downloaded again.
+    Without a cursor only the current cursor is returned
+    """
+    handle = _box_events_handle(handle)
+    wait_sec = max(min(wait_sec, BOX_EVENTS_MAX_WAIT_SEC), 0)
+    deadline = time.time() + wait_sec
+    with _BOX_EVENTS['changed']:
+        reset = False
+        events = []
+        if since > 0:
+            account = _BOX_EVENTS['accounts'].get(handle)
+            dropped_id = _BOX_EVENTS['start_id']
+            if account:
+                dropped_id = account['dropped_id']
+            if since < dropped_id:
+                reset = True
+            else:
+                events = _box_events_after(account, since)
+                while not events:
+                    remaining_sec = deadline - time.time()
+                    if remaining_sec <= 0:
+                        break
+                    _BOX_EVENTS['changed'].wait(remaining_sec)
+                    account = _BOX_EVENTS['accounts'].get(handle)
+                    if account and since < account['dropped_id']:
+                        reset = True
+                        break
+                    events = _box_events_after(account, since)
+        cursor = max(_BOX_EVENTS['last_id'], _BOX_EVENTS['start_id'])
+    if events and not reset:
+        cursor = events[-1]['id']
+    return {
+        'cursor': cursor,
+        'reset': reset,
+        'events': events
+    }
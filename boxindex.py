@@ -0,0 +1,284 @@
+__filename__ = "boxindex.py"
+__author__ = "Bob Mottram"
+__license__ = "AGPL3+"
+__version__ = "1.4.0"
+__maintainer__ = "Bob Mottram"
+__email__ = "bob@libreserver.org"
+__status__ = "Production"
+__module_group__ = "Timeline"
+
+# Timeline index files such as inbox.index, tlreplies.index or
+# outbox.index contain one post filename per line. New entries are
+# appended to the end of the file, so the newest post is the last line.
+# Alongside each index there is an offsets file containing the byte
+# position of each line as a fixed width big endian integer. This means
+# that adding a post is O(1) and any page of the timeline can be read
+# with a couple of seeks, without needing to scan the earlier pages.
+#
+# Index files created by earlier versions have the newest entry at the
+# top and no offsets file. These are converted the first time they
+# are accessed.
+
+import os
+
+# number of bytes used to store each offset
+BOX_INDEX_OFFSET_BYTES = 8
+
+# how many of the most recent entries are checked for duplicates
+# when appending
+BOX_INDEX_DUPLICATE_WINDOW = 64
+
+
+def _box_index_offsets_filename(index_filename: str) -> str:
+    """Returns the filename of the offsets table for the given index
+    """
+    return index_filename + '.offsets'
+
+
+def _box_index_write_offsets(index_filename: str) -> bool:
+    """Creates the offsets table for an index file which is already
+    in the append-only format
+    """
+    offsets = []
+    try:
+        with open(index_filename, 'rb') as fp_index:
+            position = 0
+            for line in fp_index:
+                offsets.append(position.to_bytes(BOX_INDEX_OFFSET_BYTES,
+                                                 'big'))
+                position += len(line)
+    except OSError:
+        print('EX: unable to read box index ' + index_filename)
+        return False
+    offsets_filename = _box_index_offsets_filename(index_filename)
+    try:
+        with open(offsets_filename, 'wb+') as fp_offsets:
+            fp_offsets.write(b''.join(offsets))
+    except OSError:
+        print('EX: unable to write box index offsets ' + offsets_filename)
+        return False
+    return True
+
+
+def _box_index_save(index_filename: str, entries: []) -> bool:
+    """Saves a list of entries, oldest first, as an index file
+    together with its offsets table
+    """
+    index_str = ''
+    for entry in entries:
+        index_str += entry + '\n'
+    try:
+        with open(index_filename, 'w+', encoding='utf-8') as fp_index:
+            fp_index.write(index_str)
+    except OSError:
+        print('EX: unable to write box index ' + index_filename)
+        return False
+    return _box_index_write_offsets(index_filename)
+
+
+def _box_index_rewrite(index_filename: str, legacy: bool) -> bool:
+    """Rewrites an index file together with its offsets table.
+    If this is a legacy index then its newest-first ordering
+    is converted into the append-only format
+    """
+    entries = []
+    try:
+        with open(index_filename, 'r', encoding='utf-8') as fp_index:
+            for line in fp_index:
+                entry = line.strip()
+                if entry:
+                    entries.append(entry)
+    except OSError:
+        print('EX: unable to read box index for rewrite ' + index_filename)
+        return False
+    if legacy:
+        print('Upgrading box index ' + index_filename)
+        entries.reverse()
+    else:
+        print('Rebuilding box index offsets ' + index_filename)
+    return _box_index_save(index_filename, entries)
+
+
+def _box_index_offsets_valid(index_filename: str) -> bool:
+    """Does the offsets table agree with the index file?
+    """
+    offsets_filename = _box_index_offsets_filename(index_filename)
+    try:
+        index_stat = os.stat(index_filename)
+        offsets_stat = os.stat(offsets_filename)
+    except OSError:
+        return False
+    # the index was changed after the offsets were written
+    if index_stat.st_mtime_ns > offsets_stat.st_mtime_ns:
+        return False
+    if offsets_stat.st_size % BOX_INDEX_OFFSET_BYTES != 0:
+        return False
+    if offsets_stat.st_size == 0:
+        return index_stat.st_size == 0
+    # the last offset should point to the last line of the index
+    try:
+        with open(offsets_filename, 'rb') as fp_offsets:
+            fp_offsets.seek(-BOX_INDEX_OFFSET_BYTES, 2)
+            last_offset = \
+                int.from_bytes(fp_offsets.read(BOX_INDEX_OFFSET_BYTES), 'big')
+        if last_offset >= index_stat.st_size:
+            return False
+        with open(index_filename, 'rb') as fp_index:
+            fp_index.seek(last_offset)
+            last_line = fp_index.read()
+    except OSError:
+        return False
+    if not last_line.endswith(b'\n'):
+        return False
+    if b'\n' in last_line[:-1]:
+        return False
+    if last_offset > 0:
+        # the previous byte should be the end of a line
+        try:
+            with open(index_filename, 'rb') as fp_index:
+                fp_index.seek(last_offset - 1)
+                if fp_index.read(1) != b'\n':
+                    return False
+        except OSError:
+            return False
+    return True
+
+
+def _box_index_prepare(index_filename: str) -> bool:
+    """Ensures that the given index is in the append-only format
+    and has a valid offsets table
+    """
+    if not os.path.isfile(index_filename):
+        return False
+    offsets_filename = _box_index_offsets_filename(index_filename)
+    if not os.path.isfile(offsets_filename):
+        return _box_index_rewrite(index_filename, True)
+    if not _box_index_offsets_valid(index_filename):
+        return _box_index_rewrite(index_filename, False)
+    return True
+
+
+def box_index_count(index_filename: str) -> int:
+    """Returns the number of entries within the given index
+    """
+    if not _box_index_prepare(index_filename):
+        return 0
+    offsets_filename = _box_index_offsets_filename(index_filename)
+    try:
+        return os.path.getsize(offsets_filename) // BOX_INDEX_OFFSET_BYTES
+    except OSError:
+        print('EX: unable to get size of ' + offsets_filename)
+    return 0
+
+
+def box_index_page(index_filename: str, start: int, count: int) -> []:
+    """Returns up to count entries from the index, newest first,
+    after skipping the given number of most recent entries
+    """
+    total = box_index_count(index_filename)
+    if start < 0:
+        start = 0
+    if count <= 0 or start >= total:
+        return []
+    # range of entries in file order
+    last_index = total - 1 - start
+    first_index = last_index - count + 1
+    if first_index < 0:
+        first_index = 0
+    offsets_filename = _box_index_offsets_filename(index_filename)
+    try:
+        with open(offsets_filename, 'rb') as fp_offsets:
+            fp_offsets.seek(first_index * BOX_INDEX_OFFSET_BYTES)
+            first_offset = \
+                int.from_bytes(fp_offsets.read(BOX_INDEX_OFFSET_BYTES), 'big')
+            end_offset = None
+            if last_index + 1 < total:
+                fp_offsets.seek((last_index + 1) * BOX_INDEX_OFFSET_BYTES)
+                end_offset = \
+                    int.from_bytes(fp_offsets.read(BOX_INDEX_OFFSET_BYTES),
+                                   'big')
+        with open(index_filename, 'rb') as fp_index:
+            fp_index.seek(first_offset)
+            if end_offset is None:
+                data = fp_index.read()
+            else:
+                data = fp_index.read(end_offset - first_offset)
+    except OSError:
+        print('EX: unable to read page of box index ' + index_filename)
+        return []
+    entries = []
+    for line in data.decode('utf-8').split('\n'):
+        entry = line.strip()
+        if entry:
+            entries.append(entry)
+    entries.reverse()
+    return entries
+
+
+def box_index_entries(index_filename: str) -> []:
+    """Returns all entries within the index, newest first
+    """
+    return box_index_page(index_filename, 0, box_index_count(index_filename))
+
+
+def box_index_append(index_filename: str, entry: str) -> bool:
+    """Adds a new entry to the end of an index
+    """
+    entry = entry.strip()
+    if not entry:
+        return False
+    if os.path.isfile(index_filename):
+        if not _box_index_prepare(index_filename):
+            return False
+        # has this entry been added recently?
+        if entry in box_index_page(index_filename, 0,
+                                   BOX_INDEX_DUPLICATE_WINDOW):
+            return True
+    offsets_filename = _box_index_offsets_filename(index_filename)
+    try:
+        with open(index_filename, 'ab') as fp_index:
+            fp_index.seek(0, 2)
+            position = fp_index.tell()
+            fp_index.write((entry + '\n').encode('utf-8'))
+        with open(offsets_filename, 'ab') as fp_offsets:
+            fp_offsets.write(position.to_bytes(BOX_INDEX_OFFSET_BYTES, 'big'))
+    except OSError as ex:
+        print('EX: unable to append to box index ' + index_filename +
+              ' ' + str(ex))
+        return False
+    return True
+
+
+def box_index_remove(index_filename: str, entry: str) -> bool:
+    """Removes an entry from an index
+    """
+    entry = entry.strip()
+    if not _box_index_prepare(index_filename):
+        return False
+    entries = box_index_entries(index_filename)
+    if entry not in entries:
+        return False
+    new_entries = []
+    for existing in entries:
+        if existing != entry:
+            new_entries.append(existing)
+    new_entries.reverse()
+    return _box_index_save(index_filename, new_entries)
+
+
+def box_index_truncate(index_filename: str, max_entries: int) -> bool:
+    """Retains only the most recent entries within an index
+    """
+    if box_index_count(index_filename) <= max_entries:
+        return False
+    entries = box_index_page(index_filename, 0, max_entries)
+    entries.reverse()
+    return _box_index_save(index_filename, entries)
+
+
+def box_index_create(index_filename: str, entries: []) -> bool:
+    """Creates a new index from a list of entries, newest first
+    """
+    entries = entries.copy()
+    entries.reverse()
+    return _box_index_save(index_filename, entries)
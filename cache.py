@@ -8,28 +8,34 @@ __status__ = "Production"
 __module_group__ = "Core"
 
 import os
-import datetime
+import time
 from session import url_exists
 from session import get_json
-from utils import load_json
-from utils import save_json
-from utils import get_file_case_insensitive
 from utils import get_user_paths
+from actorstore import actor_store_record
+from actorstore import actor_store_projection
+from actorstore import actor_store_full
+from actorstore import actor_store_forget
+from actorstore import actor_store_load
+from actorstore import actor_store_unchanged
+from actorstore import actor_store_save
+from actorstore import actor_store_remove
+from sigcache import forget_actor_public_keys
+from skillsindex import skills_index_update
+from webfingercache import WEBFINGER_CACHE_TTL_SEC
+from webfingercache import WEBFINGER_CACHE_FAILURE_SEC
+from webfingercache import webfinger_cache_append
 
 
 def _remove_person_from_cache(base_dir: str, person_url: str,
                               person_cache: {}) -> bool:
     """Removes an actor from the cache
     """
-    cache_filename = base_dir + '/cache/actors/' + \
-        person_url.replace('/', '#') + '.json'
-    if os.path.isfile(cache_filename):
-        try:
-            os.remove(cache_filename)
-        except OSError:
-            print('EX: unable to delete cached actor ' + str(cache_filename))
+    actor_store_remove(base_dir, person_url)
     if person_cache.get(person_url):
+        actor_store_forget(person_url, person_cache[person_url])
         del person_cache[person_url]
+    forget_actor_public_keys(person_url)
 
 
 def check_for_changed_actor(session, base_dir: str,
@@ -59,22 +65,37 @@ def store_person_in_cache(base_dir: str, person_url: str,
         # This is not an actor or person account
         return
 
-    curr_time = datetime.datetime.utcnow()
-    person_cache[person_url] = {
-        "actor": person_json,
-        "timestamp": curr_time.strftime("%Y-%m-%dT%H:%M:%SZ")
-    }
-    if not base_dir:
-        return
-
     # store to file
-    if not allow_write_to_file:
-        return
-    if os.path.isdir(base_dir + '/cache/actors'):
-        cache_filename = base_dir + '/cache/actors/' + \
-            person_url.replace('/', '#') + '.json'
-        if not os.path.isfile(cache_filename):
-            save_json(person_json, cache_filename)
+    persisted = False
+    if base_dir and allow_write_to_file:
+        skills_index_update(base_dir, person_json, False)
+        if os.path.isdir(base_dir + '/cache/actors'):
+            # the actor on file must be the same as the one in memory,
+            # because it is loaded again if the actor is dropped from
+            # memory
+            persisted = True
+            prev_record = person_cache.get(person_url)
+            if not actor_store_unchanged(prev_record, person_json):
+                persisted = \
+                    actor_store_save(base_dir, person_url, person_json)
+    _store_person_record(person_url, person_json, person_cache, persisted)
+
+
+def _store_person_record(person_url: str, person_json: {},
+                         person_cache: {}, persisted: bool) -> None:
+    """Stores the record for an actor within the cache in memory.
+    Actors which are stored on file may later be dropped from memory,
+    keeping only their compact form
+    """
+    record = actor_store_record(person_url, person_json, persisted, 0)
+    prev_record = person_cache.get(person_url)
+    if prev_record:
+        # if the key of the actor has changed, for example after an
+        # actor Update, then forget the previous key
+        prev_key_pem = actor_store_projection(prev_record).get('publicKeyPem')
+        if prev_key_pem != record['compact'].get('publicKeyPem'):
+            forget_actor_public_keys(person_url)
+    person_cache[person_url] = record
 
 
 def get_person_from_cache(base_dir: str, person_url: str,
@@ -82,59 +103,75 @@ def get_person_from_cache(base_dir: str, person_url: str,
     """Get an actor from the cache
     """
     # if the actor is not in memory then try to load it from file
-    loaded_from_file = False
     if not person_cache.get(person_url):
+        if not base_dir:
+            return None
         # does the person exist as a cached file?
-        cache_filename = base_dir + '/cache/actors/' + \
-            person_url.replace('/', '#') + '.json'
-        actor_filename = get_file_case_insensitive(cache_filename)
-        if actor_filename:
-            person_json = load_json(actor_filename)
-            if person_json:
-                store_person_in_cache(base_dir, person_url, person_json,
-                                      person_cache, False)
-                loaded_from_file = True
+        if 'statuses' in person_url or person_url.endswith('/actor'):
+            # This is not an actor or person account
+            return None
+        person_json = actor_store_load(base_dir, person_url)
+        if not person_json:
+            return None
+        _store_person_record(person_url, person_json, person_cache, True)
 
-    if person_cache.get(person_url):
-        if not loaded_from_file:
-            # update the timestamp for the last time the actor was retrieved
-            curr_time = datetime.datetime.utcnow()
-            curr_time_str = curr_time.strftime("%Y-%m-%dT%H:%M:%SZ")
-            person_cache[person_url]['timestamp'] = curr_time_str
-        return person_cache[person_url]['actor']
-    return None
+    # the full actor is loaded from file if it is no longer in memory,
+    # and the timestamp is updated for the last time it was retrieved
+    person_json = \
+        actor_store_full(base_dir, person_url, person_cache[person_url])
+    if not person_json:
+        del person_cache[person_url]
+    return person_json
 
 
 def expire_person_cache(person_cache: {}):
     """Expires old entries from the cache in memory
     """
-    curr_time = datetime.datetime.utcnow()
+    curr_time = int(time.time())
     removals = []
-    for person_url, cache_json in person_cache.items():
-        cache_time = datetime.datetime.strptime(cache_json['timestamp'],
-                                                "%Y-%m-%dT%H:%M:%SZ")
-        days_since_cached = (curr_time - cache_time).days
-        if days_since_cached > 2:
+    for person_url, record in person_cache.items():
+        if curr_time - record['timestamp'] >= 3 * 24 * 60 * 60:
             removals.append(person_url)
     if len(removals) > 0:
         for person_url in removals:
+            actor_store_forget(person_url, person_cache[person_url])
             del person_cache[person_url]
         print(str(len(removals)) + ' actors were expired from the cache')
 
 
 def store_webfinger_in_cache(handle: str, webfing,
                              cached_webfingers: {}) -> None:
-    """Store a webfinger endpoint in the cache
+    """Store a webfinger endpoint in the cache.
+    If the lookup failed then webfing is None, and the failure is
+    remembered for a short time
     """
-    cached_webfingers[handle] = webfing
+    curr_time = int(time.time())
+    if webfing:
+        expires = curr_time + WEBFINGER_CACHE_TTL_SEC
+    else:
+        webfing = None
+        expires = curr_time + WEBFINGER_CACHE_FAILURE_SEC
+    record = {
+        'wf': webfing,
+        'expires': expires
+    }
+    cached_webfingers[handle] = record
+    webfinger_cache_append(handle, record, cached_webfingers)
 
 
 def get_webfinger_from_cache(handle: str, cached_webfingers: {}) -> {}:
-    """Get webfinger endpoint from the cache
+    """Get webfinger endpoint from the cache.
+    Returns an empty dict if a recent lookup failed
     """
-    if cached_webfingers.get(handle):
-        return cached_webfingers[handle]
-    return None
+    record = cached_webfingers.get(handle)
+    if not record:
+        return None
+    if record['expires'] < int(time.time()):
+        cached_webfingers.pop(handle, None)
+        return None
+    if not record['wf']:
+        return {}
+    return record['wf']
 
 
 def get_person_pub_key(base_dir: str, session, person_url: str,
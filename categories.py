@@ -8,7 +8,8 @@ __status__ = "Production"
 __module_group__ = "RSS Feeds"
 
 import os
-import datetime
+from hashtagstats import hashtag_stats_categories
+from hashtagstats import hashtag_stats_set_category
 
 MAX_TAG_LENGTH = 42
 
@@ -43,54 +44,12 @@ def get_hashtag_categories(base_dir: str,
                            category: str = None) -> None:
     """Returns a dictionary containing hashtag categories
     """
-    hashtag_categories = {}
-
-    if recent:
-        curr_time = datetime.datetime.utcnow()
-        days_since_epoch = (curr_time - datetime.datetime(1970, 1, 1)).days
-        recently = days_since_epoch - 1
-
-    for _, _, files in os.walk(base_dir + '/tags'):
-        for catfile in files:
-            if not catfile.endswith('.category'):
-                continue
-            category_filename = os.path.join(base_dir + '/tags', catfile)
-            if not os.path.isfile(category_filename):
-                continue
-            hashtag = catfile.split('.')[0]
-            if len(hashtag) > MAX_TAG_LENGTH:
-                continue
-            with open(category_filename, 'r', encoding='utf-8') as fp_category:
-                category_str = fp_category.read()
-
-                if not category_str:
-                    continue
-
-                if category:
-                    # only return a dictionary for a specific category
-                    if category_str != category:
-                        continue
-
-                if recent:
-                    tags_filename = base_dir + '/tags/' + hashtag + '.txt'
-                    if not os.path.isfile(tags_filename):
-                        continue
-                    mod_time_since_epoc = \
-                        os.path.getmtime(tags_filename)
-                    last_modified_date = \
-                        datetime.datetime.fromtimestamp(mod_time_since_epoc)
-                    file_days_since_epoch = \
-                        (last_modified_date -
-                         datetime.datetime(1970, 1, 1)).days
-                    if file_days_since_epoch < recently:
-                        continue
-
-                if not hashtag_categories.get(category_str):
-                    hashtag_categories[category_str] = [hashtag]
-                else:
-                    if hashtag not in hashtag_categories[category_str]:
-                        hashtag_categories[category_str].append(hashtag)
-        break
+    hashtag_categories = \
+        hashtag_stats_categories(base_dir, recent, category)
+    for category_str, hashtag_list in hashtag_categories.items():
+        hashtag_categories[category_str] = \
+            [hashtag for hashtag in hashtag_list
+             if len(hashtag) <= MAX_TAG_LENGTH]
     return hashtag_categories
 
 
@@ -180,6 +139,7 @@ def set_hashtag_category(base_dir: str, hashtag: str, category: str,
               ' ' + str(ex))
 
     if category_written:
+        hashtag_stats_set_category(base_dir, hashtag, category)
         if update:
             update_hashtag_categories(base_dir)
         return True
@@ -13,7 +13,6 @@ import html
 import os
 import email.parser
 import urllib.parse
-from shutil import copyfile
 from dateutil.parser import parse
 from utils import get_content_from_post
 from utils import get_full_domain
@@ -32,12 +31,16 @@ from utils import dangerous_markup
 from utils import is_pgp_encrypted
 from utils import contains_pgp_public_key
 from utils import acct_dir
+from accountsettings import get_account_settings
 from utils import is_float
 from utils import get_currencies
 from utils import remove_html
 from utils import remove_eol
 from petnames import get_pet_name
 from session import download_image
+from actorstore import actor_store_locate
+from contentcache import get_content_context
+from contentcache import get_emoji_context
 
 MUSIC_SITES = ('soundcloud.com', 'bandcamp.com')
 
@@ -351,18 +354,8 @@ def _save_custom_emoji(session, base_dir: str, emojiName: str, url: str,
 def _get_emoji_name_from_code(base_dir: str, emoji_code: str) -> str:
     """Returns the emoji name from its code
     """
-    emojis_filename = base_dir + '/emoji/emoji.json'
-    if not os.path.isfile(emojis_filename):
-        emojis_filename = base_dir + '/emoji/default_emoji.json'
-        if not os.path.isfile(emojis_filename):
-            return None
-    emojis_json = load_json(emojis_filename)
-    if not emojis_json:
-        return None
-    for emoji_name, code in emojis_json.items():
-        if code == emoji_code:
-            return emoji_name
-    return None
+    emoji_context = get_emoji_context(base_dir)
+    return emoji_context['names'].get(emoji_code)
 
 
 def _update_common_emoji(base_dir: str, emoji_content: str) -> None:
@@ -811,7 +804,7 @@ def replace_remote_hashtags(content: str,
 def _add_emoji(base_dir: str, word_str: str,
                http_prefix: str, domain: str,
                replace_emoji: {}, post_tags: {},
-               emoji_dict: {}) -> bool:
+               emoji_context: {}) -> bool:
     """Detects Emoji and adds them to the replacements dict
     Also updates the tags list to be added to the post
     """
@@ -829,14 +822,15 @@ def _add_emoji(base_dir: str, word_str: str,
     # is the text of the emoji valid?
     if not valid_hash_tag(emoji):
         return False
+    emoji_dict = emoji_context['emoji']
     if not emoji_dict.get(emoji):
         return False
-    emoji_filename = base_dir + '/emoji/' + emoji_dict[emoji] + '.png'
-    if not os.path.isfile(emoji_filename):
-        emoji_filename = \
-            base_dir + '/emojicustom/' + emoji_dict[emoji] + '.png'
-        if not os.path.isfile(emoji_filename):
-            return False
+    # directory containing the emoji image
+    emoji_dir = emoji_context['images'].get(emoji_dict[emoji])
+    if not emoji_dir:
+        return False
+    emoji_filename = \
+        base_dir + '/' + emoji_dir + '/' + emoji_dict[emoji] + '.png'
     emoji_url = http_prefix + "://" + domain + \
         "/emoji/" + emoji_dict[emoji] + '.png'
     post_tags[emoji] = {
@@ -870,15 +864,10 @@ def _mention_to_url(base_dir: str, http_prefix: str,
     there is a matching actor
     """
     possible_paths = get_user_paths()
-    cache_dir = base_dir + '/cache/actors'
-    cache_path_start = cache_dir + '/' + http_prefix + ':##' + domain
     for users_path in possible_paths:
-        users_path = users_path.replace('/', '#')
-        possible_cache_entry = \
-            cache_path_start + users_path + nickname + '.json'
-        if os.path.isfile(possible_cache_entry):
-            return http_prefix + '://' + \
-                domain + users_path.replace('#', '/') + nickname
+        possible_actor = http_prefix + '://' + domain + users_path + nickname
+        if actor_store_locate(base_dir, possible_actor):
+            return possible_actor
     return http_prefix + '://' + domain + '/users/' + nickname
 
 
@@ -1111,41 +1100,12 @@ def remove_long_words(content: str, max_word_length: int,
     return content
 
 
-def _load_auto_tags(base_dir: str, nickname: str, domain: str) -> []:
-    """Loads automatic tags file and returns a list containing
-    the lines of the file
-    """
-    filename = acct_dir(base_dir, nickname, domain) + '/autotags.txt'
-    if not os.path.isfile(filename):
-        return []
-    try:
-        with open(filename, 'r', encoding='utf-8') as tags_file:
-            return tags_file.readlines()
-    except OSError:
-        print('EX: unable to read auto tags ' + filename)
-    return []
-
-
-def _auto_tag(base_dir: str, nickname: str, domain: str,
-              word_str: str, auto_tag_list: [],
-              append_tags: []):
+def _auto_tag(word_str: str, auto_tags: {}, append_tags: []) -> None:
     """Generates a list of tags to be automatically appended to the content
     """
-    for tag_rule in auto_tag_list:
-        if word_str not in tag_rule:
-            continue
-        if '->' not in tag_rule:
-            continue
-        rulematch = tag_rule.split('->')[0].strip()
-        if rulematch != word_str:
-            continue
-        tag_name = tag_rule.split('->')[1].strip()
-        if tag_name.startswith('#'):
-            if tag_name not in append_tags:
-                append_tags.append(tag_name)
-        else:
-            if '#' + tag_name not in append_tags:
-                append_tags.append('#' + tag_name)
+    for tag_name in auto_tags.get(word_str, ()):
+        if tag_name not in append_tags:
+            append_tags.append(tag_name)
 
 
 def _get_simplified_content(content: str) -> str:
@@ -1329,25 +1289,17 @@ def add_html_tags(base_dir: str, http_prefix: str,
     replace_mentions = {}
     replace_hashtags = {}
     replace_emoji = {}
-    emoji_dict = {}
     original_domain = domain
     domain = remove_domain_port(domain)
-    following_filename = \
-        acct_dir(base_dir, nickname, domain) + '/following.txt'
+    content_context = get_content_context(base_dir, nickname, domain)
 
-    # read the following list so that we can detect just @nick
+    # use the following list so that we can detect just @nick
     # in addition to @nick@domain
     following = None
     petnames = None
     if '@' in words:
-        if os.path.isfile(following_filename):
-            following = []
-            try:
-                with open(following_filename, 'r',
-                          encoding='utf-8') as foll_file:
-                    following = foll_file.readlines()
-            except OSError:
-                print('EX: unable to read ' + following_filename)
+        if content_context['following']:
+            following = content_context['following']
             for handle in following:
                 pet = get_pet_name(base_dir, nickname, domain, handle)
                 if pet:
@@ -1356,7 +1308,7 @@ def add_html_tags(base_dir: str, http_prefix: str,
     # extract mentions and tags from words
     long_words_list = []
     prev_word_str = ''
-    auto_tags_list = _load_auto_tags(base_dir, nickname, domain)
+    auto_tags = content_context['auto_tags']
     append_tags = []
     for word_str in words:
         word_len = len(word_str)
@@ -1385,41 +1337,15 @@ def add_html_tags(base_dir: str, http_prefix: str,
             elif ':' in word_str:
                 word_str2 = word_str.split(':')[1]
 #                print('TAG: emoji located - ' + word_str)
-                if not emoji_dict:
-                    # emoji.json is generated so that it can be customized and
-                    # the changes will be retained even if default_emoji.json
-                    # is subsequently updated
-                    if not os.path.isfile(base_dir + '/emoji/emoji.json'):
-                        copyfile(base_dir + '/emoji/default_emoji.json',
-                                 base_dir + '/emoji/emoji.json')
-                emoji_dict = load_json(base_dir + '/emoji/emoji.json')
-
-                # append custom emoji to the dict
-                custom_emoji_filename = base_dir + '/emojicustom/emoji.json'
-                if os.path.isfile(custom_emoji_filename):
-                    custom_emoji_dict = load_json(custom_emoji_filename)
-                    if custom_emoji_dict:
-                        # combine emoji dicts one by one
-                        for ename, eitem in custom_emoji_dict.items():
-                            if ename and eitem:
-                                if not emoji_dict.get(ename):
-                                    emoji_dict[ename] = eitem
-
 #                print('TAG: looking up emoji for :' + word_str2 + ':')
                 _add_emoji(base_dir, ':' + word_str2 + ':', http_prefix,
                            original_domain, replace_emoji, hashtags,
-                           emoji_dict)
+                           content_context['emoji'])
             else:
-                if _auto_tag(base_dir, nickname, domain, word_str,
-                             auto_tags_list, append_tags):
-                    prev_word_str = ''
-                    continue
+                _auto_tag(word_str, auto_tags, append_tags)
                 if prev_word_str:
-                    if _auto_tag(base_dir, nickname, domain,
-                                 prev_word_str + ' ' + word_str,
-                                 auto_tags_list, append_tags):
-                        prev_word_str = ''
-                        continue
+                    phrase_str = prev_word_str + ' ' + word_str
+                    _auto_tag(phrase_str, auto_tags, append_tags)
             prev_word_str = word_str
 
     # add any auto generated tags
@@ -2098,9 +2024,8 @@ def reject_twitter_summary(base_dir: str, nickname: str, domain: str,
     """
     if not summary:
         return False
-    remove_twitter = \
-        acct_dir(base_dir, nickname, domain) + '/.removeTwitter'
-    if not os.path.isfile(remove_twitter):
+    account_dir = acct_dir(base_dir, nickname, domain)
+    if not get_account_settings(account_dir)['removeTwitter']:
         return False
     summary_lower = summary.lower()
     if 'twitter' in summary_lower or \
@@ -0,0 +1,175 @@
+__filename__ = "contentcache.py"
+__author__ = "Bob Mottram"
+__license__ = "AGPL3+"
+__version__ = "1.4.0"
+__maintainer__ = "Bob Mottram"
+__email__ = "bob@libreserver.org"
+__status__ = "Production"
+__module_group__ = "Core"
+
+# Dictionaries used when converting the text of a new post into html.
+# The default and custom emoji are merged into a single dictionary, and
+# the names of the emoji images are listed, once for the instance. The
+# following list and automatic tag rules of each account are read once
+# for the account. Each is read again only when the modification times
+# of the files which it was read from change, so that creating a post
+# doesn't need to load several json and text files.
+# Automatic tag rules are held as a dictionary from the word or phrase
+# matched to the tags which it adds, so that each word of a post can be
+# looked up rather than compared against every rule.
+
+import os
+import threading
+from shutil import copyfile
+from utils import acct_dir
+from utils import load_json
+
+_CONTENT_CACHE = {
+    'lock': threading.Lock(),
+    # base directory -> {'modified', 'emoji', 'names', 'images'}
+    'emoji': {},
+    # account directory -> {'modified', 'following', 'auto_tags'}
+    'accounts': {}
+}
+
+
+def _content_cache_modified(filenames: []) -> tuple:
+    """Returns the modification times of the given files or directories
+    """
+    modified = []
+    for filename in filenames:
+        try:
+            modified.append(os.stat(filename).st_mtime_ns)
+        except OSError:
+            modified.append(0)
+    return tuple(modified)
+
+
+def _content_cache_read_lines(filename: str) -> []:
+    """Returns the lines of a text file
+    """
+    if not os.path.isfile(filename):
+        return []
+    try:
+        with open(filename, 'r', encoding='utf-8') as fp_lines:
+            return fp_lines.readlines()
+    except OSError:
+        print('EX: _content_cache_read_lines unable to read ' + filename)
+    return []
+
+
+def _emoji_context_load(base_dir: str) -> {}:
+    """Reads the default and custom emoji
+    """
+    emoji_dict = load_json(base_dir + '/emoji/emoji.json')
+    if not emoji_dict:
+        emoji_dict = {}
+    # append custom emoji to the dict
+    custom_emoji_filename = base_dir + '/emojicustom/emoji.json'
+    if os.path.isfile(custom_emoji_filename):
+        custom_emoji_dict = load_json(custom_emoji_filename)
+        if custom_emoji_dict:
+            # combine emoji dicts one by one
+            for ename, eitem in custom_emoji_dict.items():
+                if ename and eitem:
+                    if not emoji_dict.get(ename):
+                        emoji_dict[ename] = eitem
+    # emoji name for each code
+    names = {}
+    for ename, eitem in emoji_dict.items():
+        if eitem not in names:
+            names[eitem] = ename
+    # directory containing each emoji image
+    images = {}
+    for emoji_dir in ('emojicustom', 'emoji'):
+        if not os.path.isdir(base_dir + '/' + emoji_dir):
+            continue
+        for fname in os.listdir(base_dir + '/' + emoji_dir):
+            if fname.endswith('.png'):
+                images[fname[:-len('.png')]] = emoji_dir
+    return {
+        'emoji': emoji_dict,
+        'names': names,
+        'images': images
+    }
+
+
+def get_emoji_context(base_dir: str) -> {}:
+    """Returns the merged default and custom emoji, as a dict
+    containing 'emoji' (name -> code), 'names' (code -> name) and
+    'images' (code -> directory containing its image).
+    The returned dicts should not be changed
+    """
+    # emoji.json is generated so that it can be customized and
+    # the changes will be retained even if default_emoji.json
+    # is subsequently updated
+    emoji_filename = base_dir + '/emoji/emoji.json'
+    if not os.path.isfile(emoji_filename):
+        default_emoji_filename = base_dir + '/emoji/default_emoji.json'
+        if os.path.isfile(default_emoji_filename):
+            copyfile(default_emoji_filename, emoji_filename)
+    watched = (
+        emoji_filename, base_dir + '/emojicustom/emoji.json',
+        base_dir + '/emoji', base_dir + '/emojicustom'
+    )
+    modified = _content_cache_modified(watched)
+    with _CONTENT_CACHE['lock']:
+        emoji_context = _CONTENT_CACHE['emoji'].get(base_dir)
+    if emoji_context and emoji_context['modified'] == modified:
+        return emoji_context
+    emoji_context = _emoji_context_load(base_dir)
+    emoji_context['modified'] = modified
+    with _CONTENT_CACHE['lock']:
+        _CONTENT_CACHE['emoji'][base_dir] = emoji_context
+    return emoji_context
+
+
+def _content_cache_auto_tags(auto_tags_list: []) -> {}:
+    """Returns a dict from the word or phrase matched by each
+    automatic tag rule to the tags which it adds
+    """
+    auto_tags = {}
+    for tag_rule in auto_tags_list:
+        if '->' not in tag_rule:
+            continue
+        rulematch = tag_rule.split('->')[0].strip()
+        tag_name = tag_rule.split('->')[1].strip()
+        if not tag_name.startswith('#'):
+            tag_name = '#' + tag_name
+        rule_tags = auto_tags.setdefault(rulematch, [])
+        if tag_name not in rule_tags:
+            rule_tags.append(tag_name)
+    return auto_tags
+
+
+def get_content_context(base_dir: str, nickname: str, domain: str) -> {}:
+    """Returns the dictionaries used to convert the text of a post
+    by an account into html. The following list is within 'following'
+    and 'auto_tags' maps words or phrases to the tags which they add.
+    The emoji are within 'emoji' (see get_emoji_context).
+    The returned dicts should not be changed
+    """
+    account_dir = acct_dir(base_dir, nickname, domain)
+    following_filename = account_dir + '/following.txt'
+    auto_tags_filename = account_dir + '/autotags.txt'
+    watched = (following_filename, auto_tags_filename)
+    modified = _content_cache_modified(watched)
+    with _CONTENT_CACHE['lock']:
+        account = _CONTENT_CACHE['accounts'].get(account_dir)
+    if not account or account['modified'] != modified:
+        following = _content_cache_read_lines(following_filename)
+        auto_tags_list = _content_cache_read_lines(auto_tags_filename)
+        auto_tags = _content_cache_auto_tags(auto_tags_list)
+        account = {
+            'modified': modified,
+            'following': tuple(following),
+            'auto_tags': auto_tags
+        }
+        with _CONTENT_CACHE['lock']:
+            _CONTENT_CACHE['accounts'][account_dir] = account
+    emoji_context = get_emoji_context(base_dir)
+    return {
+        'following': account['following'],
+        'auto_tags': account['auto_tags'],
+        'emoji': emoji_context
+    }
@@ -117,6 +117,7 @@ from inbox import inbox_message_has_params
 from inbox import run_inbox_queue
 from inbox import run_inbox_queue_watchdog
 from inbox import save_post_to_inbox_queue
+from inboxqueue import inbox_queue_push
 from inbox import populate_replies
 from inbox import receive_edit_to_post
 from followerSync import update_followers_sync_cache
@@ -132,6 +133,9 @@ from skills import no_of_actor_skills
 from skills import actor_has_skill
 from skills import actor_skill_value
 from skills import set_actor_skill_level
+from skillsindex import skills_index_update
+from skillsindex import rebuild_skills_index
+from hashtagstats import hashtag_stats_set_category
 from auth import record_login_failure
 from auth import authorize
 from auth import create_password
@@ -141,6 +145,9 @@ from auth import store_basic_credentials
 from threads import begin_thread
 from threads import thread_with_trace
 from threads import remove_dormant_threads
+from threads import thread_sleep
+from boxindex import box_index_append
+from delivery import delivery_metrics
 from media import process_meta_data
 from media import convert_image_to_low_bandwidth
 from media import replace_you_tube
@@ -337,6 +344,9 @@ from utils import media_file_mime_type
 from utils import get_css
 from utils import first_paragraph_from_string
 from utils import clear_from_post_caches
+from accountsettings import account_settings_changed
+from boxevents import box_events_since
+from scheduler import scheduler_add
 from utils import contains_invalid_chars
 from utils import is_system_account
 from utils import set_config_param
@@ -423,6 +433,11 @@ from context import get_individual_post_context
 from speaker import get_ssml_box
 from city import get_spoofed_city
 from fitnessFunctions import fitness_performance
+from fitnessFunctions import fitness_queue_metrics
+from fitnessFunctions import fitness_route_performance
+from fitnessFunctions import fitness_route_histograms
+from utils import set_recent_posts_cache_budget
+from utils import recent_posts_cache_metrics
 from fitnessFunctions import fitness_thread
 from fitnessFunctions import sorted_watch_points
 from fitnessFunctions import html_watch_points_graph
@@ -437,6 +452,18 @@ from maps import map_format_from_tagmaps_path
 from relationships import get_moved_feed
 from relationships import get_inactive_feed
 from relationships import update_moved_actors
+from routes import compile_routes
+from routes import match_route
+from staticfiles import static_file_info
+from staticfiles import static_etag_matches
+from staticfiles import static_file_range
+from staticfiles import static_file_send
+from staticfiles import static_files_metrics
+from actorstore import actor_store_save
+from actorstore import actor_store_metrics
+from actorstore import set_actor_store_budget
+from webfingercache import webfinger_cache_load
+from webfingercache import webfinger_cache_metrics
 
 # maximum number of posts to list in outbox feed
 MAX_POSTS_IN_FEED = 12
@@ -461,6 +488,53 @@ FOLLOWS_PER_PAGE = 6
 # number of item shares per page
 SHARES_PER_PAGE = 12
 
+# routes which are dispatched before the remaining checks within
+# do_GET and do_POST. See routes.py for the format
+PUBSERVER_ROUTES = compile_routes([
+    ('GET', '/fonts/*', 'fonts', None),
+    ('GET', '/logo72.png', 'manifest logo', None),
+    ('GET', '/logo96.png', 'manifest logo', None),
+    ('GET', '/logo128.png', 'manifest logo', None),
+    ('GET', '/logo144.png', 'manifest logo', None),
+    ('GET', '/logo150.png', 'manifest logo', None),
+    ('GET', '/logo192.png', 'manifest logo', None),
+    ('GET', '/logo256.png', 'manifest logo', None),
+    ('GET', '/logo512.png', 'manifest logo', None),
+    ('GET', '/apple-touch-icon.png', 'manifest logo', None),
+    ('GET', '/screenshot1.jpg', 'manifest screenshot', None),
+    ('GET', '/screenshot2.jpg', 'manifest screenshot', None),
+    ('GET', '/emoji/*', 'emoji', None),
+    ('GET', '/system/media_attachments/files/*', 'media', None),
+    ('GET', '/media/*', 'media', None),
+    ('GET', '/sharefiles/*', 'share image', None),
+    ('GET', '/icons/*', 'icon', None),
+    ('GET', '/activitypub-tutorial-*', 'specification image', None),
+    ('GET', '/manual-*', 'manual image', None),
+    ('GET', '/helpimages/*', 'help image', None),
+    ('GET', '/avatars/*', 'cached avatar', None),
+    ('POST', '*/sethashtagcategory', 'hashtag category',
+     {'authorized': True}),
+    ('POST', '*/profiledata', 'profile edit', {'authorized': True}),
+    ('POST', '*/linksdata', 'links edit', {'authorized': True}),
+    ('POST', '*/newswiredata', 'newswire edit', {'authorized': True}),
+    ('POST', '*/citationsdata', 'citations edit', {'authorized': True}),
+    ('POST', '*/newseditdata', 'news post edit', {'authorized': True}),
+    ('POST', '*/moderationaction', 'moderation action',
+     {'authorized': True, 'users': True}),
+    ('POST', '*/rmshare', 'remove share', {'authorized': True}),
+    ('POST', '*/rmwanted', 'remove wanted', {'authorized': True}),
+    ('POST', '*/rmpost', 'remove post', {'authorized': True}),
+    ('POST', '*/followconfirm', 'follow confirm', {'authorized': True}),
+    ('POST', '*/unfollowconfirm', 'unfollow confirm', {'authorized': True}),
+    ('POST', '*/unblockconfirm', 'unblock confirm', {'authorized': True}),
+    ('POST', '*/blockconfirm', 'block confirm', {'authorized': True}),
+    ('POST', '*/personoptions', 'person options', {'authorized': True}),
+    ('POST', '*/changeAccessKeys', 'key shortcuts',
+     {'authorized': True, 'users': True}),
+    ('POST', '*/changeThemeSettings', 'theme designer',
+     {'authorized': True, 'users': True})
+])
+
 
 class PubServer(BaseHTTPRequestHandler):
     protocol_version = 'HTTP/1.1'
@@ -544,16 +618,9 @@ class PubServer(BaseHTTPRequestHandler):
         index_filename = \
             acct_dir(base_dir, nickname, domain) + '/' + box_name + '.index'
         if not text_in_file(id_str, index_filename):
-            try:
-                with open(index_filename, 'r+',
-                          encoding='utf-8') as fp_index:
-                    content = fp_index.read()
-                    if id_str + '\n' not in content:
-                        fp_index.seek(0, 0)
-                        fp_index.write(id_str + '\n' + content)
-            except OSError as ex:
+            if not box_index_append(index_filename, id_str):
                 print('WARN: Failed to write index after edit ' +
-                      index_filename + ' ' + str(ex))
+                      index_filename)
 
     def _convert_domains(self, calling_domain, referer_domain,
                          msg_str: str) -> str:
@@ -748,8 +815,6 @@ class PubServer(BaseHTTPRequestHandler):
                         # so that it then will be recreated
                         cached_post_filename = \
                             get_cached_post_filename(self.server.base_dir,
-                                                     nickname,
-                                                     self.server.domain,
                                                      post_json_object)
                         if cached_post_filename:
                             if os.path.isfile(cached_post_filename):
@@ -1019,7 +1084,13 @@ class PubServer(BaseHTTPRequestHandler):
 
     def _set_headers_base(self, file_format: str, length: int, cookie: str,
                           calling_domain: str, permissive: bool) -> None:
-        self.send_response(200)
+        self._set_headers_status(200, file_format, length, cookie,
+                                 calling_domain, permissive)
+
+    def _set_headers_status(self, status: int, file_format: str,
+                            length: int, cookie: str,
+                            calling_domain: str, permissive: bool) -> None:
+        self.send_response(status)
         self.send_header('Content-type', file_format)
         if 'image/' in file_format or \
            'audio/' in file_format or \
@@ -1099,6 +1170,49 @@ class PubServer(BaseHTTPRequestHandler):
         self.send_header('accept-ranges', 'bytes')
         self.end_headers()
 
+    def _send_static_file(self, media_filename: str, file_format: str,
+                          calling_domain: str, permissive: bool) -> bool:
+        """Sends a file such as an image, audio or video without reading
+        it into memory, supporting If-None-Match and Range headers.
+        Returns False if the file does not exist
+        """
+        media_info = static_file_info(media_filename)
+        if not media_info:
+            return False
+        if_none_match = self.headers.get('If-None-Match')
+        if static_etag_matches(if_none_match, media_info['etag']):
+            # The file has not changed
+            self._304()
+            return True
+        file_size = media_info['size']
+        range_header = self.headers.get('Range')
+        byte_range = static_file_range(range_header, file_size)
+        if byte_range is None:
+            self.send_response(416)
+            self.send_header('Content-Range', 'bytes */' + str(file_size))
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return True
+        status = 200
+        offset = 0
+        length = file_size
+        if byte_range:
+            status = 206
+            offset = byte_range[0]
+            length = byte_range[1] - byte_range[0] + 1
+        self._set_headers_status(status, file_format, length, None,
+                                 calling_domain, permissive)
+        if status == 206:
+            self.send_header('Content-Range',
+                             'bytes ' + str(byte_range[0]) + '-' +
+                             str(byte_range[1]) + '/' + str(file_size))
+        self.send_header('ETag', '"' + media_info['etag'] + '"')
+        self.send_header('last-modified', media_info['lastModified'])
+        self.send_header('accept-ranges', 'bytes')
+        self.end_headers()
+        static_file_send(self.connection, media_filename, offset, length)
+        return True
+
     def _etag_exists(self, media_filename: str) -> bool:
         """Does an etag header exist for the given file?
         """
@@ -2238,8 +2352,9 @@ class PubServer(BaseHTTPRequestHandler):
                                      mitm)
         if queue_filename:
             # add json to the queue
-            if queue_filename not in self.server.inbox_queue:
-                self.server.inbox_queue.append(queue_filename)
+            arrival_time = time.time()
+            inbox_queue_push(self.server.inbox_queue, queue_filename,
+                             arrival_time)
             if self.server.debug:
                 time_diff = int((time.time() - begin_save_time) * 1000)
                 if time_diff > 200:
@@ -3505,6 +3620,7 @@ class PubServer(BaseHTTPRequestHandler):
                                   ' ' + str(ex))
                         if feat_written:
                             refresh_newswire(self.server.base_dir)
+                account_settings_changed(account_dir)
             users_path_str = \
                 users_path + '/' + self.server.default_timeline + \
                 '?page=' + str(page_number)
@@ -5684,6 +5800,7 @@ class PubServer(BaseHTTPRequestHandler):
                     except OSError:
                         print('EX: _set_hashtag_category unable to delete ' +
                               category_filename)
+                    hashtag_stats_set_category(base_dir, hashtag, '')
 
         # redirect back to the default timeline
         self._redirect_headers(tag_screen_str,
@@ -6256,6 +6373,9 @@ class PubServer(BaseHTTPRequestHandler):
                 if m_type == 'importFollows':
                     if os.path.isfile(filename_base):
                         print(nickname + ' imported follows csv')
+                        import_handle = nickname + '@' + domain
+                        scheduler_add('importFollowing', import_handle,
+                                      time.time())
                     else:
                         print('WARN: failed to import follows from csv for ' +
                               nickname)
@@ -7650,6 +7770,10 @@ class PubServer(BaseHTTPRequestHandler):
                                           'unable to delete ' +
                                           notify_reactions_filename)
 
+                    # the settings of the account have been changed
+                    account_dir = acct_dir(base_dir, nickname, domain)
+                    account_settings_changed(account_dir)
+
                     # this account is a bot
                     if fields.get('isBot'):
                         if fields['isBot'] == 'on' and \
@@ -7858,6 +7982,9 @@ class PubServer(BaseHTTPRequestHandler):
                         except OSError:
                             print('EX: unable to write imported follows ' +
                                   filename_base)
+                        import_handle = nickname + '@' + domain
+                        scheduler_add('importFollowing', import_handle,
+                                      time.time())
 
                     if fields.get('importTheme'):
                         if not os.path.isdir(base_dir + '/imports'):
@@ -8100,6 +8227,7 @@ class PubServer(BaseHTTPRequestHandler):
                         add_actor_update_timestamp(actor_json)
                         # save the actor
                         save_json(actor_json, actor_filename)
+                        skills_index_update(base_dir, actor_json, True)
                         webfinger_update(base_dir,
                                          nickname, domain,
                                          onion_domain, i2p_domain,
@@ -8114,10 +8242,8 @@ class PubServer(BaseHTTPRequestHandler):
                         id_str = actor_json['id'].replace('/', '-')
                         remove_avatar_from_cache(base_dir, id_str)
                         # save the actor to the cache
-                        actor_cache_filename = \
-                            base_dir + '/cache/actors/' + \
-                            actor_json['id'].replace('/', '#') + '.json'
-                        save_json(actor_json, actor_cache_filename)
+                        actor_store_save(base_dir, actor_json['id'],
+                                         actor_json)
                         # send profile update to followers
                         update_actor_json = get_actor_update_json(actor_json)
                         print('Sending actor update: ' +
@@ -8907,19 +9033,20 @@ class PubServer(BaseHTTPRequestHandler):
             media_str = path.split('/media/')[1]
             media_filename = base_dir + '/media/' + media_str
             if os.path.isfile(media_filename):
-                if self._etag_exists(media_filename):
-                    # The file has not changed
-                    self._304()
-                    return
-
                 media_file_type = media_file_mime_type(media_filename)
 
-                media_tm = os.path.getmtime(media_filename)
-                last_modified_time = datetime.datetime.fromtimestamp(media_tm)
-                last_modified_time_str = \
-                    last_modified_time.strftime('%a, %d %b %Y %H:%M:%S GMT')
-
                 if media_filename.endswith('.vtt'):
+                    if self._etag_exists(media_filename):
+                        # The file has not changed
+                        self._304()
+                        return
+
+                    media_tm = os.path.getmtime(media_filename)
+                    last_modified_time = \
+                        datetime.datetime.fromtimestamp(media_tm)
+                    last_modified_time_str = \
+                        last_modified_time.strftime('%a, %d %b %Y ' +
+                                                    '%H:%M:%S GMT')
                     media_transcript = None
                     try:
                         with open(media_filename, 'r',
@@ -8944,21 +9071,13 @@ class PubServer(BaseHTTPRequestHandler):
                     self._404()
                     return
 
-                media_binary = None
-                try:
-                    with open(media_filename, 'rb') as av_file:
-                        media_binary = av_file.read()
-                except OSError:
-                    print('EX: unable to read media binary ' + media_filename)
-                if media_binary:
-                    self._set_headers_etag(media_filename, media_file_type,
-                                           media_binary, None,
-                                           None, True,
-                                           last_modified_time_str)
-                    self._write(media_binary)
-                fitness_performance(getreq_start_time, self.server.fitness,
-                                    '_GET', '_show_media', self.server.debug)
-                return
+                if self._send_static_file(media_filename, media_file_type,
+                                          None, True):
+                    fitness_performance(getreq_start_time,
+                                        self.server.fitness,
+                                        '_GET', '_show_media',
+                                        self.server.debug)
+                    return
         self._404()
 
     def _get_ontology(self, calling_domain: str,
@@ -9018,26 +9137,9 @@ class PubServer(BaseHTTPRequestHandler):
             emoji_filename = base_dir + '/emoji/' + emoji_str
             if not os.path.isfile(emoji_filename):
                 emoji_filename = base_dir + '/emojicustom/' + emoji_str
-            if os.path.isfile(emoji_filename):
-                if self._etag_exists(emoji_filename):
-                    # The file has not changed
-                    self._304()
-                    return
-
-                media_image_type = get_image_mime_type(emoji_filename)
-                media_binary = None
-                try:
-                    with open(emoji_filename, 'rb') as av_file:
-                        media_binary = av_file.read()
-                except OSError:
-                    print('EX: unable to read emoji image ' + emoji_filename)
-                if media_binary:
-                    self._set_headers_etag(emoji_filename,
-                                           media_image_type,
-                                           media_binary, None,
-                                           self.server.domain_full,
-                                           False, None)
-                    self._write(media_binary)
+            media_image_type = get_image_mime_type(emoji_filename)
+            if self._send_static_file(emoji_filename, media_image_type,
+                                      self.server.domain_full, False):
                 fitness_performance(getreq_start_time, self.server.fitness,
                                     '_GET', '_show_emoji', self.server.debug)
                 return
@@ -9062,38 +9164,9 @@ class PubServer(BaseHTTPRequestHandler):
             icon_filename = media_str.split('/')[1]
         media_filename = \
             base_dir + '/theme/' + theme + '/icons/' + icon_filename
-        if self._etag_exists(media_filename):
-            # The file has not changed
-            self._304()
-            return
-        if self.server.iconsCache.get(media_str):
-            media_binary = self.server.iconsCache[media_str]
-            mime_type_str = media_file_mime_type(media_filename)
-            self._set_headers_etag(media_filename,
-                                   mime_type_str,
-                                   media_binary, None,
-                                   self.server.domain_full,
-                                   False, None)
-            self._write(media_binary)
-            fitness_performance(getreq_start_time, self.server.fitness,
-                                '_GET', '_show_icon', self.server.debug)
-            return
-        if os.path.isfile(media_filename):
-            media_binary = None
-            try:
-                with open(media_filename, 'rb') as av_file:
-                    media_binary = av_file.read()
-            except OSError:
-                print('EX: unable to read icon image ' + media_filename)
-            if media_binary:
-                mime_type = media_file_mime_type(media_filename)
-                self._set_headers_etag(media_filename,
-                                       mime_type,
-                                       media_binary, None,
-                                       self.server.domain_full,
-                                       False, None)
-                self._write(media_binary)
-                self.server.iconsCache[media_str] = media_binary
+        mime_type = media_file_mime_type(media_filename)
+        if self._send_static_file(media_filename, mime_type,
+                                  self.server.domain_full, False):
             fitness_performance(getreq_start_time, self.server.fitness,
                                 '_GET', '_show_icon', self.server.debug)
             return
@@ -9299,29 +9372,13 @@ class PubServer(BaseHTTPRequestHandler):
         """Shows an avatar image obtained from the cache
         """
         media_filename = base_dir + '/cache' + path
-        if os.path.isfile(media_filename):
-            if self._etag_exists(media_filename):
-                # The file has not changed
-                self._304()
-                return
-            media_binary = None
-            try:
-                with open(media_filename, 'rb') as av_file:
-                    media_binary = av_file.read()
-            except OSError:
-                print('EX: unable to read cached avatar ' + media_filename)
-            if media_binary:
-                mime_type = media_file_mime_type(media_filename)
-                self._set_headers_etag(media_filename,
-                                       mime_type,
-                                       media_binary, None,
-                                       referer_domain,
-                                       False, None)
-                self._write(media_binary)
-                fitness_performance(getreq_start_time, self.server.fitness,
-                                    '_GET', '_show_cached_avatar',
-                                    self.server.debug)
-                return
+        mime_type = media_file_mime_type(media_filename)
+        if self._send_static_file(media_filename, mime_type,
+                                  referer_domain, False):
+            fitness_performance(getreq_start_time, self.server.fitness,
+                                '_GET', '_show_cached_avatar',
+                                self.server.debug)
+            return
         self._404()
 
     def _hashtag_search(self, calling_domain: str,
@@ -9662,8 +9719,7 @@ class PubServer(BaseHTTPRequestHandler):
             if debug:
                 print('Generating html post for announce')
             cached_post_filename = \
-                get_cached_post_filename(base_dir, self.post_to_nickname,
-                                         domain, announce_json)
+                get_cached_post_filename(base_dir, announce_json)
             if debug:
                 print('Announced post json: ' + str(announce_json))
                 print('Announced post nickname: ' +
@@ -10230,8 +10286,7 @@ class PubServer(BaseHTTPRequestHandler):
             # clear the icon from the cache so that it gets updated
             if liked_post_json:
                 cached_post_filename = \
-                    get_cached_post_filename(base_dir, self.post_to_nickname,
-                                             domain, liked_post_json)
+                    get_cached_post_filename(base_dir, liked_post_json)
                 if debug:
                     print('Liked post json: ' + str(liked_post_json))
                     print('Liked post nickname: ' +
@@ -10669,8 +10724,7 @@ class PubServer(BaseHTTPRequestHandler):
             # clear the icon from the cache so that it gets updated
             if reaction_post_json:
                 cached_post_filename = \
-                    get_cached_post_filename(base_dir, self.post_to_nickname,
-                                             domain, reaction_post_json)
+                    get_cached_post_filename(base_dir, reaction_post_json)
                 if debug:
                     print('Reaction post json: ' + str(reaction_post_json))
                     print('Reaction post nickname: ' +
@@ -11164,8 +11218,7 @@ class PubServer(BaseHTTPRequestHandler):
             bookmark_post_json = load_json(bookmark_filename, 0, 1)
             if bookmark_post_json:
                 cached_post_filename = \
-                    get_cached_post_filename(base_dir, self.post_to_nickname,
-                                             domain, bookmark_post_json)
+                    get_cached_post_filename(base_dir, bookmark_post_json)
                 print('Bookmarked post json: ' + str(bookmark_post_json))
                 print('Bookmarked post nickname: ' +
                       self.post_to_nickname + ' ' + domain)
@@ -11333,8 +11386,7 @@ class PubServer(BaseHTTPRequestHandler):
             bookmark_post_json = load_json(bookmark_filename, 0, 1)
             if bookmark_post_json:
                 cached_post_filename = \
-                    get_cached_post_filename(base_dir, self.post_to_nickname,
-                                             domain, bookmark_post_json)
+                    get_cached_post_filename(base_dir, bookmark_post_json)
                 print('Unbookmarked post json: ' + str(bookmark_post_json))
                 print('Unbookmarked post nickname: ' +
                       self.post_to_nickname + ' ' + domain)
@@ -11583,8 +11635,7 @@ class PubServer(BaseHTTPRequestHandler):
             mute_post_json = load_json(mute_filename, 0, 1)
             if mute_post_json:
                 cached_post_filename = \
-                    get_cached_post_filename(base_dir, nickname,
-                                             domain, mute_post_json)
+                    get_cached_post_filename(base_dir, mute_post_json)
                 print('mute_post: Muted post json: ' + str(mute_post_json))
                 print('mute_post: Muted post nickname: ' +
                       nickname + ' ' + domain)
@@ -11729,8 +11780,7 @@ class PubServer(BaseHTTPRequestHandler):
             mute_post_json = load_json(mute_filename, 0, 1)
             if mute_post_json:
                 cached_post_filename = \
-                    get_cached_post_filename(base_dir, nickname,
-                                             domain, mute_post_json)
+                    get_cached_post_filename(base_dir, mute_post_json)
                 print('unmute_post: Unmuted post json: ' + str(mute_post_json))
                 print('unmute_post: Unmuted post nickname: ' +
                       nickname + ' ' + domain)
@@ -16723,6 +16773,39 @@ class PubServer(BaseHTTPRequestHandler):
                           None, calling_domain, False)
         self._write(msg)
 
+    def _get_box_events(self, path: str, calling_domain: str,
+                        domain: str, debug: bool) -> None:
+        """Returns the events for an account after the given cursor,
+        waiting until an event arrives if there are none yet.
+        This allows C2S clients to find out when their timelines
+        change without repeatedly downloading them
+        """
+        nickname = path.split('/users/')[1].split('/')[0]
+        since = 0
+        wait_sec = 0
+        if '?' in path:
+            for param in path.split('?', 1)[1].split('&'):
+                if '=' not in param:
+                    continue
+                key, value = param.split('=', 1)
+                if not value.isdigit():
+                    continue
+                if key == 'since':
+                    since = int(value)
+                elif key == 'wait':
+                    wait_sec = int(value)
+        handle = nickname + '@' + domain
+        events_json = box_events_since(handle, since, wait_sec)
+        if debug:
+            print('DEBUG: ' + str(len(events_json['events'])) +
+                  ' events for ' + handle + ' since ' + str(since))
+        msg_str = json.dumps(events_json, ensure_ascii=False)
+        msg = msg_str.encode('utf-8')
+        msglen = len(msg)
+        self._set_headers('application/json', msglen,
+                          None, calling_domain, False)
+        self._write(msg)
+
     def _send_block(self, http_prefix: str,
                     blocker_nickname: str, blocker_domain_full: str,
                     blocking_nickname: str, blocking_domain_full: str,
@@ -16807,6 +16890,237 @@ class PubServer(BaseHTTPRequestHandler):
             return True
         return False
 
+    def _show_manifest_image(self, path: str, cookie: str,
+                             getreq_start_time, watch_point: str) -> None:
+        """Shows an image used by the manifest of the progressive web app,
+        such as a logo or screenshot
+        """
+        media_filename = self.server.base_dir + '/img' + path
+        if os.path.isfile(media_filename):
+            if self._etag_exists(media_filename):
+                # The file has not changed
+                self._304()
+                return
+
+            tries = 0
+            media_binary = None
+            while tries < 5:
+                try:
+                    with open(media_filename, 'rb') as av_file:
+                        media_binary = av_file.read()
+                        break
+                except OSError as ex:
+                    print('EX: ' + watch_point + ' ' +
+                          str(tries) + ' ' + str(ex))
+                    time.sleep(1)
+                    tries += 1
+            if media_binary:
+                mime_type = media_file_mime_type(media_filename)
+                self._set_headers_etag(media_filename, mime_type,
+                                       media_binary, cookie,
+                                       self.server.domain_full,
+                                       False, None)
+                self._write(media_binary)
+                fitness_performance(getreq_start_time, self.server.fitness,
+                                    '_GET', watch_point + ' shown',
+                                    self.server.debug)
+                return
+        self._404()
+
+    def _get_route(self, route_name: str, calling_domain: str,
+                   referer_domain: str, cookie: str,
+                   getreq_start_time) -> bool:
+        """Responds to a GET request for a route within PUBSERVER_ROUTES.
+        Returns False if the request should be handled by do_GET instead
+        """
+        base_dir = self.server.base_dir
+        if route_name == 'fonts':
+            self._get_fonts(calling_domain, self.path,
+                            base_dir, self.server.debug,
+                            getreq_start_time)
+        elif route_name in ('manifest logo', 'manifest screenshot'):
+            # images used to create a home screen icon when selecting
+            # "add to home screen", or to show example screenshots
+            self._show_manifest_image(self.path, cookie,
+                                      getreq_start_time, route_name)
+        elif route_name == 'emoji':
+            self._show_emoji(self.path, base_dir, getreq_start_time)
+        elif route_name == 'media':
+            # replace mastodon-style media path
+            self.path = self.path.replace('/system/media_attachments/files/',
+                                          '/media/')
+            self._show_media(self.path, base_dir, getreq_start_time)
+        elif route_name == 'share image':
+            return self._show_share_image(self.path, base_dir,
+                                          getreq_start_time)
+        elif route_name == 'icon':
+            self._show_icon(self.path, base_dir, getreq_start_time)
+        elif route_name == 'specification image':
+            # show images within https://instancedomain/activitypub
+            if not self.path.endswith('.png'):
+                return False
+            self._show_specification_image(self.path, base_dir,
+                                           getreq_start_time)
+        elif route_name == 'manual image':
+            # show images within https://instancedomain/manual
+            if not is_image_file(self.path):
+                return False
+            self._show_manual_image(self.path, base_dir,
+                                    getreq_start_time)
+        elif route_name == 'help image':
+            self._show_help_screen_image(self.path, base_dir,
+                                         getreq_start_time)
+        elif route_name == 'cached avatar':
+            self._show_cached_avatar(referer_domain, self.path,
+                                     base_dir, getreq_start_time)
+        else:
+            return False
+        return True
+
+    def _post_route(self, route_name: str, calling_domain: str,
+                    cookie: str, authorized: bool,
+                    curr_session, proxy_type: str) -> bool:
+        """Responds to a POST request for a route within PUBSERVER_ROUTES.
+        Returns False if the request should be handled by do_POST instead
+        """
+        base_dir = self.server.base_dir
+        http_prefix = self.server.http_prefix
+        domain = self.server.domain
+        domain_full = self.server.domain_full
+        onion_domain = self.server.onion_domain
+        i2p_domain = self.server.i2p_domain
+        debug = self.server.debug
+        if route_name == 'hashtag category':
+            self._set_hashtag_category(calling_domain, cookie,
+                                       self.path, base_dir, domain, debug,
+                                       self.server.system_language)
+        elif route_name == 'profile edit':
+            # update of profile/avatar from web interface,
+            # after selecting Edit button then Submit
+            self._profile_edit(calling_domain, cookie, self.path,
+                               base_dir, http_prefix,
+                               domain, domain_full,
+                               onion_domain, i2p_domain, debug,
+                               self.server.allow_local_network_access,
+                               self.server.system_language,
+                               self.server.content_license_url,
+                               curr_session,
+                               proxy_type)
+        elif route_name == 'links edit':
+            self._links_update(calling_domain, cookie, self.path,
+                               base_dir, debug,
+                               self.server.default_timeline,
+                               self.server.allow_local_network_access)
+        elif route_name == 'newswire edit':
+            self._newswire_update(calling_domain, cookie,
+                                  self.path, base_dir, domain, debug,
+                                  self.server.default_timeline)
+        elif route_name == 'citations edit':
+            self._citations_update(calling_domain, cookie,
+                                   self.path, base_dir, domain, debug,
+                                   self.server.newswire)
+        elif route_name == 'news post edit':
+            self._news_post_edit(calling_domain, cookie, self.path,
+                                 base_dir, domain, debug)
+        elif route_name == 'moderation action':
+            # moderator action buttons
+            self._moderator_actions(self.path, calling_domain, cookie,
+                                    base_dir, http_prefix, domain,
+                                    self.server.port, debug)
+        elif route_name == 'remove share':
+            # removes a shared item
+            self._remove_share(calling_domain, cookie,
+                               authorized, self.path,
+                               base_dir, http_prefix, domain_full,
+                               onion_domain, i2p_domain)
+        elif route_name == 'remove wanted':
+            # removes a wanted item
+            self._remove_wanted(calling_domain, cookie,
+                                authorized, self.path,
+                                base_dir, http_prefix, domain_full,
+                                onion_domain, i2p_domain)
+        elif route_name == 'remove post':
+            # removes a post
+            if '/users/' not in self.path:
+                print('ERROR: attempt to remove post ' +
+                      'was not authorized. ' + self.path)
+                self._400()
+                return True
+            self._receive_remove_post(calling_domain, cookie,
+                                      self.path, base_dir, http_prefix,
+                                      domain, domain_full,
+                                      onion_domain, i2p_domain,
+                                      curr_session, proxy_type)
+        elif route_name == 'follow confirm':
+            # decision to follow in the web interface is confirmed
+            self._follow_confirm(calling_domain, cookie,
+                                 self.path, base_dir, http_prefix,
+                                 domain, domain_full, self.server.port,
+                                 onion_domain, i2p_domain, debug,
+                                 curr_session, proxy_type)
+        elif route_name == 'unfollow confirm':
+            # decision to unfollow in the web interface is confirmed
+            self._unfollow_confirm(calling_domain, cookie,
+                                   self.path, base_dir, http_prefix,
+                                   domain, domain_full, self.server.port,
+                                   onion_domain, i2p_domain, debug,
+                                   curr_session, proxy_type)
+        elif route_name == 'unblock confirm':
+            # decision to unblock in the web interface is confirmed
+            self._unblock_confirm(calling_domain, cookie,
+                                  self.path, base_dir, http_prefix,
+                                  domain, domain_full, self.server.port,
+                                  onion_domain, i2p_domain, debug)
+        elif route_name == 'block confirm':
+            # decision to block in the web interface is confirmed
+            self._block_confirm(calling_domain, cookie,
+                                self.path, base_dir, http_prefix,
+                                domain, domain_full, self.server.port,
+                                onion_domain, i2p_domain, debug,
+                                curr_session, proxy_type)
+        elif route_name == 'person options':
+            # an option was chosen from person options screen
+            # view/follow/block/report
+            self._person_options(self.path, calling_domain, cookie,
+                                 base_dir, http_prefix,
+                                 domain, domain_full, self.server.port,
+                                 onion_domain, i2p_domain, debug,
+                                 curr_session)
+        elif route_name in ('key shortcuts', 'theme designer'):
+            nickname = self.path.split('/users/')[1]
+            if '/' in nickname:
+                nickname = nickname.split('/')[0]
+
+            if not self.server.key_shortcuts.get(nickname):
+                access_keys = self.server.access_keys
+                self.server.key_shortcuts[nickname] = access_keys.copy()
+            access_keys = self.server.key_shortcuts[nickname]
+
+            if route_name == 'key shortcuts':
+                # Change the key shortcuts
+                self._key_shortcuts(calling_domain, cookie,
+                                    base_dir, http_prefix, nickname,
+                                    domain, domain_full,
+                                    onion_domain, i2p_domain,
+                                    access_keys,
+                                    self.server.default_timeline)
+            else:
+                # theme designer submit/cancel button
+                allow_local_network_access = \
+                    self.server.allow_local_network_access
+                self._theme_designer_edit(calling_domain, cookie,
+                                          base_dir, http_prefix, nickname,
+                                          domain, domain_full,
+                                          onion_domain, i2p_domain,
+                                          self.server.default_timeline,
+                                          self.server.theme_name,
+                                          allow_local_network_access,
+                                          self.server.system_language,
+                                          self.server.dyslexic_font)
+        else:
+            return False
+        return True
+
     def do_GET(self):
         if self._check_bad_path():
             return
@@ -17440,6 +17754,33 @@ class PubServer(BaseHTTPRequestHandler):
                                          self.server.domain_full)
             return
 
+        # requests for static files such as images and fonts, which
+        # are typically within web pages
+        # Note that this comes before the busy flag to avoid conflicts
+        request_type = None
+        if html_getreq:
+            request_type = 'html'
+        elif csv_getreq:
+            request_type = 'csv'
+        elif ssml_getreq:
+            request_type = 'ssml'
+        elif icalendar_getreq:
+            request_type = 'icalendar'
+        route_request = {
+            'authorized': authorized,
+            'accept': request_type
+        }
+        route_name = \
+            match_route(PUBSERVER_ROUTES, 'GET', self.path, route_request)
+        if route_name:
+            if self._get_route(route_name, calling_domain, referer_domain,
+                               cookie, getreq_start_time):
+                fitness_route_performance(getreq_start_time,
+                                          self.server.fitness,
+                                          '_GET_ROUTES', route_name,
+                                          self.server.debug)
+                return
+
         # get fonts
         if '/fonts/' in self.path:
             self._get_fonts(calling_domain, self.path,
@@ -17562,6 +17903,11 @@ class PubServer(BaseHTTPRequestHandler):
                                          self.server.debug,
                                          'followrequests')
                 return
+            if self.path.split('?')[0].endswith('/events'):
+                self._get_box_events(self.path, calling_domain,
+                                     self.server.domain,
+                                     self.server.debug)
+                return
 
         # authorized endpoint used for TTS of posts
         # arriving in your inbox
@@ -17714,6 +18060,10 @@ class PubServer(BaseHTTPRequestHandler):
                     graph = 'INBOX'
                 elif graph == 'get':
                     graph = '_GET'
+                elif graph == 'getroutes':
+                    graph = '_GET_ROUTES'
+                elif graph == 'postroutes':
+                    graph = '_POST_ROUTES'
                 msg = \
                     html_watch_points_graph(self.server.base_dir,
                                             self.server.fitness,
@@ -17733,8 +18083,18 @@ class PubServer(BaseHTTPRequestHandler):
                 graph = 'INBOX'
             elif graph == 'get':
                 graph = '_GET'
-            watch_points_json = \
-                sorted_watch_points(self.server.fitness, graph)
+            elif graph == 'getroutes':
+                graph = '_GET_ROUTES'
+            elif graph == 'postroutes':
+                graph = '_POST_ROUTES'
+            if graph == 'queues':
+                watch_points_json = self.server.fitness.get('queues', {})
+            elif graph == 'routes':
+                watch_points_json = \
+                    fitness_route_histograms(self.server.fitness)
+            else:
+                watch_points_json = \
+                    sorted_watch_points(self.server.fitness, graph)
             msg_str = json.dumps(watch_points_json,
                                  ensure_ascii=False)
             msg_str = self._convert_domains(calling_domain,
@@ -18404,17 +18764,14 @@ class PubServer(BaseHTTPRequestHandler):
                             '_GET', 'show login screen done',
                             self.server.debug)
 
-        # manifest images used to create a home screen icon
-        # when selecting "add to home screen" in browsers
-        # which support progressive web apps
-        if self.path in ('/logo72.png', '/logo96.png', '/logo128.png',
-                         '/logo144.png', '/logo150.png', '/logo192.png',
-                         '/logo256.png', '/logo512.png',
-                         '/apple-touch-icon.png'):
-            media_filename = \
-                self.server.base_dir + '/img' + self.path
-            if os.path.isfile(media_filename):
-                if self._etag_exists(media_filename):
+        # image on login screen or qrcode
+        if (is_image_file(self.path) and
+            (self.path.startswith('/login.') or
+             self.path.startswith('/qrcode.png'))):
+            icon_filename = \
+                self.server.base_dir + '/accounts' + self.path
+            if os.path.isfile(icon_filename):
+                if self._etag_exists(icon_filename):
                     # The file has not changed
                     self._304()
                     return
@@ -18423,128 +18780,44 @@ class PubServer(BaseHTTPRequestHandler):
                 media_binary = None
                 while tries < 5:
                     try:
-                        with open(media_filename, 'rb') as av_file:
+                        with open(icon_filename, 'rb') as av_file:
                             media_binary = av_file.read()
                             break
                     except OSError as ex:
-                        print('EX: manifest logo ' +
+                        print('EX: login screen image ' +
                               str(tries) + ' ' + str(ex))
                         time.sleep(1)
                         tries += 1
                 if media_binary:
-                    mime_type = media_file_mime_type(media_filename)
-                    self._set_headers_etag(media_filename, mime_type,
+                    mime_type_str = media_file_mime_type(icon_filename)
+                    self._set_headers_etag(icon_filename,
+                                           mime_type_str,
                                            media_binary, cookie,
                                            self.server.domain_full,
                                            False, None)
                     self._write(media_binary)
                     fitness_performance(getreq_start_time, self.server.fitness,
-                                        '_GET', 'manifest logo shown',
+                                        '_GET', 'login screen logo',
                                         self.server.debug)
                     return
             self._404()
             return
 
         fitness_performance(getreq_start_time, self.server.fitness,
-                            '_GET', 'manifest logo done',
+                            '_GET', 'login screen logo done',
                             self.server.debug)
 
-        # manifest images used to show example screenshots
-        # for use by app stores
-        if self.path == '/screenshot1.jpg' or \
-           self.path == '/screenshot2.jpg':
-            screen_filename = \
-                self.server.base_dir + '/img' + self.path
-            if os.path.isfile(screen_filename):
-                if self._etag_exists(screen_filename):
-                    # The file has not changed
-                    self._304()
-                    return
-
-                tries = 0
-                media_binary = None
-                while tries < 5:
-                    try:
-                        with open(screen_filename, 'rb') as av_file:
-                            media_binary = av_file.read()
-                            break
-                    except OSError as ex:
-                        print('EX: manifest screenshot ' +
-                              str(tries) + ' ' + str(ex))
-                        time.sleep(1)
-                        tries += 1
-                if media_binary:
-                    mime_type = media_file_mime_type(screen_filename)
-                    self._set_headers_etag(screen_filename, mime_type,
-                                           media_binary, cookie,
-                                           self.server.domain_full,
-                                           False, None)
-                    self._write(media_binary)
-                    fitness_performance(getreq_start_time, self.server.fitness,
-                                        '_GET', 'show screenshot',
-                                        self.server.debug)
-                    return
-            self._404()
-            return
-
-        fitness_performance(getreq_start_time, self.server.fitness,
-                            '_GET', 'show screenshot done',
-                            self.server.debug)
-
-        # image on login screen or qrcode
-        if (is_image_file(self.path) and
-            (self.path.startswith('/login.') or
-             self.path.startswith('/qrcode.png'))):
-            icon_filename = \
-                self.server.base_dir + '/accounts' + self.path
-            if os.path.isfile(icon_filename):
-                if self._etag_exists(icon_filename):
-                    # The file has not changed
-                    self._304()
-                    return
-
-                tries = 0
-                media_binary = None
-                while tries < 5:
-                    try:
-                        with open(icon_filename, 'rb') as av_file:
-                            media_binary = av_file.read()
-                            break
-                    except OSError as ex:
-                        print('EX: login screen image ' +
-                              str(tries) + ' ' + str(ex))
-                        time.sleep(1)
-                        tries += 1
-                if media_binary:
-                    mime_type_str = media_file_mime_type(icon_filename)
-                    self._set_headers_etag(icon_filename,
-                                           mime_type_str,
-                                           media_binary, cookie,
-                                           self.server.domain_full,
-                                           False, None)
-                    self._write(media_binary)
-                    fitness_performance(getreq_start_time, self.server.fitness,
-                                        '_GET', 'login screen logo',
-                                        self.server.debug)
-                    return
-            self._404()
-            return
-
-        fitness_performance(getreq_start_time, self.server.fitness,
-                            '_GET', 'login screen logo done',
-                            self.server.debug)
-
-        # QR code for account handle
-        if users_in_path and \
-           self.path.endswith('/qrcode.png'):
-            if self._show_qrcode(calling_domain, self.path,
-                                 self.server.base_dir,
-                                 self.server.domain,
-                                 self.server.onion_domain,
-                                 self.server.i2p_domain,
-                                 self.server.port,
-                                 getreq_start_time):
-                return
+        # QR code for account handle
+        if users_in_path and \
+           self.path.endswith('/qrcode.png'):
+            if self._show_qrcode(calling_domain, self.path,
+                                 self.server.base_dir,
+                                 self.server.domain,
+                                 self.server.onion_domain,
+                                 self.server.i2p_domain,
+                                 self.server.port,
+                                 getreq_start_time):
+                return
 
         fitness_performance(getreq_start_time, self.server.fitness,
                             '_GET', 'account qrcode done',
@@ -18638,53 +18911,6 @@ class PubServer(BaseHTTPRequestHandler):
                             '_GET', 'share image done',
                             self.server.debug)
 
-        # icon images
-        # Note that this comes before the busy flag to avoid conflicts
-        if self.path.startswith('/icons/'):
-            self._show_icon(self.path, self.server.base_dir,
-                            getreq_start_time)
-            return
-
-        # show images within https://instancedomain/activitypub
-        if self.path.startswith('/activitypub-tutorial-'):
-            if self.path.endswith('.png'):
-                self._show_specification_image(self.path,
-                                               self.server.base_dir,
-                                               getreq_start_time)
-                return
-
-        # show images within https://instancedomain/manual
-        if self.path.startswith('/manual-'):
-            if is_image_file(self.path):
-                self._show_manual_image(self.path,
-                                        self.server.base_dir,
-                                        getreq_start_time)
-                return
-
-        # help screen images
-        # Note that this comes before the busy flag to avoid conflicts
-        if self.path.startswith('/helpimages/'):
-            self._show_help_screen_image(self.path,
-                                         self.server.base_dir,
-                                         getreq_start_time)
-            return
-
-        fitness_performance(getreq_start_time, self.server.fitness,
-                            '_GET', 'help screen image done',
-                            self.server.debug)
-
-        # cached avatar images
-        # Note that this comes before the busy flag to avoid conflicts
-        if self.path.startswith('/avatars/'):
-            self._show_cached_avatar(referer_domain, self.path,
-                                     self.server.base_dir,
-                                     getreq_start_time)
-            return
-
-        fitness_performance(getreq_start_time, self.server.fitness,
-                            '_GET', 'cached avatar done',
-                            self.server.debug)
-
         # show avatar or background image
         # Note that this comes before the busy flag to avoid conflicts
         if self._show_avatar_or_banner(referer_domain, self.path,
@@ -20691,44 +20917,14 @@ class PubServer(BaseHTTPRequestHandler):
                         nickname + '@' + self.server.domain + '/' + \
                         banner_file
 
-                if os.path.isfile(media_filename):
-                    check_path = media_filename
-                    file_length = os.path.getsize(media_filename)
-                    media_tm = os.path.getmtime(media_filename)
-                    last_modified_time = \
-                        datetime.datetime.fromtimestamp(media_tm)
-                    time_format_str = '%a, %d %b %Y %H:%M:%S GMT'
-                    last_modified_time_str = \
-                        last_modified_time.strftime(time_format_str)
-                    media_tag_filename = media_filename + '.etag'
-                    if os.path.isfile(media_tag_filename):
-                        try:
-                            with open(media_tag_filename, 'r',
-                                      encoding='utf-8') as efile:
-                                etag = efile.read()
-                        except OSError:
-                            print('EX: do_HEAD unable to read ' +
-                                  media_tag_filename)
-                    else:
-                        media_binary = None
-                        try:
-                            with open(media_filename, 'rb') as av_file:
-                                media_binary = av_file.read()
-                        except OSError:
-                            print('EX: unable to read media binary ' +
-                                  media_filename)
-                        if media_binary:
-                            etag = md5(media_binary).hexdigest()  # nosec
-                            try:
-                                with open(media_tag_filename, 'w+',
-                                          encoding='utf-8') as efile:
-                                    efile.write(etag)
-                            except OSError:
-                                print('EX: do_HEAD unable to write ' +
-                                      media_tag_filename)
-                else:
+                media_info = static_file_info(media_filename)
+                if not media_info:
                     self._404()
                     return
+                check_path = media_filename
+                file_length = media_info['size']
+                last_modified_time_str = media_info['lastModified']
+                etag = media_info['etag']
 
         media_file_type = media_file_mime_type(check_path)
         self._set_headers_head(media_file_type, file_length,
@@ -21194,10 +21390,8 @@ class PubServer(BaseHTTPRequestHandler):
                     post_json_object = load_json(post_filename)
                     if post_json_object:
                         cached_filename = \
-                            acct_dir(self.server.base_dir,
-                                     nickname, self.server.domain) + \
-                            '/postcache/' + \
-                            fields['postUrl'].replace('/', '#') + '.html'
+                            get_cached_post_filename(self.server.base_dir,
+                                                     post_json_object)
                         if os.path.isfile(cached_filename):
                             print('Edited blog post, removing cached html')
                             try:
@@ -22440,92 +22634,27 @@ class PubServer(BaseHTTPRequestHandler):
                             '_POST', '_login_screen',
                             self.server.debug)
 
-        if authorized and self.path.endswith('/sethashtagcategory'):
-            self._set_hashtag_category(calling_domain, cookie,
-                                       self.path,
-                                       self.server.base_dir,
-                                       self.server.domain,
-                                       self.server.debug,
-                                       self.server.system_language)
-            self.server.postreq_busy = False
-            return
-
-        # update of profile/avatar from web interface,
-        # after selecting Edit button then Submit
-        if authorized and self.path.endswith('/profiledata'):
-            self._profile_edit(calling_domain, cookie, self.path,
-                               self.server.base_dir, self.server.http_prefix,
-                               self.server.domain,
-                               self.server.domain_full,
-                               self.server.onion_domain,
-                               self.server.i2p_domain, self.server.debug,
-                               self.server.allow_local_network_access,
-                               self.server.system_language,
-                               self.server.content_license_url,
-                               curr_session,
-                               proxy_type)
-            self.server.postreq_busy = False
-            return
-
-        if authorized and self.path.endswith('/linksdata'):
-            self._links_update(calling_domain, cookie, self.path,
-                               self.server.base_dir, self.server.debug,
-                               self.server.default_timeline,
-                               self.server.allow_local_network_access)
-            self.server.postreq_busy = False
-            return
-
-        if authorized and self.path.endswith('/newswiredata'):
-            self._newswire_update(calling_domain, cookie,
-                                  self.path,
-                                  self.server.base_dir,
-                                  self.server.domain, self.server.debug,
-                                  self.server.default_timeline)
-            self.server.postreq_busy = False
-            return
-
-        if authorized and self.path.endswith('/citationsdata'):
-            self._citations_update(calling_domain, cookie,
-                                   self.path,
-                                   self.server.base_dir,
-                                   self.server.domain,
-                                   self.server.debug,
-                                   self.server.newswire)
-            self.server.postreq_busy = False
-            return
-
-        if authorized and self.path.endswith('/newseditdata'):
-            self._news_post_edit(calling_domain, cookie, self.path,
-                                 self.server.base_dir,
-                                 self.server.domain,
-                                 self.server.debug)
-            self.server.postreq_busy = False
-            return
-
-        fitness_performance(postreq_start_time, self.server.fitness,
-                            '_POST', '_news_post_edit',
-                            self.server.debug)
+        # forms submitted from the web interface
+        route_request = {
+            'authorized': authorized,
+            'users': '/users/' in self.path
+        }
+        route_name = \
+            match_route(PUBSERVER_ROUTES, 'POST', self.path, route_request)
+        if route_name:
+            if self._post_route(route_name, calling_domain, cookie,
+                                authorized, curr_session, proxy_type):
+                fitness_route_performance(postreq_start_time,
+                                          self.server.fitness,
+                                          '_POST_ROUTES', route_name,
+                                          self.server.debug)
+                self.server.postreq_busy = False
+                return
 
         users_in_path = False
         if '/users/' in self.path:
             users_in_path = True
 
-        # moderator action buttons
-        if authorized and users_in_path and \
-           self.path.endswith('/moderationaction'):
-            self._moderator_actions(self.path, calling_domain, cookie,
-                                    self.server.base_dir,
-                                    self.server.http_prefix,
-                                    self.server.domain,
-                                    self.server.port,
-                                    self.server.debug)
-            self.server.postreq_busy = False
-            return
-
-        fitness_performance(postreq_start_time, self.server.fitness,
-                            '_POST', '_moderator_actions',
-                            self.server.debug)
-
         search_for_emoji = False
         if self.path.endswith('/searchhandleemoji'):
             search_for_emoji = True
@@ -22588,212 +22717,6 @@ class PubServer(BaseHTTPRequestHandler):
                 self.server.postreq_busy = False
                 return
 
-            # removes a shared item
-            if self.path.endswith('/rmshare'):
-                self._remove_share(calling_domain, cookie,
-                                   authorized, self.path,
-                                   self.server.base_dir,
-                                   self.server.http_prefix,
-                                   self.server.domain_full,
-                                   self.server.onion_domain,
-                                   self.server.i2p_domain)
-                self.server.postreq_busy = False
-                return
-
-            # removes a wanted item
-            if self.path.endswith('/rmwanted'):
-                self._remove_wanted(calling_domain, cookie,
-                                    authorized, self.path,
-                                    self.server.base_dir,
-                                    self.server.http_prefix,
-                                    self.server.domain_full,
-                                    self.server.onion_domain,
-                                    self.server.i2p_domain)
-                self.server.postreq_busy = False
-                return
-
-            fitness_performance(postreq_start_time, self.server.fitness,
-                                '_POST', '_remove_wanted',
-                                self.server.debug)
-
-            # removes a post
-            if self.path.endswith('/rmpost'):
-                if '/users/' not in self.path:
-                    print('ERROR: attempt to remove post ' +
-                          'was not authorized. ' + self.path)
-                    self._400()
-                    self.server.postreq_busy = False
-                    return
-            if self.path.endswith('/rmpost'):
-                self._receive_remove_post(calling_domain, cookie,
-                                          self.path,
-                                          self.server.base_dir,
-                                          self.server.http_prefix,
-                                          self.server.domain,
-                                          self.server.domain_full,
-                                          self.server.onion_domain,
-                                          self.server.i2p_domain,
-                                          curr_session, proxy_type)
-                self.server.postreq_busy = False
-                return
-
-            fitness_performance(postreq_start_time, self.server.fitness,
-                                '_POST', '_remove_post',
-                                self.server.debug)
-
-            # decision to follow in the web interface is confirmed
-            if self.path.endswith('/followconfirm'):
-                self._follow_confirm(calling_domain, cookie,
-                                     self.path,
-                                     self.server.base_dir,
-                                     self.server.http_prefix,
-                                     self.server.domain,
-                                     self.server.domain_full,
-                                     self.server.port,
-                                     self.server.onion_domain,
-                                     self.server.i2p_domain,
-                                     self.server.debug,
-                                     curr_session,
-                                     proxy_type)
-                self.server.postreq_busy = False
-                return
-
-            fitness_performance(postreq_start_time, self.server.fitness,
-                                '_POST', '_follow_confirm',
-                                self.server.debug)
-
-            # decision to unfollow in the web interface is confirmed
-            if self.path.endswith('/unfollowconfirm'):
-                self._unfollow_confirm(calling_domain, cookie,
-                                       self.path,
-                                       self.server.base_dir,
-                                       self.server.http_prefix,
-                                       self.server.domain,
-                                       self.server.domain_full,
-                                       self.server.port,
-                                       self.server.onion_domain,
-                                       self.server.i2p_domain,
-                                       self.server.debug,
-                                       curr_session, proxy_type)
-                self.server.postreq_busy = False
-                return
-
-            fitness_performance(postreq_start_time, self.server.fitness,
-                                '_POST', '_unfollow_confirm',
-                                self.server.debug)
-
-            # decision to unblock in the web interface is confirmed
-            if self.path.endswith('/unblockconfirm'):
-                self._unblock_confirm(calling_domain, cookie,
-                                      self.path,
-                                      self.server.base_dir,
-                                      self.server.http_prefix,
-                                      self.server.domain,
-                                      self.server.domain_full,
-                                      self.server.port,
-                                      self.server.onion_domain,
-                                      self.server.i2p_domain,
-                                      self.server.debug)
-                self.server.postreq_busy = False
-                return
-
-            fitness_performance(postreq_start_time, self.server.fitness,
-                                '_POST', '_unblock_confirm',
-                                self.server.debug)
-
-            # decision to block in the web interface is confirmed
-            if self.path.endswith('/blockconfirm'):
-                self._block_confirm(calling_domain, cookie,
-                                    self.path,
-                                    self.server.base_dir,
-                                    self.server.http_prefix,
-                                    self.server.domain,
-                                    self.server.domain_full,
-                                    self.server.port,
-                                    self.server.onion_domain,
-                                    self.server.i2p_domain,
-                                    self.server.debug,
-                                    curr_session,
-                                    proxy_type)
-                self.server.postreq_busy = False
-                return
-
-            fitness_performance(postreq_start_time, self.server.fitness,
-                                '_POST', '_block_confirm',
-                                self.server.debug)
-
-            # an option was chosen from person options screen
-            # view/follow/block/report
-            if self.path.endswith('/personoptions'):
-                self._person_options(self.path,
-                                     calling_domain, cookie,
-                                     self.server.base_dir,
-                                     self.server.http_prefix,
-                                     self.server.domain,
-                                     self.server.domain_full,
-                                     self.server.port,
-                                     self.server.onion_domain,
-                                     self.server.i2p_domain,
-                                     self.server.debug,
-                                     curr_session)
-                self.server.postreq_busy = False
-                return
-
-            # Change the key shortcuts
-            if users_in_path and \
-               self.path.endswith('/changeAccessKeys'):
-                nickname = self.path.split('/users/')[1]
-                if '/' in nickname:
-                    nickname = nickname.split('/')[0]
-
-                if not self.server.key_shortcuts.get(nickname):
-                    access_keys = self.server.access_keys
-                    self.server.key_shortcuts[nickname] = access_keys.copy()
-                access_keys = self.server.key_shortcuts[nickname]
-
-                self._key_shortcuts(calling_domain, cookie,
-                                    self.server.base_dir,
-                                    self.server.http_prefix,
-                                    nickname,
-                                    self.server.domain,
-                                    self.server.domain_full,
-                                    self.server.onion_domain,
-                                    self.server.i2p_domain,
-                                    access_keys,
-                                    self.server.default_timeline)
-                self.server.postreq_busy = False
-                return
-
-            # theme designer submit/cancel button
-            if users_in_path and \
-               self.path.endswith('/changeThemeSettings'):
-                nickname = self.path.split('/users/')[1]
-                if '/' in nickname:
-                    nickname = nickname.split('/')[0]
-
-                if not self.server.key_shortcuts.get(nickname):
-                    access_keys = self.server.access_keys
-                    self.server.key_shortcuts[nickname] = access_keys.copy()
-                access_keys = self.server.key_shortcuts[nickname]
-                allow_local_network_access = \
-                    self.server.allow_local_network_access
-
-                self._theme_designer_edit(calling_domain, cookie,
-                                          self.server.base_dir,
-                                          self.server.http_prefix,
-                                          nickname,
-                                          self.server.domain,
-                                          self.server.domain_full,
-                                          self.server.onion_domain,
-                                          self.server.i2p_domain,
-                                          self.server.default_timeline,
-                                          self.server.theme_name,
-                                          allow_local_network_access,
-                                          self.server.system_language,
-                                          self.server.dyslexic_font)
-                self.server.postreq_busy = False
-                return
-
         # update the shared item federation token for the calling domain
         # if it is within the permitted federation
         if self.headers.get('Origin') and \
@@ -23219,19 +23142,37 @@ class EpicyonServer(ThreadingHTTPServer):
 
 
 def run_posts_queue(base_dir: str, send_threads: [], debug: bool,
-                    timeout_mins: int) -> None:
+                    timeout_mins: int, fitness: {},
+                    recent_posts_cache: {}) -> None:
     """Manages the threads used to send posts
+    and records the state of the delivery queues,
+    the recent posts cache, the etags of static files, the
+    actors held in memory and webfinger lookups
     """
+    ctr = 0
     while True:
-        time.sleep(1)
+        thread_sleep(1)
         remove_dormant_threads(base_dir, send_threads, debug, timeout_mins)
+        ctr += 1
+        if ctr >= 10:
+            fitness_queue_metrics(fitness, 'DELIVERY', delivery_metrics())
+            cache_metrics = recent_posts_cache_metrics(recent_posts_cache)
+            fitness_queue_metrics(fitness, 'RECENT_POSTS_CACHE',
+                                  cache_metrics)
+            fitness_queue_metrics(fitness, 'STATIC_FILES',
+                                  static_files_metrics())
+            fitness_queue_metrics(fitness, 'ACTOR_CACHE',
+                                  actor_store_metrics())
+            fitness_queue_metrics(fitness, 'WEBFINGER_CACHE',
+                                  webfinger_cache_metrics())
+            ctr = 0
 
 
 def run_shares_expire(version_number: str, base_dir: str) -> None:
     """Expires shares as needed
     """
     while True:
-        time.sleep(120)
+        thread_sleep(120)
         expire_shares(base_dir)
 
 
@@ -23703,6 +23644,7 @@ def run_daemon(max_hashtags: int,
     httpd.instance_id = instance_id
     httpd.person_cache = {}
     httpd.cached_webfingers = {}
+    webfinger_cache_load(base_dir, httpd.cached_webfingers)
     httpd.favicons_cache = {}
     httpd.proxy_type = proxy_type
     httpd.session = None
@@ -23813,6 +23755,12 @@ def run_daemon(max_hashtags: int,
         print('Creating shared item files directory')
         os.mkdir(base_dir + '/sharefiles')
 
+    print('THREAD: Creating skills index thread')
+    httpd.thrSkillsIndex = \
+        thread_with_trace(target=rebuild_skills_index,
+                          args=(base_dir, debug), daemon=True)
+    begin_thread(httpd.thrSkillsIndex, 'run_daemon thrSkillsIndex')
+
     print('THREAD: Creating fitness thread')
     httpd.thrFitness = \
         thread_with_trace(target=fitness_thread,
@@ -23821,6 +23769,18 @@ def run_daemon(max_hashtags: int,
 
     httpd.recent_posts_cache = {}
 
+    # maximum size of the recent posts cache in memory
+    max_recent_posts_mb = get_config_param(base_dir, 'maxRecentPostsMb')
+    if max_recent_posts_mb:
+        max_recent_posts_bytes = int(max_recent_posts_mb) * 1024 * 1024
+        set_recent_posts_cache_budget(httpd.recent_posts_cache,
+                                      max_recent_posts_bytes)
+
+    # maximum size of the full actors held in memory
+    max_actor_cache_mb = get_config_param(base_dir, 'maxActorCacheMb')
+    if max_actor_cache_mb:
+        set_actor_store_budget(int(max_actor_cache_mb) * 1024 * 1024)
+
     print('THREAD: Creating cache expiry thread')
     httpd.thrCache = \
         thread_with_trace(target=expire_cache,
@@ -23839,7 +23799,9 @@ def run_daemon(max_hashtags: int,
     httpd.thrPostsQueue = \
         thread_with_trace(target=run_posts_queue,
                           args=(base_dir, httpd.send_threads, debug,
-                                httpd.send_threads_timeout_mins), daemon=True)
+                                httpd.send_threads_timeout_mins,
+                                httpd.fitness,
+                                httpd.recent_posts_cache), daemon=True)
     if not unit_test:
         print('THREAD: run_posts_watchdog')
         httpd.thrPostsWatchdog = \
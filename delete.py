@@ -20,6 +20,7 @@ from utils import locate_post
 from utils import delete_post
 from utils import remove_moderation_post_from_index
 from utils import local_actor_url
+from hashtagstats import hashtag_stats_set_category
 from session import post_json
 from webfinger import webfinger_handle
 from auth import create_basic_auth_header
@@ -205,3 +206,7 @@ def remove_old_hashtags(base_dir: str, max_months: int) -> str:
         except OSError:
             print('EX: remove_old_hashtags unable to delete ' +
                   remove_filename)
+            continue
+        if remove_filename.endswith('.category'):
+            hashtag = os.path.basename(remove_filename).split('.')[0]
+            hashtag_stats_set_category(base_dir, hashtag, '')
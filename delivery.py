@@ -0,0 +1,370 @@
+__filename__ = "delivery.py"
+__author__ = "Bob Mottram"
+__license__ = "AGPL3+"
+__version__ = "1.4.0"
+__maintainer__ = "Bob Mottram"
+__email__ = "bob@libreserver.org"
+__status__ = "Production"
+__module_group__ = "ActivityPub"
+
+# Scheduler for delivering posts to the inboxes of other instances.
+# Rather than starting a new thread for every recipient, deliveries
+# are placed into a queue for each destination host and a fixed number
+# of worker threads take them from the queues in turn. The number of
+# simultaneous deliveries to any one host is limited, and failed
+# deliveries are retried with exponential backoff and random jitter.
+# The http signature is created again for each attempt, so that its
+# date is current even if the delivery has waited within a queue.
+
+import time
+import heapq
+import random
+import threading
+from collections import deque
+from threads import thread_with_trace
+from threads import begin_thread
+from session import post_json_string
+from httpsig import create_signed_header
+
+# number of worker threads which send posts
+DELIVERY_WORKERS = 16
+
+# maximum number of simultaneous deliveries to the same host
+DELIVERY_MAX_PER_HOST = 2
+
+# maximum number of deliveries waiting for any one host
+DELIVERY_MAX_QUEUED_PER_HOST = 10000
+
+# maximum number of attempts to deliver a post
+DELIVERY_MAX_TRIES = 8
+
+# the delay before the first retry, which then doubles with each try
+DELIVERY_BACKOFF_BASE_SEC = 30
+
+# the maximum delay between retries
+DELIVERY_BACKOFF_MAX_SEC = 60 * 60
+
+# state of the delivery queues, shared by all worker threads
+_DELIVERY = {
+    'condition': threading.Condition(),
+    'hosts': {},
+    'host_order': [],
+    'active': {},
+    'retries': [],
+    'sequence': 0,
+    'workers': [],
+    'delivered': 0,
+    'failed': 0,
+    'retried': 0,
+    'dropped': 0
+}
+
+
+def _delivery_host(inbox_url: str) -> str:
+    """Returns the host which a delivery is being sent to
+    """
+    host = inbox_url
+    if '://' in host:
+        host = host.split('://', 1)[1]
+    return host.split('/')[0]
+
+
+def _delivery_backoff_sec(tries: int) -> float:
+    """Returns the time to wait before the next try, which doubles
+    with each try and has random jitter so that retries to the
+    same host do not all happen at the same time
+    """
+    backoff_sec = DELIVERY_BACKOFF_BASE_SEC * (2 ** tries)
+    backoff_sec = min(backoff_sec, DELIVERY_BACKOFF_MAX_SEC)
+    return backoff_sec * random.uniform(0.5, 1.5)
+
+
+def _delivery_add_to_host(job: {}) -> None:
+    """Adds a delivery to the queue for its host.
+    This must be called while holding the condition lock
+    """
+    host = job['host']
+    if not _DELIVERY['hosts'].get(host):
+        _DELIVERY['hosts'][host] = deque()
+        if host not in _DELIVERY['host_order']:
+            _DELIVERY['host_order'].append(host)
+    host_queue = _DELIVERY['hosts'][host]
+    host_queue.append(job)
+    # Don't allow the queue for a host to grow without limit
+    while len(host_queue) > DELIVERY_MAX_QUEUED_PER_HOST:
+        host_queue.popleft()
+        _DELIVERY['dropped'] += 1
+        print('WARN: delivery queue full for ' + host +
+              ' - dropping oldest delivery')
+
+
+def _next_delivery_job() -> {}:
+    """Returns the next delivery to be sent, or None.
+    This must be called while holding the condition lock
+    """
+    # move any retries which are now due back into the host queues
+    curr_time = time.time()
+    retries = _DELIVERY['retries']
+    while retries and retries[0][0] <= curr_time:
+        job = heapq.heappop(retries)[2]
+        _delivery_add_to_host(job)
+
+    # take turns between hosts which are below their concurrency limit
+    host_order = _DELIVERY['host_order']
+    for host in host_order:
+        if _DELIVERY['active'].get(host, 0) >= DELIVERY_MAX_PER_HOST:
+            continue
+        host_queue = _DELIVERY['hosts'].get(host)
+        if not host_queue:
+            continue
+        job = host_queue.popleft()
+        if not host_queue:
+            del _DELIVERY['hosts'][host]
+            host_order.remove(host)
+        else:
+            # move this host to the back of the line
+            host_order.remove(host)
+            host_order.append(host)
+        _DELIVERY['active'][host] = _DELIVERY['active'].get(host, 0) + 1
+        return job
+
+    # remove any hosts which no longer have anything queued
+    for host in host_order.copy():
+        if not _DELIVERY['hosts'].get(host):
+            host_order.remove(host)
+    return None
+
+
+def _delivery_wait_sec() -> float:
+    """How long a worker should wait for new deliveries.
+    This must be called while holding the condition lock
+    """
+    wait_sec = 10.0
+    if _DELIVERY['retries']:
+        next_retry_sec = _DELIVERY['retries'][0][0] - time.time()
+        wait_sec = min(wait_sec, max(next_retry_sec, 0.1))
+    return wait_sec
+
+
+def _log_delivery(job: {}, log_str: str) -> None:
+    """Adds an entry to the post log
+    """
+    post_log = job['post_log']
+    post_log.append(log_str)
+    # keep the length of the log finite
+    # Don't accumulate massive files on systems with limited resources
+    while len(post_log) > 16:
+        post_log.pop(0)
+    if not job['debug']:
+        return
+    # save the log file
+    post_log_filename = job['base_dir'] + '/post.log'
+    try:
+        with open(post_log_filename, 'a+', encoding='utf-8') as log_file:
+            log_file.write(log_str + '\n')
+    except OSError:
+        print('EX: unable to append to post log ' + post_log_filename)
+
+
+def _delivery_signature_header(job: {}, content_type: str,
+                               extra_headers: {}) -> {}:
+    """Returns the signed http header for an attempt at delivery
+    """
+    signing = job['signing']
+    signature_header = \
+        create_signed_header(None, signing['private_key_pem'],
+                             signing['nickname'], signing['domain'],
+                             signing['port'], signing['to_domain'],
+                             signing['to_port'], signing['path'],
+                             job['http_prefix'], signing['with_digest'],
+                             job['post_json_str'], content_type)
+    signature_header.update(extra_headers)
+    return signature_header
+
+
+def _attempt_delivery(job: {}) -> str:
+    """Makes a single attempt at sending a post.
+    Returns 'delivered', 'retry' or 'failed'
+    """
+    inbox_url = job['inbox_url']
+    debug = job['debug']
+    post_result = None
+    unauthorized = False
+    return_code = 0
+    signing = job['signing']
+    for content_type, extra_headers in (
+            ('application/activity+json', signing['headers_json']),
+            ('application/ld+json', signing['headers_json_ld'])):
+        signature_header = \
+            _delivery_signature_header(job, content_type, extra_headers)
+        if debug:
+            print('Getting post_json_string for ' + inbox_url)
+        try:
+            post_result, unauthorized, return_code = \
+                post_json_string(job['session'], job['post_json_str'],
+                                 job['federation_list'],
+                                 inbox_url, signature_header,
+                                 debug, job['http_prefix'],
+                                 job['domain_full'])
+        except Exception as ex:
+            print('ERROR: post_json_string failed ' + str(ex))
+            post_result = None
+            unauthorized = False
+            return_code = 0
+        if return_code in range(500, 600):
+            # if an instance is returning a code which indicates that
+            # it might have a runtime error, like 503, then don't
+            # continue to post to it
+            return 'failed'
+        if debug:
+            print('Obtained post_json_string for ' + inbox_url +
+                  ' unauthorized: ' + str(unauthorized))
+        if not unauthorized:
+            break
+        # try again with application/ld+json header
+
+    if unauthorized:
+        print('WARN: delivery: Post is unauthorized ' +
+              inbox_url + ' ' + job['post_json_str'])
+        return 'failed'
+    if post_result:
+        _log_delivery(job, 'Success on try ' + str(job['tries']) + ': ' +
+                      job['post_json_str'])
+        if debug:
+            print('DEBUG: successful json post to ' + inbox_url)
+        return 'delivered'
+    _log_delivery(job, 'Retry ' + str(job['tries']) + ': ' +
+                  job['post_json_str'])
+    return 'retry'
+
+
+def _delivery_finished(job: {}, result: str) -> None:
+    """Updates the queues after an attempt at delivery.
+    This must be called while holding the condition lock
+    """
+    host = job['host']
+    _DELIVERY['active'][host] -= 1
+    if _DELIVERY['active'][host] <= 0:
+        del _DELIVERY['active'][host]
+    if result == 'delivered':
+        _DELIVERY['delivered'] += 1
+        return
+    if result == 'retry':
+        job['tries'] += 1
+        if job['tries'] < DELIVERY_MAX_TRIES:
+            backoff_sec = _delivery_backoff_sec(job['tries'] - 1)
+            if job['debug']:
+                print('DEBUG: json post to ' + job['inbox_url'] +
+                      ' failed. Retrying in ' + str(int(backoff_sec)) +
+                      ' seconds.')
+            _DELIVERY['sequence'] += 1
+            heapq.heappush(_DELIVERY['retries'],
+                           (time.time() + backoff_sec,
+                            _DELIVERY['sequence'], job))
+            _DELIVERY['retried'] += 1
+            return
+    _DELIVERY['failed'] += 1
+
+
+def _run_delivery_worker(worker_index: int, debug: bool) -> None:
+    """A worker thread which sends posts from the delivery queues
+    """
+    if debug:
+        print('DEBUG: delivery worker ' + str(worker_index) + ' started')
+    condition = _DELIVERY['condition']
+    while True:
+        with condition:
+            job = _next_delivery_job()
+            while not job:
+                condition.wait(_delivery_wait_sec())
+                job = _next_delivery_job()
+        result = 'failed'
+        try:
+            result = _attempt_delivery(job)
+        except Exception as ex:
+            print('ERROR: delivery to ' + job['inbox_url'] +
+                  ' failed ' + str(ex))
+        finally:
+            # also when the worker is stopped during the attempt
+            with condition:
+                _delivery_finished(job, result)
+                # a slot for this host may now be free
+                condition.notify()
+
+
+def _start_delivery_workers(debug: bool) -> None:
+    """Ensures that the delivery worker threads are running.
+    This must be called while holding the condition lock
+    """
+    workers = _DELIVERY['workers']
+    for thr in workers.copy():
+        if thr.is_started and not thr.is_alive():
+            print('WARN: delivery worker stopped')
+            workers.remove(thr)
+    while len(workers) < DELIVERY_WORKERS:
+        worker_index = len(workers)
+        print('THREAD: delivery worker ' + str(worker_index))
+        thr = thread_with_trace(target=_run_delivery_worker,
+                                args=(worker_index, debug), daemon=True)
+        workers.append(thr)
+        begin_thread(thr, '_start_delivery_workers')
+
+
+def queue_delivery(session, post_json_str: str, federation_list: [],
+                   inbox_url: str, base_dir: str, signing: {},
+                   post_log: [], debug: bool,
+                   http_prefix: str, domain_full: str) -> None:
+    """Adds a post to the queue of deliveries for the host of the
+    given inbox. The signing dict contains the parameters used to sign
+    the http headers, together with any extra headers to be sent
+    """
+    job = {
+        'session': session,
+        'post_json_str': post_json_str,
+        'federation_list': federation_list,
+        'inbox_url': inbox_url,
+        'host': _delivery_host(inbox_url),
+        'base_dir': base_dir,
+        'signing': signing,
+        'post_log': post_log,
+        'debug': debug,
+        'http_prefix': http_prefix,
+        'domain_full': domain_full,
+        'tries': 0
+    }
+    condition = _DELIVERY['condition']
+    with condition:
+        _delivery_add_to_host(job)
+        _start_delivery_workers(debug)
+        condition.notify()
+
+
+def delivery_metrics() -> {}:
+    """Returns the current state of the delivery queues
+    """
+    condition = _DELIVERY['condition']
+    with condition:
+        queued = 0
+        deepest_host = ''
+        deepest_host_queued = 0
+        for host, host_queue in _DELIVERY['hosts'].items():
+            queued += len(host_queue)
+            if len(host_queue) > deepest_host_queued:
+                deepest_host = host
+                deepest_host_queued = len(host_queue)
+        active = 0
+        for host_active in _DELIVERY['active'].values():
+            active += host_active
+        return {
+            'queued': queued,
+            'active': active,
+            'waitingRetry': len(_DELIVERY['retries']),
+            'hosts': len(_DELIVERY['hosts']),
+            'deepestHost': deepest_host,
+            'deepestHostQueued': deepest_host_queued,
+            'workers': len(_DELIVERY['workers']),
+            'delivered': _DELIVERY['delivered'],
+            'failed': _DELIVERY['failed'],
+            'retried': _DELIVERY['retried'],
+            'dropped': _DELIVERY['dropped']
+        }
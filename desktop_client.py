@@ -50,6 +50,7 @@ from posts import send_mute_via_server
 from posts import send_undo_mute_via_server
 from posts import send_post_via_server
 from posts import c2s_box_json
+from posts import c2s_box_events
 from posts import download_announce
 from announce import send_announce_via_server
 from announce import send_undo_announce_via_server
@@ -280,6 +281,21 @@ def _new_desktop_notifications(actor: str, inbox_json: {},
                     reply_done = True
 
 
+def _desktop_events_changed(events_json: {}, curr_timeline: str) -> bool:
+    """Returns true if the events received from the server mean that
+    the current timeline or the notifications need to be updated
+    """
+    if events_json.get('reset'):
+        return True
+    for event in events_json.get('events', []):
+        if event.get('type') == 'post':
+            if event.get('box') in (curr_timeline, 'inbox'):
+                return True
+        elif event.get('type') in ('dm', 'reply', 'follow'):
+            return True
+    return False
+
+
 def _desktop_clear_screen() -> None:
     """Clears the screen
     """
@@ -1550,6 +1566,17 @@ def run_desktop_client(base_dir: str, proxy_type: str, http_prefix: str,
     }
     prev_timeline_first_id = ''
     desktop_shown = False
+
+    # cursor for events from the server, so that timelines are only
+    # downloaded again when they change
+    events_cursor = 0
+    events_json = c2s_box_events(session, nickname, password,
+                                 domain, port, http_prefix,
+                                 events_cursor, 0,
+                                 debug, signing_priv_key_pem)
+    if events_json:
+        events_cursor = events_json['cursor']
+    refresh_boxes = True
     while (1):
         if not pgp_key_upload:
             if not has_local_pg_pkey():
@@ -1569,27 +1596,32 @@ def run_desktop_client(base_dir: str, proxy_type: str, http_prefix: str,
                              system_language, espeak)
             pgp_key_upload = True
 
-        box_json = c2s_box_json(session, nickname, password,
-                                domain, port, http_prefix,
-                                curr_timeline, page_number,
-                                debug, signing_priv_key_pem)
-
-        follow_requests_json = \
-            get_follow_requests_via_server(session,
-                                           nickname, password,
-                                           domain, port,
-                                           http_prefix, 1,
-                                           debug, __version__,
-                                           signing_priv_key_pem)
-
-        if not (curr_timeline == 'inbox' and page_number == 1):
-            # monitor the inbox to generate notifications
-            inbox_json = c2s_box_json(session, nickname, password,
-                                      domain, port, http_prefix,
-                                      'inbox', 1, debug,
-                                      signing_priv_key_pem)
+        if refresh_boxes or not prev_timeline_first_id:
+            box_json = c2s_box_json(session, nickname, password,
+                                    domain, port, http_prefix,
+                                    curr_timeline, page_number,
+                                    debug, signing_priv_key_pem)
+
+            follow_requests_json = \
+                get_follow_requests_via_server(session,
+                                               nickname, password,
+                                               domain, port,
+                                               http_prefix, 1,
+                                               debug, __version__,
+                                               signing_priv_key_pem)
+
+            if not (curr_timeline == 'inbox' and page_number == 1):
+                # monitor the inbox to generate notifications
+                inbox_json = c2s_box_json(session, nickname, password,
+                                          domain, port, http_prefix,
+                                          'inbox', 1, debug,
+                                          signing_priv_key_pem)
+            else:
+                inbox_json = box_json
         else:
-            inbox_json = box_json
+            # nothing has changed since the timeline was downloaded
+            inbox_json = None
+        refresh_boxes = False
         if inbox_json:
             _new_desktop_notifications(your_actor, inbox_json, notify_json)
             if notify_json.get('dmNotify'):
@@ -1621,6 +1653,7 @@ def run_desktop_client(base_dir: str, proxy_type: str, http_prefix: str,
             prev_timeline_first_id = timeline_first_id
         else:
             session = create_session(proxy_type)
+            refresh_boxes = True
             if not desktop_shown:
                 if not session:
                     print('No session\n')
@@ -1632,11 +1665,28 @@ def run_desktop_client(base_dir: str, proxy_type: str, http_prefix: str,
                     print('You may need to run the desktop client ' +
                           'with the --http option')
 
-        # wait for a while, or until a key is pressed
+        # wait until something changes, or until a key is pressed
+        command_str = None
+        events_wait_sec = 0
         if no_key_press:
-            time.sleep(10)
+            events_wait_sec = 30
         else:
             command_str = _desktop_wait_for_cmd(30, debug)
+        if not command_str:
+            events_json = c2s_box_events(session, nickname, password,
+                                         domain, port, http_prefix,
+                                         events_cursor, events_wait_sec,
+                                         debug, signing_priv_key_pem)
+            if events_json and events_cursor:
+                refresh_boxes = \
+                    _desktop_events_changed(events_json, curr_timeline)
+            else:
+                refresh_boxes = True
+                if not events_json and no_key_press:
+                    # the server may not support events, so poll instead
+                    time.sleep(10)
+            if events_json:
+                events_cursor = events_json['cursor']
         if command_str:
             refresh_timeline = False
 
@@ -87,6 +87,8 @@ from utils import follow_person
 from utils import valid_nickname
 from utils import get_protocol_prefixes
 from utils import acct_dir
+from utils import is_account_dir
+from postlocation import rebuild_post_locations
 from media import archive_media
 from media import get_attachment_media_type
 from delete import send_delete_via_server
@@ -113,6 +115,7 @@ from desktop_client import run_desktop_client
 from happening import dav_month_via_server
 from happening import dav_day_via_server
 from content import import_emoji
+from actorstore import migrate_actor_store
 from relationships import get_moved_accounts
 
 
@@ -166,6 +169,11 @@ def _command_options() -> None:
     parser.add_argument('--import_emoji', type=str,
                         default='',
                         help='Import emoji dict from the given filename')
+    parser.add_argument("--migrateactors", dest='migrate_actors',
+                        type=str2bool, nargs='?',
+                        const=True, default=False,
+                        help="Move cached actors stored by older " +
+                        "versions into subdirectories of the actors cache")
     parser.add_argument('--lists_enabled', type=str,
                         default=None,
                         help='Names of content warning lists enabled. ' +
@@ -594,6 +602,12 @@ def _command_options() -> None:
     parser.add_argument('--image', '--background', dest='backgroundImage',
                         type=str, default=None,
                         help='Set the profile background image for an account')
+    parser.add_argument('--rebuildPostLocations',
+                        dest='rebuildPostLocations',
+                        type=str2bool, nargs='?',
+                        const=True, default=False,
+                        help='Rebuild the index of post locations ' +
+                        'for all accounts')
     parser.add_argument('--archive', dest='archive', type=str,
                         default=None,
                         help='Archive old files to the given directory')
@@ -828,6 +842,12 @@ def _command_options() -> None:
         import_emoji(base_dir, import_filename, session)
         sys.exit()
 
+    if argb.migrate_actors:
+        print('Migrating cached actors')
+        migrated_ctr = migrate_actor_store(base_dir)
+        print(str(migrated_ctr) + ' cached actors were migrated')
+        sys.exit()
+
     # automatic translations
     if argb.libretranslateUrl:
         if '://' in argb.libretranslateUrl and \
@@ -2926,6 +2946,19 @@ def _command_options() -> None:
             print('Passwords file not found')
         sys.exit()
 
+    if argb.rebuildPostLocations:
+        print('Rebuilding post locations index...')
+        for _, dirs, _ in os.walk(base_dir + '/accounts'):
+            for acct in dirs:
+                if not is_account_dir(acct):
+                    continue
+                account_dir = os.path.join(base_dir + '/accounts', acct)
+                posts_indexed = rebuild_post_locations(account_dir)
+                print(acct + ': ' + str(posts_indexed) + ' posts')
+            break
+        print('Post locations index rebuilt')
+        sys.exit()
+
     if argb.archive:
         if argb.archive.lower().endswith('null') or \
            argb.archive.lower().endswith('delete') or \
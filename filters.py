@@ -9,6 +9,7 @@ __module_group__ = "Moderation"
 
 import os
 from utils import acct_dir
+from accountsettings import get_account_settings
 from utils import text_in_file
 from utils import remove_eol
 from utils import standardize_text
@@ -194,8 +195,8 @@ def is_filtered(base_dir: str, nickname: str, domain: str,
         return False
 
     # optionally remove retweets
-    remove_twitter = acct_dir(base_dir, nickname, domain) + '/.removeTwitter'
-    if os.path.isfile(remove_twitter):
+    account_dir = acct_dir(base_dir, nickname, domain)
+    if get_account_settings(account_dir)['removeTwitter']:
         if _is_twitter_post(content):
             return True
 
@@ -14,6 +14,11 @@ from webapp_utils import html_footer
 from utils import get_config_param
 from utils import save_json
 
+# upper limits of the buckets used for histograms of response times,
+# in milliseconds. The final bucket contains anything slower
+FITNESS_HISTOGRAM_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200,
+                                500, 1000, 2000, 5000)
+
 
 def fitness_performance(startTime, fitness_state: {},
                         fitness_id: str, watch_point: str,
@@ -49,6 +54,76 @@ def fitness_performance(startTime, fitness_state: {},
               watch_point + '/' + str(total * 1000 / ctr))
 
 
+def fitness_route_performance(startTime, fitness_state: {},
+                              fitness_id: str, route_name: str,
+                              debug: bool) -> None:
+    """Log the time taken to respond to a route of the web server,
+    together with a histogram of response times
+    """
+    if fitness_state is None:
+        return
+    time_diff_ms = float(time.time() - startTime) * 1000
+    fitness_performance(startTime, fitness_state,
+                        fitness_id, route_name, debug)
+    watch_point = fitness_state['performance'][fitness_id][route_name]
+    if 'histogram' not in watch_point:
+        watch_point['histogram'] = \
+            [0] * (len(FITNESS_HISTOGRAM_BUCKETS_MS) + 1)
+    histogram = watch_point['histogram']
+    bucket_index = len(FITNESS_HISTOGRAM_BUCKETS_MS)
+    for index, bucket_ms in enumerate(FITNESS_HISTOGRAM_BUCKETS_MS):
+        if time_diff_ms <= bucket_ms:
+            bucket_index = index
+            break
+    histogram[bucket_index] += 1
+    # decay in the same way as the average
+    if sum(histogram) >= 1024:
+        for index, count in enumerate(histogram):
+            histogram[index] = int(count / 2)
+
+
+def fitness_route_histograms(fitness_state: {}) -> {}:
+    """Returns the histograms of response times for each route
+    of the web server
+    """
+    histograms = {
+        "bucketsMs": list(FITNESS_HISTOGRAM_BUCKETS_MS)
+    }
+    if not fitness_state.get('performance'):
+        return histograms
+    for fitness_id in ('_GET_ROUTES', '_POST_ROUTES'):
+        if not fitness_state['performance'].get(fitness_id):
+            continue
+        histograms[fitness_id] = {}
+        routes = fitness_state['performance'][fitness_id]
+        for route_name, item in routes.items():
+            if not item.get('histogram'):
+                continue
+            histograms[fitness_id][route_name] = item['histogram']
+    return histograms
+
+
+def fitness_queue_metrics(fitness_state: {}, queue_id: str,
+                          metrics: {}) -> None:
+    """Records the current depth and counters for a queue, such as
+    the queue of outgoing deliveries
+    """
+    if fitness_state is None:
+        return
+    if 'queues' not in fitness_state:
+        fitness_state['queues'] = {}
+    if queue_id not in fitness_state['queues']:
+        fitness_state['queues'][queue_id] = {
+            "maxQueued": int(0)
+        }
+    queue_state = fitness_state['queues'][queue_id]
+    for metric_name, value in metrics.items():
+        queue_state[metric_name] = value
+    if metrics.get('queued'):
+        if metrics['queued'] > queue_state['maxQueued']:
+            queue_state['maxQueued'] = metrics['queued']
+
+
 def sorted_watch_points(fitness: {}, fitness_id: str) -> []:
     """Returns a sorted list of watchpoints
     times are in mS
@@ -40,6 +40,7 @@ from auth import create_basic_auth_header
 from session import get_json
 from session import post_json
 from followerSync import remove_followers_sync
+from boxevents import box_event_add
 
 
 def create_initial_last_seen(base_dir: str, http_prefix: str) -> None:
@@ -727,6 +728,8 @@ def store_follow_request(base_dir: str,
                 fp_approve.write(approve_handle_stored + '\n')
         except OSError:
             print('EX: store_follow_request 3 ' + approve_follows_filename)
+    follow_handle = nickname_to_follow + '@' + domain_to_follow
+    box_event_add(follow_handle, 'follow', '', person_url)
 
     # store the follow request in its own directory
     # We don't rely upon the inbox because items in there could expire
@@ -12,6 +12,7 @@ import hashlib
 from hashlib import sha256
 from utils import acct_dir
 from utils import get_user_paths
+from actorstore import actor_store_locate
 
 
 def remove_followers_sync(followers_sync_cache: {},
@@ -61,9 +62,7 @@ def _get_followers_for_domain(base_dir: str,
                 for possible_path in paths_list:
                     url = prefix + '://' + search_domain + \
                         possible_path + nick
-                    filename = base_dir + '/cache/actors/' + \
-                        url.replace('/', '#') + '.json'
-                    if not os.path.isfile(filename):
+                    if not actor_store_locate(base_dir, url):
                         continue
                     if url not in result:
                         result.append(url)
@@ -8,10 +8,13 @@ __status__ = "Production"
 __module_group__ = "Core"
 
 import os
+import threading
+from collections import OrderedDict
 from uuid import UUID
 from hashlib import md5
 from datetime import datetime
 from datetime import timedelta
+from datetime import timezone
 
 from utils import acct_handle_dir
 from utils import is_public_post
@@ -27,6 +30,7 @@ from utils import get_status_number
 from utils import get_full_domain
 from utils import text_in_file
 from utils import remove_eol
+from utils import remove_id_ending
 from filters import is_filtered
 from context import get_individual_post_context
 from session import get_method
@@ -87,7 +91,7 @@ def _remove_event_from_timeline(event_id: str,
 
 
 def save_event_post(base_dir: str, handle: str, post_id: str,
-                    event_json: {}) -> bool:
+                    event_json: {}, post_json_object: {}) -> bool:
     """Saves an event to the calendar and/or the events timeline
     If an event has extra fields, as per Mobilizon,
     Then it is saved as a separate entity and added to the
@@ -179,6 +183,13 @@ def save_event_post(base_dir: str, handle: str, post_id: str,
     except OSError:
         print('EX: unable to append to calendar ' + calendar_filename)
 
+    # add the post to the index of events
+    entry = _calendar_index_entry(post_json_object)
+    if entry:
+        nickname = handle.split('@')[0]
+        domain = handle.split('@')[1]
+        _calendar_index_add(base_dir, nickname, domain, post_id, entry)
+
     # create a file which will trigger a notification that
     # a new event has been added
     cal_notify_filename = handle_dir + '/.newCalendar'
@@ -232,6 +243,318 @@ def _event_text_match(content: str, text_match: str) -> bool:
     return False
 
 
+# Index of calendar events for each account, keyed by date, so that
+# the events for a day, week or month can be obtained without loading
+# each post referenced within the calendar files. For each post the
+# index holds the fields of its Event and Place tags which are shown,
+# together with the text of its content and the published date used for
+# text matches and icalendar output. Events which finished more than
+# CALENDAR_INDEX_DAYS_KEPT days ago are removed from the index.
+# The index is saved as calendar/index.json within the account directory
+# and is created from the calendar files the first time that it is needed.
+
+# maximum number of account calendar indexes held in memory
+CALENDAR_INDEX_MAX_ACCOUNTS = 64
+
+# number of days for which past events remain within the index
+CALENDAR_INDEX_DAYS_KEPT = 31
+
+_CALENDAR_INDEX = {
+    'lock': threading.Lock(),
+    'accounts': OrderedDict()
+}
+
+
+def _calendar_index_post_id(post_id: str) -> str:
+    """Returns the form of a post id used within the calendar index
+    """
+    return remove_id_ending(post_id.strip()).replace('/', '#')
+
+
+def _calendar_event_time(tag: {}):
+    """Returns the start time of an event tag, or None
+    """
+    if not tag.get('startTime'):
+        return None
+    try:
+        return datetime.strptime(tag['startTime'], "%Y-%m-%dT%H:%M:%S%z")
+    except (ValueError, TypeError):
+        return None
+
+
+def _calendar_event_dates(tags: []) -> []:
+    """Returns the dates of the events within the given tags
+    """
+    dates = []
+    for tag in tags:
+        if tag['type'] != 'Event':
+            continue
+        event_time = _calendar_event_time(tag)
+        if not event_time:
+            continue
+        date_str = event_time.strftime("%Y-%m-%d")
+        if date_str not in dates:
+            dates.append(date_str)
+    return dates
+
+
+def _calendar_index_entry(post_json_object: {}) -> {}:
+    """Returns the calendar index entry for a post
+    """
+    if not _is_happening_post(post_json_object):
+        return None
+    if not isinstance(post_json_object['object']['tag'], list):
+        return None
+    tags = []
+    for tag in post_json_object['object']['tag']:
+        if not isinstance(tag, dict):
+            continue
+        if not _is_happening_event(tag):
+            continue
+        # only the fields shown within the calendar
+        index_tag = {}
+        for field_name in ('type', 'name', 'startTime', 'endTime'):
+            if isinstance(tag.get(field_name), str):
+                index_tag[field_name] = tag[field_name]
+        tags.append(index_tag)
+    dates = _calendar_event_dates(tags)
+    if not dates:
+        return None
+    # the text of the content is used for matches
+    content = post_json_object['object'].get('content')
+    if not isinstance(content, str):
+        content = ''
+    content = remove_html(content)
+    content_map = {}
+    if isinstance(post_json_object['object'].get('contentMap'), dict):
+        for lang, lang_content in \
+                post_json_object['object']['contentMap'].items():
+            if not isinstance(lang_content, str):
+                continue
+            lang_content = remove_html(lang_content)
+            if lang_content != content:
+                content_map[lang] = lang_content
+    published = post_json_object['object'].get('published')
+    if not isinstance(published, str):
+        published = ''
+    return {
+        'dates': dates,
+        'tags': tags,
+        'public': is_public_post(post_json_object),
+        'published': published,
+        'content': content,
+        'contentMap': content_map
+    }
+
+
+def _calendar_index_build(base_dir: str, nickname: str, domain: str,
+                          calendar_path: str) -> {}:
+    """Creates the calendar index for an account from its calendar files
+    """
+    posts = {}
+    if not os.path.isdir(calendar_path):
+        return posts
+    for year_str in os.listdir(calendar_path):
+        if not year_str.isdigit():
+            continue
+        year_path = calendar_path + '/' + year_str
+        if not os.path.isdir(year_path):
+            continue
+        for month_filename in os.listdir(year_path):
+            if not month_filename.endswith('.txt'):
+                continue
+            try:
+                with open(year_path + '/' + month_filename, 'r',
+                          encoding='utf-8') as events_file:
+                    post_ids = events_file.read().split('\n')
+            except OSError:
+                print('EX: _calendar_index_build unable to read ' +
+                      year_path + '/' + month_filename)
+                continue
+            for post_id in post_ids:
+                post_id = remove_eol(post_id)
+                if not post_id:
+                    continue
+                index_post_id = _calendar_index_post_id(post_id)
+                if posts.get(index_post_id):
+                    continue
+                post_filename = \
+                    locate_post(base_dir, nickname, domain, post_id)
+                if not post_filename:
+                    continue
+                entry = _calendar_index_entry(load_json(post_filename))
+                if entry:
+                    posts[index_post_id] = entry
+    return posts
+
+
+def _calendar_index_load(base_dir: str, nickname: str, domain: str) -> {}:
+    """Returns the calendar index for an account.
+    This must be called while holding the lock
+    """
+    calendar_path = acct_dir(base_dir, nickname, domain) + '/calendar'
+    index_filename = calendar_path + '/index.json'
+    accounts = _CALENDAR_INDEX['accounts']
+    mtime = None
+    if os.path.isfile(index_filename):
+        mtime = os.path.getmtime(index_filename)
+    index = accounts.get(calendar_path)
+    if index and mtime and index['mtime'] == mtime:
+        accounts.move_to_end(calendar_path)
+        return index
+
+    posts = None
+    if mtime:
+        index_json = load_json(index_filename)
+        if index_json and isinstance(index_json.get('posts'), dict):
+            posts = index_json['posts']
+    index = {
+        'filename': index_filename,
+        'mtime': mtime,
+        'posts': {},
+        'days': {}
+    }
+    if posts is None:
+        index['posts'] = \
+            _calendar_index_build(base_dir, nickname, domain, calendar_path)
+        if os.path.isdir(calendar_path):
+            _calendar_index_save(index)
+    else:
+        index['posts'] = posts
+    for post_id, entry in index['posts'].items():
+        for date_str in entry['dates']:
+            if not index['days'].get(date_str):
+                index['days'][date_str] = []
+            index['days'][date_str].append(post_id)
+    accounts[calendar_path] = index
+    accounts.move_to_end(calendar_path)
+    while len(accounts) > CALENDAR_INDEX_MAX_ACCOUNTS:
+        accounts.popitem(last=False)
+    return index
+
+
+def _calendar_index_prune(index: {}) -> None:
+    """Removes events which finished some time ago from a calendar index.
+    This must be called while holding the lock
+    """
+    oldest_date = datetime.now(timezone.utc) - \
+        timedelta(days=CALENDAR_INDEX_DAYS_KEPT)
+    oldest_date_str = oldest_date.strftime("%Y-%m-%d")
+    expired_post_ids = []
+    for post_id, entry in index['posts'].items():
+        if max(entry['dates']) < oldest_date_str:
+            expired_post_ids.append(post_id)
+    for post_id in expired_post_ids:
+        _calendar_index_unlink(index, post_id)
+    for date_str in list(index['days'].keys()):
+        if not index['days'][date_str]:
+            del index['days'][date_str]
+
+
+def _calendar_index_save(index: {}) -> None:
+    """Saves a calendar index.
+    This must be called while holding the lock
+    """
+    _calendar_index_prune(index)
+    if not save_json({'posts': index['posts']}, index['filename']):
+        print('EX: unable to save calendar index ' + index['filename'])
+        return
+    index['mtime'] = os.path.getmtime(index['filename'])
+
+
+def _calendar_index_unlink(index: {}, post_id: str) -> None:
+    """Removes a post and the days on which it happens from a
+    calendar index. This must be called while holding the lock
+    """
+    entry = index['posts'].pop(post_id, None)
+    if not entry:
+        return
+    for date_str in entry['dates']:
+        day_post_ids = index['days'].get(date_str)
+        if day_post_ids and post_id in day_post_ids:
+            day_post_ids.remove(post_id)
+
+
+def _calendar_index_add(base_dir: str, nickname: str, domain: str,
+                        post_id: str, entry: {}) -> None:
+    """Adds a post to the calendar index of an account, replacing
+    any previous version of it
+    """
+    post_id = _calendar_index_post_id(post_id)
+    with _CALENDAR_INDEX['lock']:
+        index = _calendar_index_load(base_dir, nickname, domain)
+        if index['posts'].get(post_id) == entry:
+            return
+        _calendar_index_unlink(index, post_id)
+        index['posts'][post_id] = entry
+        for date_str in entry['dates']:
+            if not index['days'].get(date_str):
+                index['days'][date_str] = []
+            index['days'][date_str].append(post_id)
+        _calendar_index_save(index)
+
+
+def _calendar_index_remove(base_dir: str, nickname: str, domain: str,
+                           post_id: str) -> None:
+    """Removes a post from the calendar index of an account
+    """
+    post_id = _calendar_index_post_id(post_id)
+    with _CALENDAR_INDEX['lock']:
+        index = _calendar_index_load(base_dir, nickname, domain)
+        if not index['posts'].get(post_id):
+            return
+        _calendar_index_unlink(index, post_id)
+        _calendar_index_save(index)
+
+
+def _calendar_index_post(base_dir: str, nickname: str, domain: str,
+                         post_id: str) -> {}:
+    """Returns the calendar index entry for a post
+    """
+    post_id = _calendar_index_post_id(post_id)
+    with _CALENDAR_INDEX['lock']:
+        index = _calendar_index_load(base_dir, nickname, domain)
+        return index['posts'].get(post_id)
+
+
+def _calendar_index_events(base_dir: str, nickname: str, domain: str,
+                           dates: []) -> []:
+    """Returns the post ids and index entries for events on the
+    given dates. Posts which no longer exist are removed from the calendar
+    """
+    events = []
+    with _CALENDAR_INDEX['lock']:
+        index = _calendar_index_load(base_dir, nickname, domain)
+        post_ids = []
+        for date_str in dates:
+            for post_id in index['days'].get(date_str, []):
+                if post_id not in post_ids:
+                    post_ids.append(post_id)
+                    events.append((post_id, index['posts'][post_id]))
+    existing_events = []
+    for post_id, entry in events:
+        if locate_post(base_dir, nickname, domain, post_id):
+            existing_events.append((post_id, entry))
+            continue
+        # the post has been deleted
+        for date_str in entry['dates']:
+            year = int(date_str.split('-')[0])
+            month_number = int(date_str.split('-')[1])
+            remove_calendar_event(base_dir, nickname, domain,
+                                  year, month_number, post_id)
+    return existing_events
+
+
+def _calendar_month_dates(year: int, month_number: int) -> []:
+    """Returns the dates within a month, as used by the calendar index
+    """
+    dates = []
+    for day_number in range(1, 32):
+        dates.append(str(year) + '-' + str(month_number).zfill(2) + '-' +
+                     str(day_number).zfill(2))
+    return dates
+
+
 def get_todays_events(base_dir: str, nickname: str, domain: str,
                       curr_year: int, curr_month_number: int,
                       curr_day_of_month: int,
@@ -253,92 +576,53 @@ def get_todays_events(base_dir: str, nickname: str, domain: str,
     else:
         day_number = curr_day_of_month
 
-    calendar_filename = \
-        acct_dir(base_dir, nickname, domain) + \
-        '/calendar/' + str(year) + '/' + str(month_number) + '.txt'
     events = {}
-    if not os.path.isfile(calendar_filename):
-        return events
-
-    calendar_post_ids = []
-    recreate_events_file = False
-    with open(calendar_filename, 'r', encoding='utf-8') as events_file:
-        for post_id in events_file:
-            post_id = remove_eol(post_id)
-            post_filename = locate_post(base_dir, nickname, domain, post_id)
-            if not post_filename:
-                recreate_events_file = True
-                continue
-
-            post_json_object = load_json(post_filename)
-            if not _is_happening_post(post_json_object):
+    date_str = str(year) + '-' + str(month_number).zfill(2) + '-' + \
+        str(day_number).zfill(2)
+    for post_id, entry in _calendar_index_events(base_dir, nickname, domain,
+                                                 [date_str]):
+        content_language = system_language
+        content = None
+        if entry['contentMap'].get(system_language):
+            content = entry['contentMap'][system_language]
+        if not content:
+            content = entry['content']
+        if content:
+            if not _event_text_match(content, text_match):
                 continue
 
-            content_language = system_language
-            if post_json_object.get('object'):
-                content = None
-                if post_json_object['object'].get('contentMap'):
-                    sys_lang = system_language
-                    if post_json_object['object']['contentMap'].get(sys_lang):
-                        content = \
-                            post_json_object['object']['contentMap'][sys_lang]
-                        content_language = sys_lang
-                if not content:
-                    if post_json_object['object'].get('content'):
-                        content = post_json_object['object']['content']
-                if content:
-                    if not _event_text_match(content, text_match):
-                        continue
-
-            public_event = is_public_post(post_json_object)
-
-            post_event = []
-            day_of_month = None
-            for tag in post_json_object['object']['tag']:
-                if not _is_happening_event(tag):
+        post_event = []
+        day_of_month = None
+        for tag in entry['tags']:
+            # this tag is an event or a place
+            if tag['type'] == 'Event':
+                # tag is an event
+                event_time = _calendar_event_time(tag)
+                if not event_time:
                     continue
-                # this tag is an event or a place
-                if tag['type'] == 'Event':
-                    # tag is an event
-                    if not tag.get('startTime'):
-                        continue
-                    event_time = \
-                        datetime.strptime(tag['startTime'],
-                                          "%Y-%m-%dT%H:%M:%S%z")
-                    if int(event_time.strftime("%Y")) == year and \
-                       int(event_time.strftime("%m")) == month_number and \
-                       int(event_time.strftime("%d")) == day_number:
-                        day_of_month = str(int(event_time.strftime("%d")))
-                        if '#statuses#' in post_id:
-                            # link to the id so that the event can be
-                            # easily deleted
-                            tag['post_id'] = post_id.split('#statuses#')[1]
-                            tag['id'] = post_id.replace('#', '/')
-                            tag['sender'] = post_id.split('#statuses#')[0]
-                            tag['sender'] = tag['sender'].replace('#', '/')
-                            tag['public'] = public_event
-                            tag['language'] = content_language
-                        post_event.append(tag)
-                else:
-                    # tag is a place
-                    post_event.append(tag)
-            if post_event and day_of_month:
-                calendar_post_ids.append(post_id)
-                if not events.get(day_of_month):
-                    events[day_of_month] = []
-                events[day_of_month].append(post_event)
-
-    # if some posts have been deleted then regenerate the calendar file
-    if recreate_events_file:
-        try:
-            with open(calendar_filename, 'w+',
-                      encoding='utf-8') as calendar_file:
-                for post_id in calendar_post_ids:
-                    calendar_file.write(post_id + '\n')
-        except OSError:
-            print('EX: unable to recreate events file 1 ' +
-                  calendar_filename)
-
+                if event_time.year == year and \
+                   event_time.month == month_number and \
+                   event_time.day == day_number:
+                    day_of_month = str(event_time.day)
+                    event_tag = tag.copy()
+                    if '#statuses#' in post_id:
+                        # link to the id so that the event can be
+                        # easily deleted
+                        event_tag['post_id'] = post_id.split('#statuses#')[1]
+                        event_tag['id'] = post_id.replace('#', '/')
+                        event_tag['sender'] = post_id.split('#statuses#')[0]
+                        event_tag['sender'] = \
+                            event_tag['sender'].replace('#', '/')
+                        event_tag['public'] = entry['public']
+                        event_tag['language'] = content_language
+                    post_event.append(event_tag)
+            else:
+                # tag is a place
+                post_event.append(tag.copy())
+        if post_event and day_of_month:
+            if not events.get(day_of_month):
+                events[day_of_month] = []
+            events[day_of_month].append(post_event)
     return events
 
 
@@ -384,7 +668,7 @@ def _icalendar_day(base_dir: str, nickname: str, domain: str,
                                           "%Y-%m-%dT%H:%M:%S%z")
                 if evnt.get('endTime'):
                     event_end = \
-                        datetime.strptime(evnt['startTime'],
+                        datetime.strptime(evnt['endTime'],
                                           "%Y-%m-%dT%H:%M:%S%z")
                 if 'public' in evnt:
                     if evnt['public'] is True:
@@ -414,26 +698,11 @@ def _icalendar_day(base_dir: str, nickname: str, domain: str,
            not event_description or not sender_actor:
             continue
 
-        # find the corresponding post
-        post_filename = locate_post(base_dir, nickname, domain, post_id)
-        if not post_filename:
-            continue
-
-        post_json_object = load_json(post_filename)
-        if not post_json_object:
-            continue
-
-        # get the published date from the post
-        if not post_json_object.get('object'):
-            continue
-        if not isinstance(post_json_object['object'], dict):
-            continue
-        if not post_json_object['object'].get('published'):
+        # get the published date of the corresponding post
+        entry = _calendar_index_post(base_dir, nickname, domain, post_id)
+        if not entry or not entry['published']:
             continue
-        if not isinstance(post_json_object['object']['published'], str):
-            continue
-        published = \
-            _ical_date_string(post_json_object['object']['published'])
+        published = _ical_date_string(entry['published'])
 
         event_start = \
             _ical_date_string(event_start.strftime("%Y-%m-%dT%H:%M:%SZ"))
@@ -549,50 +818,11 @@ def day_events_check(base_dir: str, nickname: str, domain: str,
                      curr_date) -> bool:
     """Are there calendar events for the given date?
     """
-    year = curr_date.year
-    month_number = curr_date.month
-    day_number = curr_date.day
-
-    calendar_filename = \
-        acct_dir(base_dir, nickname, domain) + \
-        '/calendar/' + str(year) + '/' + str(month_number) + '.txt'
-    if not os.path.isfile(calendar_filename):
-        return False
-
-    events_exist = False
-    with open(calendar_filename, 'r', encoding='utf-8') as events_file:
-        for post_id in events_file:
-            post_id = remove_eol(post_id)
-            post_filename = locate_post(base_dir, nickname, domain, post_id)
-            if not post_filename:
-                continue
-
-            post_json_object = load_json(post_filename)
-            if not _is_happening_post(post_json_object):
-                continue
-
-            for tag in post_json_object['object']['tag']:
-                if not _is_happening_event(tag):
-                    continue
-                # this tag is an event or a place
-                if tag['type'] != 'Event':
-                    continue
-                # tag is an event
-                if not tag.get('startTime'):
-                    continue
-                event_time = \
-                    datetime.strptime(tag['startTime'],
-                                      "%Y-%m-%dT%H:%M:%S%z")
-                if int(event_time.strftime("%d")) != day_number:
-                    continue
-                if int(event_time.strftime("%m")) != month_number:
-                    continue
-                if int(event_time.strftime("%Y")) != year:
-                    continue
-                events_exist = True
-                break
-
-    return events_exist
+    date_str = str(curr_date.year) + '-' + \
+        str(curr_date.month).zfill(2) + '-' + str(curr_date.day).zfill(2)
+    if _calendar_index_events(base_dir, nickname, domain, [date_str]):
+        return True
+    return False
 
 
 def get_this_weeks_events(base_dir: str, nickname: str, domain: str) -> {}:
@@ -601,69 +831,36 @@ def get_this_weeks_events(base_dir: str, nickname: str, domain: str) -> {}:
     Event and Place activities
     Note: currently not used but could be with a weekly calendar screen
     """
-    now = datetime.now()
+    now = datetime.now(timezone.utc)
     end_of_week = now + timedelta(7)
-    year = now.year
-    month_number = now.month
 
-    calendar_filename = \
-        acct_dir(base_dir, nickname, domain) + \
-        '/calendar/' + str(year) + '/' + str(month_number) + '.txt'
+    # event times may be within a different time zone
+    dates = []
+    for days in range(-1, 9):
+        dates.append((now + timedelta(days)).strftime("%Y-%m-%d"))
 
     events = {}
-    if not os.path.isfile(calendar_filename):
-        return events
-
-    calendar_post_ids = []
-    recreate_events_file = False
-    with open(calendar_filename, 'r', encoding='utf-8') as events_file:
-        for post_id in events_file:
-            post_id = remove_eol(post_id)
-            post_filename = locate_post(base_dir, nickname, domain, post_id)
-            if not post_filename:
-                recreate_events_file = True
-                continue
-
-            post_json_object = load_json(post_filename)
-            if not _is_happening_post(post_json_object):
-                continue
-
-            post_event = []
-            week_day_index = None
-            for tag in post_json_object['object']['tag']:
-                if not _is_happening_event(tag):
+    for _, entry in _calendar_index_events(base_dir, nickname, domain,
+                                           dates):
+        post_event = []
+        week_day_index = None
+        for tag in entry['tags']:
+            # this tag is an event or a place
+            if tag['type'] == 'Event':
+                # tag is an event
+                event_time = _calendar_event_time(tag)
+                if not event_time:
                     continue
-                # this tag is an event or a place
-                if tag['type'] == 'Event':
-                    # tag is an event
-                    if not tag.get('startTime'):
-                        continue
-                    event_time = \
-                        datetime.strptime(tag['startTime'],
-                                          "%Y-%m-%dT%H:%M:%S%z")
-                    if now <= event_time <= end_of_week:
-                        week_day_index = (event_time - now).days()
-                        post_event.append(tag)
-                else:
-                    # tag is a place
-                    post_event.append(tag)
-            if post_event and week_day_index:
-                calendar_post_ids.append(post_id)
-                if not events.get(week_day_index):
-                    events[week_day_index] = []
-                events[week_day_index].append(post_event)
-
-    # if some posts have been deleted then regenerate the calendar file
-    if recreate_events_file:
-        try:
-            with open(calendar_filename, 'w+',
-                      encoding='utf-8') as calendar_file:
-                for post_id in calendar_post_ids:
-                    calendar_file.write(post_id + '\n')
-        except OSError:
-            print('EX: unable to recreate events file 2 ' +
-                  calendar_filename)
-
+                if now <= event_time <= end_of_week:
+                    week_day_index = (event_time - now).days
+                    post_event.append(tag.copy())
+            else:
+                # tag is a place
+                post_event.append(tag.copy())
+        if post_event and week_day_index is not None:
+            if not events.get(week_day_index):
+                events[week_day_index] = []
+            events[week_day_index].append(post_event)
     return events
 
 
@@ -674,87 +871,91 @@ def get_calendar_events(base_dir: str, nickname: str, domain: str,
     Returns a dictionary indexed by day number of lists containing
     Event and Place activities
     """
-    calendar_filename = \
-        acct_dir(base_dir, nickname, domain) + \
-        '/calendar/' + str(year) + '/' + str(month_number) + '.txt'
-
     events = {}
-    if not os.path.isfile(calendar_filename):
-        return events
-
-    calendar_post_ids = []
-    recreate_events_file = False
-    with open(calendar_filename, 'r', encoding='utf-8') as events_file:
-        for post_id in events_file:
-            post_id = remove_eol(post_id)
-            post_filename = locate_post(base_dir, nickname, domain, post_id)
-            if not post_filename:
-                recreate_events_file = True
+    month_dates = _calendar_month_dates(year, month_number)
+    for post_id, entry in _calendar_index_events(base_dir, nickname, domain,
+                                                 month_dates):
+        if entry['content']:
+            if not _event_text_match(entry['content'], text_match):
                 continue
 
-            post_json_object = load_json(post_filename)
-            if not post_json_object:
-                continue
-            if not _is_happening_post(post_json_object):
-                continue
-
-            if post_json_object.get('object'):
-                if post_json_object['object'].get('content'):
-                    content = post_json_object['object']['content']
-                    if not _event_text_match(content, text_match):
-                        continue
-
-            post_event = []
-            day_of_month = None
-            for tag in post_json_object['object']['tag']:
-                if not _is_happening_event(tag):
+        post_event = []
+        day_of_month = None
+        for tag in entry['tags']:
+            # this tag is an event or a place
+            if tag['type'] == 'Event':
+                # tag is an event
+                event_time = _calendar_event_time(tag)
+                if not event_time:
                     continue
-                # this tag is an event or a place
-                if tag['type'] == 'Event':
-                    # tag is an event
-                    if not tag.get('startTime'):
-                        continue
-                    event_time = \
-                        datetime.strptime(tag['startTime'],
-                                          "%Y-%m-%dT%H:%M:%S%z")
-                    if int(event_time.strftime("%Y")) == year and \
-                       int(event_time.strftime("%m")) == month_number:
-                        day_of_month = str(int(event_time.strftime("%d")))
-                        if '#statuses#' in post_id:
-                            tag['post_id'] = post_id.split('#statuses#')[1]
-                            tag['id'] = post_id.replace('#', '/')
-                            tag['sender'] = post_id.split('#statuses#')[0]
-                            tag['sender'] = tag['sender'].replace('#', '/')
-                        post_event.append(tag)
-                else:
-                    # tag is a place
-                    post_event.append(tag)
+                if event_time.year == year and \
+                   event_time.month == month_number:
+                    day_of_month = str(event_time.day)
+                    event_tag = tag.copy()
+                    if '#statuses#' in post_id:
+                        event_tag['post_id'] = post_id.split('#statuses#')[1]
+                        event_tag['id'] = post_id.replace('#', '/')
+                        event_tag['sender'] = post_id.split('#statuses#')[0]
+                        event_tag['sender'] = \
+                            event_tag['sender'].replace('#', '/')
+                    post_event.append(event_tag)
+            else:
+                # tag is a place
+                post_event.append(tag.copy())
+
+        if post_event and day_of_month:
+            if not events.get(day_of_month):
+                events[day_of_month] = []
+            events[day_of_month].append(post_event)
+    return events
 
-            if post_event and day_of_month:
-                calendar_post_ids.append(post_id)
-                if not events.get(day_of_month):
-                    events[day_of_month] = []
-                events[day_of_month].append(post_event)
 
-    # if some posts have been deleted then regenerate the calendar file
-    if recreate_events_file:
+def update_calendar_event(base_dir: str, nickname: str, domain: str,
+                          post_json_object: {}) -> None:
+    """Updates the calendar of an account when an event post is edited,
+    so that it is shown on its new dates and with its new details
+    """
+    if not has_object_dict(post_json_object):
+        return
+    post_id = post_json_object['object'].get('id')
+    if not isinstance(post_id, str):
+        return
+    if not _calendar_index_post(base_dir, nickname, domain, post_id):
+        return
+    entry = _calendar_index_entry(post_json_object)
+    if not entry:
+        # no longer an event
+        _calendar_index_remove(base_dir, nickname, domain, post_id)
+        return
+    _calendar_index_add(base_dir, nickname, domain, post_id, entry)
+
+    # add the post to the calendar files for any new months
+    calendar_post_id = _calendar_index_post_id(post_id)
+    calendar_path = acct_dir(base_dir, nickname, domain) + '/calendar'
+    for date_str in entry['dates']:
+        year_path = calendar_path + '/' + date_str.split('-')[0]
+        if not os.path.isdir(year_path):
+            os.mkdir(year_path)
+        calendar_filename = \
+            year_path + '/' + str(int(date_str.split('-')[1])) + '.txt'
+        if os.path.isfile(calendar_filename):
+            if text_in_file(calendar_post_id, calendar_filename):
+                continue
         try:
-            with open(calendar_filename, 'w+',
+            with open(calendar_filename, 'a+',
                       encoding='utf-8') as calendar_file:
-                for post_id in calendar_post_ids:
-                    calendar_file.write(post_id + '\n')
+                calendar_file.write(calendar_post_id + '\n')
         except OSError:
-            print('EX: unable to recreate events file 3 ' +
+            print('EX: update_calendar_event unable to append to ' +
                   calendar_filename)
 
-    return events
-
 
 def remove_calendar_event(base_dir: str, nickname: str, domain: str,
                           year: int, month_number: int,
                           message_id: str) -> None:
     """Removes a calendar event
     """
+    _calendar_index_remove(base_dir, nickname, domain, message_id)
     calendar_filename = \
         acct_dir(base_dir, nickname, domain) + \
         '/calendar/' + str(year) + '/' + str(month_number) + '.txt'
@@ -970,7 +1171,8 @@ def _dav_store_event(base_dir: str, nickname: str, domain: str,
         return False
     filename = outbox_dir + '/' + post_id.replace('/', '#') + '.json'
     save_json(event_json, filename)
-    save_event_post(base_dir, handle, post_id, event_json)
+    save_event_post(base_dir, handle, post_id,
+                    event_json['object']['tag'][1], event_json)
 
     return True
 
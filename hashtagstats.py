@@ -0,0 +1,345 @@
+__filename__ = "hashtagstats.py"
+__author__ = "Bob Mottram"
+__license__ = "AGPL3+"
+__version__ = "1.4.0"
+__maintainer__ = "Bob Mottram"
+__email__ = "bob@libreserver.org"
+__status__ = "Production"
+__module_group__ = "Core"
+
+# Statistics for hashtags, so that the hashtag swarm and the hashtag
+# categories can be obtained without reading every file within the
+# tags directory.
+# For each hashtag the number of posts on each of the recent days is
+# held, together with its category. Counts are updated as posts are
+# added or deleted, and days older than HASHTAG_STATS_DAYS are
+# forgotten. Recent hashtags are ranked by their counts, with each
+# day counting half as much as the following day.
+# Changes are appended to a log within the accounts directory, which
+# is replayed and compacted when first needed, and compacted again
+# whenever it becomes much longer than the number of hashtags. If there
+# is no log then the statistics are calculated from the tags directory.
+
+import os
+import json
+import datetime
+import threading
+
+# number of days for which counts are kept
+HASHTAG_STATS_DAYS = 14
+
+# hashtags used within this number of days are considered to be recent
+HASHTAG_STATS_RECENT_DAYS = 2
+
+# the log is compacted when it has more than this number of lines
+# for each hashtag, and at least the minimum number of lines
+HASHTAG_STATS_COMPACT_RATIO = 4
+HASHTAG_STATS_COMPACT_MIN_LINES = 1024
+
+_HASHTAG_STATS = {
+    'lock': threading.Lock(),
+    'loaded': False,
+    'base_dir': None,
+    'log_lines': 0,
+    # tag name -> {'days': {day since epoch: count}, 'category': str}
+    'tags': {}
+}
+
+
+def _hashtag_stats_filename(base_dir: str) -> str:
+    """Returns the filename of the hashtag statistics log
+    """
+    return base_dir + '/accounts/hashtagstats.jsonl'
+
+
+def _hashtag_stats_today() -> int:
+    """Returns the number of days since the epoch
+    """
+    curr_time = datetime.datetime.utcnow()
+    return (curr_time - datetime.datetime(1970, 1, 1)).days
+
+
+def _hashtag_stats_entry(tags: {}, tag_name: str) -> {}:
+    """Returns the statistics for a hashtag, creating them if needed
+    """
+    entry = tags.get(tag_name)
+    if not entry:
+        entry = {
+            'days': {},
+            'category': ''
+        }
+        tags[tag_name] = entry
+    return entry
+
+
+def _hashtag_stats_prune(tags: {}, tag_name: str, today: int) -> None:
+    """Removes old days from the statistics of a hashtag, and removes
+    the hashtag if nothing remains
+    """
+    entry = tags.get(tag_name)
+    if not entry:
+        return
+    oldest_day = today - HASHTAG_STATS_DAYS
+    for day in list(entry['days'].keys()):
+        if day < oldest_day or entry['days'][day] <= 0:
+            del entry['days'][day]
+    if not entry['days'] and not entry['category']:
+        del tags[tag_name]
+
+
+def _hashtag_stats_apply(tags: {}, record: {}, today: int) -> None:
+    """Applies a line of the log to the statistics
+    """
+    tag_name = record.get('tag')
+    if not tag_name or not isinstance(tag_name, str):
+        return
+    entry = _hashtag_stats_entry(tags, tag_name)
+    if isinstance(record.get('days'), dict):
+        for day_str, count in record['days'].items():
+            if str(day_str).isdigit() and isinstance(count, int):
+                entry['days'][int(day_str)] = count
+    if isinstance(record.get('day'), int) and \
+       isinstance(record.get('count'), int):
+        day = record['day']
+        entry['days'][day] = entry['days'].get(day, 0) + record['count']
+    if isinstance(record.get('category'), str):
+        entry['category'] = record['category']
+    _hashtag_stats_prune(tags, tag_name, today)
+
+
+def _hashtag_stats_scan(base_dir: str, today: int) -> {}:
+    """Calculates the statistics from the tags directory
+    """
+    tags = {}
+    tags_dir = base_dir + '/tags'
+    if not os.path.isdir(tags_dir):
+        return tags
+    oldest_day = today - HASHTAG_STATS_DAYS
+    for fname in os.listdir(tags_dir):
+        tag_filename = os.path.join(tags_dir, fname)
+        if fname.endswith('.category'):
+            try:
+                with open(tag_filename, 'r',
+                          encoding='utf-8') as fp_category:
+                    category_str = fp_category.read()
+            except OSError:
+                print('EX: _hashtag_stats_scan unable to read ' +
+                      tag_filename)
+                continue
+            if category_str:
+                entry = _hashtag_stats_entry(tags, fname.split('.')[0])
+                entry['category'] = category_str
+            continue
+        if not fname.endswith('.txt'):
+            continue
+        # don't read files which haven't changed recently
+        try:
+            mod_time = os.path.getmtime(tag_filename)
+        except OSError:
+            continue
+        mod_date = datetime.datetime.utcfromtimestamp(mod_time)
+        if (mod_date - datetime.datetime(1970, 1, 1)).days < oldest_day:
+            continue
+        days = {}
+        try:
+            with open(tag_filename, 'r', encoding='utf-8') as fp_tags:
+                # the most recent posts are at the start of the file
+                for line in fp_tags:
+                    day_str = line.split('  ')[0]
+                    if not day_str.isdigit():
+                        break
+                    day = int(day_str)
+                    if day < oldest_day:
+                        break
+                    days[day] = days.get(day, 0) + 1
+        except OSError:
+            print('EX: _hashtag_stats_scan unable to read ' + tag_filename)
+            continue
+        if days:
+            entry = _hashtag_stats_entry(tags, fname.split('.')[0])
+            entry['days'] = days
+    return tags
+
+
+def _hashtag_stats_save(base_dir: str) -> None:
+    """Rewrites the log with a single line for each hashtag.
+    This must be called while holding the lock
+    """
+    if not os.path.isdir(base_dir + '/accounts'):
+        return
+    stats_filename = _hashtag_stats_filename(base_dir)
+    try:
+        with open(stats_filename + '.new', 'w+',
+                  encoding='utf-8') as fp_stats:
+            for tag_name, entry in _HASHTAG_STATS['tags'].items():
+                record = {
+                    'tag': tag_name,
+                    'days': entry['days'],
+                    'category': entry['category']
+                }
+                fp_stats.write(json.dumps(record) + '\n')
+        os.replace(stats_filename + '.new', stats_filename)
+    except OSError:
+        print('EX: _hashtag_stats_save unable to save ' + stats_filename)
+        return
+    _HASHTAG_STATS['log_lines'] = len(_HASHTAG_STATS['tags'])
+
+
+def _hashtag_stats_load(base_dir: str) -> None:
+    """Loads the statistics for the given base directory.
+    This must be called while holding the lock
+    """
+    if _HASHTAG_STATS['loaded'] and _HASHTAG_STATS['base_dir'] == base_dir:
+        return
+    _HASHTAG_STATS['loaded'] = True
+    _HASHTAG_STATS['base_dir'] = base_dir
+    today = _hashtag_stats_today()
+    stats_filename = _hashtag_stats_filename(base_dir)
+    if not os.path.isfile(stats_filename):
+        _HASHTAG_STATS['tags'] = _hashtag_stats_scan(base_dir, today)
+        _hashtag_stats_save(base_dir)
+        return
+    tags = {}
+    log_lines = 0
+    try:
+        with open(stats_filename, 'r', encoding='utf-8') as fp_stats:
+            for line in fp_stats:
+                log_lines += 1
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if isinstance(record, dict):
+                    _hashtag_stats_apply(tags, record, today)
+    except OSError:
+        print('EX: _hashtag_stats_load unable to read ' + stats_filename)
+    _HASHTAG_STATS['tags'] = tags
+    _HASHTAG_STATS['log_lines'] = log_lines
+    if log_lines > len(tags):
+        _hashtag_stats_save(base_dir)
+
+
+def _hashtag_stats_append(base_dir: str, record: {}) -> None:
+    """Appends a change to the log.
+    This must be called while holding the lock
+    """
+    if not os.path.isdir(base_dir + '/accounts'):
+        return
+    stats_filename = _hashtag_stats_filename(base_dir)
+    try:
+        with open(stats_filename, 'a+', encoding='utf-8') as fp_stats:
+            fp_stats.write(json.dumps(record) + '\n')
+    except OSError:
+        print('EX: _hashtag_stats_append unable to append ' +
+              stats_filename)
+        return
+    _HASHTAG_STATS['log_lines'] += 1
+    max_log_lines = \
+        max(HASHTAG_STATS_COMPACT_MIN_LINES,
+            len(_HASHTAG_STATS['tags']) * HASHTAG_STATS_COMPACT_RATIO)
+    if _HASHTAG_STATS['log_lines'] > max_log_lines:
+        _hashtag_stats_save(base_dir)
+
+
+def hashtag_stats_add(base_dir: str, tag_name: str,
+                      day: int, count: int) -> None:
+    """Changes the number of posts with a hashtag on the given day
+    since the epoch. The count is negative if posts were deleted
+    """
+    if not base_dir or not tag_name or not count:
+        return
+    today = _hashtag_stats_today()
+    if day is None:
+        day = today
+    if day < today - HASHTAG_STATS_DAYS:
+        return
+    record = {
+        'tag': tag_name,
+        'day': day,
+        'count': count
+    }
+    with _HASHTAG_STATS['lock']:
+        _hashtag_stats_load(base_dir)
+        _hashtag_stats_apply(_HASHTAG_STATS['tags'], record, today)
+        _hashtag_stats_append(base_dir, record)
+
+
+def hashtag_stats_set_category(base_dir: str, tag_name: str,
+                               category: str) -> None:
+    """Sets the category of a hashtag, or removes it if the
+    category is empty
+    """
+    if not base_dir or not tag_name:
+        return
+    if not category:
+        category = ''
+    record = {
+        'tag': tag_name,
+        'category': category
+    }
+    with _HASHTAG_STATS['lock']:
+        _hashtag_stats_load(base_dir)
+        entry = _HASHTAG_STATS['tags'].get(tag_name)
+        if not entry:
+            if not category:
+                return
+        elif entry['category'] == category:
+            return
+        _hashtag_stats_apply(_HASHTAG_STATS['tags'], record,
+                             _hashtag_stats_today())
+        _hashtag_stats_append(base_dir, record)
+
+
+def _hashtag_stats_recent(entry: {}, today: int) -> bool:
+    """Returns true if the hashtag was used recently
+    """
+    oldest_day = today - HASHTAG_STATS_RECENT_DAYS + 1
+    for day in entry['days']:
+        if day >= oldest_day:
+            return True
+    return False
+
+
+def hashtag_stats_top(base_dir: str, max_tags: int) -> []:
+    """Returns the most popular recent hashtags and their categories
+    as a list of (tag name, category)
+    """
+    today = _hashtag_stats_today()
+    ranked = []
+    with _HASHTAG_STATS['lock']:
+        _hashtag_stats_load(base_dir)
+        for tag_name, entry in _HASHTAG_STATS['tags'].items():
+            if not _hashtag_stats_recent(entry, today):
+                continue
+            score = 0.0
+            for day, count in entry['days'].items():
+                score += count / (2 ** max(today - day, 0))
+            ranked.append((score, tag_name, entry['category']))
+    ranked.sort(key=lambda item: (-item[0], item[1]))
+    top_tags = []
+    for _, tag_name, category_str in ranked[:max_tags]:
+        top_tags.append((tag_name, category_str))
+    return top_tags
+
+
+def hashtag_stats_categories(base_dir: str, recent: bool,
+                             category: str) -> {}:
+    """Returns a dict of categories and the hashtags within them
+    """
+    today = _hashtag_stats_today()
+    hashtag_categories = {}
+    with _HASHTAG_STATS['lock']:
+        _hashtag_stats_load(base_dir)
+        for tag_name, entry in _HASHTAG_STATS['tags'].items():
+            category_str = entry['category']
+            if not category_str:
+                continue
+            if category and category_str != category:
+                continue
+            if recent and not _hashtag_stats_recent(entry, today):
+                continue
+            if not hashtag_categories.get(category_str):
+                hashtag_categories[category_str] = [tag_name]
+            else:
+                hashtag_categories[category_str].append(tag_name)
+    return hashtag_categories
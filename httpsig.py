@@ -15,7 +15,6 @@ __module_group__ = "Security"
 
 from cryptography.hazmat.backends import default_backend
 from cryptography.hazmat.primitives.serialization import load_pem_private_key
-from cryptography.hazmat.primitives.serialization import load_pem_public_key
 from cryptography.hazmat.primitives.asymmetric import padding
 from cryptography.hazmat.primitives import hashes
 from cryptography.hazmat.primitives.asymmetric import utils as hazutils
@@ -26,6 +25,10 @@ from utils import get_full_domain
 from utils import get_sha_256
 from utils import get_sha_512
 from utils import local_actor_url
+from sigcache import public_key_hash
+from sigcache import load_cached_public_key
+from sigcache import get_signature_verdict
+from sigcache import store_signature_verdict
 
 
 def message_content_digest(message_body_json_str: str,
@@ -353,8 +356,6 @@ def verify_post_headers(http_prefix: str,
         print('verify_post_headers message_body_json_str: ' +
               str(message_body_json_str))
 
-    pubkey = load_pem_public_key(public_key_pem.encode('utf-8'),
-                                 backend=default_backend())
     # Build a dictionary of the signature values
     if headers.get('Signature-Input') or headers.get('signature-input'):
         if headers.get('Signature-Input'):
@@ -562,12 +563,29 @@ def verify_post_headers(http_prefix: str,
     else:
         print('Unknown http digest algorithm: ' + digest_algorithm)
         header_digest = ''
+    # has this signature been checked before?
+    pem_hash = public_key_hash(public_key_pem)
+    signed_hash = str(signature_dict.get('alg')) + ':'
+    if isinstance(header_digest, bytes):
+        signed_hash += header_digest.hex()
+    verdict = get_signature_verdict(pem_hash, signed_hash, headers_sig)
+    if verdict is not None:
+        if debug:
+            print('DEBUG: verify_post_headers cached result ' + str(verdict))
+        return verdict
+
+    key_id = signature_dict.get('keyId')
+    if not key_id:
+        key_id = signature_dict.get('keyid')
+    pubkey = load_cached_public_key(public_key_pem, key_id)
     padding_str = padding.PKCS1v15()
 
+    verdict = False
     try:
         pubkey.verify(signature, header_digest, padding_str, alg)
-        return True
+        verdict = True
     except BaseException:
         if debug:
             print('EX: verify_post_headers pkcs1_15 verify failure')
-    return False
+    store_signature_verdict(pem_hash, signed_hash, headers_sig, verdict)
+    return verdict
@@ -20,6 +20,9 @@ from follow import send_follow_request
 from session import create_session
 from session import set_session_for_sender
 from threads import begin_thread
+from threads import check_thread_cancelled
+from scheduler import scheduler_add
+from scheduler import scheduler_wait
 
 
 def _establish_import_session(httpd,
@@ -187,33 +190,48 @@ def _update_import_following(base_dir: str,
     return False
 
 
+def _load_import_following(base_dir: str) -> None:
+    """Finds the accounts which have following lists to be imported
+    """
+    curr_time = time.time()
+    for _, dirs, _ in os.walk(base_dir + '/accounts'):
+        for account in dirs:
+            if '@' not in account:
+                continue
+            if not is_account_dir(account):
+                continue
+            import_filename = \
+                base_dir + '/accounts/' + account + '/import_following.csv'
+            if os.path.isfile(import_filename):
+                scheduler_add('importFollowing', account, curr_time)
+        break
+
+
 def run_import_following(base_dir: str, httpd):
     """Sends out follow requests for imported following csv files
     """
+    _load_import_following(base_dir)
     while True:
-        time.sleep(20)
-
-        # get a list of accounts on the instance, in random sequence
-        accounts_list = []
-        for _, dirs, _ in os.walk(base_dir + '/accounts'):
-            for account in dirs:
-                if '@' not in account:
-                    continue
-                if not is_account_dir(account):
-                    continue
-                accounts_list.append(account)
-            break
+        # sleep until an import is due
+        accounts_list = scheduler_wait('importFollowing', 60)
+        check_thread_cancelled()
         if not accounts_list:
             continue
 
-        # check if each accounts has an import csv
+        # a single follow request is sent every 20 seconds,
+        # from accounts in random sequence
         random.shuffle(accounts_list)
+        next_time = time.time() + 20
+        follow_sent = False
         for account in accounts_list:
             account_dir = base_dir + '/accounts/' + account
             import_filename = account_dir + '/import_following.csv'
 
             if not os.path.isfile(import_filename):
                 continue
+            if follow_sent:
+                scheduler_add('importFollowing', account, next_time)
+                continue
             if not _update_import_following(base_dir, account, httpd,
                                             import_filename):
                 try:
@@ -222,7 +240,8 @@ def run_import_following(base_dir: str, httpd):
                     print('EX: unable to remove import file ' +
                           import_filename)
             else:
-                break
+                follow_sent = True
+                scheduler_add('importFollowing', account, next_time)
 
 
 def run_import_following_watchdog(project_version: str, httpd) -> None:
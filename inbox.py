@@ -51,6 +51,9 @@ from utils import has_users_path
 from utils import valid_post_date
 from utils import get_full_domain
 from utils import remove_id_ending
+from utils import clear_from_post_caches
+from accountsettings import get_account_settings
+from boxevents import box_event_add
 from utils import get_protocol_prefixes
 from utils import is_blog_post
 from utils import remove_avatar_from_cache
@@ -76,7 +79,6 @@ from utils import valid_hash_tag
 from categories import get_hashtag_categories
 from categories import set_hashtag_category
 from httpsig import get_digest_algorithm_from_headers
-from httpsig import verify_post_headers
 from session import create_session
 from session import download_image
 from follow import follower_approval_active
@@ -130,6 +132,7 @@ from git import is_git_patch
 from git import receive_git_patch
 from followingCalendar import receiving_calendar_events
 from happening import save_event_post
+from happening import update_calendar_event
 from delete import remove_old_hashtags
 from categories import guess_hashtag_category
 from context import has_valid_context
@@ -142,11 +145,32 @@ from webapp_hashtagswarm import html_hash_tag_swarm
 from person import valid_sending_actor
 from person import get_person_avatar_url
 from fitnessFunctions import fitness_performance
+from fitnessFunctions import fitness_queue_metrics
+from actorstore import actor_store_projection
+from actorstore import actor_store_load
+from actorstore import actor_store_save
+from sigcache import sig_cache_metrics
 from content import reject_twitter_summary
 from content import load_dogwhistles
 from content import valid_url_lengths
 from content import remove_script
 from threads import begin_thread
+from threads import thread_sleep
+from threads import check_thread_cancelled
+from boxindex import box_index_append
+from hashtagstats import hashtag_stats_add
+from postlocation import add_post_location
+from searchindex import add_post_to_search_index
+from searchindex import remove_post_from_search_index
+from inboxqueue import inbox_queue_push
+from inboxqueue import inbox_queue_head
+from inboxqueue import inbox_queue_pop
+from inboxqueue import inbox_queue_clear
+from inboxqueue import inbox_queue_arrival_time
+from inboxqueue import inbox_queue_metrics
+from inboxqueue import inbox_preverify_submit
+from inboxqueue import inbox_preverified
+from inboxqueue import inbox_sender_session
 from maps import get_map_links_from_post_content
 from maps import get_location_from_tags
 from maps import add_tag_map_links
@@ -417,6 +441,7 @@ def store_hash_tags(base_dir: str, nickname: str, domain: str,
 
         if hashtag_added:
             hashtags_ctr += 1
+            hashtag_stats_add(base_dir, tag_name, days_since_epoch, 1)
 
             # automatically assign a category to the tag if possible
             category_filename = tags_dir + '/' + tag_name + '.category'
@@ -1151,32 +1176,29 @@ def _person_receive_update(base_dir: str,
         if debug:
             print('DEBUG: actor update does not contain a public key Pem')
         return False
-    actor_filename = base_dir + '/cache/actors/' + \
-        person_json['id'].replace('/', '#') + '.json'
     # check that the public keys match.
     # If they don't then this may be a nefarious attempt to hack an account
     idx = person_json['id']
     if person_cache.get(idx):
-        if person_cache[idx]['actor']['publicKey']['publicKeyPem'] != \
+        if actor_store_projection(person_cache[idx]).get('publicKeyPem') != \
            person_json['publicKey']['publicKeyPem']:
             if debug:
                 print('WARN: Public key does not match when updating actor')
             return False
     else:
-        if os.path.isfile(actor_filename):
-            existing_person_json = load_json(actor_filename)
-            if existing_person_json:
-                if existing_person_json['publicKey']['publicKeyPem'] != \
-                   person_json['publicKey']['publicKeyPem']:
-                    if debug:
-                        print('WARN: Public key does not match ' +
-                              'cached actor when updating')
-                    return False
+        existing_person_json = actor_store_load(base_dir, idx)
+        if existing_person_json:
+            if existing_person_json['publicKey']['publicKeyPem'] != \
+               person_json['publicKey']['publicKeyPem']:
+                if debug:
+                    print('WARN: Public key does not match ' +
+                          'cached actor when updating')
+                return False
     # save to cache in memory
     store_person_in_cache(base_dir, person_json['id'], person_json,
                           person_cache, True)
     # save to cache on file
-    if save_json(person_json, actor_filename):
+    if actor_store_save(base_dir, idx, person_json):
         if debug:
             print('actor updated for ' + person_json['id'])
 
@@ -1271,7 +1293,7 @@ def _receive_update_to_question(recent_posts_cache: {}, message_json: {},
     # ensure that the cached post is removed if it exists, so
     # that it then will be recreated
     cached_post_filename = \
-        get_cached_post_filename(base_dir, nickname, domain, message_json)
+        get_cached_post_filename(base_dir, message_json)
     if cached_post_filename:
         if os.path.isfile(cached_post_filename):
             try:
@@ -1548,7 +1570,7 @@ def receive_edit_to_post(recent_posts_cache: {}, message_json: {},
     # ensure that the cached post is removed if it exists, so
     # that it then will be recreated
     cached_post_filename = \
-        get_cached_post_filename(base_dir, nickname, domain, message_json)
+        get_cached_post_filename(base_dir, message_json)
     if cached_post_filename:
         if os.path.isfile(cached_post_filename):
             try:
@@ -1560,6 +1582,11 @@ def receive_edit_to_post(recent_posts_cache: {}, message_json: {},
     delete_cached_html(base_dir, nickname, domain, post_json_object)
     # remove from memory cache
     remove_post_from_cache(message_json, recent_posts_cache)
+    # remove any cached html for announces of the post which was edited
+    edited_post_id = remove_id_ending(message_json['object']['id'])
+    clear_from_post_caches(base_dir, recent_posts_cache, edited_post_id)
+    # show any edited event on its new dates
+    update_calendar_event(base_dir, nickname, domain, message_json)
     # regenerate html for the post
     page_number = 1
     show_published_date_only = False
@@ -1571,11 +1598,8 @@ def receive_edit_to_post(recent_posts_cache: {}, message_json: {},
     mitm = False
     if os.path.isfile(post_filename.replace('.json', '') + '.mitm'):
         mitm = True
-    bold_reading = False
-    bold_reading_filename = \
-        acct_dir(base_dir, nickname, domain) + '/.boldReading'
-    if os.path.isfile(bold_reading_filename):
-        bold_reading = True
+    account_dir = acct_dir(base_dir, nickname, domain)
+    bold_reading = get_account_settings(account_dir)['boldReading']
     timezone = get_account_timezone(base_dir, nickname, domain)
     lists_enabled = get_config_param(base_dir, "listsEnabled")
     minimize_all_images = False
@@ -1694,6 +1718,9 @@ def _receive_update_activity(recent_posts_cache: {}, session, base_dir: str,
                                           message_json['object'],
                                           person_cache, debug, http_prefix):
                     print('Person Update: ' + str(message_json))
+                    # remove any cached html for posts by this actor
+                    clear_from_post_caches(base_dir, recent_posts_cache,
+                                           message_json['object']['id'])
                     if debug:
                         print('DEBUG: Profile update was received for ' +
                               message_json['object']['url'])
@@ -1796,8 +1823,7 @@ def _receive_like(recent_posts_cache: {},
         if liked_post_json:
             if debug:
                 cached_post_filename = \
-                    get_cached_post_filename(base_dir, handle_name, domain,
-                                             liked_post_json)
+                    get_cached_post_filename(base_dir, liked_post_json)
                 print('Liked post json: ' + str(liked_post_json))
                 print('Liked post nickname: ' + handle_name + ' ' + domain)
                 print('Liked post cache: ' + str(cached_post_filename))
@@ -1922,8 +1948,7 @@ def _receive_undo_like(recent_posts_cache: {},
         if liked_post_json:
             if debug:
                 cached_post_filename = \
-                    get_cached_post_filename(base_dir, handle_name, domain,
-                                             liked_post_json)
+                    get_cached_post_filename(base_dir, liked_post_json)
                 print('Unliked post json: ' + str(liked_post_json))
                 print('Unliked post nickname: ' + handle_name + ' ' + domain)
                 print('Unliked post cache: ' + str(cached_post_filename))
@@ -2018,7 +2043,7 @@ def _receive_reaction(recent_posts_cache: {},
     handle_dir = acct_handle_dir(base_dir, handle)
     if not os.path.isdir(handle_dir):
         print('DEBUG: unknown recipient of emoji reaction - ' + handle)
-    if os.path.isfile(handle_dir + '/.hideReactionButton'):
+    if get_account_settings(handle_dir)['hideReactionButton']:
         print('Emoji reaction rejected by ' + handle +
               ' due to their settings')
         return True
@@ -2080,8 +2105,7 @@ def _receive_reaction(recent_posts_cache: {},
         if reaction_post_json:
             if debug:
                 cached_post_filename = \
-                    get_cached_post_filename(base_dir, handle_name, domain,
-                                             reaction_post_json)
+                    get_cached_post_filename(base_dir, reaction_post_json)
                 print('Reaction post json: ' + str(reaction_post_json))
                 print('Reaction post nickname: ' + handle_name + ' ' + domain)
                 print('Reaction post cache: ' + str(cached_post_filename))
@@ -2199,7 +2223,7 @@ def _receive_zot_reaction(recent_posts_cache: {},
     handle_dir = acct_handle_dir(base_dir, handle)
     if not os.path.isdir(handle_dir):
         print('DEBUG: unknown recipient of zot emoji reaction - ' + handle)
-    if os.path.isfile(handle_dir + '/.hideReactionButton'):
+    if get_account_settings(handle_dir)['hideReactionButton']:
         print('Zot emoji reaction rejected by ' + handle +
               ' due to their settings')
         return True
@@ -2262,8 +2286,7 @@ def _receive_zot_reaction(recent_posts_cache: {},
         if reaction_post_json:
             if debug:
                 cached_post_filename = \
-                    get_cached_post_filename(base_dir, handle_name, domain,
-                                             reaction_post_json)
+                    get_cached_post_filename(base_dir, reaction_post_json)
                 print('Reaction post json: ' + str(reaction_post_json))
                 print('Reaction post nickname: ' + handle_name + ' ' + domain)
                 print('Reaction post cache: ' + str(cached_post_filename))
@@ -2408,8 +2431,7 @@ def _receive_undo_reaction(recent_posts_cache: {},
         if reaction_post_json:
             if debug:
                 cached_post_filename = \
-                    get_cached_post_filename(base_dir, handle_name, domain,
-                                             reaction_post_json)
+                    get_cached_post_filename(base_dir, reaction_post_json)
                 print('Unreaction post json: ' + str(reaction_post_json))
                 print('Unreaction post nickname: ' +
                       handle_name + ' ' + domain)
@@ -2533,8 +2555,7 @@ def _receive_bookmark(recent_posts_cache: {},
     if bookmarked_post_json:
         if debug:
             cached_post_filename = \
-                get_cached_post_filename(base_dir, nickname, domain,
-                                         bookmarked_post_json)
+                get_cached_post_filename(base_dir, bookmarked_post_json)
             print('Bookmarked post json: ' + str(bookmarked_post_json))
             print('Bookmarked post nickname: ' + nickname + ' ' + domain)
             print('Bookmarked post cache: ' + str(cached_post_filename))
@@ -2659,8 +2680,7 @@ def _receive_undo_bookmark(recent_posts_cache: {},
     if bookmarked_post_json:
         if debug:
             cached_post_filename = \
-                get_cached_post_filename(base_dir, nickname, domain,
-                                         bookmarked_post_json)
+                get_cached_post_filename(base_dir, bookmarked_post_json)
             print('Unbookmarked post json: ' + str(bookmarked_post_json))
             print('Unbookmarked post nickname: ' + nickname + ' ' + domain)
             print('Unbookmarked post cache: ' + str(cached_post_filename))
@@ -3049,7 +3069,7 @@ def _receive_announce(recent_posts_cache: {},
                     if debug:
                         print('DEBUG: Retry ' + str(tries + 1) +
                               ' obtaining actor for ' + lookup_actor)
-                    time.sleep(5)
+                    thread_sleep(5)
         if debug:
             print('DEBUG: announced/repeated post arrived in inbox')
     return True
@@ -3276,7 +3296,7 @@ def _obtain_avatar_for_reply_post(session, base_dir: str, http_prefix: str,
         if debug:
             print('DEBUG: Retry ' + str(tries + 1) +
                   ' obtaining actor for ' + lookup_actor)
-        time.sleep(5)
+        thread_sleep(5)
 
 
 def _dm_notify(base_dir: str, handle: str, url: str) -> None:
@@ -3285,6 +3305,7 @@ def _dm_notify(base_dir: str, handle: str, url: str) -> None:
     account_dir = acct_handle_dir(base_dir, handle)
     if not os.path.isdir(account_dir):
         return
+    box_event_add(handle, 'dm', '', url)
     dm_file = account_dir + '/.newDM'
     if not os.path.isfile(dm_file):
         try:
@@ -3381,8 +3402,7 @@ def _like_notify(base_dir: str, domain: str,
     account_dir = acct_handle_dir(base_dir,  handle)
 
     # are like notifications enabled?
-    notify_likes_enabled_filename = account_dir + '/.notifyLikes'
-    if not os.path.isfile(notify_likes_enabled_filename):
+    if not get_account_settings(account_dir)['notifyLikes']:
         return
 
     like_file = account_dir + '/.newLike'
@@ -3410,6 +3430,7 @@ def _like_notify(base_dir: str, domain: str,
             prev_like_str = fp_like.read()
             if prev_like_str == like_str:
                 return
+    box_event_add(handle, 'like', '', url)
     try:
         with open(prev_like_file, 'w+', encoding='utf-8') as fp_like:
             fp_like.write(like_str)
@@ -3445,8 +3466,7 @@ def _reaction_notify(base_dir: str, domain: str, onion_domain: str,
     account_dir = acct_handle_dir(base_dir, handle)
 
     # are reaction notifications enabled?
-    notify_reaction_enabled_filename = account_dir + '/.notifyReactions'
-    if not os.path.isfile(notify_reaction_enabled_filename):
+    if not get_account_settings(account_dir)['notifyReactions']:
         return
 
     reaction_file = account_dir + '/.newReaction'
@@ -3475,6 +3495,7 @@ def _reaction_notify(base_dir: str, domain: str, onion_domain: str,
             prev_reaction_str = fp_react.read()
             if prev_reaction_str == reaction_str:
                 return
+    box_event_add(handle, 'reaction', '', url)
     try:
         with open(prev_reaction_file, 'w+', encoding='utf-8') as fp_react:
             fp_react.write(reaction_str)
@@ -3505,6 +3526,7 @@ def _notify_post_arrival(base_dir: str, handle: str, url: str) -> None:
             existing_notification_message = fp_notify.read()
             if url in existing_notification_message:
                 return
+    box_event_add(handle, 'notify', '', url)
     try:
         with open(notify_file, 'w+', encoding='utf-8') as fp_notify:
             fp_notify.write(url)
@@ -3518,6 +3540,7 @@ def _reply_notify(base_dir: str, handle: str, url: str) -> None:
     account_dir = acct_handle_dir(base_dir, handle)
     if not os.path.isdir(account_dir):
         return
+    box_event_add(handle, 'reply', '', url)
     reply_file = account_dir + '/.newReply'
     if not os.path.isfile(reply_file):
         try:
@@ -3672,19 +3695,29 @@ def _inbox_update_calendar(base_dir: str, handle: str,
             continue
         if not tag_dict.get('startTime'):
             continue
-        save_event_post(base_dir, handle, post_id, tag_dict)
+        save_event_post(base_dir, handle, post_id, tag_dict,
+                        post_json_object)
 
 
 def inbox_update_index(boxname: str, base_dir: str, handle: str,
                        destination_filename: str, debug: bool) -> bool:
     """Updates the index of received posts
-    The new entry is added to the top of the file
+    The new entry is appended to the end of the file
     """
     index_filename = \
         acct_handle_dir(base_dir, handle) + '/' + boxname + '.index'
     if debug:
         print('DEBUG: Updating index ' + index_filename)
 
+    if '/' in destination_filename:
+        # record which box the post is stored within
+        box_name = destination_filename.split('/')[-2]
+        post_filename = destination_filename.split('/')[-1]
+        if post_filename.endswith('.json'):
+            post_id = post_filename[:-len('.json')]
+            account_dir = acct_handle_dir(base_dir, handle)
+            add_post_location(account_dir, post_id, box_name)
+
     if '/' + boxname + '/' in destination_filename:
         destination_filename = \
             destination_filename.split('/' + boxname + '/')[1]
@@ -3693,27 +3726,14 @@ def inbox_update_index(boxname: str, base_dir: str, handle: str,
     if '/' in destination_filename:
         destination_filename = destination_filename.split('/')[-1]
 
-    written = False
-    if os.path.isfile(index_filename):
-        try:
-            with open(index_filename, 'r+', encoding='utf-8') as index_file:
-                content = index_file.read()
-                if destination_filename + '\n' not in content:
-                    index_file.seek(0, 0)
-                    index_file.write(destination_filename + '\n' + content)
-                written = True
-                return True
-        except OSError as ex:
-            print('EX: Failed to write entry to index ' + str(ex))
-    else:
-        try:
-            with open(index_filename, 'w+', encoding='utf-8') as index_file:
-                index_file.write(destination_filename + '\n')
-                written = True
-        except OSError as ex:
-            print('EX: Failed to write initial entry to index ' + str(ex))
-
-    return written
+    if not box_index_append(index_filename, destination_filename):
+        return False
+    # tell any waiting clients that the box has changed
+    post_url = destination_filename.replace('#', '/')
+    if post_url.endswith('.json'):
+        post_url = post_url[:-len('.json')]
+    box_event_add(handle, 'post', boxname, post_url)
+    return True
 
 
 def _update_last_seen(base_dir: str, handle: str, actor: str) -> None:
@@ -3869,8 +3889,8 @@ def _is_valid_dm(base_dir: str, nickname: str, domain: str, port: int,
 
     # check for the flag file which indicates to
     # only receive DMs from people you are following
-    follow_dms_filename = acct_dir(base_dir, nickname, domain) + '/.followDMs'
-    if not os.path.isfile(follow_dms_filename):
+    account_dir = acct_dir(base_dir, nickname, domain)
+    if not get_account_settings(account_dir)['followDMs']:
         # dm index will be updated
         update_index_list.append('dm')
         act_url = local_actor_url(http_prefix, nickname, domain)
@@ -4009,7 +4029,7 @@ def _receive_question_vote(server, base_dir: str, nickname: str, domain: str,
     # ensure that the cached post is removed if it exists, so
     # that it then will be recreated
     cached_post_filename = \
-        get_cached_post_filename(base_dir, nickname, domain, question_json)
+        get_cached_post_filename(base_dir, question_json)
     if cached_post_filename:
         if os.path.isfile(cached_post_filename):
             try:
@@ -4728,8 +4748,23 @@ def _inbox_after_initial(server, inbox_start_time,
 
         inbox_start_time = time.time()
 
+        # if the post is being edited then remove the previous
+        # version from the search index
+        account_dir = acct_handle_dir(base_dir, handle)
+        destination_post_id = \
+            destination_filename.split('/')[-1].replace('.json', '')
+        if os.path.isfile(destination_filename):
+            prev_post_json = load_json(destination_filename)
+            if prev_post_json:
+                remove_post_from_search_index(account_dir,
+                                              destination_post_id,
+                                              prev_post_json, True)
+
         # save the post to file
         if save_json(post_json_object, destination_filename):
+            destination_box_name = destination_filename.split('/')[-2]
+            add_post_to_search_index(account_dir, destination_box_name,
+                                     destination_post_id, post_json_object)
             fitness_performance(inbox_start_time, server.fitness,
                                 'INBOX', 'save_json',
                                 debug)
@@ -4975,7 +5010,7 @@ def clear_queue_items(base_dir: str, queue: []) -> None:
     """Clears the queue for each account
     """
     ctr = 0
-    queue.clear()
+    inbox_queue_clear(queue)
     for _, dirs, _ in os.walk(base_dir + '/accounts'):
         for account in dirs:
             queue_dir = base_dir + '/accounts/' + account + '/queue'
@@ -4998,7 +5033,7 @@ def clear_queue_items(base_dir: str, queue: []) -> None:
 def _restore_queue_items(base_dir: str, queue: []) -> None:
     """Checks the queue for each account and appends filenames
     """
-    queue.clear()
+    inbox_queue_clear(queue)
     for _, dirs, _ in os.walk(base_dir + '/accounts'):
         for account in dirs:
             queue_dir = base_dir + '/accounts/' + account + '/queue'
@@ -5006,7 +5041,9 @@ def _restore_queue_items(base_dir: str, queue: []) -> None:
                 continue
             for _, _, queuefiles in os.walk(queue_dir):
                 for qfile in queuefiles:
-                    queue.append(os.path.join(queue_dir, qfile))
+                    queue_filename = os.path.join(queue_dir, qfile)
+                    arrival_time = inbox_queue_arrival_time(queue_filename)
+                    inbox_queue_push(queue, queue_filename, arrival_time)
                 break
         break
     if len(queue) > 0:
@@ -5024,9 +5061,16 @@ def run_inbox_queue_watchdog(project_version: str, httpd) -> None:
         if not httpd.thrInboxQueue.is_alive() or httpd.restart_inbox_queue:
             httpd.restart_inbox_queue_in_progress = True
             httpd.thrInboxQueue.kill()
+            # the previous thread must have exited before its clone is
+            # started, so that the queue is never processed twice
+            if httpd.thrInboxQueue.is_alive():
+                httpd.thrInboxQueue.join(60)
+            if httpd.thrInboxQueue.is_alive():
+                print('THREAD: waiting for inbox queue to exit')
+                continue
             print('THREAD: restarting inbox queue watchdog')
             httpd.thrInboxQueue = inbox_queue_original.clone(run_inbox_queue)
-            httpd.inbox_queue.clear()
+            inbox_queue_clear(httpd.inbox_queue)
             begin_thread(httpd.thrInboxQueue, 'run_inbox_queue_watchdog 2')
             print('Restarting inbox queue...')
             httpd.restart_inbox_queue_in_progress = False
@@ -5057,7 +5101,7 @@ def _inbox_quota_exceeded(queue: {}, queue_filename: str,
                     except OSError:
                         print('EX: _inbox_quota_exceeded unable to delete 1 ' +
                               str(queue_filename))
-                    queue.pop(0)
+                    inbox_queue_pop(queue, True)
                 return True
             quotas_daily['domains'][post_domain] += 1
         else:
@@ -5079,7 +5123,7 @@ def _inbox_quota_exceeded(queue: {}, queue_filename: str,
                     except OSError:
                         print('EX: _inbox_quota_exceeded unable to delete 2 ' +
                               str(queue_filename))
-                    queue.pop(0)
+                    inbox_queue_pop(queue, True)
                 return True
             quotas_per_min['domains'][post_domain] += 1
         else:
@@ -5100,7 +5144,7 @@ def _inbox_quota_exceeded(queue: {}, queue_filename: str,
                     except OSError:
                         print('EX: _inbox_quota_exceeded unable to delete 3 ' +
                               str(queue_filename))
-                    queue.pop(0)
+                    inbox_queue_pop(queue, True)
                 return True
             quotas_daily['accounts'][post_handle] += 1
         else:
@@ -5122,7 +5166,7 @@ def _inbox_quota_exceeded(queue: {}, queue_filename: str,
                     except OSError:
                         print('EX: _inbox_quota_exceeded unable to delete 4 ' +
                               str(queue_filename))
-                    queue.pop(0)
+                    inbox_queue_pop(queue, True)
                 return True
             quotas_per_min['accounts'][post_handle] += 1
         else:
@@ -5554,7 +5598,6 @@ def run_inbox_queue(server,
         'accounts': {}
     }
 
-    heart_beat_ctr = 0
     queue_restore_ctr = 0
 
     # time when the last DM bounce message was sent
@@ -5568,16 +5611,19 @@ def run_inbox_queue(server,
     fitness_performance(inbox_start_time, server.fitness,
                         'INBOX', 'while_loop_start', debug)
     inbox_start_time = time.time()
+    heart_beat_time = int(time.time())
     while True:
-        time.sleep(1)
+        # exit here if this thread has been killed by the watchdog
+        check_thread_cancelled()
+        if len(queue) == 0:
+            thread_sleep(1)
         inbox_start_time = time.time()
         fitness_performance(inbox_start_time, server.fitness,
                             'INBOX', 'while_loop_itteration', debug)
         inbox_start_time = time.time()
 
         # heartbeat to monitor whether the inbox queue is running
-        heart_beat_ctr += 1
-        if heart_beat_ctr >= 10:
+        if int(inbox_start_time) - heart_beat_time >= 10:
             # turn off broch mode after it has timed out
             if broch_modeLapses(base_dir, broch_lapse_days):
                 broch_lapse_days = random.randrange(7, 14)
@@ -5586,7 +5632,11 @@ def run_inbox_queue(server,
             inbox_start_time = time.time()
             print('>>> Heartbeat Q:' + str(len(queue)) + ' ' +
                   '{:%F %T}'.format(datetime.datetime.now()))
-            heart_beat_ctr = 0
+            fitness_queue_metrics(server.fitness, 'INBOX',
+                                  inbox_queue_metrics(queue))
+            fitness_queue_metrics(server.fitness, 'SIGNATURE_CACHE',
+                                  sig_cache_metrics())
+            heart_beat_time = int(inbox_start_time)
 
         if len(queue) == 0:
             # restore any remaining queue items
@@ -5599,71 +5649,8 @@ def run_inbox_queue(server,
             inbox_start_time = time.time()
             continue
 
-        # oldest item first
-        queue.sort()
-        queue_filename = queue[0]
-        if not os.path.isfile(queue_filename):
-            print("Queue: queue item rejected because it has no file: " +
-                  queue_filename)
-            if len(queue) > 0:
-                queue.pop(0)
-            continue
-
-        if debug:
-            print('Loading queue item ' + queue_filename)
-
-        # Load the queue json
-        queue_json = load_json(queue_filename, 1)
-        fitness_performance(inbox_start_time, server.fitness,
-                            'INBOX', 'load_queue_json', debug)
-        inbox_start_time = time.time()
-        if not queue_json:
-            print('Queue: run_inbox_queue failed to load inbox queue item ' +
-                  queue_filename)
-            # Assume that the file is probably corrupt/unreadable
-            if len(queue) > 0:
-                queue.pop(0)
-            # delete the queue file
-            if os.path.isfile(queue_filename):
-                try:
-                    os.remove(queue_filename)
-                except OSError:
-                    print('EX: run_inbox_queue 1 unable to delete ' +
-                          str(queue_filename))
-            continue
-
         curr_time = int(time.time())
 
-        # clear the daily quotas for maximum numbers of received posts
-        if curr_time - quotas_last_update_daily > 60 * 60 * 24:
-            quotas_daily = {
-                'domains': {},
-                'accounts': {}
-            }
-            quotas_last_update_daily = curr_time
-
-        if curr_time - quotas_last_update_per_min > 60:
-            # clear the per minute quotas for maximum numbers of received posts
-            quotas_per_min = {
-                'domains': {},
-                'accounts': {}
-            }
-            # also check if the json signature enforcement has changed
-            verify_all_sigs = get_config_param(base_dir, "verifyAllSignatures")
-            if verify_all_sigs is not None:
-                verify_all_signatures = verify_all_sigs
-            # change the last time that this was done
-            quotas_last_update_per_min = curr_time
-
-        if _inbox_quota_exceeded(queue, queue_filename,
-                                 queue_json, quotas_daily, quotas_per_min,
-                                 domain_max_posts_per_day,
-                                 account_max_posts_per_day, debug):
-            continue
-        fitness_performance(inbox_start_time, server.fitness,
-                            'INBOX', '_inbox_quota_exceeded', debug)
-        inbox_start_time = time.time()
-
         # recreate the session periodically
         if not session or curr_time - session_last_update > 21600:
             print('Regenerating inbox queue session at 6hr interval')
@@ -5672,6 +5659,7 @@ def run_inbox_queue(server,
                 session_last_update = curr_time
             else:
                 print('WARN: inbox session not created')
+                thread_sleep(1)
                 continue
         if onion_domain:
             if not session_onion or \
@@ -5682,6 +5670,7 @@ def run_inbox_queue(server,
                     session_last_update_onion = curr_time
                 else:
                     print('WARN: inbox onion session not created')
+                    thread_sleep(1)
                     continue
         if i2p_domain:
             if not session_i2p or curr_time - session_last_update_i2p > 21600:
@@ -5691,102 +5680,114 @@ def run_inbox_queue(server,
                     session_last_update_i2p = curr_time
                 else:
                     print('WARN: inbox i2p session not created')
+                    thread_sleep(1)
                     continue
         fitness_performance(inbox_start_time, server.fitness,
                             'INBOX', 'recreate_session', debug)
         inbox_start_time = time.time()
 
-        curr_session = session
-        if queue_json.get('actor'):
-            if isinstance(queue_json['actor'], str):
-                sender_domain, _ = get_domain_from_actor(queue_json['actor'])
-                if sender_domain:
-                    if sender_domain.endswith('.onion') and \
-                       session_onion and proxy_type != 'tor':
-                        curr_session = session_onion
-                    elif (sender_domain.endswith('.i2p') and
-                          session_i2p and proxy_type != 'i2p'):
-                        curr_session = session_i2p
-
-        if debug and queue_json.get('actor'):
-            print('Obtaining public key for actor ' + queue_json['actor'])
+        # clear the daily quotas for maximum numbers of received posts
+        if curr_time - quotas_last_update_daily > 60 * 60 * 24:
+            quotas_daily = {
+                'domains': {},
+                'accounts': {}
+            }
+            quotas_last_update_daily = curr_time
+
+        if curr_time - quotas_last_update_per_min > 60:
+            # clear the per minute quotas for maximum numbers of received posts
+            quotas_per_min = {
+                'domains': {},
+                'accounts': {}
+            }
+            # also check if the json signature enforcement has changed
+            verify_all_sigs = get_config_param(base_dir, "verifyAllSignatures")
+            if verify_all_sigs is not None:
+                verify_all_signatures = verify_all_sigs
+            # change the last time that this was done
+            quotas_last_update_per_min = curr_time
+
+        # the oldest items in the queue are verified in parallel
+        preverify_params = {
+            'base_dir': base_dir,
+            'session': session,
+            'session_onion': session_onion,
+            'session_i2p': session_i2p,
+            'proxy_type': proxy_type,
+            'person_cache': person_cache,
+            'debug': debug,
+            'project_version': project_version,
+            'http_prefix': http_prefix,
+            'domain': domain,
+            'onion_domain': onion_domain,
+            'i2p_domain': i2p_domain,
+            'signing_priv_key_pem': signing_priv_key_pem,
+            'fitness': server.fitness,
+            'quotas_daily': quotas_daily,
+            'quotas_per_min': quotas_per_min,
+            'domain_max_posts_per_day': domain_max_posts_per_day,
+            'account_max_posts_per_day': account_max_posts_per_day
+        }
+        inbox_preverify_submit(queue, preverify_params)
 
+        # oldest item first
+        queue_filename = inbox_queue_head(queue)
+        if not os.path.isfile(queue_filename):
+            print("Queue: queue item rejected because it has no file: " +
+                  queue_filename)
+            inbox_queue_pop(queue, True)
+            continue
+
+        if debug:
+            print('Loading queue item ' + queue_filename)
+
+        # Load the queue json, together with the public key of the
+        # sender and the result of checking the http signature
+        preverified = inbox_preverified(queue_filename, preverify_params)
         fitness_performance(inbox_start_time, server.fitness,
-                            'INBOX', 'start_get_pubkey', debug)
+                            'INBOX', 'inbox_preverified', debug)
         inbox_start_time = time.time()
-        # Try a few times to obtain the public key
-        pub_key = None
-        key_id = None
-        for tries in range(8):
-            key_id = None
-            signature_params = \
-                queue_json['httpHeaders']['signature'].split(',')
-            for signature_item in signature_params:
-                if signature_item.startswith('keyId='):
-                    if '"' in signature_item:
-                        key_id = signature_item.split('"')[1]
-                        break
-            if not key_id:
-                print('Queue: No keyId in signature: ' +
-                      queue_json['httpHeaders']['signature'])
-                pub_key = None
-                break
-
-            pub_key = \
-                get_person_pub_key(base_dir, curr_session, key_id,
-                                   person_cache, debug,
-                                   project_version, http_prefix,
-                                   domain, onion_domain, i2p_domain,
-                                   signing_priv_key_pem)
-            fitness_performance(inbox_start_time, server.fitness,
-                                'INBOX', 'get_person_pub_key', debug)
-            inbox_start_time = time.time()
-            if pub_key:
-                if debug:
-                    print('DEBUG: public key: ' + str(pub_key))
-                break
+        queue_json = preverified['queue_json']
+        if not queue_json:
+            print('Queue: run_inbox_queue failed to load inbox queue item ' +
+                  queue_filename)
+            # Assume that the file is probably corrupt/unreadable
+            inbox_queue_pop(queue, True)
+            # delete the queue file
+            if os.path.isfile(queue_filename):
+                try:
+                    os.remove(queue_filename)
+                except OSError:
+                    print('EX: run_inbox_queue 1 unable to delete ' +
+                          str(queue_filename))
+            continue
 
-            if debug:
-                print('DEBUG: Retry ' + str(tries+1) +
-                      ' obtaining public key for ' + key_id)
-            time.sleep(1)
+        if _inbox_quota_exceeded(queue, queue_filename,
+                                 queue_json, quotas_daily, quotas_per_min,
+                                 domain_max_posts_per_day,
+                                 account_max_posts_per_day, debug):
+            continue
+        fitness_performance(inbox_start_time, server.fitness,
+                            'INBOX', '_inbox_quota_exceeded', debug)
+        inbox_start_time = time.time()
 
+        key_id = preverified['key_id']
+        pub_key = preverified['pub_key']
         if not pub_key:
             if debug:
-                print('Queue: public key could not be obtained from ' + key_id)
+                print('Queue: public key could not be obtained from ' +
+                      str(key_id))
             if os.path.isfile(queue_filename):
                 try:
                     os.remove(queue_filename)
                 except OSError:
                     print('EX: run_inbox_queue 2 unable to delete ' +
                           str(queue_filename))
-            if len(queue) > 0:
-                queue.pop(0)
+            inbox_queue_pop(queue, True)
             continue
 
-        # check the http header signature
-        fitness_performance(inbox_start_time, server.fitness,
-                            'INBOX', 'begin_check_signature', debug)
-        inbox_start_time = time.time()
-        if debug:
-            print('DEBUG: checking http header signature')
-            pprint(queue_json['httpHeaders'])
-        post_str = json.dumps(queue_json['post'])
-        http_signature_failed = False
-        if not verify_post_headers(http_prefix, pub_key,
-                                   queue_json['httpHeaders'],
-                                   queue_json['path'], False,
-                                   queue_json['digest'],
-                                   post_str, debug):
-            http_signature_failed = True
-            print('Queue: Header signature check failed')
-            pprint(queue_json['httpHeaders'])
-        else:
-            if debug:
-                print('DEBUG: http header signature check success')
-        fitness_performance(inbox_start_time, server.fitness,
-                            'INBOX', 'verify_post_headers', debug)
-        inbox_start_time = time.time()
+        http_signature_failed = preverified['http_signature_failed']
+        curr_session = inbox_sender_session(queue_json, preverify_params)
 
         # check if a json signature exists on this post
         has_json_signature, jwebsig_type = \
@@ -5820,8 +5821,7 @@ def run_inbox_queue(server,
                     except OSError:
                         print('EX: run_inbox_queue 3 unable to delete ' +
                               str(queue_filename))
-                if len(queue) > 0:
-                    queue.pop(0)
+                inbox_queue_pop(queue, True)
                 continue
         else:
             if http_signature_failed or verify_all_signatures:
@@ -5842,8 +5842,7 @@ def run_inbox_queue(server,
                         except OSError:
                             print('EX: run_inbox_queue 4 unable to delete ' +
                                   str(queue_filename))
-                    if len(queue) > 0:
-                        queue.pop(0)
+                    inbox_queue_pop(queue, True)
                     fitness_performance(inbox_start_time, server.fitness,
                                         'INBOX', 'not_verify_signature',
                                         debug)
@@ -5879,8 +5878,7 @@ def run_inbox_queue(server,
                 except OSError:
                     print('EX: run_inbox_queue 5 unable to delete ' +
                           str(queue_filename))
-            if len(queue) > 0:
-                queue.pop(0)
+            inbox_queue_pop(queue, False)
             fitness_performance(inbox_start_time, server.fitness,
                                 'INBOX', '_receive_undo',
                                 debug)
@@ -5908,8 +5906,7 @@ def run_inbox_queue(server,
                 except OSError:
                     print('EX: run_inbox_queue 6 unable to delete ' +
                           str(queue_filename))
-            if len(queue) > 0:
-                queue.pop(0)
+            inbox_queue_pop(queue, False)
             print('Queue: Follow activity for ' + key_id +
                   ' removed from queue')
             fitness_performance(inbox_start_time, server.fitness,
@@ -5931,8 +5928,7 @@ def run_inbox_queue(server,
                 except OSError:
                     print('EX: run_inbox_queue 7 unable to delete ' +
                           str(queue_filename))
-            if len(queue) > 0:
-                queue.pop(0)
+            inbox_queue_pop(queue, False)
             fitness_performance(inbox_start_time, server.fitness,
                                 'INBOX', 'receive_accept_reject',
                                 debug)
@@ -5969,8 +5965,7 @@ def run_inbox_queue(server,
                 except OSError:
                     print('EX: run_inbox_queue 8 unable to delete ' +
                           str(queue_filename))
-            if len(queue) > 0:
-                queue.pop(0)
+            inbox_queue_pop(queue, False)
             fitness_performance(inbox_start_time, server.fitness,
                                 'INBOX', '_receive_update_activity',
                                 debug)
@@ -5993,8 +5988,7 @@ def run_inbox_queue(server,
                 except OSError:
                     print('EX: run_inbox_queue 9 unable to delete ' +
                           str(queue_filename))
-            if len(queue) > 0:
-                queue.pop(0)
+            inbox_queue_pop(queue, True)
             continue
         fitness_performance(inbox_start_time, server.fitness,
                             'INBOX', '_post_recipients',
@@ -6053,11 +6047,8 @@ def run_inbox_queue(server,
             mitm = False
             if queue_json.get('mitm'):
                 mitm = True
-            bold_reading = False
-            bold_reading_filename = \
-                acct_handle_dir(base_dir, handle) + '/.boldReading'
-            if os.path.isfile(bold_reading_filename):
-                bold_reading = True
+            account_dir = acct_handle_dir(base_dir, handle)
+            bold_reading = get_account_settings(account_dir)['boldReading']
             _inbox_after_initial(server, inbox_start_time,
                                  recent_posts_cache,
                                  max_recent_posts,
@@ -6103,5 +6094,4 @@ def run_inbox_queue(server,
             except OSError:
                 print('EX: run_inbox_queue 10 unable to delete ' +
                       str(queue_filename))
-        if len(queue) > 0:
-            queue.pop(0)
+        inbox_queue_pop(queue, False)
@@ -0,0 +1,426 @@
+__filename__ = "inboxqueue.py"
+__author__ = "Bob Mottram"
+__license__ = "AGPL3+"
+__version__ = "1.4.0"
+__maintainer__ = "Bob Mottram"
+__email__ = "bob@libreserver.org"
+__status__ = "Production"
+__module_group__ = "Timeline"
+
+# The inbox queue is a heap of (arrival time, queue filename) entries,
+# so that the oldest item can always be obtained without sorting.
+# Items near the front of the queue are pre-verified by a pool of
+# worker threads, which fetch the public key of the sender and check
+# the http signature. These are the slowest parts of processing an
+# incoming post, because they may involve network requests. The inbox
+# queue thread then takes the pre-verified items in order of arrival
+# and does everything else, so that side effects such as saving posts
+# or sending Accept activities happen in the same order as before.
+# Items are added to the queue by http handler threads, so the heap
+# is only changed while holding the inbox queue lock. The oldest items
+# are submitted again only when the head of the queue changes, or while
+# there are fewer of them than the number pre-verified, and items from
+# senders who have reached their quota are not pre-verified.
+
+import os
+import json
+import time
+import heapq
+import threading
+from pprint import pprint
+from threads import thread_with_trace
+from threads import begin_thread
+from threads import thread_sleep
+from utils import load_json
+from utils import get_domain_from_actor
+from cache import get_person_pub_key
+from httpsig import verify_post_headers
+from fitnessFunctions import fitness_performance
+
+# number of worker threads which pre-verify queue items
+INBOX_PREVERIFY_WORKERS = 4
+
+# how many of the oldest queue items are pre-verified
+INBOX_PREVERIFY_AHEAD = 16
+
+# maximum time to wait for a worker to finish verifying an item
+INBOX_PREVERIFY_WAIT_SEC = 120
+
+# number of attempts to obtain the public key of the sender
+INBOX_PUB_KEY_TRIES = 8
+
+# state of the pre-verification stage, shared by the worker threads
+_INBOX_PREVERIFY = {
+    'condition': threading.Condition(),
+    'pending': [],
+    'in_progress': set(),
+    'results': {},
+    'workers': [],
+    'preverified': 0,
+    'dropped': 0
+}
+
+# state of each inbox queue, keyed by its id
+_INBOX_QUEUE = {
+    'lock': threading.Lock(),
+    # set of the filenames within each queue, so that duplicates
+    # can be found without scanning the queue
+    'queued': {},
+    # head and length of each queue when its oldest items were
+    # last submitted for pre-verification
+    'submitted': {}
+}
+
+
+def _inbox_queued(queue: []) -> set:
+    """Returns the set of filenames within an inbox queue.
+    If the queue was changed elsewhere then the set is rebuilt.
+    This must be called while holding the inbox queue lock
+    """
+    queued = _INBOX_QUEUE['queued'].get(id(queue))
+    if queued is None or len(queued) != len(queue):
+        queued = set()
+        for item in queue:
+            queued.add(item[1])
+        _INBOX_QUEUE['queued'][id(queue)] = queued
+    return queued
+
+
+def inbox_queue_push(queue: [], queue_filename: str,
+                     arrival_time: float) -> bool:
+    """Adds an item to the inbox queue
+    """
+    with _INBOX_QUEUE['lock']:
+        queued = _inbox_queued(queue)
+        if queue_filename in queued:
+            return False
+        heapq.heappush(queue, (arrival_time, queue_filename))
+        queued.add(queue_filename)
+    return True
+
+
+def inbox_queue_head(queue: []) -> str:
+    """Returns the filename of the oldest item in the inbox queue
+    """
+    with _INBOX_QUEUE['lock']:
+        if not queue:
+            return None
+        return queue[0][1]
+
+
+def inbox_queue_clear(queue: []) -> None:
+    """Removes all items from the inbox queue
+    """
+    with _INBOX_QUEUE['lock']:
+        queue.clear()
+        _INBOX_QUEUE['queued'][id(queue)] = set()
+        _INBOX_QUEUE['submitted'].pop(id(queue), None)
+
+
+def inbox_queue_pop(queue: [], dropped: bool) -> None:
+    """Removes the oldest item from the inbox queue
+    """
+    with _INBOX_QUEUE['lock']:
+        if not queue:
+            return
+        queued = _inbox_queued(queue)
+        queue_filename = heapq.heappop(queue)[1]
+        queued.discard(queue_filename)
+    condition = _INBOX_PREVERIFY['condition']
+    with condition:
+        if _INBOX_PREVERIFY['results'].get(queue_filename):
+            del _INBOX_PREVERIFY['results'][queue_filename]
+        if dropped:
+            _INBOX_PREVERIFY['dropped'] += 1
+
+
+def _inbox_key_id(signature_header: str) -> str:
+    """Returns the keyId from a http signature header
+    """
+    for signature_item in signature_header.split(','):
+        if signature_item.startswith('keyId='):
+            if '"' in signature_item:
+                return signature_item.split('"')[1]
+    return None
+
+
+def _inbox_quota_reached(queue_json: {}, params: {}) -> bool:
+    """Returns true if the sender of a queue item has already reached
+    the maximum number of posts received from their domain or account.
+    The quotas are counted by the inbox queue thread
+    """
+    post_domain = queue_json.get('postDomain')
+    if not post_domain:
+        return False
+    quotas_daily = params['quotas_daily']
+    quotas_per_min = params['quotas_per_min']
+    domain_max_posts_per_day = params['domain_max_posts_per_day']
+    if domain_max_posts_per_day > 0:
+        if quotas_daily['domains'].get(post_domain, 0) > \
+           domain_max_posts_per_day:
+            return True
+        domain_max_posts_per_min = \
+            max(int(domain_max_posts_per_day / (24 * 60)), 5)
+        if quotas_per_min['domains'].get(post_domain, 0) > \
+           domain_max_posts_per_min:
+            return True
+    account_max_posts_per_day = params['account_max_posts_per_day']
+    if account_max_posts_per_day > 0 and queue_json.get('postNickname'):
+        post_handle = queue_json['postNickname'] + '@' + post_domain
+        if quotas_daily['accounts'].get(post_handle, 0) > \
+           account_max_posts_per_day:
+            return True
+        account_max_posts_per_min = \
+            max(int(account_max_posts_per_day / (24 * 60)), 5)
+        if quotas_per_min['accounts'].get(post_handle, 0) > \
+           account_max_posts_per_min:
+            return True
+    return False
+
+
+def inbox_sender_session(queue_json: {}, params: {}):
+    """Returns the session to use to fetch the actor of the sender
+    """
+    curr_session = params['session']
+    if not queue_json.get('actor'):
+        return curr_session
+    if not isinstance(queue_json['actor'], str):
+        return curr_session
+    sender_domain, _ = get_domain_from_actor(queue_json['actor'])
+    if not sender_domain:
+        return curr_session
+    proxy_type = params['proxy_type']
+    if sender_domain.endswith('.onion') and \
+       params['session_onion'] and proxy_type != 'tor':
+        curr_session = params['session_onion']
+    elif (sender_domain.endswith('.i2p') and
+          params['session_i2p'] and proxy_type != 'i2p'):
+        curr_session = params['session_i2p']
+    return curr_session
+
+
+def _verify_inbox_item(queue_filename: str, params: {}) -> {}:
+    """Loads a queue item, obtains the public key of the sender
+    and checks the http signature
+    """
+    debug = params['debug']
+    fitness = params['fitness']
+    start_time = time.time()
+    result = {
+        'queue_json': None,
+        'key_id': None,
+        'pub_key': None,
+        'http_signature_failed': False,
+        'quota_reached': False
+    }
+    queue_json = load_json(queue_filename, 1)
+    fitness_performance(start_time, fitness,
+                        'INBOX', 'load_queue_json', debug)
+    if not queue_json:
+        return result
+    result['queue_json'] = queue_json
+    # don't fetch the public key if the item will be rejected
+    if _inbox_quota_reached(queue_json, params):
+        result['quota_reached'] = True
+        return result
+    curr_session = inbox_sender_session(queue_json, params)
+
+    if debug and queue_json.get('actor'):
+        print('Obtaining public key for actor ' + queue_json['actor'])
+
+    # Try a few times to obtain the public key
+    start_time = time.time()
+    key_id = None
+    pub_key = None
+    for tries in range(INBOX_PUB_KEY_TRIES):
+        key_id = _inbox_key_id(queue_json['httpHeaders']['signature'])
+        if not key_id:
+            print('Queue: No keyId in signature: ' +
+                  queue_json['httpHeaders']['signature'])
+            break
+        pub_key = \
+            get_person_pub_key(params['base_dir'], curr_session, key_id,
+                               params['person_cache'], debug,
+                               params['project_version'],
+                               params['http_prefix'], params['domain'],
+                               params['onion_domain'], params['i2p_domain'],
+                               params['signing_priv_key_pem'])
+        if pub_key:
+            if debug:
+                print('DEBUG: public key: ' + str(pub_key))
+            break
+        if debug:
+            print('DEBUG: Retry ' + str(tries+1) +
+                  ' obtaining public key for ' + key_id)
+        thread_sleep(1)
+    fitness_performance(start_time, fitness,
+                        'INBOX', 'get_person_pub_key', debug)
+    result['key_id'] = key_id
+    result['pub_key'] = pub_key
+    if not pub_key:
+        return result
+
+    # check the http header signature
+    start_time = time.time()
+    if debug:
+        print('DEBUG: checking http header signature')
+        pprint(queue_json['httpHeaders'])
+    post_str = json.dumps(queue_json['post'])
+    if not verify_post_headers(params['http_prefix'], pub_key,
+                               queue_json['httpHeaders'],
+                               queue_json['path'], False,
+                               queue_json['digest'],
+                               post_str, debug):
+        result['http_signature_failed'] = True
+        print('Queue: Header signature check failed')
+        pprint(queue_json['httpHeaders'])
+    else:
+        if debug:
+            print('DEBUG: http header signature check success')
+    fitness_performance(start_time, fitness,
+                        'INBOX', 'verify_post_headers', debug)
+    return result
+
+
+def _run_inbox_preverify_worker(worker_index: int, debug: bool) -> None:
+    """A worker thread which pre-verifies inbox queue items
+    """
+    if debug:
+        print('DEBUG: inbox pre-verify worker ' +
+              str(worker_index) + ' started')
+    condition = _INBOX_PREVERIFY['condition']
+    while True:
+        with condition:
+            while not _INBOX_PREVERIFY['pending']:
+                condition.wait(10)
+            job = _INBOX_PREVERIFY['pending'].pop(0)
+            _INBOX_PREVERIFY['in_progress'].add(job['queue_filename'])
+        start_time = time.time()
+        result = None
+        try:
+            result = _verify_inbox_item(job['queue_filename'],
+                                        job['params'])
+        except Exception as ex:
+            print('ERROR: inbox pre-verify ' + job['queue_filename'] +
+                  ' failed ' + str(ex))
+        fitness_performance(start_time, job['params']['fitness'],
+                            'INBOX', 'preverify', debug)
+        with condition:
+            _INBOX_PREVERIFY['in_progress'].discard(job['queue_filename'])
+            if result:
+                _INBOX_PREVERIFY['results'][job['queue_filename']] = result
+                _INBOX_PREVERIFY['preverified'] += 1
+            condition.notify_all()
+
+
+def _start_inbox_preverify_workers(debug: bool) -> None:
+    """Ensures that the pre-verify worker threads are running.
+    This must be called while holding the condition lock
+    """
+    workers = _INBOX_PREVERIFY['workers']
+    for thr in workers.copy():
+        if thr.is_started and not thr.is_alive():
+            print('WARN: inbox pre-verify worker stopped')
+            workers.remove(thr)
+    while len(workers) < INBOX_PREVERIFY_WORKERS:
+        worker_index = len(workers)
+        print('THREAD: inbox pre-verify worker ' + str(worker_index))
+        thr = thread_with_trace(target=_run_inbox_preverify_worker,
+                                args=(worker_index, debug), daemon=True)
+        workers.append(thr)
+        begin_thread(thr, '_start_inbox_preverify_workers')
+
+
+def inbox_preverify_submit(queue: [], params: {}) -> None:
+    """Submits the oldest items within the inbox queue to
+    the pre-verification workers
+    """
+    with _INBOX_QUEUE['lock']:
+        queue_head = None
+        if queue:
+            queue_head = queue[0][1]
+        submitted = _INBOX_QUEUE['submitted'].get(id(queue))
+        if submitted and submitted['head'] == queue_head:
+            if submitted['length'] >= INBOX_PREVERIFY_AHEAD or \
+               submitted['length'] == len(queue):
+                return
+        ahead = heapq.nsmallest(INBOX_PREVERIFY_AHEAD, queue)
+        _INBOX_QUEUE['submitted'][id(queue)] = {
+            'head': queue_head,
+            'length': len(queue)
+        }
+    ahead_filenames = set()
+    for item in ahead:
+        ahead_filenames.add(item[1])
+    condition = _INBOX_PREVERIFY['condition']
+    with condition:
+        # remove any results for items which are no longer queued
+        results = _INBOX_PREVERIFY['results']
+        for queue_filename in list(results.keys()):
+            if queue_filename not in ahead_filenames:
+                del results[queue_filename]
+        pending = []
+        for item in ahead:
+            queue_filename = item[1]
+            if results.get(queue_filename):
+                continue
+            if queue_filename in _INBOX_PREVERIFY['in_progress']:
+                continue
+            pending.append({
+                'queue_filename': queue_filename,
+                'params': params
+            })
+        _INBOX_PREVERIFY['pending'] = pending
+        if pending:
+            _start_inbox_preverify_workers(params['debug'])
+            condition.notify_all()
+
+
+def inbox_preverified(queue_filename: str, params: {}) -> {}:
+    """Returns the result of verifying the given queue item.
+    If a worker is verifying it then this waits for the result,
+    otherwise the item is verified here
+    """
+    condition = _INBOX_PREVERIFY['condition']
+    with condition:
+        for job in _INBOX_PREVERIFY['pending']:
+            if job['queue_filename'] == queue_filename:
+                _INBOX_PREVERIFY['pending'].remove(job)
+                break
+        wait_until = time.time() + INBOX_PREVERIFY_WAIT_SEC
+        while queue_filename in _INBOX_PREVERIFY['in_progress']:
+            if time.time() > wait_until:
+                break
+            condition.wait(1)
+        result = _INBOX_PREVERIFY['results'].get(queue_filename)
+        if result:
+            del _INBOX_PREVERIFY['results'][queue_filename]
+            # quotas may have been reset since it was pre-verified
+            if not result['quota_reached']:
+                return result
+    return _verify_inbox_item(queue_filename, params)
+
+
+def inbox_queue_metrics(queue: []) -> {}:
+    """Returns the current state of the inbox queue
+    """
+    condition = _INBOX_PREVERIFY['condition']
+    with condition:
+        return {
+            'queued': len(queue),
+            'pending': len(_INBOX_PREVERIFY['pending']),
+            'active': len(_INBOX_PREVERIFY['in_progress']),
+            'ready': len(_INBOX_PREVERIFY['results']),
+            'workers': len(_INBOX_PREVERIFY['workers']),
+            'preverified': _INBOX_PREVERIFY['preverified'],
+            'dropped': _INBOX_PREVERIFY['dropped']
+        }
+
+
+def inbox_queue_arrival_time(queue_filename: str) -> float:
+    """Returns the time when a queue item arrived, from its file
+    """
+    try:
+        return os.path.getmtime(queue_filename)
+    except OSError:
+        return time.time()
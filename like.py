@@ -7,7 +7,6 @@ __email__ = "bob@libreserver.org"
 __status__ = "Production"
 __module_group__ = "ActivityPub"
 
-import os
 from pprint import pprint
 from utils import has_object_string
 from utils import has_object_string_object
@@ -27,7 +26,7 @@ from utils import local_actor_url
 from utils import load_json
 from utils import save_json
 from utils import remove_post_from_cache
-from utils import get_cached_post_filename
+from utils import clear_from_post_caches
 from posts import send_signed_json
 from session import post_json
 from webfinger import webfinger_handle
@@ -434,19 +433,12 @@ def update_likes_collection(recent_posts_cache: {},
     if not post_json_object:
         return
 
-    # remove any cached version of this post so that the
-    # like icon is changed
+    # remove any cached version of this post, and of any announces
+    # of it, so that the like icon is changed
     remove_post_from_cache(post_json_object, recent_posts_cache)
-    cached_post_filename = \
-        get_cached_post_filename(base_dir, nickname,
-                                 domain, post_json_object)
-    if cached_post_filename:
-        if os.path.isfile(cached_post_filename):
-            try:
-                os.remove(cached_post_filename)
-            except OSError:
-                print('EX: update_likes_collection unable to delete ' +
-                      cached_post_filename)
+    if post_json_object.get('id'):
+        cached_post_id = remove_id_ending(post_json_object['id'])
+        clear_from_post_caches(base_dir, recent_posts_cache, cached_post_id)
 
     obj = post_json_object
     if has_object_dict(post_json_object):
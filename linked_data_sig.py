@@ -11,17 +11,21 @@ __module_group__ = "Security"
 
 import random
 import base64
+import json
 import hashlib
 from datetime import datetime
 from cryptography.hazmat.backends import default_backend
 from cryptography.hazmat.primitives.serialization import load_pem_private_key
-from cryptography.hazmat.primitives.serialization import load_pem_public_key
 from cryptography.hazmat.primitives.asymmetric import padding
 from cryptography.hazmat.primitives import hashes
 from cryptography.hazmat.primitives.asymmetric import utils as hazutils
 from pyjsonld import normalize
 from context import has_valid_context
 from utils import get_sha_256
+from sigcache import public_key_hash
+from sigcache import load_cached_public_key
+from sigcache import get_signature_verdict
+from sigcache import store_signature_verdict
 
 
 def _options_hash(doc: {}) -> str:
@@ -72,24 +76,35 @@ def verify_json_signature(doc: {}, public_key_pem: str) -> bool:
     """
     if not has_valid_context(doc):
         return False
-    pubkey = load_pem_public_key(public_key_pem.encode('utf-8'),
-                                 backend=default_backend())
-    to_be_signed = _options_hash(doc) + _doc_hash(doc)
     signature = doc["signature"]["signatureValue"]
 
+    # has this document been checked before?
+    pem_hash = public_key_hash(public_key_pem)
+    doc_str = json.dumps(doc, sort_keys=True)
+    signed_hash = hashlib.sha256(doc_str.encode('utf-8')).hexdigest()
+    verdict = get_signature_verdict(pem_hash, signed_hash, signature)
+    if verdict is not None:
+        return verdict
+
+    pubkey = load_cached_public_key(public_key_pem,
+                                    doc["signature"].get('creator'))
+    to_be_signed = _options_hash(doc) + _doc_hash(doc)
+
     digest = get_sha_256(to_be_signed.encode("utf-8"))
     base64sig = base64.b64decode(signature)
 
+    verdict = False
     try:
         pubkey.verify(
             base64sig,
             digest,
             padding.PKCS1v15(),
             hazutils.Prehashed(hashes.SHA256()))
-        return True
+        verdict = True
     except BaseException as ex:
         print('EX: verify_json_signature unable to verify ' + str(ex))
-        return False
+    store_signature_verdict(pem_hash, signed_hash, signature, verdict)
+    return verdict
 
 
 def generate_json_signature(doc: {}, private_key_pem: str) -> None:
@@ -38,6 +38,8 @@ from utils import text_in_file
 from inbox import store_hash_tags
 from session import create_session
 from threads import begin_thread
+from threads import thread_sleep
+from boxindex import box_index_append
 
 
 def _update_feeds_outbox_index(base_dir: str, domain: str,
@@ -48,23 +50,13 @@ def _update_feeds_outbox_index(base_dir: str, domain: str,
     index_filename = base_path + '/outbox.index'
 
     if os.path.isfile(index_filename):
-        if not text_in_file(post_id, index_filename):
-            try:
-                with open(index_filename, 'r+') as feeds_file:
-                    content = feeds_file.read()
-                    if post_id + '\n' not in content:
-                        feeds_file.seek(0, 0)
-                        feeds_file.write(post_id + '\n' + content)
-                        print('DEBUG: feeds post added to index')
-            except OSError as ex:
-                print('EX: Failed to write entry to feeds posts index ' +
-                      index_filename + ' ' + str(ex))
+        if text_in_file(post_id, index_filename):
+            return
+    if box_index_append(index_filename, post_id):
+        print('DEBUG: feeds post added to index')
     else:
-        try:
-            with open(index_filename, 'w+', encoding='utf-8') as feeds_file:
-                feeds_file.write(post_id + '\n')
-        except OSError:
-            print('EX: unable to write ' + index_filename)
+        print('EX: Failed to write entry to feeds posts index ' +
+              index_filename)
 
 
 def _save_arrived_time(post_filename: str, arrived: str) -> None:
@@ -779,6 +771,22 @@ def _merge_with_previous_newswire(oldNewswire: {}, new_newswire: {}) -> None:
             new_newswire[published][i] = fields[i]
 
 
+def _unconverted_newswire_items(base_dir: str, domain: str,
+                                newswire: {}) -> {}:
+    """Returns the newswire items which have not already been
+    converted into posts, so that items from feeds which have not
+    changed are not processed again
+    """
+    news_path = base_dir + '/accounts/news@' + domain + '/'
+    news_items = {}
+    for published, fields in newswire.items():
+        if isinstance(fields[3], str):
+            if fields[3].startswith(news_path):
+                continue
+        news_items[published] = fields
+    return news_items
+
+
 def run_newswire_daemon(base_dir: str, httpd,
                         http_prefix: str, domain: str, port: int,
                         translate: {}) -> None:
@@ -789,7 +797,7 @@ def run_newswire_daemon(base_dir: str, httpd,
 
     print('Starting newswire daemon')
     # initial sleep to allow the system to start up
-    time.sleep(50)
+    thread_sleep(50)
     while True:
         # has the session been created yet?
         if not httpd.session:
@@ -797,7 +805,7 @@ def run_newswire_daemon(base_dir: str, httpd,
             httpd.session = create_session(httpd.proxy_type)
             if not httpd.session:
                 print('Newswire daemon has no session')
-                time.sleep(60)
+                thread_sleep(60)
                 continue
             print('Newswire daemon session established')
 
@@ -814,7 +822,8 @@ def run_newswire_daemon(base_dir: str, httpd,
                                    httpd.system_language,
                                    httpd.debug,
                                    httpd.preferred_podcast_formats,
-                                   httpd.rss_timeout_sec)
+                                   httpd.rss_timeout_sec,
+                                   httpd.fitness)
 
         if not httpd.newswire:
             print('Newswire feeds not updated')
@@ -833,8 +842,10 @@ def run_newswire_daemon(base_dir: str, httpd,
             print('No new newswire')
 
         print('Converting newswire to activitypub format')
+        news_items = _unconverted_newswire_items(base_dir, domain,
+                                                 new_newswire)
         _convert_rss_to_activitypub(base_dir, http_prefix, domain, port,
-                                    new_newswire, translate,
+                                    news_items, translate,
                                     httpd.recent_posts_cache,
                                     httpd.max_mirrored_articles,
                                     httpd.allow_local_network_access,
@@ -857,7 +868,7 @@ def run_newswire_daemon(base_dir: str, httpd,
 
         # wait a while before the next feeds update
         for _ in range(360):
-            time.sleep(10)
+            thread_sleep(10)
             # if a new blog post has been created then stop
             # waiting and recalculate the newswire
             if os.path.isfile(refresh_filename):
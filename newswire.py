@@ -10,8 +10,13 @@ __module_group__ = "Web Interface Columns"
 import os
 import json
 import requests
-import random
 import time
+import copy
+import codecs
+import random
+import hashlib
+import itertools
+import threading
 from socket import error as SocketError
 import errno
 from datetime import datetime
@@ -45,6 +50,19 @@ from blocking import is_blocked_domain
 from blocking import is_blocked_hashtag
 from filters import is_filtered
 from session import download_image_any_mime_type
+from boxindex import box_index_page
+from threads import thread_with_trace
+from threads import begin_thread
+from fitnessFunctions import fitness_performance
+
+# number of threads which fetch newswire feeds at the same time
+NEWSWIRE_FETCH_WORKERS = 8
+
+# minimum time between requests to the same host
+NEWSWIRE_FETCH_HOST_DELAY_SEC = 4
+
+# size of the chunks in which feeds are downloaded
+NEWSWIRE_STREAM_CHUNK_BYTES = 16 * 1024
 
 
 def _remove_cdata(text: str) -> str:
@@ -1309,31 +1327,225 @@ def _yt_channel_to_atom_feed(url: str) -> str:
     return channel_url
 
 
-def get_rss(base_dir: str, domain: str, session, url: str,
-            moderated: bool, mirrored: bool,
-            max_posts_per_source: int, max_feed_size_kb: int,
-            max_feed_item_size_kb: int,
-            max_categories_feed_item_size_kb: int, debug: bool,
-            preferred_podcast_formats: [],
-            timeout_sec: int, system_language: str) -> {}:
-    """Returns an RSS url as a dict
+def _feed_response_chunks(result):
+    """Returns the text of a feed as it is downloaded
+    """
+    try:
+        decoder = \
+            codecs.getincrementaldecoder(result.encoding or 'utf-8')('replace')
+    except LookupError:
+        decoder = codecs.getincrementaldecoder('utf-8')('replace')
+    for chunk in result.iter_content(chunk_size=NEWSWIRE_STREAM_CHUNK_BYTES):
+        if chunk:
+            yield decoder.decode(chunk)
+    yield decoder.decode(b'', True)
+
+
+def _feed_item_start(feed_str: str, start_pos: int) -> int:
+    """Returns the position of the next rss item or atom entry
+    """
+    item_pos = -1
+    for start_tag in ('<item>', '<item ', '<entry>', '<entry '):
+        pos = feed_str.find(start_tag, start_pos)
+        if pos != -1:
+            if item_pos == -1 or pos < item_pos:
+                item_pos = pos
+    return item_pos
+
+
+def _feed_item_documents(chunks, max_bytes: int):
+    """Splits a feed into documents as it is downloaded, each containing
+    the header of the feed followed by a single item, so that only the
+    header and the current item need to be held in memory.
+    Feeds which can't be split are returned as a single document.
+    Returns None if the feed is too large
+    """
+    json_decoder = json.JSONDecoder()
+    feed_str = ''
+    header = None
+    split_feed = True
+    end_tag = None
+    total_bytes = 0
+    for chunk in chunks:
+        total_bytes += len(chunk)
+        if total_bytes > max_bytes:
+            yield None
+            return
+        feed_str += chunk
+        if not split_feed:
+            continue
+        if header is None:
+            if feed_str.lstrip().startswith('{'):
+                # json feed
+                items_pos = feed_str.find('"items"')
+                if items_pos == -1:
+                    continue
+                array_pos = feed_str.find('[', items_pos)
+                if array_pos == -1:
+                    continue
+                header = feed_str[:array_pos + 1]
+                feed_str = feed_str[array_pos + 1:]
+            else:
+                item_pos = _feed_item_start(feed_str, 0)
+                if item_pos == -1:
+                    continue
+                header = feed_str[:item_pos]
+                if '<title>#categories</title>' in header:
+                    # hashtag categories need the whole feed
+                    split_feed = False
+                    header = None
+                    continue
+                feed_str = feed_str[item_pos:]
+                end_tag = '</item>'
+                if feed_str.startswith('<entry'):
+                    end_tag = '</entry>'
+        while feed_str:
+            if end_tag is None:
+                # the next item within a json feed
+                feed_str = feed_str.lstrip(', \t\r\n')
+                if not feed_str or feed_str.startswith(']'):
+                    break
+                try:
+                    json_item, end_pos = json_decoder.raw_decode(feed_str)
+                except json.JSONDecodeError:
+                    # wait for the rest of the item
+                    break
+                feed_str = feed_str[end_pos:]
+                yield header + json.dumps(json_item) + ']}'
+                continue
+            end_pos = feed_str.find(end_tag)
+            if end_pos == -1:
+                break
+            end_pos += len(end_tag)
+            yield header + feed_str[:end_pos]
+            item_pos = _feed_item_start(feed_str, end_pos)
+            if item_pos == -1:
+                feed_str = feed_str[end_pos:]
+                break
+            feed_str = feed_str[item_pos:]
+    if header is None and feed_str:
+        yield feed_str
+
+
+def _stream_feed_to_dict(url: str, result, moderated: bool, mirrored: bool,
+                         params: {}, validator: {}) -> {}:
+    """Parses a feed one item at a time as it is downloaded,
+    and stops once enough items have been obtained
+    """
+    max_posts_per_source = params['max_posts_per_source']
+    max_categories_feed_item_size_kb = \
+        params['max_categories_feed_item_size_kb']
+    max_bytes = params['max_feed_size_kb'] * 1024
+    feed_chunks = _feed_response_chunks(result)
+    feed_documents = _feed_item_documents(feed_chunks, max_bytes)
+
+    # read the first items, and if they are the same as the previous
+    # time that the feed was fetched then don't parse them again
+    first_documents = []
+    feed_hash = hashlib.sha256()
+    for feed_doc in feed_documents:
+        first_documents.append(feed_doc)
+        if feed_doc is None:
+            break
+        feed_hash.update(feed_doc.encode('utf-8'))
+        if len(first_documents) >= max_posts_per_source:
+            break
+    feed_hash_str = feed_hash.hexdigest()
+    if validator and validator.get('items') is not None and \
+       validator.get('hash') == feed_hash_str and \
+       None not in first_documents:
+        # the server doesn't support conditional requests
+        # but the feed is the same as last time
+        if params['debug']:
+            print('Newswire feed unchanged ' + url)
+        return _cached_feed_items(params['base_dir'], validator['items'],
+                                  moderated, mirrored,
+                                  params['system_language'])
+
+    items = {}
+    for feed_doc in itertools.chain(first_documents, feed_documents):
+        if feed_doc is None or contains_invalid_chars(feed_doc):
+            print('WARN: feed is too large, ' +
+                  'or contains invalid characters: ' + url)
+            return None
+        feed_items = \
+            _xml_str_to_dict(params['base_dir'], params['domain'],
+                             feed_doc, moderated, mirrored,
+                             max_posts_per_source,
+                             params['max_feed_item_size_kb'],
+                             max_categories_feed_item_size_kb,
+                             params['session'], params['debug'],
+                             params['preferred_podcast_formats'],
+                             params['system_language'])
+        items.update(feed_items)
+        if len(items) >= max_posts_per_source:
+            break
+
+    if validator is not None:
+        validator['etag'] = result.headers.get('ETag')
+        validator['lastModified'] = result.headers.get('Last-Modified')
+        validator['hash'] = feed_hash_str
+        validator['items'] = copy.deepcopy(items)
+    return items
+
+
+def _cached_feed_items(base_dir: str, items: {},
+                       moderated: bool, mirrored: bool,
+                       system_language: str) -> {}:
+    """Returns the items from a previous fetch of a feed, checked again
+    against the current filters, blocked domains and blocked hashtags,
+    and with the current moderation settings for the feed
+    """
+    result = {}
+    for date_str, item in items.items():
+        all_text = item[0] + ' ' + item[4]
+        if is_filtered(base_dir, None, None, all_text, system_language):
+            continue
+        link = item[1]
+        if '://' in link:
+            item_domain = link.split('://')[1]
+            if '/' in item_domain:
+                item_domain = item_domain.split('/')[0]
+            if is_blocked_domain(base_dir, item_domain):
+                continue
+        tag_blocked = False
+        for tag in item[6]:
+            if is_blocked_hashtag(base_dir, tag):
+                tag_blocked = True
+                break
+        if tag_blocked:
+            continue
+        item = copy.deepcopy(item)
+        item[5] = moderated
+        item[7] = mirrored
+        result[date_str] = item
+    return result
+
+
+def _get_rss_conditional(url: str, moderated: bool, mirrored: bool,
+                         params: {}, validator: {}) -> {}:
+    """Returns an RSS url as a dict.
+    If a validator from a previous fetch of the feed is given then a
+    conditional request is made, and if the feed has not changed then
+    the items from the previous fetch are filtered again and returned,
+    without downloading or parsing the feed again
     """
     if not isinstance(url, str):
         print('url: ' + str(url))
         print('ERROR: get_rss url should be a string')
         return None
-    headers = {
+    session = params['session']
+    session_params = {}
+    session_headers = {
         'Accept': 'text/xml, application/xml; charset=UTF-8'
     }
-    params = None
-    session_params = {}
-    session_headers = {}
-    if headers:
-        session_headers = headers
-    if params:
-        session_params = params
     session_headers['User-Agent'] = \
         'Mozilla/5.0 (X11; Linux x86_64; rv:81.0) Gecko/20100101 Firefox/81.0'
+    if validator and validator.get('items') is not None:
+        if validator.get('etag'):
+            session_headers['If-None-Match'] = validator['etag']
+        if validator.get('lastModified'):
+            session_headers['If-Modified-Since'] = validator['lastModified']
     if not session:
         print('WARN: no session specified for get_rss')
     url = _yt_channel_to_atom_feed(url)
@@ -1341,23 +1553,26 @@ def get_rss(base_dir: str, domain: str, session, url: str,
         result = \
             session.get(url, headers=session_headers,
                         params=session_params,
-                        timeout=timeout_sec,
-                        allow_redirects=False)
-        if result:
-            if int(len(result.text) / 1024) < max_feed_size_kb and \
-               not contains_invalid_chars(result.text):
-                return _xml_str_to_dict(base_dir, domain, result.text,
-                                        moderated, mirrored,
-                                        max_posts_per_source,
-                                        max_feed_item_size_kb,
-                                        max_categories_feed_item_size_kb,
-                                        session, debug,
-                                        preferred_podcast_formats,
-                                        system_language)
-            print('WARN: feed is too large, ' +
-                  'or contains invalid characters: ' + url)
-        else:
+                        timeout=params['timeout_sec'],
+                        allow_redirects=False, stream=True)
+        if result is None:
+            print('WARN: no result returned for feed ' + url)
+            return None
+        try:
+            if result.status_code == 304 and \
+               validator and validator.get('items') is not None:
+                if params['debug']:
+                    print('Newswire feed not modified ' + url)
+                return _cached_feed_items(params['base_dir'],
+                                          validator['items'],
+                                          moderated, mirrored,
+                                          params['system_language'])
+            if result:
+                return _stream_feed_to_dict(url, result, moderated, mirrored,
+                                            params, validator)
             print('WARN: no result returned for feed ' + url)
+        finally:
+            result.close()
     except requests.exceptions.RequestException as ex:
         print('WARN: get_rss failed\nurl: ' + str(url) + ', ' +
               'headers: ' + str(session_headers) + ', ' +
@@ -1374,6 +1589,145 @@ def get_rss(base_dir: str, domain: str, session, url: str,
     return None
 
 
+def get_rss(base_dir: str, domain: str, session, url: str,
+            moderated: bool, mirrored: bool,
+            max_posts_per_source: int, max_feed_size_kb: int,
+            max_feed_item_size_kb: int,
+            max_categories_feed_item_size_kb: int, debug: bool,
+            preferred_podcast_formats: [],
+            timeout_sec: int, system_language: str) -> {}:
+    """Returns an RSS url as a dict
+    """
+    params = {
+        'base_dir': base_dir,
+        'domain': domain,
+        'session': session,
+        'max_posts_per_source': max_posts_per_source,
+        'max_feed_size_kb': max_feed_size_kb,
+        'max_feed_item_size_kb': max_feed_item_size_kb,
+        'max_categories_feed_item_size_kb': max_categories_feed_item_size_kb,
+        'debug': debug,
+        'preferred_podcast_formats': preferred_podcast_formats,
+        'timeout_sec': timeout_sec,
+        'system_language': system_language
+    }
+    return _get_rss_conditional(url, moderated, mirrored, params, None)
+
+
+def _newswire_feed_host(url: str) -> str:
+    """Returns the host of a feed url
+    """
+    host = url
+    if '://' in host:
+        host = host.split('://', 1)[1]
+    return host.split('/')[0]
+
+
+def _next_newswire_feed(state: {}) -> ({}, float):
+    """Returns the next feed to be fetched, or None together with
+    the time to wait before trying again.
+    This must be called while holding the condition lock
+    """
+    curr_time = time.time()
+    wait_sec = 1.0
+    for host, host_feeds in state['hosts'].items():
+        if host in state['active_hosts']:
+            continue
+        # don't make requests to the same host too often
+        since_last_sec = curr_time - state['last_fetch'].get(host, 0)
+        if since_last_sec < NEWSWIRE_FETCH_HOST_DELAY_SEC:
+            wait_sec = \
+                min(wait_sec, NEWSWIRE_FETCH_HOST_DELAY_SEC - since_last_sec)
+            continue
+        feed = host_feeds.pop(0)
+        if not host_feeds:
+            del state['hosts'][host]
+        state['active_hosts'].add(host)
+        return feed, 0
+    return None, max(wait_sec, 0.1)
+
+
+def _run_newswire_fetch_worker(state: {}, worker_index: int) -> None:
+    """A worker thread which fetches newswire feeds
+    """
+    params = state['params']
+    if params['debug']:
+        print('DEBUG: newswire fetch worker ' + str(worker_index) +
+              ' started')
+    condition = state['condition']
+    while True:
+        with condition:
+            feed = None
+            while not feed:
+                if not state['hosts']:
+                    return
+                feed, wait_sec = _next_newswire_feed(state)
+                if not feed:
+                    condition.wait(wait_sec)
+            validator = state['validators'].get(feed['key'])
+            if validator is None:
+                validator = {}
+        items = None
+        start_time = time.time()
+        try:
+            items = _get_rss_conditional(feed['url'], feed['moderated'],
+                                         feed['mirrored'], params,
+                                         validator)
+        except Exception as ex:
+            print('ERROR: newswire fetch ' + feed['url'] +
+                  ' failed ' + str(ex))
+        fitness_performance(start_time, params['fitness'],
+                            'NEWSWIRE', 'get_rss', params['debug'])
+        with condition:
+            state['active_hosts'].discard(feed['host'])
+            state['last_fetch'][feed['host']] = time.time()
+            if validator.get('items') is not None:
+                state['validators'][feed['key']] = validator
+            state['results'][feed['key']] = items
+            condition.notify_all()
+
+
+def _fetch_newswire_feeds(feeds: [], validators: {}, params: {}) -> {}:
+    """Fetches newswire feeds concurrently, with no more than one request
+    at a time to any host. Returns the items for each feed
+    """
+    state = {
+        'condition': threading.Condition(),
+        'hosts': {},
+        'active_hosts': set(),
+        'last_fetch': {},
+        'results': {},
+        'validators': validators,
+        'params': params
+    }
+    for feed in feeds:
+        if not state['hosts'].get(feed['host']):
+            state['hosts'][feed['host']] = []
+        state['hosts'][feed['host']].append(feed)
+    no_of_workers = min(NEWSWIRE_FETCH_WORKERS, len(state['hosts']))
+    workers = []
+    for worker_index in range(no_of_workers):
+        thr = thread_with_trace(target=_run_newswire_fetch_worker,
+                                args=(state, worker_index), daemon=True)
+        workers.append(thr)
+        begin_thread(thr, '_fetch_newswire_feeds')
+    for thr in workers:
+        thr.join()
+    return state['results']
+
+
+def _load_newswire_validators(base_dir: str) -> {}:
+    """Returns the validators from the previous fetch of each feed
+    """
+    validators_filename = base_dir + '/accounts/.newswire_validators.json'
+    validators = None
+    if os.path.isfile(validators_filename):
+        validators = load_json(validators_filename)
+    if not isinstance(validators, dict):
+        return {}
+    return validators
+
+
 def get_rs_sfrom_dict(base_dir: str, newswire: {},
                       http_prefix: str, domain_full: str,
                       title: str, translate: {}) -> str:
@@ -1479,63 +1833,51 @@ def _add_account_blogs_to_newswire(base_dir: str, nickname: str, domain: str,
     if os.path.isfile(moderated_filename):
         moderated = True
 
-    with open(index_filename, 'r', encoding='utf-8') as index_file:
-        post_filename = 'start'
-        ctr = 0
-        while post_filename:
-            post_filename = index_file.readline()
-            if post_filename:
-                # if this is a full path then remove the directories
-                if '/' in post_filename:
-                    post_filename = post_filename.split('/')[-1]
-
-                # filename of the post without any extension or path
-                # This should also correspond to any index entry in
-                # the posts cache
-                post_url = remove_eol(post_filename)
-                post_url = post_url.replace('.json', '').strip()
-
-                # read the post from file
-                full_post_filename = \
-                    locate_post(base_dir, nickname,
-                                domain, post_url, False)
-                if not full_post_filename:
-                    print('Unable to locate post for newswire ' + post_url)
-                    ctr += 1
-                    if ctr >= max_blogs_per_account:
-                        break
-                    continue
-
-                post_json_object = None
-                if full_post_filename:
-                    post_json_object = load_json(full_post_filename)
-                if _is_newswire_blog_post(post_json_object):
-                    published = post_json_object['object']['published']
-                    published = published.replace('T', ' ')
-                    published = published.replace('Z', '+00:00')
-                    votes = []
-                    if os.path.isfile(full_post_filename + '.votes'):
-                        votes = load_json(full_post_filename + '.votes')
-                    content = \
-                        get_base_content_from_post(post_json_object,
-                                                   system_language)
-                    description = first_paragraph_from_string(content)
-                    description = remove_html(description)
-                    tags_from_post = _get_hashtags_from_post(post_json_object)
-                    summary = post_json_object['object']['summary']
-                    _add_newswire_dict_entry(base_dir, domain,
-                                             newswire, published,
-                                             summary,
-                                             post_json_object['object']['url'],
-                                             votes, full_post_filename,
-                                             description, moderated, False,
-                                             tags_from_post,
-                                             max_tags, session, debug,
-                                             None, system_language)
-
-            ctr += 1
-            if ctr >= max_blogs_per_account:
-                break
+    blog_entries = \
+        box_index_page(index_filename, 0, max_blogs_per_account)
+    for post_filename in blog_entries:
+        # if this is a full path then remove the directories
+        if '/' in post_filename:
+            post_filename = post_filename.split('/')[-1]
+
+        # filename of the post without any extension or path
+        # This should also correspond to any index entry in
+        # the posts cache
+        post_url = remove_eol(post_filename)
+        post_url = post_url.replace('.json', '').strip()
+
+        # read the post from file
+        full_post_filename = \
+            locate_post(base_dir, nickname,
+                        domain, post_url, False)
+        if not full_post_filename:
+            print('Unable to locate post for newswire ' + post_url)
+            continue
+
+        post_json_object = load_json(full_post_filename)
+        if _is_newswire_blog_post(post_json_object):
+            published = post_json_object['object']['published']
+            published = published.replace('T', ' ')
+            published = published.replace('Z', '+00:00')
+            votes = []
+            if os.path.isfile(full_post_filename + '.votes'):
+                votes = load_json(full_post_filename + '.votes')
+            content = \
+                get_base_content_from_post(post_json_object,
+                                           system_language)
+            description = first_paragraph_from_string(content)
+            description = remove_html(description)
+            tags_from_post = _get_hashtags_from_post(post_json_object)
+            summary = post_json_object['object']['summary']
+            _add_newswire_dict_entry(base_dir, domain,
+                                     newswire, published,
+                                     summary,
+                                     post_json_object['object']['url'],
+                                     votes, full_post_filename,
+                                     description, moderated, False,
+                                     tags_from_post,
+                                     max_tags, session, debug,
+                                     None, system_language)
 
 
 def _add_blogs_to_newswire(base_dir: str, domain: str, newswire: {},
@@ -1599,7 +1941,7 @@ def get_dict_from_newswire(session, base_dir: str, domain: str,
                            max_categories_feed_item_size_kb: int,
                            system_language: str, debug: bool,
                            preferred_podcast_formats: [],
-                           timeout_sec: int) -> {}:
+                           timeout_sec: int, fitness: {}) -> {}:
     """Gets rss feeds as a dictionary from newswire file
     """
     subscriptions_filename = base_dir + '/accounts/newswire.txt'
@@ -1613,8 +1955,10 @@ def get_dict_from_newswire(session, base_dir: str, domain: str,
     with open(subscriptions_filename, 'r', encoding='utf-8') as fp_sub:
         rss_feed = fp_sub.readlines()
     result = {}
+    feeds = []
     for url in rss_feed:
         url = url.strip()
+        feed_key = url
 
         # Does this contain a url?
         if '://' not in url:
@@ -1636,17 +1980,43 @@ def get_dict_from_newswire(session, base_dir: str, domain: str,
             mirrored = True
             url = url.replace('!', '').strip()
 
-        items_list = get_rss(base_dir, domain, session, url,
-                             moderated, mirrored,
-                             max_posts_per_source, max_feed_size_kb,
-                             max_feed_item_size_kb,
-                             max_categories_feed_item_size_kb, debug,
-                             preferred_podcast_formats,
-                             timeout_sec, system_language)
+        feeds.append({
+            'key': feed_key,
+            'url': url,
+            'host': _newswire_feed_host(url),
+            'moderated': moderated,
+            'mirrored': mirrored
+        })
+
+    # fetch the feeds, using the validators from the previous fetch
+    # so that unchanged feeds are not downloaded again
+    fetch_params = {
+        'base_dir': base_dir,
+        'domain': domain,
+        'session': session,
+        'max_posts_per_source': max_posts_per_source,
+        'max_feed_size_kb': max_feed_size_kb,
+        'max_feed_item_size_kb': max_feed_item_size_kb,
+        'max_categories_feed_item_size_kb': max_categories_feed_item_size_kb,
+        'debug': debug,
+        'preferred_podcast_formats': preferred_podcast_formats,
+        'timeout_sec': timeout_sec,
+        'system_language': system_language,
+        'fitness': fitness
+    }
+    prev_validators = _load_newswire_validators(base_dir)
+    validators = {}
+    for feed in feeds:
+        if prev_validators.get(feed['key']):
+            validators[feed['key']] = prev_validators[feed['key']]
+    feed_results = _fetch_newswire_feeds(feeds, validators, fetch_params)
+    for feed in feeds:
+        items_list = feed_results.get(feed['key'])
         if items_list:
             for date_str, item in items_list.items():
                 result[date_str] = item
-        time.sleep(4)
+    if validators or prev_validators:
+        save_json(validators, base_dir + '/accounts/.newswire_validators.json')
 
     # add blogs from each user account
     _add_blogs_to_newswire(base_dir, domain, result,
@@ -61,6 +61,8 @@ from utils import has_users_path
 from utils import get_image_extensions
 from utils import is_image_file
 from utils import acct_dir
+from accountsettings import get_account_settings
+from accountsettings import account_settings_changed
 from utils import get_user_paths
 from utils import get_group_paths
 from utils import local_actor_url
@@ -74,6 +76,8 @@ from cache import get_person_from_cache
 from cache import store_person_in_cache
 from filters import is_filtered_bio
 from follow import is_following_actor
+from actorstore import actor_store_locate
+from actorstore import actor_store_save
 
 
 def generate_rsa_key() -> (str, str):
@@ -520,9 +524,7 @@ def _create_person_base(base_dir: str, nickname: str, domain: str, port: int,
             os.mkdir(base_dir + '/cache')
         if not os.path.isdir(base_dir + '/cache/actors'):
             os.mkdir(base_dir + '/cache/actors')
-        cache_filename = base_dir + '/cache/actors/' + \
-            new_person['id'].replace('/', '#') + '.json'
-        save_json(new_person, cache_filename)
+        actor_store_save(base_dir, new_person['id'], new_person)
 
         # save the private key
         private_keys_subdir = '/keys/private'
@@ -887,19 +889,13 @@ def person_upgrade_actor(base_dir: str, person_json: {},
         save_json(person_json, filename)
 
         # also update the actor within the cache
-        actor_cache_filename = \
-            base_dir + '/accounts/cache/actors/' + \
-            person_json['id'].replace('/', '#') + '.json'
-        if os.path.isfile(actor_cache_filename):
-            save_json(person_json, actor_cache_filename)
+        if actor_store_locate(base_dir, person_json['id']):
+            actor_store_save(base_dir, person_json['id'], person_json)
 
         # update domain/@nickname in actors cache
-        actor_cache_filename = \
-            base_dir + '/accounts/cache/actors/' + \
-            replace_users_with_at(person_json['id']).replace('/', '#') + \
-            '.json'
-        if os.path.isfile(actor_cache_filename):
-            save_json(person_json, actor_cache_filename)
+        actor_at_url = replace_users_with_at(person_json['id'])
+        if actor_store_locate(base_dir, actor_at_url):
+            actor_store_save(base_dir, actor_at_url, person_json)
 
 
 def add_alternate_domains(actor_json: {}, domain: str,
@@ -1394,7 +1390,10 @@ def is_person_snoozed(base_dir: str, nickname: str, domain: str,
                       snooze_actor: str) -> bool:
     """Returns true if the given actor is snoozed
     """
-    snoozed_filename = acct_dir(base_dir, nickname, domain) + '/snoozed.txt'
+    account_dir = acct_dir(base_dir, nickname, domain)
+    if snooze_actor not in get_account_settings(account_dir)['snoozed']:
+        return False
+    snoozed_filename = account_dir + '/snoozed.txt'
     if not os.path.isfile(snoozed_filename):
         return False
     if not text_in_file(snooze_actor + ' ', snoozed_filename):
@@ -1421,13 +1420,14 @@ def is_person_snoozed(base_dir: str, nickname: str, domain: str,
         content = None
         with open(snoozed_filename, 'r', encoding='utf-8') as snoozed_file:
             content = snoozed_file.read().replace(replace_str, '')
-        if content:
+        if content is not None:
             try:
                 with open(snoozed_filename, 'w+',
                           encoding='utf-8') as snoozfile:
                     snoozfile.write(content)
             except OSError:
                 print('EX: unable to write ' + snoozed_filename)
+            account_settings_changed(account_dir)
 
     if text_in_file(snooze_actor + ' ', snoozed_filename):
         return True
@@ -1452,6 +1452,7 @@ def person_snooze(base_dir: str, nickname: str, domain: str,
                                str(int(time.time())) + '\n')
     except OSError:
         print('EX: unable to append ' + snoozed_filename)
+    account_settings_changed(account_dir)
 
 
 def person_unsnooze(base_dir: str, nickname: str, domain: str,
@@ -1477,13 +1478,14 @@ def person_unsnooze(base_dir: str, nickname: str, domain: str,
         content = None
         with open(snoozed_filename, 'r', encoding='utf-8') as snoozed_file:
             content = snoozed_file.read().replace(replace_str, '')
-        if content:
+        if content is not None:
             try:
                 with open(snoozed_filename, 'w+',
                           encoding='utf-8') as snoozfile:
                     snoozfile.write(content)
             except OSError:
                 print('EX: unable to write ' + snoozed_filename)
+            account_settings_changed(account_dir)
 
 
 def set_person_notes(base_dir: str, nickname: str, domain: str,
@@ -0,0 +1,216 @@
+__filename__ = "posthtmlcache.py"
+__author__ = "Bob Mottram"
+__license__ = "AGPL3+"
+__version__ = "1.4.0"
+__maintainer__ = "Bob Mottram"
+__email__ = "bob@libreserver.org"
+__status__ = "Production"
+__module_group__ = "Timeline"
+
+# Cache of the html for posts, shared by all accounts on the instance.
+# Rendered posts are stored once within cache/posthtml/v<version>/<shard>/
+# rather than once for every account which has the post within its
+# timeline, and the details specific to the account viewing the post,
+# such as its nickname and page number, are substituted when the post
+# is shown. Icons which depend upon the account, such as whether it
+# has liked or bookmarked the post or can delete it, are stored as
+# placeholders and added for each account. Cached html begins with a
+# marker for the settings of the account which rendered it, such as its
+# timezone, and is only shown to accounts having the same settings.
+# Posts muted by an account are never cached. The version changes
+# whenever the way that posts are rendered changes, so that html from a
+# previous version is never shown.
+# Each cached post depends upon its own id, the actor who sent it, its
+# author and any post which it announces. A map from each dependency to
+# the cached posts which depend upon it is kept in memory, so that when
+# a post is edited, liked or reacted to, or an actor is updated, only
+# the html for the posts affected needs to be removed. Because the map
+# is not kept after a restart, html cached before then is never shown
+# and is removed when it is next loaded.
+
+import os
+import time
+import shutil
+import hashlib
+import threading
+
+# changes whenever the html of a post is rendered differently
+POST_HTML_CACHE_VERSION = 3
+
+_POST_HTML_CACHE = {
+    'lock': threading.Lock(),
+    # dependency -> set of ids of cached posts
+    'depends': {},
+    # id of cached post -> list of its dependencies
+    'posts': {}
+}
+
+
+def _post_html_cache_key(post_id: str) -> str:
+    """Returns the key used for a post or actor within the cache
+    """
+    return post_id.replace('/', '#')
+
+
+def _post_html_cache_root(base_dir: str) -> str:
+    """Returns the directory containing cached html for all versions
+    """
+    return base_dir + '/cache/posthtml'
+
+
+def post_html_cache_filename(base_dir: str, post_id: str) -> str:
+    """Returns the filename used to store the html for a post
+    """
+    post_key = _post_html_cache_key(post_id)
+    shard = hashlib.sha1(post_key.encode('utf-8')).hexdigest()[:2]
+    return _post_html_cache_root(base_dir) + \
+        '/v' + str(POST_HTML_CACHE_VERSION) + '/' + shard + '/' + \
+        post_key + '.html'
+
+
+def _post_html_cache_register(post_key: str, dependencies: []) -> None:
+    """Records the dependencies of a cached post
+    """
+    dependency_keys = [post_key]
+    for dependency in dependencies:
+        if not dependency:
+            continue
+        dependency_key = _post_html_cache_key(dependency)
+        if dependency_key not in dependency_keys:
+            dependency_keys.append(dependency_key)
+    with _POST_HTML_CACHE['lock']:
+        if _POST_HTML_CACHE['posts'].get(post_key) == dependency_keys:
+            return
+        _post_html_cache_unregister(post_key)
+        _POST_HTML_CACHE['posts'][post_key] = dependency_keys
+        for dependency_key in dependency_keys:
+            _POST_HTML_CACHE['depends'].setdefault(dependency_key,
+                                                   set()).add(post_key)
+
+
+def _post_html_cache_unregister(post_key: str) -> None:
+    """Forgets the dependencies of a cached post.
+    This must be called while holding the lock
+    """
+    dependency_keys = _POST_HTML_CACHE['posts'].pop(post_key, None)
+    if not dependency_keys:
+        return
+    for dependency_key in dependency_keys:
+        post_keys = _POST_HTML_CACHE['depends'].get(dependency_key)
+        if post_keys is None:
+            continue
+        post_keys.discard(post_key)
+        if not post_keys:
+            del _POST_HTML_CACHE['depends'][dependency_key]
+
+
+def post_html_cache_save(base_dir: str, post_id: str, post_html: str,
+                         dependencies: []) -> bool:
+    """Saves the html for a post, together with the posts and actors
+    which it depends upon
+    """
+    cached_filename = post_html_cache_filename(base_dir, post_id)
+    try:
+        shard_dir = os.path.dirname(cached_filename)
+        if not os.path.isdir(shard_dir):
+            os.makedirs(shard_dir, exist_ok=True)
+        with open(cached_filename, 'w+', encoding='utf-8') as fp_cache:
+            fp_cache.write(post_html)
+    except OSError as ex:
+        print('EX: post_html_cache_save unable to save ' +
+              cached_filename + ' ' + str(ex))
+        return False
+    post_key = _post_html_cache_key(post_id)
+    _post_html_cache_register(post_key, dependencies)
+    return True
+
+
+def post_html_cache_load(base_dir: str, post_id: str) -> str:
+    """Returns the cached html for a post, or an empty string
+    """
+    cached_filename = post_html_cache_filename(base_dir, post_id)
+    post_key = _post_html_cache_key(post_id)
+    with _POST_HTML_CACHE['lock']:
+        dependencies_known = post_key in _POST_HTML_CACHE['posts']
+    if not dependencies_known:
+        # cached before a restart, so it may not have been removed
+        # when the posts or actors which it depends upon changed
+        if os.path.isfile(cached_filename):
+            try:
+                os.remove(cached_filename)
+            except OSError:
+                print('EX: post_html_cache_load unable to delete ' +
+                      cached_filename)
+        return ''
+    try:
+        with open(cached_filename, 'r', encoding='utf-8') as fp_cache:
+            post_html = fp_cache.read()
+    except FileNotFoundError:
+        return ''
+    except OSError as ex:
+        print('EX: post_html_cache_load unable to read ' +
+              cached_filename + ' ' + str(ex))
+        return ''
+    return post_html
+
+
+def post_html_cache_invalidate(base_dir: str, dependency: str) -> []:
+    """Removes the cached html for a post, and for any posts which
+    depend upon the given post or actor.
+    Returns the ids of the posts removed, in the form used by
+    the recent posts cache
+    """
+    dependency_key = _post_html_cache_key(dependency)
+    with _POST_HTML_CACHE['lock']:
+        post_keys = set(_POST_HTML_CACHE['depends'].get(dependency_key, ()))
+        post_keys.add(dependency_key)
+        for post_key in post_keys:
+            _post_html_cache_unregister(post_key)
+    removed = []
+    for post_key in post_keys:
+        cached_filename = post_html_cache_filename(base_dir, post_key)
+        removed.append(post_key)
+        if not os.path.isfile(cached_filename):
+            continue
+        try:
+            os.remove(cached_filename)
+        except OSError:
+            print('EX: post_html_cache_invalidate unable to delete ' +
+                  cached_filename)
+    return removed
+
+
+def expire_post_html_cache(base_dir: str, max_age_days: int) -> int:
+    """Removes html for posts which was cached more than the given
+    number of days ago, and html cached by previous versions.
+    Returns the number of cached posts removed
+    """
+    cache_root = _post_html_cache_root(base_dir)
+    if not os.path.isdir(cache_root):
+        return 0
+    curr_version_dir = 'v' + str(POST_HTML_CACHE_VERSION)
+    for entry in os.scandir(cache_root):
+        if entry.name == curr_version_dir or not entry.is_dir():
+            continue
+        shutil.rmtree(entry.path, ignore_errors=True)
+    version_dir = cache_root + '/' + curr_version_dir
+    if not os.path.isdir(version_dir):
+        return 0
+    oldest_time = time.time() - max_age_days * 24 * 60 * 60
+    expired_post_count = 0
+    for shard_entry in os.scandir(version_dir):
+        if not shard_entry.is_dir():
+            continue
+        for entry in os.scandir(shard_entry.path):
+            if entry.stat().st_mtime >= oldest_time:
+                continue
+            try:
+                os.remove(entry.path)
+            except OSError:
+                print('EX: expire_post_html_cache unable to delete ' +
+                      entry.path)
+                continue
+            with _POST_HTML_CACHE['lock']:
+                _post_html_cache_unregister(entry.name[:-len('.html')])
+            expired_post_count += 1
+    return expired_post_count
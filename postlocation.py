@@ -0,0 +1,287 @@
+__filename__ = "postlocation.py"
+__author__ = "Bob Mottram"
+__license__ = "AGPL3+"
+__version__ = "1.4.0"
+__maintainer__ = "Bob Mottram"
+__email__ = "bob@libreserver.org"
+__status__ = "Production"
+__module_group__ = "Timeline"
+
+# Index of which box each post of an account is stored within, so that
+# a post can be located without checking for its file in every box.
+# The index is a hash table on disk, stored within the postlocations
+# directory of the account, with each bucket being a small text file
+# containing lines of the form "post_id box_name". The most recently
+# used locations are also held in memory, together with a small number
+# of posts which were recently looked for and not found in any box, so
+# that repeated requests for unknown posts don't check every box again.
+# A post is no longer considered to be missing once it has been saved,
+# or after a short time, in case it was moved into a box without
+# being saved.
+
+import os
+import time
+import zlib
+import threading
+from collections import OrderedDict
+
+# boxes of an account which are included in the index
+POST_LOCATION_BOXES = ('inbox', 'outbox', 'tlblogs')
+
+# number of buckets within the hash table on disk
+POST_LOCATION_BUCKETS = 4096
+
+# maximum number of locations held in memory
+POST_LOCATION_CACHE_SIZE = 8192
+
+# maximum number of missing posts held in memory
+POST_LOCATION_MISSING_SIZE = 1024
+
+# time after which a post is looked for again
+POST_LOCATION_MISSING_SEC = 60
+
+_POST_LOCATIONS = {
+    'lock': threading.Lock(),
+    'cache': OrderedDict(),
+    # post filename -> {account directory: time when it was not found}
+    'missing': OrderedDict(),
+    # held while the buckets on disk are being changed
+    'bucket_lock': threading.Lock()
+}
+
+
+def _post_location_dir(account_dir: str) -> str:
+    """Returns the directory containing the index for an account
+    """
+    return account_dir.rstrip('/') + '/postlocations'
+
+
+def _post_location_bucket(account_dir: str, post_id: str) -> str:
+    """Returns the filename of the bucket for the given post
+    """
+    bucket = zlib.crc32(post_id.encode('utf-8')) % POST_LOCATION_BUCKETS
+    return _post_location_dir(account_dir) + '/' + format(bucket, '03x')
+
+
+def _post_location_key(account_dir: str, post_id: str) -> str:
+    """Returns the key used for the in memory cache
+    """
+    return account_dir.rstrip('/') + '/' + post_id
+
+
+def _post_location_remember(key: str, box_name: str) -> None:
+    """Adds a location to the in memory cache, removing the least
+    recently used if the cache is full
+    """
+    with _POST_LOCATIONS['lock']:
+        cache = _POST_LOCATIONS['cache']
+        cache[key] = box_name
+        cache.move_to_end(key)
+        while len(cache) > POST_LOCATION_CACHE_SIZE:
+            cache.popitem(last=False)
+
+
+def _post_location_read_bucket(bucket_filename: str) -> {}:
+    """Returns the locations within a bucket
+    """
+    locations = {}
+    try:
+        with open(bucket_filename, 'r', encoding='utf-8') as fp_bucket:
+            for line in fp_bucket:
+                if ' ' not in line:
+                    continue
+                post_id, box_name = line.strip().split(' ', 1)
+                locations[post_id] = box_name
+    except OSError:
+        pass
+    return locations
+
+
+def _post_location_write_bucket(bucket_filename: str,
+                                locations: {}) -> None:
+    """Saves the locations within a bucket
+    """
+    if not locations:
+        try:
+            os.remove(bucket_filename)
+        except OSError:
+            print('EX: unable to remove post location bucket ' +
+                  bucket_filename)
+        return
+    bucket_str = ''
+    for post_id, box_name in locations.items():
+        bucket_str += post_id + ' ' + box_name + '\n'
+    try:
+        with open(bucket_filename, 'w+', encoding='utf-8') as fp_bucket:
+            fp_bucket.write(bucket_str)
+    except OSError:
+        print('EX: unable to write post location bucket ' + bucket_filename)
+
+
+def is_post_missing(account_dir: str, post_filename: str) -> bool:
+    """Returns true if the given post was recently looked for
+    and was not found
+    """
+    with _POST_LOCATIONS['lock']:
+        accounts = _POST_LOCATIONS['missing'].get(post_filename)
+        if not accounts:
+            return False
+        missing_time = accounts.get(account_dir)
+        if missing_time is None:
+            return False
+        if time.time() - missing_time < POST_LOCATION_MISSING_SEC:
+            return True
+        del accounts[account_dir]
+        if not accounts:
+            del _POST_LOCATIONS['missing'][post_filename]
+    return False
+
+
+def add_missing_post(account_dir: str, post_filename: str) -> None:
+    """Records that the given post was not found, removing the least
+    recently missed if there are too many
+    """
+    with _POST_LOCATIONS['lock']:
+        missing = _POST_LOCATIONS['missing']
+        missing.setdefault(post_filename, {})[account_dir] = time.time()
+        missing.move_to_end(post_filename)
+        while len(missing) > POST_LOCATION_MISSING_SIZE:
+            missing.popitem(last=False)
+
+
+def remove_missing_post(post_filename: str) -> None:
+    """Called when a post is saved, so that it is no longer
+    considered to be missing by any account
+    """
+    with _POST_LOCATIONS['lock']:
+        _POST_LOCATIONS['missing'].pop(post_filename, None)
+
+
+def get_post_location(account_dir: str, post_id: str) -> str:
+    """Returns the box within which the given post is stored,
+    or None if it is not within the index
+    """
+    key = _post_location_key(account_dir, post_id)
+    with _POST_LOCATIONS['lock']:
+        cache = _POST_LOCATIONS['cache']
+        box_name = cache.get(key)
+        if box_name:
+            cache.move_to_end(key)
+            return box_name
+    bucket_filename = _post_location_bucket(account_dir, post_id)
+    if not os.path.isfile(bucket_filename):
+        return None
+    box_name = _post_location_read_bucket(bucket_filename).get(post_id)
+    if box_name:
+        _post_location_remember(key, box_name)
+    return box_name
+
+
+def add_post_location(account_dir: str, post_id: str,
+                      box_name: str) -> None:
+    """Records the box within which a post is stored
+    """
+    if box_name not in POST_LOCATION_BOXES:
+        return
+    remove_missing_post(post_id + '.json')
+    key = _post_location_key(account_dir, post_id)
+    with _POST_LOCATIONS['lock']:
+        if _POST_LOCATIONS['cache'].get(key) == box_name:
+            return
+    location_dir = _post_location_dir(account_dir)
+    bucket_filename = _post_location_bucket(account_dir, post_id)
+    with _POST_LOCATIONS['bucket_lock']:
+        if not os.path.isdir(location_dir):
+            try:
+                os.mkdir(location_dir)
+            except OSError:
+                print('EX: unable to create post locations ' + location_dir)
+                return
+        locations = _post_location_read_bucket(bucket_filename)
+        if locations.get(post_id) != box_name:
+            if not locations.get(post_id):
+                try:
+                    with open(bucket_filename, 'a+',
+                              encoding='utf-8') as fp_bucket:
+                        fp_bucket.write(post_id + ' ' + box_name + '\n')
+                except OSError:
+                    print('EX: unable to append post location ' +
+                          bucket_filename)
+                    return
+            else:
+                locations[post_id] = box_name
+                _post_location_write_bucket(bucket_filename, locations)
+    _post_location_remember(key, box_name)
+
+
+def remove_post_location(account_dir: str, post_id: str) -> None:
+    """Removes a post from the index
+    """
+    key = _post_location_key(account_dir, post_id)
+    with _POST_LOCATIONS['lock']:
+        cache = _POST_LOCATIONS['cache']
+        if key in cache:
+            del cache[key]
+    bucket_filename = _post_location_bucket(account_dir, post_id)
+    with _POST_LOCATIONS['bucket_lock']:
+        if not os.path.isfile(bucket_filename):
+            return
+        locations = _post_location_read_bucket(bucket_filename)
+        if post_id not in locations:
+            return
+        del locations[post_id]
+        _post_location_write_bucket(bucket_filename, locations)
+
+
+def rebuild_post_locations(account_dir: str) -> int:
+    """Recreates the index for an account from the posts within its
+    boxes. Returns the number of posts indexed
+    """
+    account_dir = account_dir.rstrip('/')
+    buckets = {}
+    ctr = 0
+    for box_name in POST_LOCATION_BOXES:
+        box_dir = account_dir + '/' + box_name
+        if not os.path.isdir(box_dir):
+            continue
+        for _, _, files in os.walk(box_dir):
+            for post_filename in files:
+                if not post_filename.endswith('.json'):
+                    continue
+                post_id = post_filename[:-len('.json')]
+                bucket_filename = \
+                    _post_location_bucket(account_dir, post_id)
+                if not buckets.get(bucket_filename):
+                    buckets[bucket_filename] = {}
+                buckets[bucket_filename][post_id] = box_name
+                ctr += 1
+            break
+
+    location_dir = _post_location_dir(account_dir)
+    with _POST_LOCATIONS['bucket_lock']:
+        if os.path.isdir(location_dir):
+            for _, _, files in os.walk(location_dir):
+                for bucket_filename in files:
+                    try:
+                        os.remove(location_dir + '/' + bucket_filename)
+                    except OSError:
+                        print('EX: unable to remove post location bucket ' +
+                              bucket_filename)
+                break
+        else:
+            try:
+                os.mkdir(location_dir)
+            except OSError:
+                print('EX: unable to create post locations ' + location_dir)
+                return 0
+        for bucket_filename, locations in buckets.items():
+            _post_location_write_bucket(bucket_filename, locations)
+
+    # forget any locations for this account held in memory
+    prefix = account_dir + '/'
+    with _POST_LOCATIONS['lock']:
+        cache = _POST_LOCATIONS['cache']
+        for key in list(cache.keys()):
+            if key.startswith(prefix):
+                del cache[key]
+    return ctr
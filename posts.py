@@ -19,6 +19,19 @@ from time import gmtime, strftime
 from collections import OrderedDict
 from threads import thread_with_trace
 from threads import begin_thread
+from threads import thread_sleep
+from threads import check_thread_cancelled
+from delivery import queue_delivery
+from boxindex import box_index_count
+from postlocation import add_post_location
+from posthtmlcache import post_html_cache_filename
+from posthtmlcache import expire_post_html_cache
+from searchindex import add_post_to_search_index
+from searchindex import remove_post_from_search_index
+from boxindex import box_index_page
+from boxindex import box_index_truncate
+from boxindex import box_index_create
+from hashtagstats import hashtag_stats_add
 from cache import store_person_in_cache
 from cache import get_person_from_cache
 from cache import expire_person_cache
@@ -29,11 +42,11 @@ from session import post_json
 from session import post_json_string
 from session import post_image
 from webfinger import webfinger_handle
-from httpsig import create_signed_header
 from siteactive import site_is_active
 from languages import understood_post_language
 from utils import contains_invalid_actor_url_chars
 from utils import acct_handle_dir
+from scheduler import scheduler_add
 from utils import is_dm
 from utils import remove_eol
 from utils import text_in_file
@@ -78,6 +91,7 @@ from utils import remove_html
 from utils import dangerous_markup
 from utils import acct_dir
 from utils import local_actor_url
+from utils import get_from_recent_posts_cache
 from media import get_music_metadata
 from media import attach_media
 from media import replace_you_tube
@@ -935,9 +949,22 @@ def save_post_to_box(base_dir: str, http_prefix: str, post_id: str,
         post_json_object['object']['atomUri'] = post_id
 
     box_dir = create_person_dir(nickname, domain, base_dir, boxname)
-    filename = box_dir + '/' + post_id.replace('/', '#') + '.json'
+    post_filename_id = post_id.replace('/', '#')
+    filename = box_dir + '/' + post_filename_id + '.json'
+    account_dir = acct_dir(base_dir, nickname, domain)
+
+    # if the post is being edited then remove the previous
+    # version from the search index
+    if os.path.isfile(filename):
+        prev_post_json = load_json(filename)
+        if prev_post_json:
+            remove_post_from_search_index(account_dir, post_filename_id,
+                                          prev_post_json, True)
 
     save_json(post_json_object, filename)
+    add_post_location(account_dir, post_filename_id, boxname)
+    add_post_to_search_index(account_dir, boxname,
+                             post_filename_id, post_json_object)
     # if this is an outbox post with a duplicate in the inbox then save to both
     # This happens for edited posts
     if '/outbox/' in filename:
@@ -994,6 +1021,8 @@ def _update_hashtags_index(base_dir: str, tag: {}, new_post_id: str,
         except OSError:
             print('EX: _update_hashtags_index unable to write tags file ' +
                   tags_filename)
+            return
+        hashtag_stats_add(base_dir, tag_name[1:], days_since_epoch, 1)
     else:
         # prepend to tags index file
         if not text_in_file(new_post_id, tags_filename):
@@ -1009,6 +1038,8 @@ def _update_hashtags_index(base_dir: str, tag: {}, new_post_id: str,
                     if tag_line not in content:
                         tags_file.seek(0, 0)
                         tags_file.write(tag_line + content)
+                        hashtag_stats_add(base_dir, tag_name[1:],
+                                          days_since_epoch, 1)
             except OSError as ex:
                 print('EX: Failed to write entry to tags file ' +
                       tags_filename + ' ' + str(ex))
@@ -1044,6 +1075,8 @@ def _add_schedule_post(base_dir: str, nickname: str, domain: str,
         except OSError as ex:
             print('EX: Failed to write entry to scheduled posts index2 ' +
                   schedule_index_filename + ' ' + str(ex))
+    # wake the scheduled posts thread, which finds when this post is due
+    scheduler_add('scheduledPosts', handle, time.time())
 
 
 def valid_content_warning(cw: str) -> str:
@@ -1926,15 +1959,10 @@ def regenerate_index_for_box(base_dir: str,
 
     index_lines.sort(reverse=True)
 
-    result = ''
-    try:
-        with open(box_index_filename, 'w+', encoding='utf-8') as fp_box:
-            for line in index_lines:
-                result += line + '\n'
-                fp_box.write(line + '\n')
-    except OSError:
-        print('EX: unable to generate index for ' + box_name + ' ' + result)
-    print('Index generated for ' + box_name + '\n' + result)
+    if not box_index_create(box_index_filename, index_lines):
+        print('EX: unable to generate index for ' + box_name)
+        return
+    print('Index generated for ' + box_name + '\n' + '\n'.join(index_lines))
 
 
 def create_public_post(base_dir: str,
@@ -2432,98 +2460,6 @@ def create_report_post(base_dir: str,
     return post_json_object
 
 
-def thread_send_post(session, post_json_str: str, federation_list: [],
-                     inbox_url: str, base_dir: str,
-                     signature_header_json: {},
-                     signature_header_json_ld: {},
-                     post_log: [], debug: bool,
-                     http_prefix: str, domain_full: str) -> None:
-    """Sends a with retries
-    """
-    tries = 0
-    send_interval_sec = 30
-    for _ in range(20):
-        post_result = None
-        unauthorized = False
-        if debug:
-            print('Getting post_json_string for ' + inbox_url)
-        try:
-            post_result, unauthorized, return_code = \
-                post_json_string(session, post_json_str, federation_list,
-                                 inbox_url, signature_header_json,
-                                 debug, http_prefix, domain_full)
-            if return_code in range(500, 600):
-                # if an instance is returning a code which indicates that
-                # it might have a runtime error, like 503, then don't
-                # continue to post to it
-                break
-            if debug:
-                print('Obtained post_json_string for ' + inbox_url +
-                      ' unauthorized: ' + str(unauthorized))
-        except Exception as ex:
-            print('ERROR: post_json_string failed ' + str(ex))
-
-        if unauthorized:
-            # try again with application/ld+json header
-            post_result = None
-            unauthorized = False
-            if debug:
-                print('Getting ld post_json_string for ' + inbox_url)
-            try:
-                post_result, unauthorized, return_code = \
-                    post_json_string(session, post_json_str, federation_list,
-                                     inbox_url, signature_header_json_ld,
-                                     debug, http_prefix, domain_full)
-                if return_code in range(500, 600):
-                    # if an instance is returning a code which indicates that
-                    # it might have a runtime error, like 503, then don't
-                    # continue to post to it
-                    break
-                if debug:
-                    print('Obtained ld post_json_string for ' + inbox_url +
-                          ' unauthorized: ' + str(unauthorized))
-            except Exception as ex:
-                print('ERROR: ld post_json_string failed ' + str(ex))
-
-        if unauthorized:
-            print('WARN: thread_send_post: Post is unauthorized ' +
-                  inbox_url + ' ' + post_json_str)
-            break
-        if post_result:
-            log_str = 'Success on try ' + str(tries) + ': ' + post_json_str
-        else:
-            log_str = 'Retry ' + str(tries) + ': ' + post_json_str
-        post_log.append(log_str)
-        # keep the length of the log finite
-        # Don't accumulate massive files on systems with limited resources
-        while len(post_log) > 16:
-            post_log.pop(0)
-        if debug:
-            # save the log file
-            post_log_filename = base_dir + '/post.log'
-            if os.path.isfile(post_log_filename):
-                with open(post_log_filename, 'a+',
-                          encoding='utf-8') as log_file:
-                    log_file.write(log_str + '\n')
-            else:
-                with open(post_log_filename, 'w+',
-                          encoding='utf-8') as log_file:
-                    log_file.write(log_str + '\n')
-
-        if post_result:
-            if debug:
-                print('DEBUG: successful json post to ' + inbox_url)
-            # our work here is done
-            break
-        if debug:
-            print(post_json_str)
-            print('DEBUG: json post to ' + inbox_url +
-                  ' failed. Waiting for ' +
-                  str(send_interval_sec) + ' seconds.')
-        time.sleep(send_interval_sec)
-        tries += 1
-
-
 def send_post(signing_priv_key_pem: str, project_version: str,
               session, base_dir: str, nickname: str, domain: str, port: int,
               to_nickname: str, to_domain: str, to_port: int, cc_str: str,
@@ -2634,17 +2570,20 @@ def send_post(signing_priv_key_pem: str, project_version: str,
     # subsequent conversions after creating message body digest
     post_json_str = json.dumps(post_json_object)
 
-    # construct the http header, including the message body digest
-    signature_header_json = \
-        create_signed_header(None, private_key_pem, nickname, domain, port,
-                             to_domain, to_port,
-                             post_path, http_prefix, with_digest,
-                             post_json_str, 'application/activity+json')
-    signature_header_json_ld = \
-        create_signed_header(None, private_key_pem, nickname, domain, port,
-                             to_domain, to_port,
-                             post_path, http_prefix, with_digest,
-                             post_json_str, 'application/ld+json')
+    # the http header, including the message body digest,
+    # is signed when each attempt at delivery is made
+    signing = {
+        'private_key_pem': private_key_pem,
+        'nickname': nickname,
+        'domain': domain,
+        'port': port,
+        'to_domain': to_domain,
+        'to_port': to_port,
+        'path': post_path,
+        'with_digest': with_digest,
+        'headers_json': {},
+        'headers_json_ld': {}
+    }
 
     # if the "to" domain is within the shared items
     # federation list then send the token for this domain
@@ -2652,11 +2591,11 @@ def send_post(signing_priv_key_pem: str, project_version: str,
     domain_full = get_full_domain(domain, port)
     if to_domain in shared_items_federated_domains:
         if shared_item_federation_tokens.get(domain_full):
-            signature_header_json['Origin'] = domain_full
-            signature_header_json_ld['Origin'] = domain_full
-            signature_header_json['SharesCatalog'] = \
+            signing['headers_json']['Origin'] = domain_full
+            signing['headers_json_ld']['Origin'] = domain_full
+            signing['headers_json']['SharesCatalog'] = \
                 shared_item_federation_tokens[domain_full]
-            signature_header_json_ld['SharesCatalog'] = \
+            signing['headers_json_ld']['SharesCatalog'] = \
                 shared_item_federation_tokens[domain_full]
             if debug:
                 print('SharesCatalog added to header')
@@ -2667,27 +2606,11 @@ def send_post(signing_priv_key_pem: str, project_version: str,
               str(shared_items_federated_domains))
 
     if debug:
-        print('signature_header_json: ' + str(signature_header_json))
-
-    # Keep the number of threads being used small
-    while len(send_threads) > 1000:
-        print('WARN: Maximum threads reached - killing send thread')
-        send_threads[0].kill()
-        send_threads.pop(0)
-        print('WARN: thread killed')
-    print('THREAD: thread_send_post')
-    thr = \
-        thread_with_trace(target=thread_send_post,
-                          args=(session,
-                                post_json_str,
-                                federation_list,
-                                inbox_url, base_dir,
-                                signature_header_json.copy(),
-                                signature_header_json_ld.copy(),
-                                post_log, debug, http_prefix,
-                                domain_full), daemon=True)
-    send_threads.append(thr)
-    begin_thread(thr, 'send_post')
+        print('extra headers: ' + str(signing['headers_json']))
+
+    queue_delivery(session, post_json_str, federation_list,
+                   inbox_url, base_dir, signing,
+                   post_log, debug, http_prefix, domain_full)
     return 0
 
 
@@ -3070,55 +2993,39 @@ def send_signed_json(post_json_object: {}, session, base_dir: str,
             post_json_str = \
                 post_json_str.replace(curr_domain, domain)
 
-    # construct the http header, including the message body digest
-    signature_header_json = \
-        create_signed_header(None, private_key_pem, nickname, domain, port,
-                             to_domain, to_port,
-                             post_path, http_prefix, with_digest,
-                             post_json_str,
-                             'application/activity+json')
-    signature_header_json_ld = \
-        create_signed_header(None, private_key_pem, nickname, domain, port,
-                             to_domain, to_port,
-                             post_path, http_prefix, with_digest,
-                             post_json_str,
-                             'application/ld+json')
+    # the http header, including the message body digest,
+    # is signed when each attempt at delivery is made
+    signing = {
+        'private_key_pem': private_key_pem,
+        'nickname': nickname,
+        'domain': domain,
+        'port': port,
+        'to_domain': to_domain,
+        'to_port': to_port,
+        'path': post_path,
+        'with_digest': with_digest,
+        'headers_json': {},
+        'headers_json_ld': {}
+    }
     # optionally add a token so that the receiving instance may access
     # your shared items catalog
     if shared_items_token:
-        signature_header_json['Origin'] = get_full_domain(domain, port)
-        signature_header_json['SharesCatalog'] = shared_items_token
+        signing['headers_json']['Origin'] = get_full_domain(domain, port)
+        signing['headers_json']['SharesCatalog'] = shared_items_token
     elif debug:
         print('Not sending shared items federation token')
 
     # add any extra headers
     for header_title, header_text in extra_headers.items():
-        signature_header_json[header_title] = header_text
-
-    # Keep the number of threads being used small
-    while len(send_threads) > 1000:
-        print('WARN: Maximum threads reached - killing send thread')
-        send_threads[0].kill()
-        send_threads.pop(0)
-        print('WARN: thread killed')
+        signing['headers_json'][header_title] = header_text
 
     if debug:
-        print('DEBUG: starting thread to send post')
+        print('DEBUG: queueing post for delivery')
         pprint(post_json_object)
     domain_full = get_full_domain(domain, port)
-    print('THREAD: thread_send_post 2')
-    thr = \
-        thread_with_trace(target=thread_send_post,
-                          args=(session,
-                                post_json_str,
-                                federation_list,
-                                inbox_url, base_dir,
-                                signature_header_json.copy(),
-                                signature_header_json_ld.copy(),
-                                post_log, debug,
-                                http_prefix, domain_full), daemon=True)
-    send_threads.append(thr)
-    # begin_thread(thr, 'send_signed_json')
+    queue_delivery(session, post_json_str, federation_list,
+                   inbox_url, base_dir, signing,
+                   post_log, debug, http_prefix, domain_full)
     return 0
 
 
@@ -3546,6 +3453,8 @@ def send_to_followers(server, session, session_onion, session_i2p,
 
     # send out to each instance
     for group_send in randomized_instances:
+        # stop here if this sending thread has been killed
+        check_thread_cancelled()
         follower_domain = group_send[0]
         follower_handles = group_send[1]
         print('Sending post to followers progress ' +
@@ -3711,7 +3620,7 @@ def send_to_followers(server, session, session_onion, session_i2p,
                                  domain, onion_domain, i2p_domain,
                                  extra_headers)
 
-        time.sleep(4)
+        thread_sleep(4)
 
     if debug:
         print('DEBUG: End of send_to_followers')
@@ -4158,111 +4067,122 @@ def _create_box_items(base_dir: str,
         first_post_id = first_post_id.replace('--', '#')
         first_post_id = first_post_id.replace('/', '#')
 
-    with open(index_filename, 'r', encoding='utf-8') as index_file:
-        posts_added_to_timeline = 0
-        while posts_added_to_timeline < items_per_page:
-            post_filename = index_file.readline()
-
-            if not post_filename:
+    # If there is no voting and no first post to search for then the
+    # index can be read starting from the requested page, without
+    # needing to go through the earlier pages
+    index_position = 0
+    if not first_post_id and newswire_votes_threshold <= 0:
+        index_position = int((page_number - 1) * items_per_page)
+        total_posts_count = \
+            min(index_position, box_index_count(index_filename))
+
+    index_page = []
+    while posts_added_to_timeline < items_per_page:
+        if not index_page:
+            index_page = \
+                box_index_page(index_filename, index_position,
+                               items_per_page)
+            if not index_page:
                 break
+            index_position += len(index_page)
+        post_filename = index_page.pop(0)
 
-            # if a first post is specified then wait until it is found
-            # before starting to generate the timeline
-            if first_post_id and total_posts_count == 0:
-                if first_post_id not in post_filename:
-                    continue
-                total_posts_count = \
-                    int((page_number - 1) * items_per_page)
-
-            # Has this post passed through the newswire voting stage?
-            if not _passed_newswire_voting(newswire_votes_threshold,
-                                           base_dir, domain,
-                                           post_filename,
-                                           positive_voting,
-                                           voting_time_mins):
+        # if a first post is specified then wait until it is found
+        # before starting to generate the timeline
+        if first_post_id and total_posts_count == 0:
+            if first_post_id not in post_filename:
                 continue
+            total_posts_count = \
+                int((page_number - 1) * items_per_page)
+
+        # Has this post passed through the newswire voting stage?
+        if not _passed_newswire_voting(newswire_votes_threshold,
+                                       base_dir, domain,
+                                       post_filename,
+                                       positive_voting,
+                                       voting_time_mins):
+            continue
 
-            # Skip through any posts previous to the current page
-            if not first_post_id:
-                if total_posts_count < \
-                   int((page_number - 1) * items_per_page):
-                    total_posts_count += 1
-                    continue
+        # Skip through any posts previous to the current page
+        if not first_post_id:
+            if total_posts_count < \
+               int((page_number - 1) * items_per_page):
+                total_posts_count += 1
+                continue
 
-            # if this is a full path then remove the directories
-            if '/' in post_filename:
-                post_filename = post_filename.split('/')[-1]
+        # if this is a full path then remove the directories
+        if '/' in post_filename:
+            post_filename = post_filename.split('/')[-1]
 
-            # filename of the post without any extension or path
-            # This should also correspond to any index entry in
-            # the posts cache
-            post_url = remove_eol(post_filename)
-            post_url = post_url.replace('.json', '').strip()
+        # filename of the post without any extension or path
+        # This should also correspond to any index entry in
+        # the posts cache
+        post_url = remove_eol(post_filename)
+        post_url = post_url.replace('.json', '').strip()
 
-            # is this a duplicate?
-            if post_url in post_urls_in_box:
-                continue
+        # is this a duplicate?
+        if post_url in post_urls_in_box:
+            continue
 
-            # is the post cached in memory?
-            if recent_posts_cache.get('index'):
-                if post_url in recent_posts_cache['index']:
-                    if recent_posts_cache['json'].get(post_url):
-                        url = recent_posts_cache['json'][post_url]
-                        if _add_post_string_to_timeline(url,
-                                                        boxname,
-                                                        posts_in_box,
-                                                        box_actor):
-                            total_posts_count += 1
-                            posts_added_to_timeline += 1
-                            post_urls_in_box.append(post_url)
-                            continue
-                        print('Post not added to timeline')
-
-            # read the post from file
-            full_post_filename = \
-                locate_post(base_dir, nickname,
-                            original_domain, post_url, False)
-            if full_post_filename:
-                # has the post been rejected?
-                if os.path.isfile(full_post_filename + '.reject'):
-                    continue
+        # is the post cached in memory?
+        url = get_from_recent_posts_cache(recent_posts_cache, post_url,
+                                          'json')
+        if url:
+            if _add_post_string_to_timeline(url,
+                                            boxname,
+                                            posts_in_box,
+                                            box_actor):
+                total_posts_count += 1
+                posts_added_to_timeline += 1
+                post_urls_in_box.append(post_url)
+                continue
+            print('Post not added to timeline')
+
+        # read the post from file
+        full_post_filename = \
+            locate_post(base_dir, nickname,
+                        original_domain, post_url, False)
+        if full_post_filename:
+            # has the post been rejected?
+            if os.path.isfile(full_post_filename + '.reject'):
+                continue
 
-                if _add_post_to_timeline(full_post_filename, boxname,
-                                         posts_in_box, box_actor):
-                    posts_added_to_timeline += 1
-                    total_posts_count += 1
-                    post_urls_in_box.append(post_url)
-                else:
-                    print('WARN: Unable to add post ' + post_url +
-                          ' nickname ' + nickname +
-                          ' timeline ' + boxname)
+            if _add_post_to_timeline(full_post_filename, boxname,
+                                     posts_in_box, box_actor):
+                posts_added_to_timeline += 1
+                total_posts_count += 1
+                post_urls_in_box.append(post_url)
             else:
-                if timeline_nickname != nickname:
-                    # if this is the features timeline
-                    full_post_filename = \
-                        locate_post(base_dir, timeline_nickname,
-                                    original_domain, post_url, False)
-                    if full_post_filename:
-                        if _add_post_to_timeline(full_post_filename,
-                                                 boxname,
-                                                 posts_in_box, box_actor):
-                            posts_added_to_timeline += 1
-                            total_posts_count += 1
-                            post_urls_in_box.append(post_url)
-                        else:
-                            print('WARN: Unable to add features post ' +
-                                  post_url + ' nickname ' + nickname +
-                                  ' timeline ' + boxname)
+                print('WARN: Unable to add post ' + post_url +
+                      ' nickname ' + nickname +
+                      ' timeline ' + boxname)
+        else:
+            if timeline_nickname != nickname:
+                # if this is the features timeline
+                full_post_filename = \
+                    locate_post(base_dir, timeline_nickname,
+                                original_domain, post_url, False)
+                if full_post_filename:
+                    if _add_post_to_timeline(full_post_filename,
+                                             boxname,
+                                             posts_in_box, box_actor):
+                        posts_added_to_timeline += 1
+                        total_posts_count += 1
+                        post_urls_in_box.append(post_url)
                     else:
-                        print('WARN: features timeline. ' +
-                              'Unable to locate post ' + post_url)
+                        print('WARN: Unable to add features post ' +
+                              post_url + ' nickname ' + nickname +
+                              ' timeline ' + boxname)
                 else:
-                    if timeline_nickname == 'news':
-                        print('WARN: Unable to locate news post ' +
-                              post_url + ' nickname ' + nickname)
-                    else:
-                        print('WARN: Unable to locate post ' + post_url +
-                              ' nickname ' + nickname)
+                    print('WARN: features timeline. ' +
+                          'Unable to locate post ' + post_url)
+            else:
+                if timeline_nickname == 'news':
+                    print('WARN: Unable to locate news post ' +
+                          post_url + ' nickname ' + nickname)
+                else:
+                    print('WARN: Unable to locate post ' + post_url +
+                          ' nickname ' + nickname)
     return total_posts_count, posts_added_to_timeline
 
 
@@ -4565,6 +4485,8 @@ def archive_posts(base_dir: str, http_prefix: str, archive_dir: str,
                                          'outbox', archive_subdir,
                                          recent_posts_cache, max_posts_in_box)
         break
+    expired_posts = expire_post_html_cache(base_dir, max_cache_age_days)
+    print('Expired ' + str(expired_posts) + ' cached html posts')
 
 
 def _expire_posts_for_person(http_prefix: str, nickname: str, domain: str,
@@ -4760,20 +4682,7 @@ def archive_posts_for_person(http_prefix: str, nickname: str, domain: str,
     handle = nickname + '@' + domain
     index_filename = \
         acct_handle_dir(base_dir, handle) + '/' + boxname + '.index'
-    if os.path.isfile(index_filename):
-        index_ctr = 0
-        # get the existing index entries as a string
-        new_index = ''
-        with open(index_filename, 'r', encoding='utf-8') as index_file:
-            for post_id in index_file:
-                new_index += post_id
-                index_ctr += 1
-                if index_ctr >= max_posts_in_box:
-                    break
-        # save the new index file
-        if len(new_index) > 0:
-            with open(index_filename, 'w+', encoding='utf-8') as index_file:
-                index_file.write(new_index)
+    box_index_truncate(index_filename, max_posts_in_box)
 
     posts_in_box_dict = {}
     posts_ctr = 0
@@ -4809,9 +4718,6 @@ def archive_posts_for_person(http_prefix: str, nickname: str, domain: str,
     posts_in_box_sorted = \
         OrderedDict(sorted(posts_in_box_dict.items(), reverse=False))
 
-    # directory containing cached html posts
-    post_cache_dir = box_dir.replace('/' + boxname, '/postcache')
-
     remove_ctr = 0
     for published_str, post_filename in posts_in_box_sorted.items():
         file_path = os.path.join(box_dir, post_filename)
@@ -4840,8 +4746,8 @@ def archive_posts_for_person(http_prefix: str, nickname: str, domain: str,
 
         # remove cached html posts
         post_cache_filename = \
-            os.path.join(post_cache_dir, post_filename)
-        post_cache_filename = post_cache_filename.replace('.json', '.html')
+            post_html_cache_filename(base_dir,
+                                     post_filename.replace('.json', ''))
         if os.path.isfile(post_cache_filename):
             try:
                 os.remove(post_cache_filename)
@@ -6053,6 +5959,43 @@ def c2s_box_json(session, nickname: str, password: str,
     return box_json
 
 
+def c2s_box_events(session, nickname: str, password: str,
+                   domain: str, port: int, http_prefix: str,
+                   since: int, wait_sec: int,
+                   debug: bool, signing_priv_key_pem: str) -> {}:
+    """C2S Authenticated GET of the events for an account after the
+    given cursor, waiting for up to the given number of seconds
+    until an event arrives
+    """
+    if not session:
+        print('WARN: No session for c2s_box_events')
+        return None
+
+    domain_full = get_full_domain(domain, port)
+    actor = local_actor_url(http_prefix, nickname, domain_full)
+
+    auth_header = create_basic_auth_header(nickname, password)
+
+    headers = {
+        'host': domain,
+        'Content-type': 'application/json',
+        'Authorization': auth_header,
+        'Accept': 'application/json'
+    }
+
+    # GET json
+    url = actor + '/events?since=' + str(since) + '&wait=' + str(wait_sec)
+    timeout_sec = wait_sec + 20
+    events_json = get_json(signing_priv_key_pem, session, url, headers, None,
+                           debug, __version__, http_prefix, None,
+                           timeout_sec)
+
+    if events_json is not None and debug:
+        print('DEBUG: GET c2s_box_events success')
+
+    return events_json
+
+
 def seconds_between_published(published1: str, published2: str) -> int:
     """Returns the number of seconds between two published dates
     """
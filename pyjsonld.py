@@ -34,8 +34,9 @@ import socket
 import ssl
 import string
 import sys
+import threading
 import traceback
-from collections import deque, namedtuple
+from collections import OrderedDict, namedtuple
 from numbers import Integral, Real
 
 from context import getApschemaV1_9
@@ -362,6 +363,53 @@ def parse_link_header(header):
     return rval
 
 
+def _load_preloaded_contexts():
+    """
+    Creates the local copies of the contexts within VALID_CONTEXTS.
+    """
+    with _preloaded_contexts_lock:
+        if _preloaded_contexts:
+            return
+        _preloaded_contexts.update({
+            'https://www.w3.org/ns/activitystreams':
+            get_activitystreams_schema(),
+            'https://w3id.org/identity/v1': get_v1schema(),
+            'https://w3id.org/security/v1': get_v1security_schema(),
+            '*/apschema/v1.9': getApschemaV1_9(),
+            '*/apschema/v1.10': getApschemaV1_10(),
+            '*/apschema/v1.21': getApschemaV1_21(),
+            '*/apschema/v1.20': getApschemaV1_20(),
+            '*/litepub-0.1.jsonld': getLitepubV0_1(),
+            'https://litepub.social/litepub/context.jsonld':
+            get_litepub_social()
+        })
+
+
+def _preloaded_context(url):
+    """
+    Returns the local copy of a context, or None if there isn't one.
+
+    :param url: the URL of the context.
+
+    :return: the context document.
+    """
+    if not _preloaded_contexts:
+        _load_preloaded_contexts()
+    document = _preloaded_contexts.get(url)
+    if document is None:
+        for context_url, context_document in _preloaded_contexts.items():
+            if context_url.startswith('*') and url.endswith(context_url[1:]):
+                document = context_document
+                break
+    if document is None:
+        return None
+    # references to other contexts are replaced in place when
+    # processed, so contexts containing them can't be shared
+    if _is_array(document.get('@context')):
+        return copy.deepcopy(document)
+    return document
+
+
 def load_document(url):
     """
     Retrieves JSON-LD at the given URL.
@@ -383,70 +431,15 @@ def load_document(url):
                 'jsonld.InvalidUrl', {'url': url},
                 code='loading document failed')
 
-        if url == 'https://w3id.org/identity/v1':
-            doc = {
-                'contextUrl': None,
-                'documentUrl': url,
-                'document': get_v1schema()
-            }
-            return doc
-        if url == 'https://w3id.org/security/v1':
-            doc = {
-                'contextUrl': None,
-                'documentUrl': url,
-                'document': get_v1security_schema()
-            }
-            return doc
-        elif url == 'https://www.w3.org/ns/activitystreams':
-            doc = {
-                'contextUrl': None,
-                'documentUrl': url,
-                'document': get_activitystreams_schema()
-            }
-            return doc
-        elif url.endswith('/apschema/v1.9'):
-            doc = {
-                'contextUrl': None,
-                'documentUrl': url,
-                'document': getApschemaV1_9()
-            }
-            return doc
-        elif url.endswith('/apschema/v1.10'):
-            doc = {
-                'contextUrl': None,
-                'documentUrl': url,
-                'document': getApschemaV1_10()
-            }
-            return doc
-        elif url.endswith('/apschema/v1.20'):
-            doc = {
-                'contextUrl': None,
-                'documentUrl': url,
-                'document': getApschemaV1_20()
-            }
-            return doc
-        elif url.endswith('/apschema/v1.21'):
-            doc = {
-                'contextUrl': None,
-                'documentUrl': url,
-                'document': getApschemaV1_21()
-            }
-            return doc
-        elif url.endswith('/litepub-0.1.jsonld'):
-            doc = {
-                'contextUrl': None,
-                'documentUrl': url,
-                'document': getLitepubV0_1()
-            }
-            return doc
-        elif url == 'https://litepub.social/litepub/context.jsonld':
-            doc = {
-                'contextUrl': None,
-                'documentUrl': url,
-                'document': get_litepub_social()
-            }
-            return doc
-        return None
+        # only the contexts which have local copies are loaded
+        document = _preloaded_context(url)
+        if document is None:
+            return None
+        return {
+            'contextUrl': None,
+            'documentUrl': url,
+            'document': document
+        }
     except JsonLdError as ex:
         raise ex
     except Exception as cause:
@@ -4876,27 +4869,55 @@ def _is_absolute_iri(v):
 class ActiveContextCache(object):
     """
     An ActiveContextCache caches active contexts so they can be reused without
-    the overhead of recomputing them.
+    the overhead of recomputing them. It can be shared between threads, and
+    the least recently used contexts are removed when it is full. The keys
+    of contexts which have been seen recently are remembered, so that
+    they don't need to be serialized again.
     """
 
     def __init__(self, size: int = 100):
-        self.order = deque()
+        self.order = OrderedDict()
         self.cache = {}
+        self.keys = OrderedDict()
         self.size = size
+        self.lock = threading.Lock()
+
+    def _ctx_cache_key(self, ctx):
+        # the context is held within the entry so that its id
+        # can't be reused by another object
+        ctx_id = id(ctx)
+        entry = self.keys.get(ctx_id)
+        if entry is not None and entry[0] is ctx:
+            self.keys.move_to_end(ctx_id)
+            return entry[1]
+        key = json.dumps(ctx)
+        self.keys[ctx_id] = (ctx, key)
+        while len(self.keys) > self.size * 2:
+            self.keys.popitem(last=False)
+        return key
 
     def get(self, active_ctx, local_ctx):
-        key1 = json.dumps(active_ctx)
-        key2 = json.dumps(local_ctx)
-        return self.cache.get(key1, {}).get(key2)
+        with self.lock:
+            key1 = self._ctx_cache_key(active_ctx)
+            key2 = self._ctx_cache_key(local_ctx)
+            result = self.cache.get(key1, {}).get(key2)
+            if result is not None:
+                self.order.move_to_end((key1, key2))
+            return result
 
     def set(self, active_ctx, local_ctx, result):
-        if len(self.order) == self.size:
-            entry = self.order.popleft()
-            del self.cache[entry['activeCtx']][entry['localCtx']]
-        key1 = json.dumps(active_ctx)
-        key2 = json.dumps(local_ctx)
-        self.order.append({'activeCtx': key1, 'localCtx': key2})
-        self.cache.setdefault(key1, {})[key2] = json.loads(json.dumps(result))
+        result = json.loads(json.dumps(result))
+        with self.lock:
+            key1 = self._ctx_cache_key(active_ctx)
+            key2 = self._ctx_cache_key(local_ctx)
+            if (key1, key2) not in self.order:
+                while len(self.order) >= self.size:
+                    old_key1, old_key2 = self.order.popitem(last=False)[0]
+                    del self.cache[old_key1][old_key2]
+                    if not self.cache[old_key1]:
+                        del self.cache[old_key1]
+            self.order[(key1, key2)] = True
+            self.cache.setdefault(key1, {})[key2] = result
 
 
 class VerifiedHTTPSConnection(HTTPSConnection):
@@ -4951,5 +4972,10 @@ for path in _possible_trust_root_certificates:
 
 # Shared in-memory caches.
 _cache = {
-    'activeCtx': ActiveContextCache()
+    'activeCtx': ActiveContextCache(1024)
 }
+
+# Local copies of the contexts within VALID_CONTEXTS, which are
+# created when first needed.
+_preloaded_contexts = {}
+_preloaded_contexts_lock = threading.Lock()
@@ -29,7 +29,7 @@ from utils import local_actor_url
 from utils import load_json
 from utils import save_json
 from utils import remove_post_from_cache
-from utils import get_cached_post_filename
+from utils import clear_from_post_caches
 from utils import contains_invalid_chars
 from utils import remove_eol
 from posts import send_signed_json
@@ -512,19 +512,12 @@ def update_reaction_collection(recent_posts_cache: {},
     if not post_json_object:
         return
 
-    # remove any cached version of this post so that the
-    # reaction icon is changed
+    # remove any cached version of this post, and of any announces
+    # of it, so that the reaction icon is changed
     remove_post_from_cache(post_json_object, recent_posts_cache)
-    cached_post_filename = \
-        get_cached_post_filename(base_dir, nickname,
-                                 domain, post_json_object)
-    if cached_post_filename:
-        if os.path.isfile(cached_post_filename):
-            try:
-                os.remove(cached_post_filename)
-            except OSError:
-                print('EX: update_reaction_collection unable to delete ' +
-                      cached_post_filename)
+    if post_json_object.get('id'):
+        cached_post_id = remove_id_ending(post_json_object['id'])
+        clear_from_post_caches(base_dir, recent_posts_cache, cached_post_id)
 
     obj = post_json_object
     if has_object_dict(post_json_object):
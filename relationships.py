@@ -20,6 +20,7 @@ from utils import is_account_dir
 from utils import get_nickname_from_actor
 from utils import get_domain_from_actor
 from utils import load_json
+from actorstore import actor_store_files
 
 
 def get_moved_accounts(base_dir: str, nickname: str, domain: str,
@@ -190,8 +191,7 @@ def get_moved_feed(base_dir: str, domain: str, port: int, path: str,
 def update_moved_actors(base_dir: str, debug: bool) -> None:
     """Updates the file containing moved actors
     """
-    actors_cache_dir = base_dir + '/cache/actors'
-    if not os.path.isdir(actors_cache_dir):
+    if not os.path.isdir(base_dir + '/cache/actors'):
         if debug:
             print('No cached actors')
         return
@@ -200,21 +200,15 @@ def update_moved_actors(base_dir: str, debug: bool) -> None:
         print('Updating moved actors')
     actors_dict = {}
     ctr = 0
-    for _, _, files in os.walk(actors_cache_dir):
-        for actor_str in files:
-            if not actor_str.endswith('.json'):
-                continue
-            orig_str = actor_str
-            actor_str = actor_str.replace('.json', '').replace('#', '/')
-            nickname = get_nickname_from_actor(actor_str)
-            domain, port = get_domain_from_actor(actor_str)
-            if not domain:
-                continue
-            domain_full = get_full_domain(domain, port)
-            handle = nickname + '@' + domain_full
-            actors_dict[handle] = orig_str
-            ctr += 1
-        break
+    for actor_str, actor_filename in actor_store_files(base_dir):
+        nickname = get_nickname_from_actor(actor_str)
+        domain, port = get_domain_from_actor(actor_str)
+        if not domain:
+            continue
+        domain_full = get_full_domain(domain, port)
+        handle = nickname + '@' + domain_full
+        actors_dict[handle] = actor_filename
+        ctr += 1
 
     if actors_dict:
         print('Actors dict created ' + str(ctr))
@@ -257,7 +251,7 @@ def update_moved_actors(base_dir: str, debug: bool) -> None:
     for handle in handles_to_check:
         if not actors_dict.get(handle):
             continue
-        actor_filename = base_dir + '/cache/actors/' + actors_dict[handle]
+        actor_filename = actors_dict[handle]
         if not os.path.isfile(actor_filename):
             continue
         actor_json = load_json(actor_filename, 1, 1)
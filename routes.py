@@ -0,0 +1,121 @@
+__filename__ = "routes.py"
+__author__ = "Bob Mottram"
+__license__ = "AGPL3+"
+__version__ = "1.4.0"
+__maintainer__ = "Bob Mottram"
+__email__ = "bob@libreserver.org"
+__status__ = "Production"
+__module_group__ = "Core"
+
+# Table of routes used by the web server to decide which handler
+# should respond to a request, rather than checking each possible path
+# in turn. Each route is a tuple of the form
+# (method, pattern, route name, filters). The pattern is either an
+# exact path such as "/logo72.png", a prefix ending with "*" such as
+# "/emoji/*", or a suffix beginning with "*" such as "*/profiledata".
+# Filters are a dict of properties which the request must have,
+# such as {'authorized': True}, or None.
+# Exact paths are held in a dict, prefixes in a trie keyed on the
+# segments of the path and suffixes in a dict keyed on the last
+# segment. Where more than one route matches, the one which appears
+# first within the table is used, in the same manner as a sequence
+# of if statements.
+
+
+def _route_pattern_segments(pattern: str) -> ([], str):
+    """Returns the complete segments of a prefix pattern and any
+    partial final segment
+    """
+    segments = pattern.strip('/').split('/')
+    if pattern.endswith('/'):
+        return segments, ''
+    return segments[:-1], segments[-1]
+
+
+def compile_routes(route_list: []) -> {}:
+    """Compiles a list of routes into a table which can be searched
+    using the segments of a path
+    """
+    routes = {}
+    for priority, route in enumerate(route_list):
+        method, pattern, route_name, filters = route
+        if not routes.get(method):
+            routes[method] = {
+                'exact': {},
+                'prefix': {'children': {}, 'routes': [], 'partial': []},
+                'suffix': {}
+            }
+        table = routes[method]
+        entry = (priority, route_name, filters)
+        if pattern.startswith('*'):
+            last_segment = pattern[1:].split('/')[-1]
+            if not table['suffix'].get(last_segment):
+                table['suffix'][last_segment] = []
+            table['suffix'][last_segment].append(entry)
+        elif pattern.endswith('*'):
+            segments, partial = _route_pattern_segments(pattern[:-1])
+            node = table['prefix']
+            for segment in segments:
+                if not node['children'].get(segment):
+                    node['children'][segment] = {
+                        'children': {},
+                        'routes': [],
+                        'partial': []
+                    }
+                node = node['children'][segment]
+            if partial:
+                node['partial'].append((partial, entry))
+            else:
+                node['routes'].append(entry)
+        else:
+            if not table['exact'].get(pattern):
+                table['exact'][pattern] = []
+            table['exact'][pattern].append(entry)
+    return routes
+
+
+def _route_permitted(filters: {}, request: {}) -> bool:
+    """Returns true if a request has the properties required by a route
+    """
+    if not filters:
+        return True
+    for name, value in filters.items():
+        if request.get(name) != value:
+            return False
+    return True
+
+
+def match_route(routes: {}, method: str, path: str, request: {}) -> str:
+    """Returns the name of the route for a request, or None
+    if it does not match any route
+    """
+    table = routes.get(method)
+    if not table:
+        return None
+    candidates = []
+    if table['exact'].get(path):
+        candidates += table['exact'][path]
+    segments = path.split('/')
+    if table['suffix'].get(segments[-1]):
+        candidates += table['suffix'][segments[-1]]
+    # descend the trie, collecting any prefixes which match
+    node = table['prefix']
+    last_index = len(segments) - 1
+    for index in range(1, len(segments)):
+        segment = segments[index]
+        for partial, entry in node['partial']:
+            if segment.startswith(partial):
+                candidates.append(entry)
+        node = node['children'].get(segment)
+        if not node:
+            break
+        # a prefix such as /emoji/ must be followed by something
+        if index < last_index:
+            candidates += node['routes']
+    if not candidates:
+        return None
+    candidates.sort()
+    for _, route_name, filters in candidates:
+        if _route_permitted(filters, request):
+            return route_name
+    return None
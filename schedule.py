@@ -20,6 +20,50 @@ from utils import remove_eol
 from outbox import post_message_to_outbox
 from session import create_session
 from threads import begin_thread
+from threads import check_thread_cancelled
+from scheduler import scheduler_add
+from scheduler import scheduler_remove
+from scheduler import scheduler_wait
+
+
+def _schedule_post_time(date_str: str):
+    """Returns the time when a scheduled post is due, from the date
+    within the scheduled posts index
+    """
+    post_time = \
+        datetime.datetime.strptime(date_str, "%Y-%m-%dT%H:%M:%S%z")
+    return post_time.replace(tzinfo=None)
+
+
+def _schedule_next_due(base_dir: str, handle: str) -> float:
+    """Returns the time when the next scheduled post for an account
+    is due, or zero if there are no scheduled posts
+    """
+    schedule_index_filename = \
+        acct_handle_dir(base_dir, handle) + '/schedule.index'
+    if not os.path.isfile(schedule_index_filename):
+        return 0
+    next_due = 0
+    try:
+        with open(schedule_index_filename, 'r',
+                  encoding='utf-8') as sched_file:
+            for line in sched_file:
+                date_str = line.split(' ')[0]
+                if ' ' not in line or 'T' not in date_str:
+                    continue
+                try:
+                    post_time = _schedule_post_time(date_str)
+                except ValueError:
+                    print('EX: _schedule_next_due invalid date ' + date_str)
+                    continue
+                due_time = \
+                    (post_time - datetime.datetime(1970, 1, 1)).total_seconds()
+                if not next_due or due_time < next_due:
+                    next_due = due_time
+    except OSError:
+        print('EX: _schedule_next_due unable to read ' +
+              schedule_index_filename)
+    return next_due
 
 
 def _update_post_schedule(base_dir: str, handle: str, httpd,
@@ -32,9 +76,7 @@ def _update_post_schedule(base_dir: str, handle: str, httpd,
     if not os.path.isfile(schedule_index_filename):
         return
 
-    # get the current time as an int
     curr_time = datetime.datetime.utcnow()
-    days_since_epoch = (curr_time - datetime.datetime(1970, 1, 1)).days
 
     schedule_dir = acct_handle_dir(base_dir, handle) + '/scheduled/'
     index_lines = []
@@ -61,19 +103,9 @@ def _update_post_schedule(base_dir: str, handle: str, httpd,
                 continue
             # create the new index file
             index_lines.append(line)
-            # convert string date to int
-            post_time = \
-                datetime.datetime.strptime(date_str, "%Y-%m-%dT%H:%M:%S%z")
-            post_time = post_time.replace(tzinfo=None)
-            post_days_since_epoch = \
-                (post_time - datetime.datetime(1970, 1, 1)).days
-            if days_since_epoch < post_days_since_epoch:
+            post_time = _schedule_post_time(date_str)
+            if curr_time < post_time:
                 continue
-            if days_since_epoch == post_days_since_epoch:
-                if curr_time.time().hour < post_time.time().hour:
-                    continue
-                if curr_time.time().minute < post_time.time().minute:
-                    continue
             if not os.path.isfile(post_filename):
                 print('WARN: schedule missing post_filename=' + post_filename)
                 index_lines.remove(line)
@@ -176,26 +208,40 @@ def _update_post_schedule(base_dir: str, handle: str, httpd,
             schedule_file.write(line)
 
 
+def _load_post_schedule(base_dir: str) -> None:
+    """Finds when the next scheduled post of each account is due
+    """
+    for _, dirs, _ in os.walk(base_dir + '/accounts'):
+        for account in dirs:
+            if '@' not in account:
+                continue
+            if not is_account_dir(account):
+                continue
+            due_time = _schedule_next_due(base_dir, account)
+            if due_time:
+                scheduler_add('scheduledPosts', account, due_time)
+        break
+
+
 def run_post_schedule(base_dir: str, httpd, max_scheduled_posts: int):
     """Dispatches scheduled posts
     """
+    _load_post_schedule(base_dir)
     while True:
-        time.sleep(60)
-        # for each account
-        for _, dirs, _ in os.walk(base_dir + '/accounts'):
-            for account in dirs:
-                if '@' not in account:
-                    continue
-                if not is_account_dir(account):
-                    continue
-                # scheduled posts index for this account
-                schedule_index_filename = \
-                    base_dir + '/accounts/' + account + '/schedule.index'
-                if not os.path.isfile(schedule_index_filename):
-                    continue
-                _update_post_schedule(base_dir, account,
-                                      httpd, max_scheduled_posts)
-            break
+        # sleep until the next scheduled post is due
+        handles = scheduler_wait('scheduledPosts', 60)
+        check_thread_cancelled()
+        for handle in handles:
+            _update_post_schedule(base_dir, handle,
+                                  httpd, max_scheduled_posts)
+            due_time = _schedule_next_due(base_dir, handle)
+            if not due_time:
+                continue
+            # posts which could not be sent are tried again later
+            curr_time = time.time()
+            if due_time <= curr_time:
+                due_time = curr_time + 60
+            scheduler_add('scheduledPosts', handle, due_time)
 
 
 def run_post_schedule_watchdog(project_version: str, httpd) -> None:
@@ -220,6 +266,7 @@ def run_post_schedule_watchdog(project_version: str, httpd) -> None:
 def remove_scheduled_posts(base_dir: str, nickname: str, domain: str) -> None:
     """Removes any scheduled posts
     """
+    scheduler_remove('scheduledPosts', nickname + '@' + domain)
     # remove the index
     schedule_index_filename = \
         acct_dir(base_dir, nickname, domain) + '/schedule.index'
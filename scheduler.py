@@ -0,0 +1,99 @@
+__filename__ = "scheduler.py"
+__author__ = "Bob Mottram"
+__license__ = "AGPL3+"
+__version__ = "1.4.0"
+__maintainer__ = "Bob Mottram"
+__email__ = "bob@libreserver.org"
+__status__ = "Production"
+__module_group__ = "Core"
+
+# Times when background work is next due for each account, such as
+# sending scheduled posts or following imported accounts. Each queue
+# holds a heap of due times, so that the thread doing the work can sleep
+# until the next item is due rather than regularly examining every
+# account. Adding an item wakes the thread, so that items due sooner
+# than any others are not delayed.
+# Each account has at most one due time within a queue. When the due
+# time of an account changes its previous entry remains within the heap
+# and is ignored when it reaches the top.
+
+import time
+import heapq
+import threading
+
+_SCHEDULER = {
+    'changed': threading.Condition(),
+    # queue name -> heap of (due time, handle)
+    'heaps': {},
+    # queue name -> {handle: due time}
+    'due': {}
+}
+
+
+def scheduler_add(queue_name: str, handle: str, due_time: float) -> None:
+    """Adds an account to a queue at the given time, or moves it
+    earlier if it is already within the queue
+    """
+    with _SCHEDULER['changed']:
+        queue_due = _SCHEDULER['due'].setdefault(queue_name, {})
+        if handle in queue_due and queue_due[handle] <= due_time:
+            return
+        queue_due[handle] = due_time
+        heap = _SCHEDULER['heaps'].setdefault(queue_name, [])
+        heapq.heappush(heap, (due_time, handle))
+        _SCHEDULER['changed'].notify_all()
+
+
+def scheduler_remove(queue_name: str, handle: str) -> None:
+    """Removes an account from a queue
+    """
+    with _SCHEDULER['changed']:
+        queue_due = _SCHEDULER['due'].get(queue_name)
+        if queue_due:
+            queue_due.pop(handle, None)
+
+
+def _scheduler_next(queue_name: str):
+    """Returns the time when the next item within a queue is due,
+    or None if the queue is empty.
+    This must be called while holding the lock
+    """
+    heap = _SCHEDULER['heaps'].get(queue_name)
+    queue_due = _SCHEDULER['due'].get(queue_name, {})
+    while heap:
+        due_time, handle = heap[0]
+        if queue_due.get(handle) == due_time:
+            return due_time
+        # the due time of this account has changed
+        heapq.heappop(heap)
+    return None
+
+
+def scheduler_wait(queue_name: str, max_wait_sec: float) -> []:
+    """Waits until items within a queue are due, or for up to the
+    given number of seconds. Returns the handles of the accounts which
+    are due, and removes them from the queue
+    """
+    deadline = time.time() + max_wait_sec
+    with _SCHEDULER['changed']:
+        while True:
+            curr_time = time.time()
+            due_time = _scheduler_next(queue_name)
+            if due_time is not None and due_time <= curr_time:
+                break
+            wait_sec = deadline - curr_time
+            if due_time is not None:
+                wait_sec = min(wait_sec, due_time - curr_time)
+            if wait_sec <= 0:
+                return []
+            _SCHEDULER['changed'].wait(wait_sec)
+        heap = _SCHEDULER['heaps'][queue_name]
+        queue_due = _SCHEDULER['due'][queue_name]
+        handles = []
+        while heap and heap[0][0] <= curr_time:
+            due_time, handle = heapq.heappop(heap)
+            if queue_due.get(handle) != due_time:
+                continue
+            del queue_due[handle]
+            handles.append(handle)
+    return handles
@@ -0,0 +1,727 @@
+__filename__ = "searchindex.py"
+__author__ = "Bob Mottram"
+__license__ = "AGPL3+"
+__version__ = "1.4.0"
+__maintainer__ = "Bob Mottram"
+__email__ = "bob@libreserver.org"
+__status__ = "Production"
+__module_group__ = "Timeline"
+
+# Inverted index used to search the posts of an account.
+# The searchindex directory of each account contains one file for each
+# word, in a similar manner to the hashtag files within the tags
+# directory. Each line of a word file is of the form
+# "box_name post_id count", where count is the number of times that the
+# word appears within the post. New posts are appended, so the most
+# recent posts are at the end of each file. Searches then only need to
+# read the files for the words being searched for.
+# The words having files are also held in a sorted list for each account,
+# so that each search word matches any indexed words which start with it,
+# such as "cat" matching "cats". Links and actor ids are not indexed,
+# and neither are common stopwords. Words which appear within so many
+# posts that their file becomes too large are not indexed either, and
+# are listed within the .common file of the index. Searches for urls, or
+# only for words which are not indexed, are done without the index.
+# Posts found using the index are then checked to contain each search
+# term, in the same way as when searching without the index, so that
+# phrases match.
+# Changes to the index are queued and written in batches by a background
+# thread, rather than by the thread which receives or sends the post, and
+# any queued changes are written before a search.
+# The index of an account is created in the background when it is first
+# searched, and until then searches don't use it.
+
+import os
+import re
+import json
+import html
+import time
+import bisect
+import shutil
+import threading
+from boxindex import box_index_entries
+from threads import thread_with_trace
+from threads import begin_thread
+
+# boxes of an account which are included within the search index
+SEARCH_INDEX_BOXES = ('inbox', 'outbox', 'tlblogs')
+
+# minimum and maximum length of indexed words
+SEARCH_INDEX_MIN_WORD_LENGTH = 2
+SEARCH_INDEX_MAX_WORD_LENGTH = 40
+
+# word files larger than this are not rewritten when a post is
+# deleted. Instead deleted posts are removed from them when they are
+# next searched
+SEARCH_INDEX_MAX_REWRITE_BYTES = 64 * 1024
+
+# search words which are the start of more indexed words than this
+# are not looked up within the index, and are only checked when the
+# posts found using the other words are read
+SEARCH_INDEX_MAX_PREFIX_WORDS = 64
+
+# word files which become larger than this are removed, and the word
+# is no longer indexed for the account
+SEARCH_INDEX_MAX_WORD_BYTES = 1024 * 1024
+
+# time between writes of queued changes to the index
+SEARCH_INDEX_FLUSH_SEC = 2
+
+# words which are too common to be worth indexing
+SEARCH_INDEX_STOPWORDS = frozenset((
+    'an', 'and', 'are', 'as', 'at', 'be', 'but', 'by', 'for', 'from',
+    'has', 'have', 'he', 'her', 'his', 'if', 'in', 'into', 'is', 'it',
+    'its', 'of', 'on', 'or', 'she', 'so', 'that', 'the', 'their', 'them',
+    'then', 'there', 'they', 'this', 'to', 'was', 'we', 'were', 'will',
+    'with', 'you', 'your'
+))
+
+_SEARCH_INDEX = {
+    'lock': threading.Lock(),
+    # index directory -> sorted list of the words having files
+    'sorted_words': {},
+    # index directory -> set of words which are too common to index
+    'common': {},
+    # account directories whose index is being created
+    'building': set(),
+    # queued changes to the index, in the order in which they were made
+    'pending': [],
+    # whether the thread which writes queued changes is running
+    'writing': False,
+    # held while queued changes are being written
+    'flush_lock': threading.Lock()
+}
+
+
+def _search_index_dir(account_dir: str) -> str:
+    """Returns the directory containing the search index for an account
+    """
+    return account_dir.rstrip('/') + '/searchindex'
+
+
+def search_index_words(text: str) -> []:
+    """Returns the words within some text which can be indexed.
+    Long words are shortened to the maximum length
+    """
+    words = []
+    for word in re.findall(r'\w+', text.lower()):
+        if len(word) < SEARCH_INDEX_MIN_WORD_LENGTH:
+            continue
+        if word in SEARCH_INDEX_STOPWORDS:
+            continue
+        words.append(word[:SEARCH_INDEX_MAX_WORD_LENGTH])
+    return words
+
+
+def _search_index_common(index_dir: str) -> set:
+    """Returns the words which are too common to be indexed.
+    This must be called while holding the lock
+    """
+    common = _SEARCH_INDEX['common'].get(index_dir)
+    if common is not None:
+        return common
+    common = set()
+    try:
+        with open(index_dir + '/.common', 'r', encoding='utf-8') as fp_common:
+            for line in fp_common:
+                if line.strip():
+                    common.add(line.strip())
+    except OSError:
+        pass
+    _SEARCH_INDEX['common'][index_dir] = common
+    return common
+
+
+def _search_index_add_common(index_dir: str, word: str) -> None:
+    """Stops indexing a word which appears within too many posts
+    """
+    with _SEARCH_INDEX['lock']:
+        common = _search_index_common(index_dir)
+        if word in common:
+            return
+        common.add(word)
+        sorted_words = _SEARCH_INDEX['sorted_words'].get(index_dir)
+        if sorted_words is not None:
+            word_pos = bisect.bisect_left(sorted_words, word)
+            if word_pos < len(sorted_words) and \
+               sorted_words[word_pos] == word:
+                del sorted_words[word_pos]
+    try:
+        with open(index_dir + '/.common', 'a+',
+                  encoding='utf-8') as fp_common:
+            fp_common.write(word + '\n')
+    except OSError:
+        print('EX: unable to add common word to search index ' + word)
+    try:
+        os.remove(index_dir + '/' + word + '.txt')
+    except OSError:
+        print('EX: unable to remove common word from search index ' + word)
+
+
+def _search_index_prefix(index_dir: str, word: str) -> []:
+    """Returns the indexed words which start with the given word
+    """
+    matched_words = []
+    with _SEARCH_INDEX['lock']:
+        sorted_words = _SEARCH_INDEX['sorted_words'].get(index_dir)
+        if sorted_words is None:
+            sorted_words = []
+            try:
+                for word_filename in os.listdir(index_dir):
+                    if word_filename.endswith('.txt'):
+                        sorted_words.append(word_filename[:-len('.txt')])
+            except OSError:
+                return matched_words
+            sorted_words.sort()
+            _SEARCH_INDEX['sorted_words'][index_dir] = sorted_words
+        word_pos = bisect.bisect_left(sorted_words, word)
+        while word_pos < len(sorted_words) and \
+                sorted_words[word_pos].startswith(word):
+            matched_words.append(sorted_words[word_pos])
+            word_pos += 1
+    return matched_words
+
+
+def _search_index_post_text(post_json_object: {}) -> str:
+    """Returns the searchable text of a post
+    """
+    post_obj = post_json_object
+    if isinstance(post_json_object.get('object'), dict):
+        post_obj = post_json_object['object']
+    text = ''
+    for field_name in ('summary', 'name', 'content'):
+        if isinstance(post_obj.get(field_name), str):
+            text += post_obj[field_name] + ' '
+    if isinstance(post_obj.get('contentMap'), dict):
+        for content in post_obj['contentMap'].values():
+            if isinstance(content, str) and content not in text:
+                text += content + ' '
+    for field_name in ('attachment', 'tag'):
+        if not isinstance(post_obj.get(field_name), list):
+            continue
+        for item in post_obj[field_name]:
+            if not isinstance(item, dict):
+                continue
+            if isinstance(item.get('name'), str):
+                text += item['name'] + ' '
+    # remove any html markup, together with any links
+    text = re.sub(r'<[^>]*>', ' ', text)
+    text = html.unescape(text)
+    return re.sub(r'\S*://\S*', ' ', text)
+
+
+def _search_index_word_counts(post_json_object: {}) -> {}:
+    """Returns the number of times that each word appears within a post
+    """
+    word_counts = {}
+    text = _search_index_post_text(post_json_object)
+    for word in search_index_words(text):
+        word_counts[word] = word_counts.get(word, 0) + 1
+    return word_counts
+
+
+def _search_index_read_word(index_dir: str, word: str) -> {}:
+    """Returns the posts containing a word, in the order in which
+    they were added
+    """
+    postings = {}
+    try:
+        with open(index_dir + '/' + word + '.txt', 'r',
+                  encoding='utf-8') as fp_word:
+            for line in fp_word:
+                fields = line.split()
+                if len(fields) != 3:
+                    continue
+                post_id = fields[1]
+                if post_id in postings:
+                    # keep the most recent entry
+                    del postings[post_id]
+                postings[post_id] = (fields[0], int(fields[2]))
+    except OSError:
+        pass
+    except ValueError:
+        print('WARN: invalid search index entry for ' + word)
+    return postings
+
+
+def _search_index_remove_from_word(index_dir: str, word: str,
+                                   post_ids: [], rewrite_large: bool) -> None:
+    """Removes posts from the file for a word
+    """
+    word_filename = index_dir + '/' + word + '.txt'
+    try:
+        if not rewrite_large:
+            if os.path.getsize(word_filename) > \
+               SEARCH_INDEX_MAX_REWRITE_BYTES:
+                return
+        with open(word_filename, 'r', encoding='utf-8') as fp_word:
+            lines = fp_word.readlines()
+    except OSError:
+        return
+    new_lines = ''
+    for line in lines:
+        fields = line.split()
+        if len(fields) == 3:
+            if fields[1] in post_ids:
+                continue
+        new_lines += line
+    if not new_lines:
+        try:
+            os.remove(word_filename)
+        except OSError:
+            print('EX: unable to remove search index ' + word_filename)
+        return
+    try:
+        with open(word_filename, 'w+', encoding='utf-8') as fp_word:
+            fp_word.write(new_lines)
+    except OSError:
+        print('EX: unable to write search index ' + word_filename)
+
+
+def _search_index_write_words(index_dir: str, word_lines: {}) -> None:
+    """Appends the queued entries for each word to its file
+    """
+    with _SEARCH_INDEX['lock']:
+        common = set(_search_index_common(index_dir))
+    common_words = []
+    for word, lines in word_lines.items():
+        if word in common:
+            continue
+        word_filename = index_dir + '/' + word + '.txt'
+        try:
+            with open(word_filename, 'a+', encoding='utf-8') as fp_word:
+                fp_word.write(lines)
+                if fp_word.tell() > SEARCH_INDEX_MAX_WORD_BYTES:
+                    common_words.append(word)
+        except OSError:
+            print('EX: unable to add to search index ' + word)
+    for word in common_words:
+        _search_index_add_common(index_dir, word)
+    # add any new words to the sorted list
+    with _SEARCH_INDEX['lock']:
+        sorted_words = _SEARCH_INDEX['sorted_words'].get(index_dir)
+        if sorted_words is None:
+            return
+        for word in word_lines:
+            if word in common or word in common_words:
+                continue
+            word_pos = bisect.bisect_left(sorted_words, word)
+            if word_pos < len(sorted_words) and \
+               sorted_words[word_pos] == word:
+                continue
+            sorted_words.insert(word_pos, word)
+
+
+def _search_index_write_pending(pending: []) -> None:
+    """Writes queued changes to the index. Consecutive additions to the
+    index of an account are written together, with each word file
+    being opened once
+    """
+    added = {}
+    for change in pending:
+        index_dir = change['index_dir']
+        if not os.path.isdir(index_dir):
+            continue
+        word_counts = _search_index_word_counts(change['post'])
+        if change['add']:
+            word_lines = added.setdefault(index_dir, {})
+            for word, count in word_counts.items():
+                word_lines[word] = word_lines.get(word, '') + \
+                    change['box_name'] + ' ' + change['post_id'] + ' ' + \
+                    str(count) + '\n'
+            continue
+        # write any earlier additions before removing
+        for added_dir, word_lines in added.items():
+            _search_index_write_words(added_dir, word_lines)
+        added = {}
+        for word in word_counts:
+            _search_index_remove_from_word(index_dir, word,
+                                           [change['post_id']],
+                                           change['rewrite_large'])
+    for added_dir, word_lines in added.items():
+        _search_index_write_words(added_dir, word_lines)
+
+
+def search_index_flush() -> int:
+    """Writes any queued changes to the index.
+    Returns the number of changes written
+    """
+    with _SEARCH_INDEX['flush_lock']:
+        with _SEARCH_INDEX['lock']:
+            pending = _SEARCH_INDEX['pending']
+            _SEARCH_INDEX['pending'] = []
+        if pending:
+            _search_index_write_pending(pending)
+    return len(pending)
+
+
+def _run_search_index_writer() -> None:
+    """Thread which writes queued changes to the index in batches,
+    and exits when there are no more changes
+    """
+    while True:
+        time.sleep(SEARCH_INDEX_FLUSH_SEC)
+        try:
+            search_index_flush()
+        except Exception as ex:
+            print('EX: _run_search_index_writer ' + str(ex))
+        with _SEARCH_INDEX['lock']:
+            if not _SEARCH_INDEX['pending']:
+                _SEARCH_INDEX['writing'] = False
+                return
+
+
+def _search_index_queue(change: {}) -> None:
+    """Queues a change to the index, to be written in the background
+    """
+    with _SEARCH_INDEX['lock']:
+        _SEARCH_INDEX['pending'].append(change)
+        if _SEARCH_INDEX['writing']:
+            return
+        _SEARCH_INDEX['writing'] = True
+    thr = thread_with_trace(target=_run_search_index_writer, daemon=True)
+    begin_thread(thr, '_search_index_queue')
+
+
+def add_post_to_search_index(account_dir: str, box_name: str,
+                             post_id: str, post_json_object: {}) -> None:
+    """Adds a post to the search index of an account
+    """
+    if box_name not in SEARCH_INDEX_BOXES:
+        return
+    index_dir = _search_index_dir(account_dir)
+    if not os.path.isdir(index_dir):
+        # the index will be created when it is first searched
+        return
+    _search_index_queue({
+        'add': True,
+        'index_dir': index_dir,
+        'box_name': box_name,
+        'post_id': post_id,
+        'post': post_json_object
+    })
+
+
+def remove_post_from_search_index(account_dir: str, post_id: str,
+                                  post_json_object: {},
+                                  rewrite_large: bool) -> None:
+    """Removes a post from the search index of an account.
+    If rewrite_large is False then large word files are left unchanged,
+    and the post is removed from them when they are next searched
+    """
+    index_dir = _search_index_dir(account_dir)
+    if not os.path.isdir(index_dir):
+        return
+    _search_index_queue({
+        'add': False,
+        'index_dir': index_dir,
+        'post_id': post_id,
+        'post': post_json_object,
+        'rewrite_large': rewrite_large
+    })
+
+
+def _search_index_box_posts(account_dir: str, box_name: str,
+                            since: float) -> []:
+    """Returns the filenames of the posts within a box which were
+    modified at or after the given time, oldest first
+    """
+    box_posts = []
+    box_dir = account_dir + '/' + box_name
+    if not os.path.isdir(box_dir):
+        return box_posts
+    for _, _, files in os.walk(box_dir):
+        for post_filename in files:
+            if not post_filename.endswith('.json'):
+                continue
+            try:
+                modified = os.path.getmtime(box_dir + '/' + post_filename)
+            except OSError:
+                continue
+            if modified >= since:
+                box_posts.append((modified, post_filename))
+        break
+    box_posts.sort()
+    return box_posts
+
+
+def _search_index_load_post(post_filename: str) -> {}:
+    """Returns a post which is to be indexed
+    """
+    post_json_object = None
+    try:
+        with open(post_filename, 'r', encoding='utf-8') as fp_post:
+            post_json_object = json.loads(fp_post.read())
+    except OSError:
+        print('EX: unable to read post for search index ' +
+              post_filename)
+    except json.JSONDecodeError:
+        print('WARN: unable to load post for search index ' +
+              post_filename)
+    if not isinstance(post_json_object, dict):
+        return None
+    return post_json_object
+
+
+def _search_index_build(account_dir: str) -> int:
+    """Creates the search index for an account, replacing any
+    previous index. Returns the number of posts indexed
+    """
+    start_time = time.time()
+    index_dir = _search_index_dir(account_dir)
+    new_index_dir = index_dir + '.new'
+    if os.path.isdir(new_index_dir):
+        shutil.rmtree(new_index_dir, ignore_errors=True)
+    try:
+        os.mkdir(new_index_dir)
+    except OSError:
+        print('EX: unable to create search index ' + new_index_dir)
+        return 0
+
+    postings = {}
+    ctr = 0
+    for box_name in SEARCH_INDEX_BOXES:
+        # oldest first, so that the most recent posts are at the end
+        box_posts = _search_index_box_posts(account_dir, box_name, 0)
+        for _, post_filename in box_posts:
+            post_json_object = \
+                _search_index_load_post(account_dir + '/' + box_name +
+                                        '/' + post_filename)
+            if not post_json_object:
+                continue
+            post_id = post_filename[:-len('.json')]
+            word_counts = _search_index_word_counts(post_json_object)
+            for word, count in word_counts.items():
+                if not postings.get(word):
+                    postings[word] = ''
+                postings[word] += \
+                    box_name + ' ' + post_id + ' ' + str(count) + '\n'
+            ctr += 1
+
+    common = set()
+    for word, word_str in postings.items():
+        if len(word_str) > SEARCH_INDEX_MAX_WORD_BYTES:
+            common.add(word)
+            continue
+        try:
+            with open(new_index_dir + '/' + word + '.txt', 'w+',
+                      encoding='utf-8') as fp_word:
+                fp_word.write(word_str)
+        except OSError:
+            print('EX: unable to write search index ' + word)
+    if common:
+        try:
+            with open(new_index_dir + '/.common', 'w+',
+                      encoding='utf-8') as fp_common:
+                for word in sorted(common):
+                    fp_common.write(word + '\n')
+        except OSError:
+            print('EX: unable to write search index common words')
+
+    # replace any previous index
+    if os.path.isdir(index_dir):
+        shutil.rmtree(index_dir, ignore_errors=True)
+    try:
+        os.rename(new_index_dir, index_dir)
+    except OSError:
+        print('EX: unable to rename search index ' + new_index_dir)
+        return 0
+    with _SEARCH_INDEX['lock']:
+        _SEARCH_INDEX['sorted_words'][index_dir] = \
+            sorted(set(postings.keys()) - common)
+        _SEARCH_INDEX['common'][index_dir] = common
+
+    # add any posts which arrived while the index was being created.
+    # If a post is indexed twice then the most recent entry is used
+    for box_name in SEARCH_INDEX_BOXES:
+        box_posts = \
+            _search_index_box_posts(account_dir, box_name, start_time - 1)
+        for _, post_filename in box_posts:
+            post_json_object = \
+                _search_index_load_post(account_dir + '/' + box_name +
+                                        '/' + post_filename)
+            if not post_json_object:
+                continue
+            post_id = post_filename[:-len('.json')]
+            add_post_to_search_index(account_dir, box_name, post_id,
+                                     post_json_object)
+    return ctr
+
+
+def rebuild_search_index(account_dir: str, debug: bool) -> int:
+    """Creates the search index for an account from the posts within
+    its boxes. Returns the number of posts indexed
+    """
+    account_dir = account_dir.rstrip('/')
+    with _SEARCH_INDEX['lock']:
+        if account_dir in _SEARCH_INDEX['building']:
+            return 0
+        _SEARCH_INDEX['building'].add(account_dir)
+    try:
+        ctr = _search_index_build(account_dir)
+    finally:
+        with _SEARCH_INDEX['lock']:
+            _SEARCH_INDEX['building'].discard(account_dir)
+    if debug:
+        print('DEBUG: search index created for ' + account_dir +
+              ' with ' + str(ctr) + ' posts')
+    return ctr
+
+
+def _search_index_begin_rebuild(account_dir: str) -> None:
+    """Creates the search index for an account in the background
+    """
+    with _SEARCH_INDEX['lock']:
+        if account_dir in _SEARCH_INDEX['building']:
+            return
+    print('THREAD: Creating search index thread')
+    thr = thread_with_trace(target=rebuild_search_index,
+                            args=(account_dir, False), daemon=True)
+    begin_thread(thr, '_search_index_begin_rebuild')
+
+
+def _search_index_contains(post_filename: str, search_terms: []) -> bool:
+    """Returns true if a post contains all of the search terms
+    """
+    try:
+        with open(post_filename, 'r', encoding='utf-8') as fp_post:
+            data = fp_post.read().lower()
+    except OSError:
+        return False
+    for search_term in search_terms:
+        if search_term not in data:
+            return False
+    return True
+
+
+def search_index_query(account_dir: str, box_name: str,
+                       search_words: [], max_results: int) -> []:
+    """Returns the filenames of posts within the given box which contain
+    all of the search words, with the most relevant first.
+    Returns None if the search can't be done using the index
+    """
+    account_dir = account_dir.rstrip('/')
+    search_terms = []
+    words = []
+    for search_word in search_words:
+        search_term = search_word.lower().strip()
+        if '/' in search_term or '.' in search_term:
+            # links and domains are not indexed
+            return None
+        word_list = search_index_words(search_term)
+        if not word_list:
+            return None
+        search_terms.append(search_term)
+        for word in word_list:
+            if word not in words:
+                words.append(word)
+    if not words:
+        return None
+
+    # virtual boxes, such as bookmarks or direct messages,
+    # are indexes of posts within other boxes
+    virtual_entries = None
+    if box_name not in SEARCH_INDEX_BOXES:
+        if os.path.isdir(account_dir + '/' + box_name):
+            return None
+        index_filename = account_dir + '/' + box_name + '.index'
+        if not os.path.isfile(index_filename):
+            return None
+        virtual_entries = set(box_index_entries(index_filename))
+
+    index_dir = _search_index_dir(account_dir)
+    if not os.path.isdir(index_dir):
+        _search_index_begin_rebuild(account_dir)
+        return None
+    search_index_flush()
+    with _SEARCH_INDEX['lock']:
+        common = set(_search_index_common(index_dir))
+
+    # the indexed words starting with each search word,
+    # beginning with the search word contained in the fewest posts
+    word_sizes = []
+    for word in words:
+        common_prefix = False
+        for common_word in common:
+            if common_word.startswith(word):
+                common_prefix = True
+                break
+        if common_prefix:
+            # posts containing a common word are not all indexed
+            continue
+        matched_words = _search_index_prefix(index_dir, word)
+        if not matched_words:
+            return []
+        if len(matched_words) > SEARCH_INDEX_MAX_PREFIX_WORDS:
+            continue
+        word_size = 0
+        for matched_word in matched_words:
+            try:
+                word_size += \
+                    os.path.getsize(index_dir + '/' + matched_word + '.txt')
+            except OSError:
+                pass
+        word_sizes.append((word_size, word, matched_words))
+    if not word_sizes:
+        return None
+    word_sizes.sort()
+    matches = None
+    for _, _, matched_words in word_sizes:
+        postings = {}
+        for matched_word in matched_words:
+            word_postings = _search_index_read_word(index_dir, matched_word)
+            for post_id, posting in word_postings.items():
+                if post_id in postings:
+                    posting = (posting[0], postings[post_id][1] + posting[1])
+                postings[post_id] = posting
+        if matches is None:
+            matches = {}
+            for post_id, posting in postings.items():
+                if virtual_entries is None:
+                    if posting[0] != box_name:
+                        continue
+                elif post_id + '.json' not in virtual_entries:
+                    continue
+                matches[post_id] = posting
+        else:
+            for post_id in list(matches.keys()):
+                posting = postings.get(post_id)
+                if not posting:
+                    del matches[post_id]
+                    continue
+                matches[post_id] = \
+                    (matches[post_id][0], matches[post_id][1] + posting[1])
+        if not matches:
+            return []
+
+    # most relevant first, then most recent first
+    ranked = []
+    recency = 0
+    for post_id, posting in matches.items():
+        ranked.append((posting[1], recency, post_id, posting[0]))
+        recency += 1
+    ranked.sort(reverse=True)
+
+    results = []
+    deleted_post_ids = []
+    for _, _, post_id, post_box_name in ranked:
+        post_filename = \
+            account_dir + '/' + post_box_name + '/' + post_id + '.json'
+        if not os.path.isfile(post_filename):
+            deleted_post_ids.append(post_id)
+            continue
+        # the index only contains words, so check that the post
+        # contains the search terms
+        if not _search_index_contains(post_filename, search_terms):
+            continue
+        results.append(post_filename)
+        if len(results) >= max_results:
+            break
+
+    # remove any posts which no longer exist from the index
+    if deleted_post_ids:
+        for _, _, matched_words in word_sizes:
+            for matched_word in matched_words:
+                _search_index_remove_from_word(index_dir, matched_word,
+                                               deleted_post_ids, True)
+    return results
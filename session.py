@@ -14,6 +14,7 @@ from utils import acct_dir
 from utils import url_permitted
 from utils import is_image_file
 from httpsig import create_signed_header
+from threads import thread_timeout_sec
 import json
 from socket import error as SocketError
 import errno
@@ -253,6 +254,8 @@ def get_json(signing_priv_key_pem: str,
     if debug:
         HTTPConnection.debuglevel = 1
 
+    timeout_sec = thread_timeout_sec(timeout_sec)
+
     if signing_priv_key_pem:
         return _get_json_signed(session, url, domain,
                                 session_headers, session_params,
@@ -539,6 +542,7 @@ def post_json(http_prefix: str, domain_full: str,
         return None
 
     _set_user_agent(session, http_prefix, domain_full)
+    timeout_sec = thread_timeout_sec(timeout_sec)
 
     try:
         post_result = \
@@ -594,6 +598,10 @@ def post_json_string(session, post_json_str: str,
 
     _set_user_agent(session, http_prefix, domain_full)
 
+    # if this is a sending thread which has been killed then stop here,
+    # otherwise don't wait for longer than the thread's deadline
+    timeout_sec = thread_timeout_sec(timeout_sec)
+
     try:
         post_result = \
             session.post(url=inbox_url, data=post_json_str,
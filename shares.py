@@ -12,6 +12,7 @@ import re
 import secrets
 import time
 import datetime
+import urllib.parse
 from random import randint
 from pprint import pprint
 from session import get_json
@@ -47,6 +48,16 @@ from siteactive import site_is_active
 from content import get_price_from_string
 from blocking import is_blocked
 from threads import begin_thread
+from threads import thread_sleep
+from sharesindex import shares_catalogs_dir
+from sharesindex import shares_index_update_account
+from sharesindex import shares_index_update_federated
+from sharesindex import shares_index_updated
+from sharesindex import shares_index_catalog
+from sharesindex import shares_index_expired
+
+# number of items within each page of a shares catalog
+SHARES_CATALOG_PAGE_SIZE = 256
 
 
 def _load_dfc_ids(base_dir: str, system_language: str,
@@ -154,7 +165,10 @@ def remove_shared_item(base_dir: str, nickname: str, domain: str,
                                   item_idfile + '.' + ext)
         # remove the item itself
         del shares_json[item_id]
-        save_json(shares_json, shares_filename)
+        if save_json(shares_json, shares_filename):
+            handle = os.path.basename(acct_dir(base_dir, nickname, domain))
+            shares_index_update_account(base_dir, handle, shares_file_type,
+                                        shares_json)
     else:
         print('ERROR: share index "' + item_id +
               '" does not exist in ' + shares_filename)
@@ -393,7 +407,10 @@ def add_share(base_dir: str,
         "itemCurrency": currency
     }
 
-    save_json(shares_json, shares_filename)
+    if save_json(shares_json, shares_filename):
+        handle = os.path.basename(acct_dir(base_dir, nickname, domain))
+        shares_index_update_account(base_dir, handle, shares_file_type,
+                                    shares_json)
 
     _indicate_new_share_available(base_dir, http_prefix,
                                   nickname, domain, domain_full,
@@ -403,16 +420,16 @@ def add_share(base_dir: str,
 def expire_shares(base_dir: str) -> None:
     """Removes expired items from shares
     """
-    for _, dirs, _ in os.walk(base_dir + '/accounts'):
-        for account in dirs:
-            if not is_account_dir(account):
-                continue
-            nickname = account.split('@')[0]
-            domain = account.split('@')[1]
-            for shares_file_type in get_shares_files_list():
-                _expire_shares_for_account(base_dir, nickname, domain,
-                                           shares_file_type)
-        break
+    curr_time = int(time.time())
+    for shares_file_type in get_shares_files_list():
+        # only the accounts having expired items need to be changed
+        expired_handles = \
+            shares_index_expired(base_dir, shares_file_type, curr_time)
+        for handle in expired_handles:
+            nickname = handle.split('@')[0]
+            domain = handle.split('@')[1]
+            _expire_shares_for_account(base_dir, nickname, domain,
+                                       shares_file_type)
 
 
 def _expire_shares_for_account(base_dir: str, nickname: str, domain: str,
@@ -447,7 +464,9 @@ def _expire_shares_for_account(base_dir: str, nickname: str, domain: str,
                 except OSError:
                     print('EX: _expire_shares_for_account unable to delete ' +
                           item_idfile + '.' + ext)
-    save_json(shares_json, shares_filename)
+    if save_json(shares_json, shares_filename):
+        shares_index_update_account(base_dir, handle, shares_file_type,
+                                    shares_json)
 
 
 def get_shares_feed_for_person(base_dir: str,
@@ -1128,22 +1147,32 @@ def outbox_undo_share_upload(base_dir: str, nickname: str, domain: str,
         print('DEBUG: shared item removed via c2s')
 
 
-def _shares_catalog_params(path: str) -> (bool, float, float, str):
-    """Returns parameters when accessing the shares catalog
+def _shares_catalog_args(path: str) -> []:
+    """Returns a list of (key, value) for the arguments of a
+    shares catalog url
     """
-    today = False
-    min_price = 0
-    max_price = 9999999
-    match_pattern = None
     if '?' not in path:
-        return today, min_price, max_price, match_pattern
+        return []
     args = path.split('?', 1)[1]
     arg_list = args.split(';')
+    key_values = []
     for arg in arg_list:
         if '=' not in arg:
             continue
         key = arg.split('=')[0].lower()
         value = arg.split('=')[1]
+        key_values.append((key, value))
+    return key_values
+
+
+def _shares_catalog_params(path: str) -> (bool, float, float, str):
+    """Returns parameters when accessing the shares catalog
+    """
+    today = False
+    min_price = 0
+    max_price = 9999999
+    match_pattern = None
+    for key, value in _shares_catalog_args(path):
         if key == 'today':
             value = value.lower()
             if 't' in value or 'y' in value or '1' in value:
@@ -1159,62 +1188,51 @@ def _shares_catalog_params(path: str) -> (bool, float, float, str):
     return today, min_price, max_price, match_pattern
 
 
-def shares_catalog_account_endpoint(base_dir: str, http_prefix: str,
-                                    nickname: str, domain: str,
-                                    domain_full: str,
-                                    path: str, debug: bool,
-                                    shares_file_type: str) -> {}:
-    """Returns the endpoint for the shares catalog of a particular account
-    See https://github.com/datafoodconsortium/ontology
-    Also the subdirectory ontology/DFC
+def _shares_catalog_index_params(path: str) -> (str, str, int, int):
+    """Returns the category, location, page number and the time
+    of a previous download when accessing the shares catalog
+    """
+    category = None
+    location = None
+    page_number = 0
+    since = 0
+    for key, value in _shares_catalog_args(path):
+        if key == 'category':
+            category = urllib.parse.unquote_plus(value)
+        elif key == 'location':
+            location = urllib.parse.unquote_plus(value)
+        elif key == 'page':
+            if value.isdigit():
+                page_number = int(value)
+        elif key == 'since':
+            if value.isdigit():
+                since = int(value)
+    return category, location, page_number, since
+
+
+def _shares_catalog_supplies(base_dir: str, http_prefix: str,
+                             domain_full: str, path: str,
+                             shares_file_type: str, handle: str) -> []:
+    """Returns the items of a shares catalog for the instance,
+    or for a single account
     """
     today, min_price, max_price, match_pattern = _shares_catalog_params(path)
-    dfc_url = \
-        http_prefix + '://' + domain_full + '/ontologies/DFC_FullModel.owl#'
-    dfc_pt_url = \
-        http_prefix + '://' + domain_full + \
-        '/ontologies/DFC_ProductGlossary.rdf#'
-    owner = local_actor_url(http_prefix, nickname, domain_full)
-    if shares_file_type == 'shares':
-        dfc_instance_id = owner + '/catalog'
-    else:
-        dfc_instance_id = owner + '/wantedItems'
-    endpoint = {
-        "@context": {
-            "DFC": dfc_url,
-            "dfc-pt": dfc_pt_url,
-            "@base": "http://maPlateformeNationale"
-        },
-        "@id": dfc_instance_id,
-        "@type": "DFC:Entreprise",
-        "DFC:supplies": []
-    }
+    category, location, _, _ = _shares_catalog_index_params(path)
 
     curr_date = datetime.datetime.utcnow()
     curr_date_str = curr_date.strftime("%Y-%m-%d")
 
-    shares_filename = \
-        acct_dir(base_dir, nickname, domain) + '/' + shares_file_type + '.json'
-    if not os.path.isfile(shares_filename):
-        if debug:
-            print(shares_file_type + '.json file not found: ' +
-                  shares_filename)
-        return endpoint
-    shares_json = load_json(shares_filename, 1, 2)
-    if not shares_json:
-        if debug:
-            print('Unable to load json for ' + shares_filename)
-        return endpoint
-
-    for item_id, item in shares_json.items():
+    supplies = []
+    catalog = shares_index_catalog(base_dir, shares_file_type,
+                                   handle, category, location)
+    for _, owner_handle, item in catalog:
         if not item.get('dfcId'):
-            if debug:
-                print('Item does not have dfcId: ' + item_id)
             continue
         if '#' not in item['dfcId']:
             continue
+        start_date_str = date_seconds_to_string(item['published'])
         if today:
-            if not item['published'].startswith(curr_date_str):
+            if not start_date_str.startswith(curr_date_str):
                 continue
         if min_price is not None:
             if float(item['itemPrice']) < min_price:
@@ -1227,9 +1245,9 @@ def shares_catalog_account_endpoint(base_dir: str, http_prefix: str,
             if not re.match(match_pattern, description):
                 continue
 
-        expire_date = datetime.datetime.fromtimestamp(item['expire'])
-        expire_date_str = expire_date.strftime("%Y-%m-%dT%H:%M:%SZ")
-
+        expire_date_str = date_seconds_to_string(item['expire'])
+        owner_nickname = owner_handle.split('@')[0]
+        owner = local_actor_url(http_prefix, owner_nickname, domain_full)
         share_id = _get_valid_shared_item_id(owner, item['displayName'])
         if item['dfcId'].startswith('epicyon#'):
             dfc_id = "epicyon:" + item['dfcId'].split('#')[1]
@@ -1240,15 +1258,95 @@ def shares_catalog_account_endpoint(base_dir: str, http_prefix: str,
             "@id": share_id,
             "@type": "DFC:SuppliedProduct",
             "DFC:hasType": dfc_id,
-            "DFC:startDate": item['published'],
+            "DFC:startDate": start_date_str,
             "DFC:expiryDate": expire_date_str,
             "DFC:quantity": float(item['itemQty']),
             "DFC:price": price_str,
             "DFC:Image": item['imageUrl'],
             "DFC:description": description
         }
-        endpoint['DFC:supplies'].append(catalog_item)
+        supplies.append(catalog_item)
+    return supplies
+
+
+def _shares_catalog_page(endpoint: {}, supplies: [], path: str) -> None:
+    """Adds the items of a shares catalog to its endpoint. If a page
+    is requested then only the items within that page are added,
+    together with a link to the next page
+    """
+    _, _, page_number, _ = _shares_catalog_index_params(path)
+    if not page_number:
+        endpoint['DFC:supplies'] = supplies
+        return
+    start_index = (page_number - 1) * SHARES_CATALOG_PAGE_SIZE
+    end_index = start_index + SHARES_CATALOG_PAGE_SIZE
+    endpoint['DFC:supplies'] = supplies[start_index:end_index]
+    if end_index >= len(supplies):
+        return
+    next_args = []
+    for key, value in _shares_catalog_args(path):
+        if key != 'page':
+            next_args.append(key + '=' + value)
+    next_args.append('page=' + str(page_number + 1))
+    endpoint['epicyon:next'] = endpoint['@id'] + '?' + ';'.join(next_args)
+
+
+def _shares_catalog_unchanged(base_dir: str, endpoint: {}, path: str,
+                              shares_file_type: str) -> bool:
+    """Records the time when the shares last changed within the
+    catalog endpoint, and returns true if they have not changed since
+    the time given by a previous download of the catalog
+    """
+    _, _, _, since = _shares_catalog_index_params(path)
+    updated = shares_index_updated(base_dir, shares_file_type)
+    endpoint['epicyon:updated'] = updated
+    if since and updated <= since:
+        endpoint['epicyon:unchanged'] = True
+        return True
+    return False
+
+
+def shares_catalog_account_endpoint(base_dir: str, http_prefix: str,
+                                    nickname: str, domain: str,
+                                    domain_full: str,
+                                    path: str, debug: bool,
+                                    shares_file_type: str) -> {}:
+    """Returns the endpoint for the shares catalog of a particular account
+    See https://github.com/datafoodconsortium/ontology
+    Also the subdirectory ontology/DFC
+    """
+    dfc_url = \
+        http_prefix + '://' + domain_full + '/ontologies/DFC_FullModel.owl#'
+    dfc_pt_url = \
+        http_prefix + '://' + domain_full + \
+        '/ontologies/DFC_ProductGlossary.rdf#'
+    owner = local_actor_url(http_prefix, nickname, domain_full)
+    if shares_file_type == 'shares':
+        dfc_instance_id = owner + '/catalog'
+    else:
+        dfc_instance_id = owner + '/wantedItems'
+    endpoint = {
+        "@context": {
+            "DFC": dfc_url,
+            "dfc-pt": dfc_pt_url,
+            "@base": "http://maPlateformeNationale"
+        },
+        "@id": dfc_instance_id,
+        "@type": "DFC:Entreprise",
+        "DFC:supplies": []
+    }
 
+    if _shares_catalog_unchanged(base_dir, endpoint, path, shares_file_type):
+        return endpoint
+
+    handle = os.path.basename(acct_dir(base_dir, nickname, domain))
+    supplies = \
+        _shares_catalog_supplies(base_dir, http_prefix, domain_full, path,
+                                 shares_file_type, handle)
+    if debug and not supplies:
+        print('No items within the ' + shares_file_type +
+              ' catalog for ' + handle)
+    _shares_catalog_page(endpoint, supplies, path)
     return endpoint
 
 
@@ -1259,7 +1357,6 @@ def shares_catalog_endpoint(base_dir: str, http_prefix: str,
     See https://github.com/datafoodconsortium/ontology
     Also the subdirectory ontology/DFC
     """
-    today, min_price, max_price, match_pattern = _shares_catalog_params(path)
     dfc_url = \
         http_prefix + '://' + domain_full + '/ontologies/DFC_FullModel.owl#'
     dfc_pt_url = \
@@ -1277,69 +1374,13 @@ def shares_catalog_endpoint(base_dir: str, http_prefix: str,
         "DFC:supplies": []
     }
 
-    curr_date = datetime.datetime.utcnow()
-    curr_date_str = curr_date.strftime("%Y-%m-%d")
-
-    for _, dirs, _ in os.walk(base_dir + '/accounts'):
-        for acct in dirs:
-            if not is_account_dir(acct):
-                continue
-            nickname = acct.split('@')[0]
-            domain = acct.split('@')[1]
-            owner = local_actor_url(http_prefix, nickname, domain_full)
-
-            shares_filename = \
-                acct_dir(base_dir, nickname, domain) + '/' + \
-                shares_file_type + '.json'
-            if not os.path.isfile(shares_filename):
-                continue
-            print('Test 78363 ' + shares_filename)
-            shares_json = load_json(shares_filename, 1, 2)
-            if not shares_json:
-                continue
-
-            for _, item in shares_json.items():
-                if not item.get('dfcId'):
-                    continue
-                if '#' not in item['dfcId']:
-                    continue
-                if today:
-                    if not item['published'].startswith(curr_date_str):
-                        continue
-                if min_price is not None:
-                    if float(item['itemPrice']) < min_price:
-                        continue
-                if max_price is not None:
-                    if float(item['itemPrice']) > max_price:
-                        continue
-                description = item['displayName'] + ': ' + item['summary']
-                if match_pattern:
-                    if not re.match(match_pattern, description):
-                        continue
-
-                start_date_str = date_seconds_to_string(item['published'])
-                expire_date_str = date_seconds_to_string(item['expire'])
-                share_id = \
-                    _get_valid_shared_item_id(owner, item['displayName'])
-                if item['dfcId'].startswith('epicyon#'):
-                    dfc_id = "epicyon:" + item['dfcId'].split('#')[1]
-                else:
-                    dfc_id = "dfc-pt:" + item['dfcId'].split('#')[1]
-                price_str = item['itemPrice'] + ' ' + item['itemCurrency']
-                catalog_item = {
-                    "@id": share_id,
-                    "@type": "DFC:SuppliedProduct",
-                    "DFC:hasType": dfc_id,
-                    "DFC:startDate": start_date_str,
-                    "DFC:expiryDate": expire_date_str,
-                    "DFC:quantity": float(item['itemQty']),
-                    "DFC:price": price_str,
-                    "DFC:Image": item['imageUrl'],
-                    "DFC:description": description
-                }
-                endpoint['DFC:supplies'].append(catalog_item)
-        break
+    if _shares_catalog_unchanged(base_dir, endpoint, path, shares_file_type):
+        return endpoint
 
+    supplies = \
+        _shares_catalog_supplies(base_dir, http_prefix, domain_full, path,
+                                 shares_file_type, None)
+    _shares_catalog_page(endpoint, supplies, path)
     return endpoint
 
 
@@ -1558,10 +1599,7 @@ def _update_federated_shares_cache(session, shared_items_federated_domains: [],
     cache_dir = base_dir + '/cache'
     if not os.path.isdir(cache_dir):
         os.mkdir(cache_dir)
-    if shares_file_type == 'shares':
-        catalogs_dir = cache_dir + '/catalogs'
-    else:
-        catalogs_dir = cache_dir + '/wantedItems'
+    catalogs_dir = shares_catalogs_dir(base_dir, shares_file_type)
     if not os.path.isdir(catalogs_dir):
         os.mkdir(catalogs_dir)
 
@@ -1584,28 +1622,90 @@ def _update_federated_shares_cache(session, shared_items_federated_domains: [],
             url = http_prefix + '://' + federated_domain_full + '/catalog'
         else:
             url = http_prefix + '://' + federated_domain_full + '/wantedItems'
+        catalog_filename = catalogs_dir + '/' + federated_domain_full + '.json'
+        shares_filename = \
+            catalogs_dir + '/' + federated_domain_full + '.' + \
+            shares_file_type + '.json'
+        prev_catalog_json = None
+        prev_shares_json = None
+        if os.path.isfile(catalog_filename) and \
+           os.path.isfile(shares_filename):
+            prev_catalog_json = load_json(catalog_filename)
+            prev_shares_json = load_json(shares_filename)
+        # only ask for the catalog if it has changed since
+        # it was previously downloaded
+        if prev_catalog_json and prev_shares_json is not None:
+            if isinstance(prev_catalog_json.get('epicyon:updated'), int):
+                url += '?since=' + str(prev_catalog_json['epicyon:updated'])
         as_header['Authorization'] = tokens_json[federated_domain_full]
-        catalog_json = get_json(session, url, as_header, None,
+        catalog_json = get_json(None, session, url, as_header, None,
                                 debug, __version__, http_prefix, None)
         if not catalog_json:
             print('WARN: failed to download shared items catalog for ' +
                   federated_domain_full)
             continue
-        catalog_filename = catalogs_dir + '/' + federated_domain_full + '.json'
+        if catalog_json.get('epicyon:unchanged'):
+            if debug:
+                print('Shared items catalog is unchanged for ' +
+                      federated_domain_full)
+            continue
         if save_json(catalog_json, catalog_filename):
             print('Downloaded shared items catalog for ' +
                   federated_domain_full)
-            shares_json = _dfc_to_shares_format(catalog_json,
-                                                base_dir, system_language,
-                                                http_prefix, domain_full)
-            if shares_json:
-                shares_filename = \
-                    catalogs_dir + '/' + federated_domain_full + '.' + \
-                    shares_file_type + '.json'
-                save_json(shares_json, shares_filename)
+            shares_json = \
+                _merge_federated_catalog(catalog_json, prev_catalog_json,
+                                         prev_shares_json, base_dir,
+                                         system_language, http_prefix,
+                                         domain_full)
+            if save_json(shares_json, shares_filename):
+                shares_index_update_federated(base_dir, federated_domain_full,
+                                              shares_file_type, shares_json)
                 print('Converted shares catalog for ' + federated_domain_full)
         else:
-            time.sleep(2)
+            thread_sleep(2)
+
+
+def _merge_federated_catalog(catalog_json: {}, prev_catalog_json: {},
+                             prev_shares_json: {}, base_dir: str,
+                             system_language: str, http_prefix: str,
+                             domain_full: str) -> {}:
+    """Converts a downloaded catalog into the internal format used to
+    store shared items. Items which have not changed since the previous
+    download are not converted again
+    """
+    prev_items = {}
+    if prev_catalog_json and prev_shares_json:
+        if isinstance(prev_catalog_json.get('DFC:supplies'), list):
+            for item in prev_catalog_json['DFC:supplies']:
+                if isinstance(item, dict) and item.get('@id'):
+                    prev_items[item['@id']] = item
+    curr_time = int(time.time())
+    shares_json = {}
+    changed_items = []
+    supplies = catalog_json.get('DFC:supplies')
+    if not isinstance(supplies, list):
+        return shares_json
+    for item in supplies:
+        if not isinstance(item, dict) or not item.get('@id'):
+            continue
+        item_id = item['@id']
+        if prev_items.get(item_id) == item and \
+           prev_shares_json.get(item_id):
+            prev_share = prev_shares_json[item_id]
+            if prev_share['expire'] >= curr_time:
+                shares_json[item_id] = prev_share
+            continue
+        changed_items.append(item)
+    if not changed_items:
+        return shares_json
+    changed_json = {
+        'DFC:supplies': changed_items
+    }
+    changed_shares_json = \
+        _dfc_to_shares_format(changed_json, base_dir, system_language,
+                              http_prefix, domain_full)
+    shares_json.update(changed_shares_json)
+    return shares_json
 
 
 def run_federated_shares_watchdog(project_version: str, httpd) -> None:
@@ -1713,7 +1813,7 @@ def run_federated_shares_daemon(base_dir: str, httpd, http_prefix: str,
     """
     seconds_per_hour = 60 * 60
     file_check_interval_sec = 120
-    time.sleep(60)
+    thread_sleep(60)
     # the token for this instance will be changed every 7-14 days
     min_days = 7
     max_days = 14
@@ -1722,7 +1822,7 @@ def run_federated_shares_daemon(base_dir: str, httpd, http_prefix: str,
         shared_items_federated_domains_str = \
             get_config_param(base_dir, 'sharedItemsFederatedDomains')
         if not shared_items_federated_domains_str:
-            time.sleep(file_check_interval_sec)
+            thread_sleep(file_check_interval_sec)
             continue
 
         # occasionally change the federated shared items token
@@ -1737,18 +1837,18 @@ def run_federated_shares_daemon(base_dir: str, httpd, http_prefix: str,
         for shared_fed_domain in fed_domains_list:
             shared_items_federated_domains.append(shared_fed_domain.strip())
         if not shared_items_federated_domains:
-            time.sleep(file_check_interval_sec)
+            thread_sleep(file_check_interval_sec)
             continue
 
         # load the tokens
         tokens_filename = \
             base_dir + '/accounts/sharedItemsFederationTokens.json'
         if not os.path.isfile(tokens_filename):
-            time.sleep(file_check_interval_sec)
+            thread_sleep(file_check_interval_sec)
             continue
         tokens_json = load_json(tokens_filename, 1, 2)
         if not tokens_json:
-            time.sleep(file_check_interval_sec)
+            thread_sleep(file_check_interval_sec)
             continue
 
         session = create_session(proxy_type)
@@ -1758,7 +1858,7 @@ def run_federated_shares_daemon(base_dir: str, httpd, http_prefix: str,
                                            base_dir, domain_full, http_prefix,
                                            tokens_json, debug, system_language,
                                            shares_file_type)
-        time.sleep(seconds_per_hour * 6)
+        thread_sleep(seconds_per_hour * 6)
 
 
 def _dfc_to_shares_format(catalog_json: {},
@@ -0,0 +1,380 @@
+__filename__ = "sharesindex.py"
+__author__ = "Bob Mottram"
+__license__ = "AGPL3+"
+__version__ = "1.4.0"
+__maintainer__ = "Bob Mottram"
+__email__ = "bob@libreserver.org"
+__status__ = "Production"
+__module_group__ = "Timeline"
+
+# Index of shared and wanted items, so that catalogs, searches and
+# expiry don't need to load the shares of every account and every
+# federated catalog from file.
+# Items are indexed by category, by location and by the words of their
+# text, and a heap of expiry times is kept so that expired items can be
+# found without examining every item. The index is built from the
+# accounts and from the cached federated catalogs when first needed,
+# and is updated whenever the shares of an account or a federated
+# catalog are saved.
+# The time of the most recent change to the items of accounts on this
+# instance is kept, so that other instances can ask whether its catalog
+# has changed since they last downloaded it. Changes to federated
+# catalogs don't alter this time, because they are not published.
+
+import os
+import re
+import time
+import heapq
+import bisect
+import threading
+from utils import is_account_dir
+from utils import load_json
+
+_SHARES_INDEX = {
+    'lock': threading.Lock(),
+    'base_dir': None,
+    # shares file type -> index of shared or wanted items
+    'types': {}
+}
+
+
+def _shares_index_new() -> {}:
+    """Returns an empty index
+    """
+    return {
+        # item id -> {'owner': handle, 'federated': domain, 'item': {}}
+        'items': {},
+        # category -> set of item ids
+        'categories': {},
+        # location -> set of item ids
+        'locations': {},
+        # (owner handle, federated domain) -> set of item ids
+        'owners': {},
+        # word -> set of item ids
+        'words': {},
+        # sorted list of words, used for prefix searches
+        'sorted_words': [],
+        # heap of (expiry time, item id)
+        'expiry': [],
+        # time of the most recent change to the items of local accounts
+        'local_updated': int(time.time())
+    }
+
+
+def shares_catalogs_dir(base_dir: str, shares_file_type: str) -> str:
+    """Returns the directory containing cached federated catalogs
+    """
+    if shares_file_type == 'shares':
+        return base_dir + '/cache/catalogs'
+    return base_dir + '/cache/wantedItems'
+
+
+def _shares_index_words(item: {}) -> set:
+    """Returns the words within the text of a shared item
+    """
+    text = ''
+    for field in ('displayName', 'summary', 'itemType',
+                  'category', 'location'):
+        if isinstance(item.get(field), str):
+            text += ' ' + item[field]
+    return set(re.findall(r'\w+', text.lower()))
+
+
+def _shares_index_field(item: {}, field: str) -> str:
+    """Returns a field of a shared item in the form used within the index
+    """
+    value = item.get(field)
+    if not isinstance(value, str):
+        return ''
+    return value.strip().lower()
+
+
+def _shares_index_discard(mapping: {}, key: str, item_id: str) -> None:
+    """Removes an item id from one of the mappings of the index
+    """
+    item_ids = mapping.get(key)
+    if item_ids is None:
+        return
+    item_ids.discard(item_id)
+    if not item_ids:
+        del mapping[key]
+
+
+def _shares_index_remove(index: {}, item_id: str) -> None:
+    """Removes an item from an index
+    """
+    entry = index['items'].pop(item_id, None)
+    if not entry:
+        return
+    item = entry['item']
+    _shares_index_discard(index['owners'],
+                          (entry['owner'], entry['federated']), item_id)
+    category = _shares_index_field(item, 'category')
+    if category:
+        _shares_index_discard(index['categories'], category, item_id)
+    location = _shares_index_field(item, 'location')
+    if location:
+        _shares_index_discard(index['locations'], location, item_id)
+    for word in entry['words']:
+        _shares_index_discard(index['words'], word, item_id)
+        if index['words'].get(word):
+            continue
+        word_pos = bisect.bisect_left(index['sorted_words'], word)
+        if word_pos < len(index['sorted_words']) and \
+           index['sorted_words'][word_pos] == word:
+            del index['sorted_words'][word_pos]
+
+
+def _shares_index_add(index: {}, item_id: str, item: {},
+                      owner: str, federated: str) -> None:
+    """Adds an item to an index, replacing any previous entry
+    """
+    _shares_index_remove(index, item_id)
+    if not isinstance(item, dict):
+        return
+    entry = {
+        'owner': owner,
+        'federated': federated,
+        'item': item,
+        'words': _shares_index_words(item)
+    }
+    index['items'][item_id] = entry
+    index['owners'].setdefault((owner, federated), set()).add(item_id)
+    category = _shares_index_field(item, 'category')
+    if category:
+        index['categories'].setdefault(category, set()).add(item_id)
+    location = _shares_index_field(item, 'location')
+    if location:
+        index['locations'].setdefault(location, set()).add(item_id)
+    for word in entry['words']:
+        if not index['words'].get(word):
+            index['words'][word] = set()
+            bisect.insort(index['sorted_words'], word)
+        index['words'][word].add(item_id)
+    if isinstance(item.get('expire'), int):
+        heapq.heappush(index['expiry'], (item['expire'], item_id))
+
+
+def _shares_index_replace(index: {}, shares_json: {},
+                          owner: str, federated: str) -> bool:
+    """Replaces all of the items of an account or of a federated
+    instance within an index.
+    Returns true if any items were added, changed or removed
+    """
+    changed = False
+    owner_ids = index['owners'].get((owner, federated), set())
+    for item_id in list(owner_ids):
+        if not shares_json or item_id not in shares_json:
+            _shares_index_remove(index, item_id)
+            changed = True
+    if shares_json:
+        for item_id, item in shares_json.items():
+            existing = index['items'].get(item_id)
+            if existing and existing['item'] == item and \
+               existing['owner'] == owner and \
+               existing['federated'] == federated:
+                continue
+            _shares_index_add(index, item_id, item, owner, federated)
+            changed = True
+    return changed
+
+
+def _shares_index_load(base_dir: str, shares_file_type: str) -> {}:
+    """Returns the index for a type of shares, building it if needed.
+    This must be called while holding the lock
+    """
+    if _SHARES_INDEX['base_dir'] != base_dir:
+        _SHARES_INDEX['base_dir'] = base_dir
+        _SHARES_INDEX['types'] = {}
+    index = _SHARES_INDEX['types'].get(shares_file_type)
+    if index:
+        return index
+    index = _shares_index_new()
+    accounts_dir = base_dir + '/accounts'
+    if os.path.isdir(accounts_dir):
+        for handle in os.listdir(accounts_dir):
+            if not is_account_dir(handle):
+                continue
+            shares_filename = \
+                accounts_dir + '/' + handle + '/' + shares_file_type + '.json'
+            if not os.path.isfile(shares_filename):
+                continue
+            shares_json = load_json(shares_filename)
+            if not shares_json:
+                continue
+            for item_id, item in shares_json.items():
+                _shares_index_add(index, item_id, item, handle, '')
+    catalogs_dir = shares_catalogs_dir(base_dir, shares_file_type)
+    suffix = '.' + shares_file_type + '.json'
+    if os.path.isdir(catalogs_dir):
+        for fname in os.listdir(catalogs_dir):
+            if '#' in fname or not fname.endswith(suffix):
+                continue
+            federated_domain = fname[:-len(suffix)]
+            shares_json = load_json(catalogs_dir + '/' + fname)
+            if not shares_json:
+                continue
+            for item_id, item in shares_json.items():
+                _shares_index_add(index, item_id, item, '', federated_domain)
+    _SHARES_INDEX['types'][shares_file_type] = index
+    return index
+
+
+def shares_index_update_account(base_dir: str, handle: str,
+                                shares_file_type: str,
+                                shares_json: {}) -> None:
+    """Updates the index after the shares of an account have changed
+    """
+    with _SHARES_INDEX['lock']:
+        index = _shares_index_load(base_dir, shares_file_type)
+        if _shares_index_replace(index, shares_json, handle, ''):
+            # always increases, so that changes made within the same
+            # second as a previous download are not missed
+            index['local_updated'] = \
+                max(int(time.time()), index['local_updated'] + 1)
+
+
+def shares_index_update_federated(base_dir: str, federated_domain: str,
+                                  shares_file_type: str,
+                                  shares_json: {}) -> None:
+    """Updates the index after the catalog of a federated
+    instance has changed
+    """
+    with _SHARES_INDEX['lock']:
+        index = _shares_index_load(base_dir, shares_file_type)
+        _shares_index_replace(index, shares_json, '', federated_domain)
+
+
+def shares_index_updated(base_dir: str, shares_file_type: str) -> int:
+    """Returns the time when the shares of accounts on this
+    instance last changed
+    """
+    with _SHARES_INDEX['lock']:
+        index = _shares_index_load(base_dir, shares_file_type)
+        return index['local_updated']
+
+
+def _shares_index_sorted(index: {}, item_ids) -> []:
+    """Returns a list of (item id, owner, federated domain, item),
+    with the most recently published first
+    """
+    results = []
+    for item_id in item_ids:
+        entry = index['items'][item_id]
+        results.append((item_id, entry['owner'], entry['federated'],
+                        entry['item']))
+    results.sort(key=lambda result: (-result[3].get('published', 0),
+                                     result[0]))
+    return results
+
+
+def shares_index_catalog(base_dir: str, shares_file_type: str,
+                         handle: str, category: str, location: str) -> []:
+    """Returns the shares of the accounts on this instance, optionally
+    for a single account or with a given category or location, as a list
+    of (item id, owner handle, item) with the most recent first
+    """
+    with _SHARES_INDEX['lock']:
+        index = _shares_index_load(base_dir, shares_file_type)
+        item_ids = None
+        if handle:
+            item_ids = set(index['owners'].get((handle, ''), ()))
+        if category:
+            category_ids = index['categories'].get(category.lower(), set())
+            if item_ids is None:
+                item_ids = set(category_ids)
+            else:
+                item_ids &= category_ids
+        if location:
+            location_ids = index['locations'].get(location.lower(), set())
+            if item_ids is None:
+                item_ids = set(location_ids)
+            else:
+                item_ids &= location_ids
+        if item_ids is None:
+            item_ids = index['items'].keys()
+        local_ids = []
+        for item_id in item_ids:
+            if not index['items'][item_id]['federated']:
+                local_ids.append(item_id)
+        results = _shares_index_sorted(index, local_ids)
+    catalog = []
+    for item_id, owner, _, item in results:
+        catalog.append((item_id, owner, item))
+    return catalog
+
+
+def _shares_index_prefix(index: {}, word: str) -> set:
+    """Returns the ids of items having a word starting with the given text
+    """
+    item_ids = set()
+    sorted_words = index['sorted_words']
+    word_pos = bisect.bisect_left(sorted_words, word)
+    while word_pos < len(sorted_words) and \
+            sorted_words[word_pos].startswith(word):
+        item_ids |= index['words'][sorted_words[word_pos]]
+        word_pos += 1
+    return item_ids
+
+
+def shares_index_search(base_dir: str, shares_file_type: str,
+                        search_terms: [], federated_domains: []) -> []:
+    """Returns the items matching any of the search terms, as a list of
+    (item id, owner handle, federated domain, item) with the most
+    recent first. Every word of a term must be the start of a word
+    within the text of the item. Federated items are only included
+    if they are from one of the given domains
+    """
+    with _SHARES_INDEX['lock']:
+        index = _shares_index_load(base_dir, shares_file_type)
+        matched_ids = set()
+        for term in search_terms:
+            term_words = re.findall(r'\w+', term.lower())
+            if not term_words:
+                continue
+            term_ids = None
+            for word in term_words:
+                word_ids = _shares_index_prefix(index, word)
+                if term_ids is None:
+                    term_ids = word_ids
+                else:
+                    term_ids &= word_ids
+                if not term_ids:
+                    break
+            if term_ids:
+                matched_ids |= term_ids
+        permitted_ids = []
+        for item_id in matched_ids:
+            federated = index['items'][item_id]['federated']
+            if federated and federated not in federated_domains:
+                continue
+            permitted_ids.append(item_id)
+        return _shares_index_sorted(index, permitted_ids)
+
+
+def shares_index_expired(base_dir: str, shares_file_type: str,
+                         curr_time: int) -> []:
+    """Returns the handles of accounts on this instance having
+    shares which have expired.
+    Expired items remain within the expiry heap until they have been
+    removed from the shares of their account, so that they are found
+    again if saving the shares fails
+    """
+    handles = set()
+    with _SHARES_INDEX['lock']:
+        index = _shares_index_load(base_dir, shares_file_type)
+        expiry = index['expiry']
+        expired = []
+        while expiry and expiry[0][0] < curr_time:
+            expire_time, item_id = heapq.heappop(expiry)
+            entry = index['items'].get(item_id)
+            if not entry or entry['federated']:
+                continue
+            # the item may have been replaced since it was added
+            if entry['item'].get('expire') != expire_time:
+                continue
+            expired.append((expire_time, item_id))
+            handles.add(entry['owner'])
+        for expiry_entry in expired:
+            heapq.heappush(expiry, expiry_entry)
+    return list(handles)
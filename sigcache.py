@@ -0,0 +1,161 @@
+__filename__ = "sigcache.py"
+__author__ = "Bob Mottram"
+__license__ = "AGPL3+"
+__version__ = "1.4.0"
+__maintainer__ = "Bob Mottram"
+__email__ = "bob@libreserver.org"
+__status__ = "Production"
+__module_group__ = "Security"
+
+# Cache of parsed public keys and of the results of checking signatures.
+# Busy instances deliver many activities signed with the same key, so
+# rather than parsing the PEM for every request the parsed key is kept,
+# indexed by a hash of the PEM. The result of each signature check is
+# also kept, so that retried or duplicate deliveries are not verified
+# again. Keys are also recorded against the actor which they belong to,
+# so that they can be forgotten if the actor changes.
+
+import hashlib
+import threading
+from collections import OrderedDict
+from cryptography.hazmat.backends import default_backend
+from cryptography.hazmat.primitives.serialization import load_pem_public_key
+
+# maximum number of parsed public keys held in memory
+SIG_CACHE_MAX_KEYS = 2048
+
+# maximum number of signature verdicts held in memory
+SIG_CACHE_MAX_VERDICTS = 8192
+
+_SIG_CACHE = {
+    'lock': threading.Lock(),
+    'keys': OrderedDict(),
+    'actors': {},
+    'verdicts': OrderedDict(),
+    'key_hits': 0,
+    'key_misses': 0,
+    'verdict_hits': 0,
+    'verdict_misses': 0
+}
+
+
+def _sig_cache_actor(key_id: str) -> str:
+    """Returns the actor which a key id belongs to
+    """
+    if not key_id:
+        return None
+    return key_id.split('#')[0]
+
+
+def _sig_cache_forget_key(pem_hash: str) -> None:
+    """Removes a key and its verdicts from the cache.
+    This must be called while holding the lock
+    """
+    entry = _SIG_CACHE['keys'].pop(pem_hash, None)
+    if not entry:
+        return
+    actor_keys = _SIG_CACHE['actors'].get(entry['actor'])
+    if actor_keys is not None:
+        actor_keys.discard(pem_hash)
+        if not actor_keys:
+            del _SIG_CACHE['actors'][entry['actor']]
+    verdicts = _SIG_CACHE['verdicts']
+    for verdict_key in list(verdicts.keys()):
+        if verdict_key[0] == pem_hash:
+            del verdicts[verdict_key]
+
+
+def public_key_hash(public_key_pem: str) -> str:
+    """Returns the hash used to identify a public key
+    """
+    return hashlib.sha256(public_key_pem.encode('utf-8')).hexdigest()
+
+
+def load_cached_public_key(public_key_pem: str, key_id: str):
+    """Returns the parsed public key for the given PEM
+    """
+    pem_hash = public_key_hash(public_key_pem)
+    with _SIG_CACHE['lock']:
+        entry = _SIG_CACHE['keys'].get(pem_hash)
+        if entry:
+            _SIG_CACHE['keys'].move_to_end(pem_hash)
+            _SIG_CACHE['key_hits'] += 1
+            return entry['key']
+        _SIG_CACHE['key_misses'] += 1
+    pubkey = load_pem_public_key(public_key_pem.encode('utf-8'),
+                                 backend=default_backend())
+    actor = _sig_cache_actor(key_id)
+    with _SIG_CACHE['lock']:
+        _SIG_CACHE['keys'][pem_hash] = {
+            'key': pubkey,
+            'actor': actor
+        }
+        if actor:
+            if not _SIG_CACHE['actors'].get(actor):
+                _SIG_CACHE['actors'][actor] = set()
+            _SIG_CACHE['actors'][actor].add(pem_hash)
+        while len(_SIG_CACHE['keys']) > SIG_CACHE_MAX_KEYS:
+            oldest_hash = next(iter(_SIG_CACHE['keys']))
+            _sig_cache_forget_key(oldest_hash)
+    return pubkey
+
+
+def get_signature_verdict(pem_hash: str, signed_hash: str,
+                          signature: str) -> bool:
+    """Returns the result of a previous check of the given signature,
+    or None if it has not been checked
+    """
+    verdict_key = (pem_hash, signed_hash, signature)
+    with _SIG_CACHE['lock']:
+        verdict = _SIG_CACHE['verdicts'].get(verdict_key)
+        if verdict is None:
+            _SIG_CACHE['verdict_misses'] += 1
+            return None
+        _SIG_CACHE['verdicts'].move_to_end(verdict_key)
+        _SIG_CACHE['verdict_hits'] += 1
+        return verdict
+
+
+def store_signature_verdict(pem_hash: str, signed_hash: str,
+                            signature: str, verdict: bool) -> None:
+    """Records the result of checking a signature
+    """
+    verdict_key = (pem_hash, signed_hash, signature)
+    with _SIG_CACHE['lock']:
+        # only keep verdicts for keys which are cached
+        if pem_hash not in _SIG_CACHE['keys']:
+            return
+        verdicts = _SIG_CACHE['verdicts']
+        verdicts[verdict_key] = verdict
+        verdicts.move_to_end(verdict_key)
+        while len(verdicts) > SIG_CACHE_MAX_VERDICTS:
+            verdicts.popitem(last=False)
+
+
+def forget_actor_public_keys(actor: str) -> None:
+    """Removes the keys of an actor and their verdicts from the cache,
+    for example if the actor has changed
+    """
+    actor = _sig_cache_actor(actor)
+    if not actor:
+        return
+    with _SIG_CACHE['lock']:
+        actor_keys = _SIG_CACHE['actors'].get(actor)
+        if not actor_keys:
+            return
+        for pem_hash in list(actor_keys):
+            _sig_cache_forget_key(pem_hash)
+
+
+def sig_cache_metrics() -> {}:
+    """Returns the current state of the signature cache
+    """
+    with _SIG_CACHE['lock']:
+        return {
+            'keys': len(_SIG_CACHE['keys']),
+            'verdicts': len(_SIG_CACHE['verdicts']),
+            'keyHits': _SIG_CACHE['key_hits'],
+            'keyMisses': _SIG_CACHE['key_misses'],
+            'verdictHits': _SIG_CACHE['verdict_hits'],
+            'verdictMisses': _SIG_CACHE['verdict_misses']
+        }
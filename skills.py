@@ -17,11 +17,13 @@ from utils import get_full_domain
 from utils import get_nickname_from_actor
 from utils import get_domain_from_actor
 from utils import load_json
+from utils import save_json
 from utils import get_occupation_skills
 from utils import set_occupation_skills_list
 from utils import acct_dir
 from utils import local_actor_url
 from utils import has_actor
+from skillsindex import skills_index_update
 
 
 def set_skills_from_dict(actor_json: {}, skills_dict: {}) -> []:
@@ -124,8 +126,15 @@ def set_skill_level(base_dir: str, nickname: str, domain: str,
         return False
 
     actor_json = load_json(actor_filename)
-    return set_actor_skill_level(actor_json,
-                                 skill, skill_level_percent)
+    if not actor_json:
+        return False
+    if not set_actor_skill_level(actor_json,
+                                 skill, skill_level_percent):
+        return False
+    if not save_json(actor_json, actor_filename):
+        return False
+    skills_index_update(base_dir, actor_json, True)
+    return True
 
 
 def get_skills(base_dir: str, nickname: str, domain: str) -> []:
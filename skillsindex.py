@@ -0,0 +1,312 @@
+__filename__ = "skillsindex.py"
+__author__ = "Bob Mottram"
+__license__ = "AGPL3+"
+__version__ = "1.4.0"
+__maintainer__ = "Bob Mottram"
+__email__ = "bob@libreserver.org"
+__status__ = "Production"
+__module_group__ = "Profile Metadata"
+
+# Index of the skills of actors, so that a search for a skill doesn't
+# need to load every account and every cached actor from file.
+# Each skill is broken down into its words, which are kept in a sorted
+# list so that a search can find all skills containing a word starting
+# with the given text.
+# The index is kept on disk as a log with one line per change to an
+# actor, so that updates only append a line. Later lines replace
+# earlier ones for the same actor, and an actor with no skills is
+# removed. The log is rewritten when the index is rebuilt on startup.
+
+import os
+import json
+import time
+import bisect
+import threading
+from utils import get_occupation_skills
+from utils import is_account_dir
+from utils import load_json
+from actorstore import actor_store_files
+
+_SKILLS_INDEX = {
+    'lock': threading.Lock(),
+    'loaded': False,
+    'base_dir': None,
+    # actor url -> details and skills of the actor
+    'actors': {},
+    # skill name -> {actor url: skill level}
+    'skills': {},
+    # word -> set of skill names containing that word
+    'words': {},
+    # sorted list of words, used for prefix searches
+    'sorted_words': []
+}
+
+
+def _skills_index_filename(base_dir: str) -> str:
+    """Returns the filename of the skills index log
+    """
+    return base_dir + '/accounts/skills_index.jsonl'
+
+
+def _skills_index_levels(actor_json: {}) -> {}:
+    """Returns a dict of skill levels for an actor
+    """
+    skills = {}
+    for skill in get_occupation_skills(actor_json):
+        if not isinstance(skill, str) or ':' not in skill:
+            continue
+        name = skill.split(':')[0].strip().lower()
+        level_str = skill.split(':')[1].strip()
+        if not name or not level_str.isdigit():
+            continue
+        skills[name] = int(level_str)
+    return skills
+
+
+def _skills_index_record(actor_json: {}, local: bool) -> {}:
+    """Returns the entry within the index for an actor
+    """
+    icon_url = ''
+    if isinstance(actor_json.get('icon'), dict):
+        icon_url = actor_json['icon'].get('url', '')
+    name = actor_json.get('name')
+    if not isinstance(name, str):
+        name = ''
+    return {
+        'actor': actor_json['id'],
+        'name': name,
+        'icon': icon_url,
+        'local': local,
+        'updated': int(time.time()),
+        'skills': _skills_index_levels(actor_json)
+    }
+
+
+def _skills_index_remove(index: {}, actor: str) -> None:
+    """Removes an actor from an index
+    """
+    record = index['actors'].pop(actor, None)
+    if not record:
+        return
+    for skill_name in record['skills']:
+        skill_actors = index['skills'].get(skill_name)
+        if skill_actors is None:
+            continue
+        skill_actors.pop(actor, None)
+        if skill_actors:
+            continue
+        del index['skills'][skill_name]
+        for word in skill_name.split():
+            word_skills = index['words'].get(word)
+            if word_skills is None:
+                continue
+            word_skills.discard(skill_name)
+            if word_skills:
+                continue
+            del index['words'][word]
+            word_pos = bisect.bisect_left(index['sorted_words'], word)
+            if word_pos < len(index['sorted_words']) and \
+               index['sorted_words'][word_pos] == word:
+                del index['sorted_words'][word_pos]
+
+
+def _skills_index_add(index: {}, record: {}) -> None:
+    """Adds an actor to an index, replacing any previous entry
+    """
+    actor = record['actor']
+    _skills_index_remove(index, actor)
+    if not record['skills']:
+        return
+    index['actors'][actor] = record
+    for skill_name, level in record['skills'].items():
+        if not index['skills'].get(skill_name):
+            index['skills'][skill_name] = {}
+        index['skills'][skill_name][actor] = level
+        for word in skill_name.split():
+            if not index['words'].get(word):
+                index['words'][word] = set()
+                bisect.insort(index['sorted_words'], word)
+            index['words'][word].add(skill_name)
+
+
+def _skills_index_load(base_dir: str) -> None:
+    """Loads the index from its log.
+    This must be called while holding the lock
+    """
+    if _SKILLS_INDEX['loaded'] and _SKILLS_INDEX['base_dir'] == base_dir:
+        return
+    _SKILLS_INDEX['loaded'] = True
+    _SKILLS_INDEX['base_dir'] = base_dir
+    _SKILLS_INDEX['actors'] = {}
+    _SKILLS_INDEX['skills'] = {}
+    _SKILLS_INDEX['words'] = {}
+    _SKILLS_INDEX['sorted_words'] = []
+    index_filename = _skills_index_filename(base_dir)
+    if not os.path.isfile(index_filename):
+        return
+    try:
+        with open(index_filename, 'r', encoding='utf-8') as fp_index:
+            for line in fp_index:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if not isinstance(record, dict) or \
+                   not record.get('actor') or \
+                   not isinstance(record.get('skills'), dict):
+                    continue
+                _skills_index_add(_SKILLS_INDEX, record)
+    except OSError:
+        print('EX: _skills_index_load unable to read ' + index_filename)
+
+
+def skills_index_update(base_dir: str, actor_json: {}, local: bool) -> None:
+    """Updates the skills of an actor within the index
+    """
+    if not base_dir or not actor_json:
+        return
+    if not isinstance(actor_json.get('id'), str):
+        return
+    record = _skills_index_record(actor_json, local)
+    with _SKILLS_INDEX['lock']:
+        _skills_index_load(base_dir)
+        existing = _SKILLS_INDEX['actors'].get(record['actor'])
+        if not existing:
+            if not record['skills']:
+                return
+        else:
+            if existing['local']:
+                record['local'] = True
+            if existing['skills'] == record['skills'] and \
+               existing['name'] == record['name'] and \
+               existing['icon'] == record['icon'] and \
+               existing['local'] == record['local']:
+                return
+        _skills_index_add(_SKILLS_INDEX, record)
+        index_filename = _skills_index_filename(base_dir)
+        try:
+            with open(index_filename, 'a+', encoding='utf-8') as fp_index:
+                fp_index.write(json.dumps(record) + '\n')
+        except OSError:
+            print('EX: skills_index_update unable to append ' +
+                  index_filename)
+
+
+def _skills_index_scan(index: {}, actor_filenames: [], local: bool) -> None:
+    """Adds the actors within the given files to an index
+    """
+    for actor_filename in actor_filenames:
+        actor_json = load_json(actor_filename)
+        if not actor_json:
+            continue
+        # older versions of the actors cache stored the actor
+        # together with a timestamp
+        if isinstance(actor_json.get('actor'), dict):
+            actor_json = actor_json['actor']
+        if not isinstance(actor_json.get('id'), str):
+            continue
+        record = _skills_index_record(actor_json, local)
+        if not record['skills']:
+            continue
+        existing = index['actors'].get(record['actor'])
+        if existing and existing['local']:
+            continue
+        _skills_index_add(index, record)
+
+
+def rebuild_skills_index(base_dir: str, debug: bool) -> None:
+    """Rebuilds the skills index from the accounts and the actors cache,
+    and rewrites its log. This is run in the background on startup
+    """
+    start_time = int(time.time())
+    index = {
+        'actors': {},
+        'skills': {},
+        'words': {},
+        'sorted_words': []
+    }
+    account_filenames = []
+    accounts_dir = base_dir + '/accounts'
+    if os.path.isdir(accounts_dir):
+        for fname in os.listdir(accounts_dir):
+            if fname.endswith('.json') and is_account_dir(fname):
+                account_filenames.append(os.path.join(accounts_dir, fname))
+    _skills_index_scan(index, account_filenames, True)
+    cached_filenames = []
+    for _, actor_filename in actor_store_files(base_dir):
+        cached_filenames.append(actor_filename)
+    _skills_index_scan(index, cached_filenames, False)
+
+    index_filename = _skills_index_filename(base_dir)
+    with _SKILLS_INDEX['lock']:
+        # keep any changes which happened during the rebuild
+        if _SKILLS_INDEX['base_dir'] != base_dir:
+            _SKILLS_INDEX['actors'] = {}
+        for record in _SKILLS_INDEX['actors'].values():
+            if record['updated'] >= start_time:
+                _skills_index_add(index, record)
+        _SKILLS_INDEX['actors'] = index['actors']
+        _SKILLS_INDEX['skills'] = index['skills']
+        _SKILLS_INDEX['words'] = index['words']
+        _SKILLS_INDEX['sorted_words'] = index['sorted_words']
+        _SKILLS_INDEX['loaded'] = True
+        _SKILLS_INDEX['base_dir'] = base_dir
+        if not os.path.isdir(base_dir + '/accounts'):
+            return
+        try:
+            with open(index_filename + '.new', 'w+',
+                      encoding='utf-8') as fp_index:
+                for record in index['actors'].values():
+                    fp_index.write(json.dumps(record) + '\n')
+            os.replace(index_filename + '.new', index_filename)
+        except OSError:
+            print('EX: rebuild_skills_index unable to save ' +
+                  index_filename)
+    if debug:
+        print('DEBUG: skills index rebuilt with ' +
+              str(len(index['actors'])) + ' actors')
+
+
+def skills_index_search(base_dir: str, skillsearch: str,
+                        instance_only: bool) -> []:
+    """Returns a list of actors having a skill, in the form
+    level;actor;name;icon url, with the highest levels first.
+    Every word of the search must be the start of a word
+    within the name of the skill
+    """
+    search_words = skillsearch.lower().split()
+    if not search_words:
+        return []
+    results = []
+    with _SKILLS_INDEX['lock']:
+        _skills_index_load(base_dir)
+        sorted_words = _SKILLS_INDEX['sorted_words']
+        matched_skills = None
+        for search_word in search_words:
+            word_skills = set()
+            word_pos = bisect.bisect_left(sorted_words, search_word)
+            while word_pos < len(sorted_words) and \
+                    sorted_words[word_pos].startswith(search_word):
+                word_skills |= \
+                    _SKILLS_INDEX['words'][sorted_words[word_pos]]
+                word_pos += 1
+            if matched_skills is None:
+                matched_skills = word_skills
+            else:
+                matched_skills &= word_skills
+            if not matched_skills:
+                return []
+        for skill_name in matched_skills:
+            for actor, level in _SKILLS_INDEX['skills'][skill_name].items():
+                record = _SKILLS_INDEX['actors'][actor]
+                if instance_only and not record['local']:
+                    continue
+                if not record['name'] or not record['icon']:
+                    continue
+                index_str = \
+                    str(level).zfill(3) + ';' + actor + ';' + \
+                    record['name'] + ';' + record['icon']
+                results.append(index_str)
+    results = list(set(results))
+    results.sort(reverse=True)
+    return results
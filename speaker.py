@@ -11,7 +11,8 @@ import os
 import html
 import random
 import urllib.parse
-from utils import get_cached_post_filename
+from utils import get_cached_post_directory
+from utils import get_cached_ssml_filename
 from utils import remove_id_ending
 from utils import is_dm
 from utils import is_reply
@@ -579,12 +580,14 @@ def update_speaker(base_dir: str, http_prefix: str,
     save_json(speaker_json, speaker_filename)
 
     # save the ssml
+    ssml_cache_dir = get_cached_post_directory(base_dir, nickname, domain)
+    if not os.path.isdir(ssml_cache_dir):
+        os.mkdir(ssml_cache_dir)
     cached_ssml_filename = \
-        get_cached_post_filename(base_dir, nickname,
-                                 domain, post_json_object)
+        get_cached_ssml_filename(base_dir, nickname, domain,
+                                 post_json_object)
     if not cached_ssml_filename:
         return
-    cached_ssml_filename = cached_ssml_filename.replace('.html', '.ssml')
     if box_name == 'outbox':
         cached_ssml_filename = \
             cached_ssml_filename.replace('/postcache/', '/outbox/')
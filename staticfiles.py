@@ -0,0 +1,169 @@
+__filename__ = "staticfiles.py"
+__author__ = "Bob Mottram"
+__license__ = "AGPL3+"
+__version__ = "1.4.0"
+__maintainer__ = "Bob Mottram"
+__email__ = "bob@libreserver.org"
+__status__ = "Production"
+__module_group__ = "Core"
+
+# Serving of files such as media, emoji, icons and avatars without
+# reading them into memory. Files are sent directly from disk to the
+# socket using sendfile where the operating system supports it, or
+# otherwise in chunks, and a range of bytes may be requested so that
+# clients can seek within audio and video.
+# ETags are held in memory, indexed by the inode, modification time
+# and size of each file, so that they don't need to be calculated from
+# the contents of the file or read from .etag files.
+
+import os
+import datetime
+import threading
+from collections import OrderedDict
+
+# maximum number of etags held in memory
+STATIC_ETAGS_MAX = 16384
+
+# size of the chunks used when sendfile is not available
+STATIC_CHUNK_BYTES = 256 * 1024
+
+_STATIC_ETAGS = {
+    'lock': threading.Lock(),
+    'etags': OrderedDict(),
+    'hits': 0,
+    'misses': 0
+}
+
+
+def static_file_info(filename: str) -> {}:
+    """Returns the etag, size and last modified time of a file,
+    or None if it doesn't exist
+    """
+    try:
+        file_stat = os.stat(filename)
+    except OSError:
+        return None
+    key = (file_stat.st_dev, file_stat.st_ino,
+           file_stat.st_mtime_ns, file_stat.st_size)
+    with _STATIC_ETAGS['lock']:
+        etags = _STATIC_ETAGS['etags']
+        info = etags.get(key)
+        if info:
+            etags.move_to_end(key)
+            _STATIC_ETAGS['hits'] += 1
+            return info
+        _STATIC_ETAGS['misses'] += 1
+    last_modified_time = \
+        datetime.datetime.fromtimestamp(file_stat.st_mtime,
+                                        datetime.timezone.utc)
+    info = {
+        'etag': format(file_stat.st_ino, 'x') + '-' +
+        format(file_stat.st_mtime_ns, 'x') + '-' +
+        format(file_stat.st_size, 'x'),
+        'size': file_stat.st_size,
+        'lastModified':
+        last_modified_time.strftime('%a, %d %b %Y %H:%M:%S GMT')
+    }
+    with _STATIC_ETAGS['lock']:
+        etags = _STATIC_ETAGS['etags']
+        etags[key] = info
+        while len(etags) > STATIC_ETAGS_MAX:
+            etags.popitem(last=False)
+    return info
+
+
+def static_etag_matches(if_none_match: str, etag: str) -> bool:
+    """Returns true if an If-None-Match header contains the given etag
+    """
+    if not if_none_match:
+        return False
+    for header_etag in if_none_match.split(','):
+        header_etag = header_etag.strip()
+        if header_etag == '*':
+            return True
+        if header_etag.startswith('W/'):
+            header_etag = header_etag[2:]
+        if header_etag.replace('"', '') == etag:
+            return True
+    return False
+
+
+def static_file_range(range_header: str, file_size: int) -> []:
+    """Returns the first and last bytes requested by a Range header.
+    Returns an empty list if the whole file should be sent, or None if
+    the range can't be satisfied
+    """
+    if not range_header:
+        return []
+    range_header = range_header.strip()
+    if not range_header.startswith('bytes='):
+        return []
+    range_str = range_header.split('=', 1)[1].strip()
+    if ',' in range_str or '-' not in range_str:
+        # multiple ranges are not supported, so send the whole file
+        return []
+    first_str, last_str = range_str.split('-', 1)
+    first_str = first_str.strip()
+    last_str = last_str.strip()
+    if not first_str:
+        # the final bytes of the file
+        if not last_str.isdigit():
+            return []
+        suffix_length = int(last_str)
+        if suffix_length == 0:
+            return None
+        if suffix_length > file_size:
+            suffix_length = file_size
+        return [file_size - suffix_length, file_size - 1]
+    if not first_str.isdigit():
+        return []
+    first_byte = int(first_str)
+    last_byte = file_size - 1
+    if last_str:
+        if not last_str.isdigit():
+            return []
+        last_byte = int(last_str)
+        if last_byte < first_byte:
+            return []
+        if last_byte > file_size - 1:
+            last_byte = file_size - 1
+    if first_byte >= file_size:
+        return None
+    return [first_byte, last_byte]
+
+
+def static_file_send(sock, filename: str, offset: int, length: int) -> bool:
+    """Sends part of a file to a socket. This uses sendfile where
+    possible, so that the file is not copied into memory
+    """
+    try:
+        with open(filename, 'rb') as fp_static:
+            if hasattr(sock, 'sendfile'):
+                sock.sendfile(fp_static, offset, length)
+                return True
+            # not a socket, such as a file used for testing
+            fp_static.seek(offset)
+            while length > 0:
+                chunk = fp_static.read(min(length, STATIC_CHUNK_BYTES))
+                if not chunk:
+                    break
+                sock.write(chunk)
+                length -= len(chunk)
+    except (BrokenPipeError, ConnectionResetError):
+        return False
+    except OSError as ex:
+        print('EX: static_file_send unable to send ' + filename + ' ' +
+              str(ex))
+        return False
+    return True
+
+
+def static_files_metrics() -> {}:
+    """Returns the current state of the etags held in memory
+    """
+    with _STATIC_ETAGS['lock']:
+        return {
+            'etags': len(_STATIC_ETAGS['etags']),
+            'hits': _STATIC_ETAGS['hits'],
+            'misses': _STATIC_ETAGS['misses']
+        }
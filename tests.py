@@ -16,9 +16,14 @@ from cryptography.hazmat.primitives.asymmetric import padding
 from cryptography.hazmat.primitives.asymmetric import utils as hazutils
 import time
 import os
+import sys
+import threading
+import socket
+import tracemalloc
 import shutil
 import json
 import datetime
+from types import SimpleNamespace
 from shutil import copyfile
 from random import randint
 from time import gmtime, strftime
@@ -33,7 +38,49 @@ from httpsig import message_content_digest
 from cache import store_person_in_cache
 from cache import get_person_from_cache
 from threads import thread_with_trace
+from threads import thread_sleep
+from delivery import queue_delivery
+from delivery import delivery_metrics
+from searchindex import add_post_to_search_index
+from searchindex import remove_post_from_search_index
+from searchindex import rebuild_search_index
+from searchindex import search_index_words
+from searchindex import search_index_flush
+from inboxqueue import inbox_queue_push
+from inboxqueue import inbox_queue_head
+from inboxqueue import inbox_queue_pop
+from inboxqueue import inbox_queue_clear
+from inboxqueue import inbox_queue_arrival_time
+from inboxqueue import inbox_queue_metrics
+from inboxqueue import inbox_preverify_submit
+from inboxqueue import inbox_preverified
+from inboxqueue import inbox_sender_session
+from blocking import is_blocked
+from postlocation import get_post_location
+from postlocation import add_post_location
+from postlocation import remove_post_location
+from postlocation import rebuild_post_locations
+from blocking import is_blocked_domain
+from blocking import is_blocked_hashtag
+from blocking import update_blocked_cache
+from fitnessFunctions import fitness_queue_metrics
+from fitnessFunctions import fitness_route_performance
+from fitnessFunctions import fitness_route_histograms
+from boxindex import box_index_append
+from boxindex import box_index_count
+from boxindex import box_index_create
+from boxindex import box_index_entries
+from boxindex import box_index_page
+from boxindex import box_index_remove
+from boxindex import box_index_truncate
 from daemon import run_daemon
+from daemon import PUBSERVER_ROUTES
+from routes import compile_routes
+from routes import match_route
+from staticfiles import static_file_info
+from staticfiles import static_etag_matches
+from staticfiles import static_file_range
+from staticfiles import static_file_send
 from session import create_session
 from session import get_json
 from posts import convert_post_content_to_html
@@ -55,6 +102,7 @@ from follow import clear_followers
 from follow import send_follow_request_via_server
 from follow import send_unfollow_request_via_server
 from siteactive import site_is_active
+from utils import delete_post
 from utils import remove_style_within_html
 from utils import html_tag_has_closing
 from utils import remove_inverted_text
@@ -83,19 +131,34 @@ from utils import get_full_domain
 from utils import valid_nickname
 from utils import first_paragraph_from_string
 from utils import remove_id_ending
+from sigcache import sig_cache_metrics
+from sigcache import forget_actor_public_keys
 from utils import update_recent_posts_cache
+from utils import get_cached_post_filename
+from utils import clear_from_post_caches
+from utils import get_account_timezone
+from utils import set_account_timezone
+from accountsettings import get_account_settings
+from accountsettings import account_settings_changed
+from accountsettings import get_account_settings_json
+from utils import get_from_recent_posts_cache
+from utils import set_recent_posts_cache_budget
+from utils import recent_posts_cache_metrics
+from utils import remove_id_from_recent_posts_cache
 from utils import follow_person
 from utils import get_nickname_from_actor
 from utils import get_domain_from_actor
 from utils import copytree
 from utils import load_json
 from utils import save_json
+from utils import search_box_posts
 from utils import get_status_number
 from utils import valid_hash_tag
 from utils import get_followers_of_person
 from utils import remove_html
 from utils import dangerous_markup
 from utils import acct_dir
+from utils import locate_post
 from pgp import extract_pgp_public_key
 from pgp import pgp_public_key_upload
 from utils import contains_pgp_public_key
@@ -104,11 +167,30 @@ from follow import unfollow_account
 from follow import unfollower_of_account
 from follow import send_follow_request
 from person import create_person
+from person import person_snooze
+from person import person_unsnooze
+from person import is_person_snoozed
 from person import create_group
 from person import set_display_nickname
 from person import set_bio
-# from person import generate_rsa_key
+from person import generate_rsa_key
 from skills import set_skill_level
+from skillsindex import skills_index_update
+from skillsindex import rebuild_skills_index
+from skillsindex import skills_index_search
+from cache import expire_person_cache
+from utils import get_display_name
+from actorstore import ACTOR_STORE_MAX_BYTES
+from actorstore import actor_store_filename
+from actorstore import actor_store_locate
+from actorstore import migrate_actor_store
+from actorstore import set_actor_store_budget
+from cache import store_webfinger_in_cache
+from cache import get_webfinger_from_cache
+from webfingercache import webfinger_cache_load
+from webfingercache import webfinger_lookup_begin
+from webfingercache import webfinger_lookup_wait
+from webfingercache import webfinger_lookup_end
 from skills import actor_skill_value
 from skills import set_skills_from_dict
 from skills import actor_has_skill
@@ -133,11 +215,26 @@ from media import get_image_dimensions
 from media import get_media_path
 from media import get_attachment_media_type
 from delete import send_delete_via_server
+from scheduler import scheduler_add
+from scheduler import scheduler_remove
+from scheduler import scheduler_wait
+from boxevents import BOX_EVENTS_MAX
+from boxevents import box_event_add
+from boxevents import box_events_since
+from inbox import inbox_update_index
 from inbox import json_post_allows_comments
 from inbox import valid_inbox
 from inbox import valid_inbox_filenames
 from inbox import cache_svg_images
+from inbox import store_hash_tags
 from categories import guess_hashtag_category
+from categories import get_hashtag_categories
+from categories import set_hashtag_category
+from hashtagstats import hashtag_stats_top
+from hashtagstats import hashtag_stats_add
+from webapp_hashtagswarm import html_hash_tag_swarm
+from contentcache import get_content_context
+from contentcache import get_emoji_context
 from content import replace_remote_hashtags
 from content import add_name_emojis_to_tags
 from content import combine_textarea_lines
@@ -168,6 +265,10 @@ from theme import set_css_param
 from theme import scan_themes_for_scripts
 from linked_data_sig import generate_json_signature
 from linked_data_sig import verify_json_signature
+from pyjsonld import load_document
+from context import VALID_CONTEXTS
+from context import getLitepubV0_1
+from context import get_activitystreams_schema
 from newsdaemon import hashtag_rule_tree
 from newsdaemon import hashtag_rule_resolve
 from newswire import get_link_from_rss_item
@@ -175,10 +276,13 @@ from newswire import xml_podcast_to_dict
 from newswire import get_newswire_tags
 from newswire import parse_feed_date
 from newswire import limit_word_lengths
+from newswire import get_dict_from_newswire
+from newswire import get_rss
 from mastoapiv1 import get_masto_api_v1id_from_nickname
 from mastoapiv1 import get_nickname_from_masto_api_v1id
 from webapp_post import replace_link_variable
 from webapp_post import prepare_html_post_nickname
+from webapp_post import individual_post_as_html
 from speaker import speaker_replace_links
 from markdown import markdown_to_html
 from languages import get_reply_language
@@ -195,10 +299,28 @@ from shares import update_shared_item_federation_token
 from shares import merge_shared_item_tokens
 from shares import send_share_via_server
 from shares import get_shared_items_catalog_via_server
+from shares import shares_catalog_endpoint
+from shares import expire_shares
+from sharesindex import shares_index_update_federated
+from sharesindex import shares_index_update_account
+from sharesindex import shares_index_expired
+from sharesindex import shares_index_search
+from posthtmlcache import post_html_cache_save
+from posthtmlcache import post_html_cache_load
+from posthtmlcache import expire_post_html_cache
+from posthtmlcache import post_html_cache_invalidate
 from cwlists import add_cw_from_lists
 from cwlists import load_cw_lists
 from happening import dav_month_via_server
 from happening import dav_day_via_server
+from happening import save_event_post
+from happening import remove_calendar_event
+from happening import update_calendar_event
+from happening import get_calendar_events
+from happening import get_todays_events
+from happening import get_this_weeks_events
+from happening import get_month_events_icalendar
+from happening import day_events_check
 from webapp_theme_designer import color_contrast
 from maps import get_map_links_from_post_content
 from maps import geocoords_from_map_link
@@ -703,7 +825,7 @@ def _test_cache():
 
 def _test_threads_function(param1: str, param2: str):
     for _ in range(10000):
-        time.sleep(2)
+        thread_sleep(2)
 
 
 def _test_threads():
@@ -3957,6 +4079,45 @@ def _test_recent_posts_cache():
     assert len(recent_posts_cache['json'].items()) == max_recent_posts
     assert len(recent_posts_cache['html'].items()) == max_recent_posts
 
+    # the least recently used post is evicted
+    post_id = 'https:##somesite.whatever#users#someuser#statuses#2'
+    assert get_from_recent_posts_cache(recent_posts_cache,
+                                       post_id, 'html') == html_str
+    post_json_object = {
+        "id": "https://somesite.whatever/users/someuser/statuses/5"
+    }
+    update_recent_posts_cache(recent_posts_cache, max_recent_posts,
+                              post_json_object, html_str)
+    assert post_id in recent_posts_cache['index']
+    evicted_id = 'https:##somesite.whatever#users#someuser#statuses#3'
+    assert evicted_id not in recent_posts_cache['index']
+    assert not get_from_recent_posts_cache(recent_posts_cache,
+                                           evicted_id, 'json')
+    metrics = recent_posts_cache_metrics(recent_posts_cache)
+    assert metrics['posts'] == max_recent_posts
+    assert metrics['hits'] == 1
+    assert metrics['misses'] == 1
+    assert metrics['evictions'] == 3
+
+    # evict by size
+    entry_bytes = recent_posts_cache['index'][post_id]
+    assert metrics['bytes'] == entry_bytes * max_recent_posts
+    set_recent_posts_cache_budget(recent_posts_cache, entry_bytes * 2)
+    post_json_object = {
+        "id": "https://somesite.whatever/users/someuser/statuses/6"
+    }
+    update_recent_posts_cache(recent_posts_cache, max_recent_posts,
+                              post_json_object, html_str)
+    assert len(recent_posts_cache['index']) == 2
+    assert recent_posts_cache['bytes'] == entry_bytes * 2
+
+    assert post_id not in recent_posts_cache['index']
+    post_id = 'https:##somesite.whatever#users#someuser#statuses#6'
+    remove_id_from_recent_posts_cache(recent_posts_cache, post_id)
+    assert post_id not in recent_posts_cache['index']
+    assert not recent_posts_cache['html'].get(post_id)
+    assert recent_posts_cache['bytes'] == entry_bytes
+
 
 def _test_remove_txt_formatting():
     print('test_remove_txt_formatting')
@@ -4029,6 +4190,22 @@ def _test_jsonld():
     assert signed_document['signature']['type'] == 'RsaSignature2017'
     assert verify_json_signature(signed_document, public_key_pem)
 
+    # checking the same document again uses the cached result
+    metrics = sig_cache_metrics()
+    assert verify_json_signature(signed_document, public_key_pem)
+    metrics2 = sig_cache_metrics()
+    assert metrics2['verdictHits'] == metrics['verdictHits'] + 1
+    assert metrics2['verdicts'] == metrics['verdicts']
+
+    # forgetting the key of the actor removes its cached results
+    creator = signed_document['signature']['creator']
+    forget_actor_public_keys(creator)
+    assert sig_cache_metrics()['verdicts'] < metrics2['verdicts']
+    assert verify_json_signature(signed_document, public_key_pem)
+    metrics3 = sig_cache_metrics()
+    assert metrics3['verdictMisses'] == metrics2['verdictMisses'] + 1
+    assert metrics3['keyMisses'] == metrics2['keyMisses'] + 1
+
     # alter the signed document
     signed_document['object']['content'] = 'forged content'
     assert not verify_json_signature(signed_document, public_key_pem)
@@ -5527,6 +5704,10 @@ def _test_functions():
 
     # don't check these functions, because they are procedurally called
     exclusions = [
+        '_newswire_fetch_get',
+        '_newswire_stream_get',
+        '_delivery_post',
+        '_feed_response_iter',
         'do_GET',
         'do_POST',
         'do_HEAD',
@@ -5536,8 +5717,6 @@ def _test_functions():
         'do_DELETE',
         '__run',
         '_send_to_named_addresses',
-        'globaltrace',
-        'localtrace',
         'kill',
         'clone',
         'unregister_rdf_parser',
@@ -5562,7 +5741,10 @@ def _test_functions():
         'run_federated_shares_watchdog',
         'run_federated_shares_daemon',
         'fitness_thread',
-        'thread_send_post',
+        '_run_delivery_worker',
+        '_run_newswire_fetch_worker',
+        '_run_inbox_preverify_worker',
+        '_run_search_index_writer',
         'send_to_followers',
         'expire_cache',
         'get_mutuals_of_person',
@@ -5573,6 +5755,9 @@ def _test_functions():
         'get_this_weeks_events',
         'get_availability',
         '_test_threads_function',
+        '_traced_throughput_workload',
+        '_static_file_receiver',
+        '_static_file_sender',
         'create_server_group',
         'create_server_alice',
         'create_server_bob',
@@ -7965,6 +8150,2301 @@ def _test_xor_hashes():
     assert result == expected
 
 
+def _test_box_index(base_dir: str) -> None:
+    print('test_box_index')
+    path = base_dir + '/.testBoxIndex'
+    if os.path.isdir(path):
+        shutil.rmtree(path, ignore_errors=False, onerror=None)
+    os.mkdir(path)
+    index_filename = path + '/inbox.index'
+
+    # an index in the older newest-first format
+    with open(index_filename, 'w+', encoding='utf-8') as fp_index:
+        fp_index.write('post3.json\npost2.json\npost1.json\n')
+    assert box_index_count(index_filename) == 3
+    assert os.path.isfile(index_filename + '.offsets')
+    with open(index_filename, 'r', encoding='utf-8') as fp_index:
+        assert fp_index.read() == 'post1.json\npost2.json\npost3.json\n'
+    assert box_index_entries(index_filename) == \
+        ['post3.json', 'post2.json', 'post1.json']
+
+    # new entries are appended and duplicates ignored
+    for ctr in range(4, 11):
+        assert box_index_append(index_filename, 'post' + str(ctr) + '.json')
+    assert box_index_append(index_filename, 'post10.json')
+    assert box_index_count(index_filename) == 10
+    assert box_index_page(index_filename, 0, 3) == \
+        ['post10.json', 'post9.json', 'post8.json']
+    assert box_index_page(index_filename, 3, 3) == \
+        ['post7.json', 'post6.json', 'post5.json']
+    assert box_index_page(index_filename, 9, 3) == ['post1.json']
+    assert not box_index_page(index_filename, 10, 3)
+
+    # remove an entry
+    assert box_index_remove(index_filename, 'post9.json')
+    assert not box_index_remove(index_filename, 'post9.json')
+    assert box_index_page(index_filename, 0, 2) == \
+        ['post10.json', 'post8.json']
+
+    # the offsets are rebuilt if the index is changed elsewhere
+    with open(index_filename, 'a+', encoding='utf-8') as fp_index:
+        fp_index.write('post11.json\n')
+    assert box_index_page(index_filename, 0, 1) == ['post11.json']
+    assert box_index_count(index_filename) == 10
+
+    # only keep the most recent entries
+    assert box_index_truncate(index_filename, 4)
+    assert box_index_entries(index_filename) == \
+        ['post11.json', 'post10.json', 'post8.json', 'post7.json']
+
+    # create a new index
+    new_index_filename = path + '/outbox.index'
+    assert box_index_create(new_index_filename, ['b.json', 'a.json'])
+    assert box_index_page(new_index_filename, 0, 1) == ['b.json']
+
+    shutil.rmtree(path, ignore_errors=False, onerror=None)
+
+
+def _inbox_throughput_workload(items: int, result: {}) -> None:
+    """Processes a number of incoming posts in a similar way to
+    the inbox queue, recording the time taken
+    """
+    post_json_str = json.dumps({
+        "@context": "https://www.w3.org/ns/activitystreams",
+        "id": "https://some.domain/users/someone/statuses/1234/activity",
+        "type": "Create",
+        "actor": "https://some.domain/users/someone",
+        "to": ["https://www.w3.org/ns/activitystreams#Public"],
+        "object": {
+            "id": "https://some.domain/users/someone/statuses/1234",
+            "type": "Note",
+            "attributedTo": "https://some.domain/users/someone",
+            "content": "<p>Some content with #hashtags and " +
+            "a <a href=\"https://other.domain\">link</a></p>",
+            "tag": [{"type": "Hashtag", "name": "#hashtags"}]
+        }
+    })
+    start_time = time.time()
+    for _ in range(items):
+        post_json_object = json.loads(post_json_str)
+        actor = post_json_object['actor']
+        get_nickname_from_actor(actor)
+        get_domain_from_actor(actor)
+        post_id = remove_id_ending(post_json_object['id'])
+        post_filename = post_id.replace('/', '#') + '.json'
+        for tag in post_json_object['object']['tag']:
+            tag['name'].replace('#', '').lower()
+        json.dumps(post_json_object)
+        assert post_filename
+    result['seconds'] = time.time() - start_time
+
+
+def _trace_every_line(frame, event, arg):
+    """The earlier thread implementation installed a trace function
+    which was called for every line executed
+    """
+    return _trace_every_line
+
+
+def _traced_throughput_workload(items: int, result: {}) -> None:
+    """Inbox workload running with every line traced
+    """
+    sys.settrace(_trace_every_line(None, 'call', None))
+    _inbox_throughput_workload(items, result)
+
+
+def _test_thread_throughput() -> None:
+    print('test_thread_throughput')
+    items = 20000
+
+    traced_result = {}
+    thr = threading.Thread(target=_traced_throughput_workload,
+                           args=(items, traced_result), daemon=True)
+    thr.start()
+    thr.join()
+
+    cooperative_result = {}
+    thr = thread_with_trace(target=_inbox_throughput_workload,
+                            args=(items, cooperative_result), daemon=True)
+    thr.start()
+    thr.join()
+
+    traced_per_sec = int(items / max(traced_result['seconds'], 0.001))
+    cooperative_per_sec = \
+        int(items / max(cooperative_result['seconds'], 0.001))
+    print('Inbox throughput with tracing: ' +
+          str(traced_per_sec) + ' posts/sec')
+    print('Inbox throughput with cooperative cancellation: ' +
+          str(cooperative_per_sec) + ' posts/sec')
+    assert cooperative_per_sec > traced_per_sec
+
+    # killing a thread which is sleeping
+    thr = thread_with_trace(target=_test_threads_function,
+                            args=('test', 'test2'), daemon=True)
+    thr.start()
+    start_time = time.time()
+    thr.kill()
+    thr.join()
+    assert thr.is_alive() is False
+    assert time.time() - start_time < 2
+
+    # a thread which passes its deadline stops at the next
+    # cancellation point
+    thr = thread_with_trace(target=_test_threads_function,
+                            args=('test', 'test2'), daemon=True)
+    thr.deadline = datetime.datetime.utcnow()
+    thr.start()
+    thr.join()
+    assert thr.is_alive() is False
+    assert thr.killed
+
+
+def _test_delivery_queue() -> None:
+    print('test_delivery_queue')
+    session = create_session(None)
+    metrics_before = delivery_metrics()
+    # nothing is listening on this port, so the delivery fails
+    # and is scheduled to be retried later
+    inbox_url = 'http://127.0.0.1:1/users/nobody/inbox'
+    post_log = []
+    base_dir = os.getcwd()
+    post_json_str = '{"type": "Note"}'
+    private_key_pem, _ = generate_rsa_key()
+    signing = {
+        'private_key_pem': private_key_pem,
+        'nickname': 'alice',
+        'domain': 'some.domain',
+        'port': 80,
+        'to_domain': '127.0.0.1',
+        'to_port': 1,
+        'path': '/users/nobody/inbox',
+        'with_digest': True,
+        'headers_json': {'SharesCatalog': 'token'},
+        'headers_json_ld': {}
+    }
+    queue_delivery(session, post_json_str, [],
+                   inbox_url, base_dir, signing,
+                   post_log, False, 'http', 'some.domain')
+    metrics = delivery_metrics()
+    assert metrics['workers'] > 0
+    for _ in range(100):
+        metrics = delivery_metrics()
+        if metrics['waitingRetry'] > metrics_before['waitingRetry']:
+            break
+        time.sleep(0.1)
+    assert metrics['waitingRetry'] == metrics_before['waitingRetry'] + 1
+    assert metrics['retried'] == metrics_before['retried'] + 1
+    assert metrics['active'] == 0
+    assert post_log
+    assert post_log[0].startswith('Retry 0:')
+
+    fitness = {}
+    fitness_queue_metrics(fitness, 'DELIVERY', metrics)
+    assert fitness['queues']['DELIVERY']['waitingRetry'] == \
+        metrics['waitingRetry']
+    assert fitness['queues']['DELIVERY']['maxQueued'] == 0
+
+    # headers are signed when the delivery is attempted
+    sent_headers = []
+
+    def _delivery_post(url: str, data: str, headers: {}, timeout: int):
+        sent_headers.append(headers)
+        return SimpleNamespace(status_code=200)
+
+    session = SimpleNamespace(post=_delivery_post, headers={})
+    queue_time = time.time()
+    queue_delivery(session, post_json_str, [],
+                   'http://127.0.0.2:1/users/nobody/inbox', base_dir,
+                   signing, post_log, False, 'http', 'some.domain')
+    for _ in range(100):
+        if sent_headers:
+            break
+        time.sleep(0.1)
+    assert len(sent_headers) == 1
+    assert sent_headers[0]['SharesCatalog'] == 'token'
+    assert sent_headers[0]['signature']
+    sent_date = \
+        datetime.datetime.strptime(sent_headers[0]['date'],
+                                   '%a, %d %b %Y %H:%M:%S %Z')
+    sent_time = \
+        sent_date.replace(tzinfo=datetime.timezone.utc).timestamp()
+    assert abs(sent_time - queue_time) < 10
+    for _ in range(100):
+        if delivery_metrics()['active'] == 0:
+            break
+        time.sleep(0.1)
+    assert delivery_metrics()['active'] == 0
+
+
+def _test_blocklist_engine(base_dir: str) -> None:
+    print('test_blocklist_engine')
+    path = base_dir + '/.testBlocklist'
+    if os.path.isdir(path):
+        shutil.rmtree(path, ignore_errors=False, onerror=None)
+    os.mkdir(path)
+    os.mkdir(path + '/accounts')
+    nickname = 'alice'
+    domain = 'local.domain'
+    account_dir = acct_dir(path, nickname, domain)
+    os.mkdir(account_dir)
+    global_blocking_filename = path + '/accounts/blocking.txt'
+    with open(global_blocking_filename, 'w+', encoding='utf-8') as fp_blk:
+        fp_blk.write('*@blocked.domain\nspammer@other.domain\n#badtag\n')
+
+    # instance level blocks read from file
+    assert is_blocked_domain(path, 'blocked.domain')
+    assert is_blocked_domain(path, 'sub.blocked.domain')
+    assert is_blocked_domain(path, 'a.b.sub.blocked.domain')
+    assert not is_blocked_domain(path, 'notblocked.domain')
+    assert not is_blocked_domain(path, 'domain')
+    assert is_blocked(path, nickname, domain, 'someone', 'blocked.domain')
+    assert is_blocked(path, nickname, domain, 'spammer', 'other.domain')
+    assert not is_blocked(path, nickname, domain, 'friend', 'other.domain')
+    assert is_blocked_hashtag(path, 'badtag')
+    assert not is_blocked_hashtag(path, 'goodtag')
+
+    # instance level blocks held in the cache
+    blocked_cache = []
+    last_updated = update_blocked_cache(path, blocked_cache, 0, 0)
+    assert last_updated > 0
+    assert '*@blocked.domain' in blocked_cache
+    assert is_blocked_domain(path, 'sub.blocked.domain', blocked_cache)
+    assert not is_blocked(path, nickname, domain,
+                          'friend', 'other.domain', blocked_cache)
+
+    # the cache is updated when the file changes
+    with open(global_blocking_filename, 'a+', encoding='utf-8') as fp_blk:
+        fp_blk.write('*@another.domain\n')
+    assert not is_blocked_domain(path, 'another.domain', blocked_cache)
+    last_updated = update_blocked_cache(path, blocked_cache, 0, 0)
+    assert '*@another.domain' in blocked_cache
+    assert is_blocked_domain(path, 'another.domain', blocked_cache)
+    assert is_blocked(path, nickname, domain,
+                      'someone', 'another.domain', blocked_cache)
+
+    # account level blocks
+    with open(account_dir + '/blocking.txt', 'w+',
+              encoding='utf-8') as fp_blk:
+        fp_blk.write('*@rude.domain\ntroll@other.domain\n')
+    assert is_blocked(path, nickname, domain, 'someone', 'x.rude.domain')
+    assert is_blocked(path, nickname, domain, 'troll', 'other.domain')
+    assert not is_blocked(path, nickname, domain, 'friend', 'other.domain')
+    assert not is_blocked(path, 'bob', domain, 'troll', 'other.domain')
+
+    # account level allow list
+    with open(account_dir + '/allowedinstances.txt', 'w+',
+              encoding='utf-8') as fp_allow:
+        fp_allow.write('other.domain\n')
+    assert not is_blocked(path, nickname, domain, 'friend', 'other.domain')
+    assert is_blocked(path, nickname, domain, 'friend', 'unknown.domain')
+    os.remove(account_dir + '/allowedinstances.txt')
+    assert not is_blocked(path, nickname, domain, 'friend', 'unknown.domain')
+
+    # instance allow list in broch mode
+    with open(path + '/accounts/allowedinstances.txt', 'w+',
+              encoding='utf-8') as fp_allow:
+        fp_allow.write('social.other.domain\n')
+    assert not is_blocked_domain(path, 'social.other.domain')
+    assert not is_blocked_domain(path, 'www.other.domain')
+    assert is_blocked_domain(path, 'unknown.domain')
+    assert is_blocked(path, nickname, domain, 'friend', 'unknown.domain')
+
+    shutil.rmtree(path, ignore_errors=False, onerror=None)
+
+
+def _test_post_locations(base_dir: str) -> None:
+    print('test_post_locations')
+    path = base_dir + '/.testPostLocations'
+    if os.path.isdir(path):
+        shutil.rmtree(path, ignore_errors=False, onerror=None)
+    os.mkdir(path)
+    os.mkdir(path + '/accounts')
+    nickname = 'alice'
+    domain = 'local.domain'
+    account_dir = acct_dir(path, nickname, domain)
+    os.mkdir(account_dir)
+    for box_name in ('inbox', 'outbox', 'tlblogs'):
+        os.mkdir(account_dir + '/' + box_name)
+    post_url = 'https://other.domain/users/bob/statuses/123'
+    post_id = post_url.replace('/', '#')
+    inbox_filename = account_dir + '/inbox/' + post_id + '.json'
+    with open(inbox_filename, 'w+', encoding='utf-8') as fp_post:
+        fp_post.write('{}')
+
+    # the location is recorded when the post is first found
+    assert get_post_location(account_dir, post_id) is None
+    assert locate_post(path, nickname, domain, post_url) == inbox_filename
+    assert get_post_location(account_dir, post_id) == 'inbox'
+
+    # the index is persistent
+    assert rebuild_post_locations(account_dir) == 1
+    assert get_post_location(account_dir, post_id) == 'inbox'
+
+    # a post which has moved is found again
+    blog_filename = account_dir + '/tlblogs/' + post_id + '.json'
+    os.rename(inbox_filename, blog_filename)
+    assert locate_post(path, nickname, domain, post_url) == blog_filename
+    assert get_post_location(account_dir, post_id) == 'tlblogs'
+
+    # removed posts are no longer within the index
+    remove_post_location(account_dir, post_id)
+    assert get_post_location(account_dir, post_id) is None
+    os.remove(blog_filename)
+    add_post_location(account_dir, post_id, 'outbox')
+    assert locate_post(path, nickname, domain, post_url) is None
+    assert get_post_location(account_dir, post_id) is None
+
+    # a missing post is remembered until it is saved
+    outbox_filename = account_dir + '/outbox/' + post_id + '.json'
+    with open(outbox_filename, 'w+', encoding='utf-8') as fp_post:
+        fp_post.write('{}')
+    assert locate_post(path, nickname, domain, post_url) is None
+    assert save_json({}, outbox_filename)
+    assert locate_post(path, nickname, domain, post_url) == outbox_filename
+
+    shutil.rmtree(path, ignore_errors=False, onerror=None)
+
+
+def _test_inbox_queue(base_dir: str) -> None:
+    print('test_inbox_queue')
+    path = base_dir + '/.testInboxQueue'
+    if os.path.isdir(path):
+        shutil.rmtree(path, ignore_errors=False, onerror=None)
+    os.mkdir(path)
+
+    # items are taken from the queue in order of arrival
+    queue = []
+    assert inbox_queue_head(queue) is None
+    assert inbox_queue_push(queue, path + '/c.json', 30.0)
+    assert inbox_queue_push(queue, path + '/a.json', 10.0)
+    assert inbox_queue_push(queue, path + '/b.json', 20.0)
+    assert not inbox_queue_push(queue, path + '/a.json', 40.0)
+    assert len(queue) == 3
+    assert inbox_queue_head(queue) == path + '/a.json'
+    inbox_queue_pop(queue, False)
+    assert inbox_queue_head(queue) == path + '/b.json'
+    # items which have left the queue may be added again
+    assert inbox_queue_push(queue, path + '/a.json', 40.0)
+    assert not inbox_queue_push(queue, path + '/a.json', 50.0)
+    inbox_queue_clear(queue)
+    assert inbox_queue_push(queue, path + '/c.json', 30.0)
+    assert inbox_queue_push(queue, path + '/b.json', 20.0)
+    assert not inbox_queue_push(queue, path + '/c.json', 60.0)
+    assert inbox_queue_head(queue) == path + '/b.json'
+    assert inbox_queue_arrival_time(path + '/missing.json') > 0
+
+    # items which can't be loaded are verified without a public key
+    with open(path + '/b.json', 'w+', encoding='utf-8') as fp_queue:
+        fp_queue.write('not json')
+    params = {
+        'base_dir': path,
+        'session': None,
+        'session_onion': None,
+        'session_i2p': None,
+        'proxy_type': None,
+        'person_cache': {},
+        'debug': False,
+        'project_version': '1.4.0',
+        'http_prefix': 'https',
+        'domain': 'local.domain',
+        'onion_domain': None,
+        'i2p_domain': None,
+        'signing_priv_key_pem': None,
+        'fitness': {},
+        'quotas_daily': {
+            'domains': {},
+            'accounts': {}
+        },
+        'quotas_per_min': {
+            'domains': {},
+            'accounts': {}
+        },
+        'domain_max_posts_per_day': 10,
+        'account_max_posts_per_day': 10
+    }
+    metrics_before = inbox_queue_metrics(queue)
+    inbox_preverify_submit(queue, params)
+    preverified = inbox_preverified(path + '/b.json', params)
+    assert preverified['queue_json'] is None
+    assert preverified['pub_key'] is None
+    inbox_queue_pop(queue, True)
+    metrics = inbox_queue_metrics(queue)
+    assert metrics['queued'] == 1
+    assert metrics['workers'] > 0
+    assert metrics['dropped'] == metrics_before['dropped'] + 1
+    assert inbox_sender_session({}, params) is None
+
+    # the public key is not obtained for senders over their quota
+    queue_json = {
+        'postDomain': 'y.net',
+        'postNickname': 'bob',
+        'httpHeaders': {
+            'signature': 'keyId="https://y.net/users/bob#main-key"'
+        }
+    }
+    inbox_queue_pop(queue, True)
+    save_json(queue_json, path + '/d.json')
+    assert inbox_queue_push(queue, path + '/d.json', 70.0)
+    params['quotas_daily']['domains']['y.net'] = 11
+    inbox_preverify_submit(queue, params)
+    preverified = inbox_preverified(path + '/d.json', params)
+    assert preverified['quota_reached']
+    assert preverified['key_id'] is None
+    inbox_queue_pop(queue, True)
+    assert inbox_queue_head(queue) is None
+
+    shutil.rmtree(path, ignore_errors=False, onerror=None)
+
+
+def _test_search_index(base_dir: str) -> None:
+    print('test_search_index')
+    path = base_dir + '/.testSearchIndex'
+    if os.path.isdir(path):
+        shutil.rmtree(path, ignore_errors=False, onerror=None)
+    os.mkdir(path)
+    os.mkdir(path + '/accounts')
+    nickname = 'alice'
+    domain = 'local.domain'
+    account_dir = acct_dir(path, nickname, domain)
+    os.mkdir(account_dir)
+    os.mkdir(account_dir + '/outbox')
+    os.mkdir(account_dir + '/inbox')
+    contents = {
+        'post1': '<p>The cat sat on the mat</p>',
+        'post2': '<p>A dog and a cat and another cat</p>',
+        'post3': '<p>Only a dog here</p>',
+        'post5': '<p>Cats with <a href="https://z.net/@carol" ' +
+        'class="u-url mention">@<span>carol</span></a></p>'
+    }
+    for post_id, content in contents.items():
+        post_json_object = {
+            'type': 'Create',
+            'object': {
+                'type': 'Note',
+                'attributedTo': 'https://y.net/users/bob',
+                'content': content
+            }
+        }
+        save_json(post_json_object,
+                  account_dir + '/outbox/' + post_id + '.json')
+
+    # the index is created in the background when first searched,
+    # and until then the posts are searched without it
+    results = search_box_posts(path, nickname, domain, 'cat', 10, 'outbox')
+    assert len(results) == 3
+    for _ in range(100):
+        if os.path.isdir(account_dir + '/searchindex'):
+            break
+        time.sleep(0.1)
+    assert os.path.isdir(account_dir + '/searchindex')
+    time.sleep(0.5)
+
+    # links, actor ids and stopwords are not indexed
+    index_dir = account_dir + '/searchindex'
+    assert os.path.isfile(index_dir + '/carol.txt')
+    assert os.path.isfile(index_dir + '/mat.txt')
+    assert not os.path.isfile(index_dir + '/net.txt')
+    assert not os.path.isfile(index_dir + '/bob.txt')
+    assert not os.path.isfile(index_dir + '/the.txt')
+
+    # search words match the start of indexed words
+    results = search_box_posts(path, nickname, domain, 'cat', 10, 'outbox')
+    assert results[0] == account_dir + '/outbox/post2.json'
+    assert len(results) == 3
+    assert account_dir + '/outbox/post5.json' in results
+    results = search_box_posts(path, nickname, domain, 'dog+cat', 10,
+                               'outbox')
+    assert results == [account_dir + '/outbox/post2.json']
+    # phrases
+    results = search_box_posts(path, nickname, domain, 'cat sat', 10,
+                               'outbox')
+    assert results == [account_dir + '/outbox/post1.json']
+    assert not search_box_posts(path, nickname, domain, 'cat on', 10,
+                                'outbox')
+    # partial handles and urls
+    results = search_box_posts(path, nickname, domain, 'z.net/@car', 10,
+                               'outbox')
+    assert results == [account_dir + '/outbox/post5.json']
+    results = search_box_posts(path, nickname, domain, '@carol', 10,
+                               'outbox')
+    assert results == [account_dir + '/outbox/post5.json']
+    assert not search_box_posts(path, nickname, domain, 'cat', 10, 'inbox')
+    assert not search_box_posts(path, nickname, domain, 'horse', 10,
+                                'outbox')
+
+    # posts are added and removed incrementally
+    post_json_object = {
+        'type': 'Note',
+        'content': '<p>A horse</p>'
+    }
+    save_json(post_json_object, account_dir + '/inbox/post4.json')
+    add_post_to_search_index(account_dir, 'inbox', 'post4',
+                             post_json_object)
+    # changes are queued and written before searching
+    search_index_flush()
+    assert os.path.isfile(index_dir + '/horse.txt')
+    assert search_box_posts(path, nickname, domain, 'horse', 10,
+                            'inbox') == [account_dir + '/inbox/post4.json']
+    remove_post_from_search_index(account_dir, 'post4',
+                                  post_json_object, True)
+    assert not search_box_posts(path, nickname, domain, 'horse', 10,
+                                'inbox')
+    os.remove(account_dir + '/outbox/post1.json')
+    assert search_box_posts(path, nickname, domain, 'mat', 10,
+                            'outbox') == []
+
+    # virtual boxes
+    box_index_create(account_dir + '/bookmarks.index', ['post3.json'])
+    assert search_box_posts(path, nickname, domain, 'dog', 10,
+                            'bookmarks') == \
+        [account_dir + '/outbox/post3.json']
+
+    # words within too many posts are no longer indexed
+    with open(index_dir + '/dog.txt', 'a+', encoding='utf-8') as fp_word:
+        fp_word.write('outbox missing 1\n' * 70000)
+    post_json_object = load_json(account_dir + '/outbox/post3.json')
+    add_post_to_search_index(account_dir, 'outbox', 'post3',
+                             post_json_object)
+    search_index_flush()
+    assert not os.path.isfile(index_dir + '/dog.txt')
+    results = search_box_posts(path, nickname, domain, 'dog', 10, 'outbox')
+    assert len(results) == 2
+    results = search_box_posts(path, nickname, domain, 'dog+cat', 10,
+                               'outbox')
+    assert results == [account_dir + '/outbox/post2.json']
+
+    assert rebuild_search_index(account_dir, False) == 4
+    assert search_box_posts(path, nickname, domain, 'here', 10,
+                            'outbox') == [account_dir + '/outbox/post3.json']
+    assert os.path.isfile(index_dir + '/dog.txt')
+    assert search_index_words('Some <b>text</b>, and the b') == \
+        ['some', 'text']
+
+    shutil.rmtree(path, ignore_errors=False, onerror=None)
+
+
+def _calendar_event_example(post_id: str, start_time: str, content: str) -> {}:
+    """Returns a post containing an event
+    """
+    return {
+        'id': post_id + '/activity',
+        'type': 'Create',
+        'actor': 'https://y.net/users/bob',
+        'object': {
+            'id': post_id,
+            'type': 'Note',
+            'published': '2030-01-02T03:04:05Z',
+            'to': ['https://www.w3.org/ns/activitystreams#Public'],
+            'content': content,
+            'tag': [{
+                'type': 'Event',
+                'name': content,
+                'startTime': start_time,
+                'endTime': start_time
+            }, {
+                'type': 'Place',
+                'name': 'The Park'
+            }]
+        }
+    }
+
+
+def _test_scheduler() -> None:
+    print('test_scheduler')
+    queue_name = 'testQueue'
+    curr_time = time.time()
+    scheduler_add(queue_name, 'alice@a.net', curr_time + 0.3)
+    scheduler_add(queue_name, 'bob@b.net', curr_time + 100)
+
+    # sleeps until the first item is due
+    handles = scheduler_wait(queue_name, 10)
+    assert handles == ['alice@a.net']
+    assert time.time() - curr_time >= 0.29
+    assert time.time() - curr_time < 5
+
+    # items can be moved earlier, but not later
+    scheduler_add(queue_name, 'bob@b.net', curr_time + 200)
+    assert not scheduler_wait(queue_name, 0.1)
+    scheduler_add(queue_name, 'bob@b.net', curr_time)
+    assert scheduler_wait(queue_name, 10) == ['bob@b.net']
+    assert not scheduler_wait(queue_name, 0.1)
+
+    # removed items are never due
+    scheduler_add(queue_name, 'carol@c.net', time.time() + 0.2)
+    scheduler_remove(queue_name, 'carol@c.net')
+    assert not scheduler_wait(queue_name, 0.5)
+
+    # adding an item wakes a waiting thread
+    add_args = [queue_name, 'dave@d.net', 0]
+    add_thread = threading.Timer(0.2, scheduler_add, add_args)
+    add_thread.start()
+    start_time = time.time()
+    handles = scheduler_wait(queue_name, 10)
+    add_thread.join()
+    assert handles == ['dave@d.net']
+    assert time.time() - start_time < 5
+
+
+def _test_box_events(base_dir: str) -> None:
+    print('test_box_events')
+    path = base_dir + '/.testBoxEvents'
+    if os.path.isdir(path):
+        shutil.rmtree(path, ignore_errors=False, onerror=None)
+    nickname = 'alice'
+    domain = 'wonderland.net'
+    handle = nickname + '@' + domain
+    account_dir = acct_dir(path, nickname, domain)
+    os.makedirs(account_dir + '/inbox')
+
+    # without a cursor only the current cursor is returned
+    events_json = box_events_since(handle, 0, 5)
+    assert not events_json['reset']
+    assert not events_json['events']
+    cursor = events_json['cursor']
+    assert cursor > 0
+
+    # adding a post to a timeline creates an event
+    post_filename = \
+        account_dir + '/inbox/https:##rabbit.net#users#bob#statuses#1.json'
+    assert inbox_update_index('inbox', path, handle, post_filename, False)
+    box_event_add('hatter@tea.net', 'like', '', 'https://tea.net/1')
+    events_json = box_events_since(handle, cursor, 0)
+    assert not events_json['reset']
+    assert len(events_json['events']) == 1
+    event = events_json['events'][0]
+    assert event['type'] == 'post'
+    assert event['box'] == 'inbox'
+    assert event['url'] == 'https://rabbit.net/users/bob/statuses/1'
+    assert events_json['cursor'] == event['id']
+    cursor = events_json['cursor']
+
+    # waiting clients are woken when an event arrives
+    dm_url = 'https://rabbit.net/users/bob/statuses/2'
+    add_thread = \
+        threading.Timer(0.2, box_event_add, [handle, 'dm', '', dm_url])
+    add_thread.start()
+    start_time = time.time()
+    events_json = box_events_since(handle, cursor, 10)
+    add_thread.join()
+    assert time.time() - start_time < 5
+    assert len(events_json['events']) == 1
+    assert events_json['events'][0]['type'] == 'dm'
+    cursor = events_json['cursor']
+
+    # no events within the waiting time
+    start_time = time.time()
+    events_json = box_events_since(handle, cursor, 1)
+    assert time.time() - start_time >= 0.9
+    assert not events_json['events']
+    assert not events_json['reset']
+
+    # cursors from before the server started need a reset
+    events_json = box_events_since(handle, 1, 0)
+    assert events_json['reset']
+    assert events_json['cursor'] >= cursor
+
+    # as do cursors older than the events retained
+    for ctr in range(BOX_EVENTS_MAX + 1):
+        box_event_add(handle, 'reply', '', dm_url + str(ctr))
+    events_json = box_events_since(handle, cursor, 0)
+    assert events_json['reset']
+    assert not events_json['events']
+
+    shutil.rmtree(path, ignore_errors=False, onerror=None)
+
+
+def _test_content_cache(base_dir: str) -> None:
+    print('test_content_cache')
+    path = base_dir + '/.testContentCache'
+    if os.path.isdir(path):
+        shutil.rmtree(path, ignore_errors=False, onerror=None)
+    os.mkdir(path)
+    os.mkdir(path + '/emoji')
+    emoji_json = {'lemon': '1F34B', 'missing': '1F34C'}
+    save_json(emoji_json, path + '/emoji/default_emoji.json')
+    with open(path + '/emoji/1F34B.png', 'wb') as fp_emoji:
+        fp_emoji.write(b'png')
+    nickname = 'alice'
+    domain = 'wonderland.net'
+    account_dir = acct_dir(path, nickname, domain)
+    os.makedirs(account_dir)
+    auto_tags_filename = account_dir + '/autotags.txt'
+    with open(auto_tags_filename, 'w+', encoding='utf-8') as fp_tags:
+        fp_tags.write('cats -> #animals\nblue whale -> whales\n')
+
+    # emoji and automatic tags are added
+    hashtags = {}
+    content = 'Some cats and a blue whale :lemon: :missing:'
+    content = add_html_tags(path, 'https', nickname, domain, content,
+                            [], hashtags, {}, False)
+    assert 'lemon' in hashtags
+    assert 'missing' not in hashtags
+    assert 'animals' in hashtags
+    assert 'whales' in hashtags
+    assert os.path.isfile(path + '/emoji/emoji.json')
+
+    # the context is only read again when files change
+    context1 = get_content_context(path, nickname, domain)
+    context2 = get_content_context(path, nickname, domain)
+    assert context1['auto_tags'] is context2['auto_tags']
+    assert context1['emoji'] is context2['emoji']
+    assert get_emoji_context(path)['names']['1F34B'] == 'lemon'
+    with open(auto_tags_filename, 'w+', encoding='utf-8') as fp_tags:
+        fp_tags.write('dogs -> animals\n')
+    stat_tags = os.stat(auto_tags_filename)
+    os.utime(auto_tags_filename,
+             ns=(stat_tags.st_atime_ns, stat_tags.st_mtime_ns + 1000000))
+    context3 = get_content_context(path, nickname, domain)
+    assert context3['auto_tags'] == {'dogs': ['#animals']}
+
+    # custom emoji are merged
+    os.mkdir(path + '/emojicustom')
+    save_json({'blob': 'blob'}, path + '/emojicustom/emoji.json')
+    with open(path + '/emojicustom/blob.png', 'wb') as fp_emoji:
+        fp_emoji.write(b'png')
+    hashtags = {}
+    content = add_html_tags(path, 'https', nickname, domain,
+                            'A :blob: and dogs', [], hashtags, {}, False)
+    assert 'blob' in hashtags
+    assert 'animals' in hashtags
+    assert '/emoji/blob.png' in hashtags['blob']['icon']['url']
+
+    # benchmark over a corpus of posts
+    no_of_posts = 2000
+    start_time = time.time()
+    for ctr in range(no_of_posts):
+        hashtags = {}
+        content = 'Post ' + str(ctr) + ' about dogs :lemon: and ' + \
+            '#tag' + str(ctr % 50) + ' with @bob@somewhere.net ' + \
+            'https://somewhere.net/page' + str(ctr) + ' :blob:'
+        add_html_tags(path, 'https', nickname, domain, content,
+                      [], hashtags, {}, False)
+        assert 'animals' in hashtags
+        assert 'lemon' in hashtags
+    time_taken_ms = (time.time() - start_time) * 1000 / no_of_posts
+    print('add_html_tags: ' + str(time_taken_ms) + 'mS per post')
+    assert time_taken_ms < 20
+
+    shutil.rmtree(path, ignore_errors=False, onerror=None)
+
+
+def _test_account_settings(base_dir: str) -> None:
+    print('test_account_settings')
+    path = base_dir + '/.testAccountSettings'
+    if os.path.isdir(path):
+        shutil.rmtree(path, ignore_errors=False, onerror=None)
+    os.mkdir(path)
+    os.mkdir(path + '/accounts')
+    account_dir = path + '/accounts/alice@x.net'
+    os.mkdir(account_dir)
+    with open(account_dir + '/.hideLikeButton', 'w+',
+              encoding='utf-8') as fp_flag:
+        fp_flag.write('\n')
+
+    settings = get_account_settings(account_dir)
+    assert settings['hideLikeButton']
+    assert not settings['hideReactionButton']
+    assert settings['timezone'] is None
+    # the snapshot can't be changed
+    try:
+        settings['hideLikeButton'] = False
+        assert False
+    except TypeError:
+        pass
+    assert get_account_settings(account_dir) is settings
+
+    # changes made by the running instance appear straight away
+    set_account_timezone(path, 'alice', 'x.net', 'Europe/London')
+    assert get_account_timezone(path, 'alice', 'x.net') == 'Europe/London'
+    os.remove(account_dir + '/.hideLikeButton')
+    account_settings_changed(account_dir)
+    assert not get_account_settings(account_dir)['hideLikeButton']
+
+    # snoozed actors
+    actor = 'https://y.net/users/bob'
+    assert not is_person_snoozed(path, 'alice', 'x.net', actor)
+    person_snooze(path, 'alice', 'x.net', actor)
+    assert is_person_snoozed(path, 'alice', 'x.net', actor)
+    person_unsnooze(path, 'alice', 'x.net', actor)
+    assert not is_person_snoozed(path, 'alice', 'x.net', actor)
+
+    # accounts which don't exist have default settings
+    settings = get_account_settings(path + '/accounts/bob@x.net')
+    assert not settings['hideLikeButton']
+
+    # small json files are read again only when they change
+    edits_filename = path + '/accounts/alice@x.net/post.edits'
+    assert get_account_settings_json(edits_filename) is None
+    save_json({'a': 1}, edits_filename)
+    edits_json = get_account_settings_json(edits_filename)
+    assert edits_json == {'a': 1}
+    assert get_account_settings_json(edits_filename) is edits_json
+    save_json({'a': 1, 'b': 2}, edits_filename)
+    assert get_account_settings_json(edits_filename) == {'a': 1, 'b': 2}
+    os.remove(edits_filename)
+    assert get_account_settings_json(edits_filename) is None
+
+    shutil.rmtree(path, ignore_errors=False, onerror=None)
+
+
+def _render_post_as(base_dir: str, translate: {}, recent_posts_cache: {},
+                    nickname: str, post_json_object: {},
+                    timezone: str, minimize_all_images: bool) -> str:
+    """Returns the html for a post as seen by the given account
+    """
+    # posts are loaded from file each time they are shown
+    post_json_object = json.loads(json.dumps(post_json_object))
+    return individual_post_as_html(None, False, recent_posts_cache, 10,
+                                   translate, 1, base_dir, None, {}, {},
+                                   nickname, 'x.net', 443,
+                                   post_json_object, None, True, False,
+                                   'https', __version__, 'inbox',
+                                   None, None, False, [], False,
+                                   'default', 'en', 10, True, True,
+                                   False, False, True, False, {}, '',
+                                   timezone, False, False, {},
+                                   minimize_all_images, '', {})
+
+
+def _test_post_html_viewer_settings(base_dir: str) -> None:
+    print('test_post_html_viewer_settings')
+    path = base_dir + '/.testPostHtmlViewerSettings'
+    if os.path.isdir(path):
+        shutil.rmtree(path, ignore_errors=False, onerror=None)
+    os.mkdir(path)
+    os.mkdir(path + '/cache')
+    os.mkdir(path + '/accounts')
+    for nickname in ('alice', 'bob'):
+        os.mkdir(path + '/accounts/' + nickname + '@x.net')
+        os.mkdir(path + '/accounts/' + nickname + '@x.net/inbox')
+    translate = load_json(base_dir + '/translations/en.json')
+
+    carol = 'https://y.net/users/carol'
+    post_id = carol + '/statuses/456'
+    post_json_object = {
+        'id': post_id + '/activity',
+        'type': 'Create',
+        'actor': carol,
+        'to': ['https://www.w3.org/ns/activitystreams#Public'],
+        'cc': [],
+        'object': {
+            'id': post_id,
+            'type': 'Note',
+            'attributedTo': carol,
+            'published': '2030-01-02T03:04:05Z',
+            'to': ['https://www.w3.org/ns/activitystreams#Public'],
+            'cc': [],
+            'content': '<p>Picture of a cat</p>',
+            'contentMap': {
+                'en': '<p>Picture of a cat</p>'
+            },
+            'sensitive': False,
+            'attachment': [{
+                'type': 'Document',
+                'mediaType': 'image/png',
+                'name': 'A cat',
+                'url': 'https://y.net/media/cat.png'
+            }]
+        }
+    }
+    for nickname in ('alice', 'bob'):
+        save_json(post_json_object, path + '/accounts/' + nickname +
+                  '@x.net/inbox/' + post_id.replace('/', '#') + '.json')
+    # only bob has seen an earlier version of the post
+    edits_json = {
+        '2030-01-02T04:00:00Z': {
+            'type': 'Create',
+            'object': {
+                'type': 'Note',
+                'content': '<p>Picture of a dog</p>',
+                'contentMap': {
+                    'en': '<p>Picture of a dog</p>'
+                }
+            }
+        }
+    }
+    save_json(edits_json, path + '/accounts/bob@x.net/inbox/' +
+              post_id.replace('/', '#') + '.edits')
+    recent_posts_cache = {}
+
+    alice_html = _render_post_as(path, translate, recent_posts_cache,
+                                 'alice', post_json_object, 'UTC', False)
+    assert 'Jan 02, 03:04' in alice_html
+    assert 'SHOW MEDIA' not in alice_html
+    assert 'dog' not in alice_html
+
+    # a different timezone and minimized images
+    bob_html = _render_post_as(path, translate, recent_posts_cache,
+                               'bob', post_json_object, 'Asia/Tokyo', True)
+    assert 'Jan 02, 12:04' in bob_html
+    assert 'Jan 02, 03:04' not in bob_html
+    assert 'SHOW MEDIA' in bob_html
+    assert 'dog' in bob_html
+
+    # each is shown with their own settings, from memory or from file
+    for recent_posts_cache in (recent_posts_cache, {}):
+        alice_html2 = _render_post_as(path, translate, recent_posts_cache,
+                                      'alice', post_json_object,
+                                      'UTC', False)
+        assert 'Jan 02, 03:04' in alice_html2
+        assert 'SHOW MEDIA' not in alice_html2
+        assert 'dog' not in alice_html2
+        bob_html2 = _render_post_as(path, translate, recent_posts_cache,
+                                    'bob', post_json_object,
+                                    'Asia/Tokyo', True)
+        assert 'Jan 02, 12:04' in bob_html2
+        assert 'SHOW MEDIA' in bob_html2
+        assert 'dog' in bob_html2
+
+    shutil.rmtree(path, ignore_errors=False, onerror=None)
+
+
+def _test_post_html_viewers(base_dir: str) -> None:
+    print('test_post_html_viewers')
+    path = base_dir + '/.testPostHtmlViewers'
+    if os.path.isdir(path):
+        shutil.rmtree(path, ignore_errors=False, onerror=None)
+    os.mkdir(path)
+    os.mkdir(path + '/cache')
+    os.mkdir(path + '/accounts')
+    for nickname in ('alice', 'bob'):
+        os.mkdir(path + '/accounts/' + nickname + '@x.net')
+        os.mkdir(path + '/accounts/' + nickname + '@x.net/inbox')
+        os.mkdir(path + '/accounts/' + nickname + '@x.net/outbox')
+    translate = load_json(base_dir + '/translations/en.json')
+
+    alice = 'https://x.net/users/alice'
+    bob = 'https://x.net/users/bob'
+    post_id = alice + '/statuses/123'
+    post_json_object = {
+        'id': post_id + '/activity',
+        'type': 'Create',
+        'actor': alice,
+        'to': ['https://www.w3.org/ns/activitystreams#Public'],
+        'cc': [],
+        'object': {
+            'id': post_id,
+            'type': 'Note',
+            'attributedTo': alice,
+            'published': '2030-01-02T03:04:05Z',
+            'to': ['https://www.w3.org/ns/activitystreams#Public'],
+            'cc': [],
+            'content': '<p>Hello world</p>',
+            'contentMap': {
+                'en': '<p>Hello world</p>'
+            },
+            'sensitive': False,
+            'likes': {
+                'totalItems': 1,
+                'items': [{
+                    'type': 'Like',
+                    'actor': bob
+                }]
+            }
+        }
+    }
+    save_json(post_json_object, path + '/accounts/alice@x.net/outbox/' +
+              post_id.replace('/', '#') + '.json')
+    save_json(post_json_object, path + '/accounts/bob@x.net/inbox/' +
+              post_id.replace('/', '#') + '.json')
+    recent_posts_cache = {}
+
+    # shown to the author, who can delete it but hasn't liked it
+    alice_html = _render_post_as(path, translate, recent_posts_cache,
+                                 'alice', post_json_object, 'UTC', False)
+    assert 'Hello world' in alice_html
+    assert '/users/alice?delete=' + post_id in alice_html
+    assert '?like=' + post_id in alice_html
+    assert '?unlike=' not in alice_html
+    cached_filename = get_cached_post_filename(path, post_json_object)
+    assert os.path.isfile(cached_filename)
+    with open(cached_filename, 'r', encoding='utf-8') as fp_cache:
+        cached_html = fp_cache.read()
+    assert '?delete=' not in cached_html
+    assert '?like=' not in cached_html
+
+    # shown from the cache to another account, which has liked it
+    bob_html = _render_post_as(path, translate, recent_posts_cache,
+                               'bob', post_json_object, 'UTC', False)
+    assert recent_posts_cache['hits'] == 1
+    assert 'Hello world' in bob_html
+    assert '?delete=' not in bob_html
+    assert '/users/bob?unlike=' + post_id in bob_html
+    assert '?like=' not in bob_html
+    assert 'href="/users/alice?' not in bob_html
+    alice_html2 = _render_post_as(path, translate, recent_posts_cache,
+                                  'alice', post_json_object, 'UTC', False)
+    assert recent_posts_cache['hits'] == 2
+    assert '/users/alice?delete=' + post_id in alice_html2
+    assert '?like=' + post_id in alice_html2
+    assert '?unlike=' not in alice_html2
+
+    # the shared cache is used when the post is not within memory
+    recent_posts_cache = {}
+    bob_html2 = _render_post_as(path, translate, recent_posts_cache,
+                                'bob', post_json_object, 'UTC', False)
+    assert bob_html2 == bob_html
+
+    # muted by one account but not the other
+    mute_filename = path + '/accounts/bob@x.net/inbox/' + \
+        post_id.replace('/', '#') + '.json.muted'
+    with open(mute_filename, 'w+', encoding='utf-8') as fp_mute:
+        fp_mute.write('\n')
+    bob_html3 = _render_post_as(path, translate, recent_posts_cache,
+                                'bob', post_json_object, 'UTC', False)
+    assert 'Hello world' not in bob_html3
+    alice_html3 = _render_post_as(path, translate, recent_posts_cache,
+                                  'alice', post_json_object, 'UTC', False)
+    assert 'Hello world' in alice_html3
+    assert '/users/alice?delete=' + post_id in alice_html3
+
+    # a post muted by one account is not held in memory for others
+    recent_posts_cache = {}
+    post_html_cache_invalidate(path, post_id)
+    bob_html4 = _render_post_as(path, translate, recent_posts_cache,
+                                'bob', post_json_object, 'UTC', False)
+    assert 'Hello world' not in bob_html4
+    assert not recent_posts_cache.get('index')
+    alice_html4 = _render_post_as(path, translate, recent_posts_cache,
+                                  'alice', post_json_object, 'UTC', False)
+    assert 'Hello world' in alice_html4
+    with open(cached_filename, 'r', encoding='utf-8') as fp_cache:
+        assert fp_cache.read() == cached_html
+
+    shutil.rmtree(path, ignore_errors=False, onerror=None)
+
+
+def _test_post_html_cache(base_dir: str) -> None:
+    print('test_post_html_cache')
+    path = base_dir + '/.testPostHtmlCache'
+    if os.path.isdir(path):
+        shutil.rmtree(path, ignore_errors=False, onerror=None)
+    os.mkdir(path)
+    os.mkdir(path + '/cache')
+
+    post_id = 'https://x.net/users/alice/statuses/1'
+    announce_id = 'https://y.net/users/bob/statuses/2'
+    other_id = 'https://y.net/users/bob/statuses/3'
+    alice = 'https://x.net/users/alice'
+    bob = 'https://y.net/users/bob'
+    dependencies = [alice]
+    assert post_html_cache_save(path, post_id, '<p>post</p>', dependencies)
+    dependencies = [bob, post_id, alice]
+    assert post_html_cache_save(path, announce_id, '<p>announce</p>',
+                                dependencies)
+    dependencies = [bob]
+    assert post_html_cache_save(path, other_id, '<p>other</p>',
+                                dependencies)
+    assert post_html_cache_load(path, post_id) == '<p>post</p>'
+    assert post_html_cache_load(path, 'https://z.net/1') == ''
+
+    # the html is shared by all accounts
+    post_json_object = {
+        'id': post_id + '/activity'
+    }
+    cached_filename = get_cached_post_filename(path, post_json_object)
+    assert os.path.isfile(cached_filename)
+
+    # editing a post removes it and announces of it
+    recent_posts_cache = {}
+    update_recent_posts_cache(recent_posts_cache, 10,
+                              post_json_object, '<p>post</p>')
+    clear_from_post_caches(path, recent_posts_cache,
+                           post_id.replace('/', '#'))
+    assert not recent_posts_cache['index']
+    assert not post_html_cache_load(path, post_id)
+    assert not post_html_cache_load(path, announce_id)
+    assert post_html_cache_load(path, other_id) == '<p>other</p>'
+
+    # updating an actor removes their posts
+    assert post_html_cache_load(path, other_id)
+    clear_from_post_caches(path, recent_posts_cache, bob)
+    assert not post_html_cache_load(path, other_id)
+
+    # old html is expired
+    dependencies = [alice]
+    assert post_html_cache_save(path, post_id, '<p>post</p>', dependencies)
+    os.mkdir(path + '/cache/posthtml/v0')
+    assert expire_post_html_cache(path, 1) == 0
+    assert not os.path.isdir(path + '/cache/posthtml/v0')
+    os.utime(cached_filename, (0, 0))
+    assert expire_post_html_cache(path, 1) == 1
+    assert not os.path.isfile(cached_filename)
+
+    # html cached before a restart is not shown, because the posts
+    # and actors which it depends upon are unknown
+    assert post_html_cache_save(path, post_id, '<p>post</p>', dependencies)
+    post_html_cache_invalidate(path, post_id)
+    with open(cached_filename, 'w+', encoding='utf-8') as fp_cache:
+        fp_cache.write('<p>post</p>')
+    assert not post_html_cache_load(path, post_id)
+    assert not os.path.isfile(cached_filename)
+
+    shutil.rmtree(path, ignore_errors=False, onerror=None)
+
+
+def _test_shares_index(base_dir: str) -> None:
+    print('test_shares_index')
+    path = base_dir + '/.testSharesIndex'
+    if os.path.isdir(path):
+        shutil.rmtree(path, ignore_errors=False, onerror=None)
+    os.mkdir(path)
+    os.mkdir(path + '/accounts')
+    os.mkdir(path + '/accounts/alice@x.net')
+    os.mkdir(path + '/cache')
+    os.mkdir(path + '/cache/catalogs')
+
+    curr_time = int(time.time())
+    shares_json = {}
+    for ctr in range(5):
+        item_id = 'https---x.net--users--alice--shareditems--item' + str(ctr)
+        shares_json[item_id] = {
+            "displayName": "Spanner " + str(ctr),
+            "summary": "Adjustable spanner",
+            "imageUrl": "",
+            "itemQty": 1,
+            "itemType": "tool",
+            "category": "Tools",
+            "location": "Hardware store",
+            "published": curr_time - ctr,
+            "expire": curr_time + 60,
+            "itemPrice": "0",
+            "itemCurrency": "EUR",
+            "dfcId": "epicyon#tool"
+        }
+    shares_json['https---x.net--users--alice--shareditems--item2'][
+        'category'] = 'Clothes'
+    expired_id = 'https---x.net--users--alice--shareditems--expired'
+    shares_json[expired_id] = {
+        "displayName": "Old bicycle",
+        "summary": "Has seen better days",
+        "imageUrl": "",
+        "itemQty": 1,
+        "itemType": "bicycle",
+        "category": "Transport",
+        "location": "",
+        "published": curr_time - 100,
+        "expire": curr_time - 1,
+        "itemPrice": "0",
+        "itemCurrency": "EUR",
+        "dfcId": "epicyon#bicycle"
+    }
+    shares_filename = path + '/accounts/alice@x.net/shares.json'
+    save_json(shares_json, shares_filename)
+    federated_json = {
+        'https---y.net--users--bob--shareditems--lamp': {
+            "displayName": "Lamp",
+            "summary": "Spanner shaped lamp",
+            "category": "Furniture",
+            "location": "",
+            "published": curr_time,
+            "expire": curr_time + 60
+        }
+    }
+    save_json(federated_json, path + '/cache/catalogs/y.net.shares.json')
+
+    # the catalog can be filtered by category
+    catalog_json = \
+        shares_catalog_endpoint(path, 'https', 'x.net',
+                                '/catalog?category=clothes', 'shares')
+    assert len(catalog_json['DFC:supplies']) == 1
+    updated = catalog_json['epicyon:updated']
+    since_path = '/catalog?since=' + str(updated)
+
+    # the catalog can be paged, with the most recent first
+    catalog_json = \
+        shares_catalog_endpoint(path, 'https', 'x.net',
+                                '/catalog?page=1', 'shares')
+    assert len(catalog_json['DFC:supplies']) == 6
+    assert catalog_json['DFC:supplies'][0]['@id'].endswith('Spanner0')
+    assert not catalog_json.get('epicyon:next')
+
+    # the catalog is not sent again if it has not changed
+    catalog_json = \
+        shares_catalog_endpoint(path, 'https', 'x.net',
+                                since_path, 'shares')
+    assert catalog_json.get('epicyon:unchanged')
+    assert not catalog_json['DFC:supplies']
+
+    # words within items are matched by their start
+    results = shares_index_search(path, 'shares', ['span'], ['y.net'])
+    assert len(results) == 6
+    results = shares_index_search(path, 'shares', ['spanner 3'], ['y.net'])
+    assert len(results) == 1
+    assert results[0][1] == 'alice@x.net'
+    results = shares_index_search(path, 'shares', ['lamp', 'bicycle'], [])
+    assert len(results) == 1
+    assert results[0][0] == expired_id
+
+    # changes to federated catalogs are indexed, but don't change
+    # the catalog of this instance
+    federated_json = {}
+    shares_index_update_federated(path, 'y.net', 'shares', federated_json)
+    results = shares_index_search(path, 'shares', ['lamp'], ['y.net'])
+    assert not results
+    catalog_json = \
+        shares_catalog_endpoint(path, 'https', 'x.net',
+                                since_path, 'shares')
+    assert catalog_json.get('epicyon:unchanged')
+
+    # saving shares which have not changed doesn't change the catalog
+    shares_index_update_account(path, 'alice@x.net', 'shares', shares_json)
+    catalog_json = \
+        shares_catalog_endpoint(path, 'https', 'x.net',
+                                since_path, 'shares')
+    assert catalog_json.get('epicyon:unchanged')
+
+    # expired items are found until they are removed from the account
+    expired_handles = shares_index_expired(path, 'shares', curr_time)
+    assert expired_handles == ['alice@x.net']
+    expired_handles = shares_index_expired(path, 'shares', curr_time)
+    assert expired_handles == ['alice@x.net']
+
+    # expired items are removed
+    expire_shares(path)
+    shares_json = load_json(shares_filename)
+    assert len(shares_json.items()) == 5
+    assert not shares_index_search(path, 'shares', ['bicycle'], [])
+    catalog_json = \
+        shares_catalog_endpoint(path, 'https', 'x.net',
+                                since_path, 'shares')
+    assert not catalog_json.get('epicyon:unchanged')
+    assert catalog_json['epicyon:updated'] > updated
+    assert not shares_index_expired(path, 'shares', curr_time)
+
+    shutil.rmtree(path, ignore_errors=False, onerror=None)
+
+
+def _test_webfinger_cache(base_dir: str) -> None:
+    print('test_webfinger_cache')
+    path = base_dir + '/.testWebfingerCache'
+    if os.path.isdir(path):
+        shutil.rmtree(path, ignore_errors=False, onerror=None)
+    os.mkdir(path)
+    os.mkdir(path + '/cache')
+
+    cached_webfingers = {}
+    assert webfinger_cache_load(path, cached_webfingers) == 0
+    wf_json = {
+        'subject': 'acct:alice@x.net'
+    }
+    store_webfinger_in_cache('alice@x.net', wf_json, cached_webfingers)
+    assert get_webfinger_from_cache('alice@x.net',
+                                    cached_webfingers) == wf_json
+    assert get_webfinger_from_cache('bob@y.net', cached_webfingers) is None
+
+    # failed lookups are remembered
+    store_webfinger_in_cache('bob@y.net', None, cached_webfingers)
+    assert get_webfinger_from_cache('bob@y.net', cached_webfingers) == {}
+
+    # entries are loaded again after a restart
+    store_webfinger_in_cache('carol@z.net', wf_json, cached_webfingers)
+    cached_webfingers2 = {}
+    assert webfinger_cache_load(path, cached_webfingers2) == 3
+    assert get_webfinger_from_cache('alice@x.net',
+                                    cached_webfingers2) == wf_json
+    assert get_webfinger_from_cache('bob@y.net', cached_webfingers2) == {}
+
+    # expired entries are removed
+    cached_webfingers2['carol@z.net']['expires'] = int(time.time()) - 1
+    assert get_webfinger_from_cache('carol@z.net',
+                                    cached_webfingers2) is None
+    assert not cached_webfingers2.get('carol@z.net')
+
+    # only the first of several lookups for a handle is sent
+    inflight, leader = webfinger_lookup_begin('eve@x.net')
+    assert leader
+    inflight2, leader2 = webfinger_lookup_begin('eve@x.net')
+    assert not leader2
+    assert inflight2 is inflight
+    webfinger_lookup_end('eve@x.net', inflight, wf_json)
+    assert webfinger_lookup_wait(inflight2) == wf_json
+    _, leader3 = webfinger_lookup_begin('eve@x.net')
+    assert leader3
+    webfinger_lookup_end('eve@x.net', inflight, None)
+
+    shutil.rmtree(path, ignore_errors=False, onerror=None)
+
+
+def _test_actor_store(base_dir: str) -> None:
+    print('test_actor_store')
+    path = base_dir + '/.testActorStore'
+    if os.path.isdir(path):
+        shutil.rmtree(path, ignore_errors=False, onerror=None)
+    os.mkdir(path)
+    os.mkdir(path + '/cache')
+    os.mkdir(path + '/cache/actors')
+
+    # an actor stored by an older version
+    actor1 = 'https://x.net/users/alice'
+    actor1_json = {
+        'id': actor1,
+        'type': 'Group',
+        'name': 'Alice',
+        'inbox': actor1 + '/inbox'
+    }
+    legacy_filename = \
+        path + '/cache/actors/' + actor1.replace('/', '#') + '.json'
+    save_json(actor1_json, legacy_filename)
+    assert actor_store_locate(path, actor1) == legacy_filename
+    assert is_group_actor(path, actor1, {})
+    assert migrate_actor_store(path) == 1
+    assert not os.path.isfile(legacy_filename)
+    actor1_filename = actor_store_filename(path, actor1)
+    assert os.path.isfile(actor1_filename)
+    assert actor_store_locate(path, actor1) == actor1_filename
+    assert is_group_actor(path, actor1, {})
+
+    # actors are stored within subdirectories
+    person_cache = {}
+    actor2 = 'https://y.net/users/bob'
+    actor2_json = {
+        'id': actor2,
+        'type': 'Person',
+        'name': 'Bob',
+        'summary': 'Some text which is not needed in memory',
+        'inbox': actor2 + '/inbox',
+        'endpoints': {
+            'sharedInbox': 'https://y.net/inbox'
+        },
+        'icon': {
+            'url': 'https://y.net/avatar.png'
+        },
+        'publicKey': {
+            'id': actor2 + '#main-key',
+            'publicKeyPem': 'pem'
+        }
+    }
+    store_person_in_cache(path, actor2, actor2_json, person_cache, True)
+    assert os.path.isfile(actor_store_filename(path, actor2))
+    compact = person_cache[actor2]['compact']
+    assert compact['sharedInbox'] == 'https://y.net/inbox'
+    assert compact['icon'] == 'https://y.net/avatar.png'
+    assert compact['publicKeyPem'] == 'pem'
+    assert not compact.get('summary')
+    assert isinstance(person_cache[actor2]['timestamp'], int)
+    assert get_display_name(path, actor2, person_cache) == 'Bob'
+
+    # with a small budget only the most recently used actor is held
+    # in full, and others are loaded again from file when needed
+    set_actor_store_budget(1)
+    result = get_person_from_cache(path, actor1, person_cache)
+    assert result['name'] == 'Alice'
+    assert person_cache[actor2]['actor'] is None
+    assert get_display_name(path, actor2, person_cache) == 'Bob'
+    assert not is_group_actor(path, actor2, person_cache)
+    assert is_group_actor(path, actor1, person_cache)
+    result = get_person_from_cache(path, actor2, person_cache)
+    assert result == actor2_json
+    assert person_cache[actor1]['actor'] is None
+
+    # an actor which changes is saved again, so that the current
+    # version is loaded from file after it is dropped from memory
+    actor2_json = actor2_json.copy()
+    actor2_json['name'] = 'Robert'
+    actor2_json['publicKey'] = {
+        'id': actor2 + '#main-key',
+        'publicKeyPem': 'newpem'
+    }
+    store_person_in_cache(path, actor2, actor2_json, person_cache, True)
+    assert person_cache[actor2]['persisted']
+    # storing the same actor again doesn't write the file
+    actor2_filename = actor_store_filename(path, actor2)
+    os.utime(actor2_filename, (0, 0))
+    store_person_in_cache(path, actor2, actor2_json, person_cache, True)
+    assert os.path.getmtime(actor2_filename) == 0
+    result = get_person_from_cache(path, actor1, person_cache)
+    assert person_cache[actor2]['actor'] is None
+    result = get_person_from_cache(path, actor2, person_cache)
+    assert result == actor2_json
+    assert person_cache[actor2]['compact']['publicKeyPem'] == 'newpem'
+    set_actor_store_budget(ACTOR_STORE_MAX_BYTES)
+
+    # old entries expire from memory
+    person_cache[actor1]['timestamp'] -= 3 * 24 * 60 * 60
+    expire_person_cache(person_cache)
+    assert not person_cache.get(actor1)
+    assert person_cache.get(actor2)
+
+    shutil.rmtree(path, ignore_errors=False, onerror=None)
+
+
+def _test_calendar_index(base_dir: str) -> None:
+    print('test_calendar_index')
+    path = base_dir + '/.testCalendarIndex'
+    if os.path.isdir(path):
+        shutil.rmtree(path, ignore_errors=False, onerror=None)
+    os.mkdir(path)
+    os.mkdir(path + '/accounts')
+    account_dir = path + '/accounts/alice@x.net'
+    os.mkdir(account_dir)
+    os.mkdir(account_dir + '/inbox')
+    os.mkdir(account_dir + '/outbox')
+    os.mkdir(account_dir + '/calendar')
+    os.mkdir(account_dir + '/calendar/2031')
+
+    # an event within an existing calendar file, before there was an index
+    post_id1 = 'https://y.net/users/bob/statuses/1'
+    post_filename1 = \
+        account_dir + '/inbox/' + post_id1.replace('/', '#') + '.json'
+    post_json1 = \
+        _calendar_event_example(post_id1, '2031-05-04T18:00:00Z', 'Concert')
+    save_json(post_json1, post_filename1)
+    with open(account_dir + '/calendar/2031/5.txt', 'w+',
+              encoding='utf-8') as fp_cal:
+        fp_cal.write(post_id1.replace('/', '#') + '\n')
+    events = get_calendar_events(path, 'alice', 'x.net', 2031, 5, '')
+    assert list(events.keys()) == ['4']
+    assert events['4'][0][0]['id'] == post_id1
+    assert events['4'][0][0]['sender'] == 'https://y.net/users/bob'
+    assert events['4'][0][1]['name'] == 'The Park'
+    assert os.path.isfile(account_dir + '/calendar/index.json')
+
+    # a new event arrives
+    post_id2 = 'https://y.net/users/bob/statuses/2'
+    post_json2 = \
+        _calendar_event_example(post_id2, '2031-05-10T10:30:00Z', 'Picnic')
+    post_filename2 = \
+        account_dir + '/inbox/' + post_id2.replace('/', '#') + '.json'
+    save_json(post_json2, post_filename2)
+    event_post_id = post_id2.replace('/', '#')
+    assert save_event_post(path, 'alice@x.net', event_post_id,
+                           post_json2['object']['tag'][0], post_json2)
+
+    # events are obtained from the index without loading the posts
+    save_json({}, post_filename1)
+    save_json({}, post_filename2)
+    events = get_calendar_events(path, 'alice', 'x.net', 2031, 5, '')
+    assert sorted(events.keys()) == ['10', '4']
+    events = get_calendar_events(path, 'alice', 'x.net', 2031, 5, 'picnic')
+    assert list(events.keys()) == ['10']
+    events = get_todays_events(path, 'alice', 'x.net', 2031, 5, 10, '',
+                               'en')
+    assert len(events['10']) == 1
+    assert events['10'][0][0]['public'] is True
+    assert events['10'][0][0]['post_id'] == '2'
+    assert day_events_check(path, 'alice', 'x.net',
+                            datetime.datetime(2031, 5, 10))
+    assert not day_events_check(path, 'alice', 'x.net',
+                                datetime.datetime(2031, 5, 11))
+    ical_str = get_month_events_icalendar(path, 'alice', 'x.net',
+                                          2031, 5, {}, '')
+    assert ical_str.count('BEGIN:VEVENT') == 2
+    assert 'DTSTAMP:20300102T030405Z' in ical_str
+    assert 'LOCATION:The Park' in ical_str
+
+    # an event is removed
+    remove_calendar_event(path, 'alice', 'x.net', 2031, 5, post_id2)
+    assert not text_in_file(post_id2.replace('/', '#'),
+                            account_dir + '/calendar/2031/5.txt')
+    events = get_calendar_events(path, 'alice', 'x.net', 2031, 5, '')
+    assert list(events.keys()) == ['4']
+
+    # a post is deleted
+    os.remove(post_filename1)
+    assert not get_calendar_events(path, 'alice', 'x.net', 2031, 5, '')
+    assert not text_in_file(post_id1.replace('/', '#'),
+                            account_dir + '/calendar/2031/5.txt')
+
+    # an event happening this week
+    post_id3 = 'https://y.net/users/bob/statuses/3'
+    event_time = datetime.datetime.utcnow() + datetime.timedelta(days=2)
+    event_time_str = event_time.strftime("%Y-%m-%dT%H:%M:%SZ")
+    post_json3 = _calendar_event_example(post_id3, event_time_str, 'Market')
+    post_filename3 = \
+        account_dir + '/inbox/' + post_id3.replace('/', '#') + '.json'
+    save_json(post_json3, post_filename3)
+    event_post_id = post_id3.replace('/', '#')
+    assert save_event_post(path, 'alice@x.net', event_post_id,
+                           post_json3['object']['tag'][0], post_json3)
+    events = get_this_weeks_events(path, 'alice', 'x.net')
+    assert len(events) == 1
+    assert len(list(events.values())[0][0]) == 2
+
+    # the date, location and content of an event are edited
+    post_id4 = 'https://y.net/users/bob/statuses/4'
+    post_json4 = \
+        _calendar_event_example(post_id4, '2031-06-01T12:00:00Z', 'Fair')
+    post_filename4 = \
+        account_dir + '/inbox/' + post_id4.replace('/', '#') + '.json'
+    save_json(post_json4, post_filename4)
+    event_post_id = post_id4.replace('/', '#')
+    assert save_event_post(path, 'alice@x.net', event_post_id,
+                           post_json4['object']['tag'][0], post_json4)
+    assert get_calendar_events(path, 'alice', 'x.net', 2031, 6, 'fair')
+    post_json4['object']['content'] = 'Festival'
+    post_json4['object']['tag'][0]['startTime'] = '2031-07-15T12:00:00Z'
+    post_json4['object']['tag'][0]['endTime'] = '2031-07-15T12:00:00Z'
+    post_json4['object']['tag'][1]['name'] = 'The Square'
+    save_json(post_json4, post_filename4)
+    update_calendar_event(path, 'alice', 'x.net', post_json4)
+    assert not get_calendar_events(path, 'alice', 'x.net', 2031, 6, '')
+    assert not get_calendar_events(path, 'alice', 'x.net', 2031, 7, 'fair')
+    events = get_calendar_events(path, 'alice', 'x.net', 2031, 7,
+                                 'festival')
+    assert list(events.keys()) == ['15']
+    assert events['15'][0][1]['name'] == 'The Square'
+    assert text_in_file(event_post_id, account_dir + '/calendar/2031/7.txt')
+
+    # events which finished long ago are not kept within the index,
+    # and only the text of the content is stored
+    post_id5 = 'https://y.net/users/bob/statuses/5'
+    post_json5 = \
+        _calendar_event_example(post_id5, '2021-03-01T12:00:00Z', 'Gala')
+    post_json5['object']['content'] = '<p>Gala</p>'
+    post_filename5 = \
+        account_dir + '/inbox/' + post_id5.replace('/', '#') + '.json'
+    save_json(post_json5, post_filename5)
+    event_post_id5 = post_id5.replace('/', '#')
+    assert save_event_post(path, 'alice@x.net', event_post_id5,
+                           post_json5['object']['tag'][0], post_json5)
+    index_json = load_json(account_dir + '/calendar/index.json')
+    assert event_post_id5 not in index_json['posts']
+    entry = index_json['posts'][event_post_id]
+    assert entry['content'] == 'Festival'
+    assert entry['tags'][1] == {
+        'type': 'Place',
+        'name': 'The Square'
+    }
+
+    shutil.rmtree(path, ignore_errors=False, onerror=None)
+
+
+def _test_hashtag_stats(base_dir: str) -> None:
+    print('test_hashtag_stats')
+    path = base_dir + '/.testHashtagStats'
+    if os.path.isdir(path):
+        shutil.rmtree(path, ignore_errors=False, onerror=None)
+    os.mkdir(path)
+    os.mkdir(path + '/accounts')
+    os.mkdir(path + '/accounts/alice@x.net')
+    os.mkdir(path + '/accounts/alice@x.net/outbox')
+    os.mkdir(path + '/tags')
+
+    days_since_epoch = (datetime.datetime.utcnow() -
+                        datetime.datetime(1970, 1, 1)).days
+    # existing tags, from which the statistics are calculated
+    with open(path + '/tags/cats.txt', 'w+', encoding='utf-8') as fp_tag:
+        fp_tag.write(str(days_since_epoch) + '  bob  ' +
+                     'https:##y.net#users#bob#statuses#2\n' +
+                     str(days_since_epoch - 1) + '  bob  ' +
+                     'https:##y.net#users#bob#statuses#1\n')
+    with open(path + '/tags/cats.category', 'w+',
+              encoding='utf-8') as fp_category:
+        fp_category.write('animals')
+    with open(path + '/tags/fossils.txt', 'w+', encoding='utf-8') as fp_tag:
+        fp_tag.write(str(days_since_epoch - 300) + '  bob  ' +
+                     'https:##y.net#users#bob#statuses#0\n')
+    assert hashtag_stats_top(path, 10) == [('cats', 'animals')]
+    assert get_hashtag_categories(path) == {'animals': ['cats']}
+    assert os.path.isfile(path + '/accounts/hashtagstats.jsonl')
+
+    # an incoming post with hashtags
+    post_url = 'https://x.net/users/alice/statuses/3'
+    post_json_object = {
+        'id': post_url + '/activity',
+        'type': 'Create',
+        'actor': 'https://x.net/users/alice',
+        'object': {
+            'id': post_url,
+            'type': 'Note',
+            'published': '2022-10-18T10:00:00Z',
+            'to': ['https://www.w3.org/ns/activitystreams#Public'],
+            'content': '<p>#dogs and #cats</p>',
+            'tag': [
+                {'type': 'Hashtag', 'name': '#dogs'},
+                {'type': 'Hashtag', 'name': '#cats'}
+            ]
+        }
+    }
+    store_hash_tags(path, 'alice', 'x.net', 'https', 'x.net',
+                    post_json_object, {})
+    assert hashtag_stats_top(path, 10) == \
+        [('cats', 'animals'), ('dogs', '')]
+    assert hashtag_stats_top(path, 1) == [('cats', 'animals')]
+    assert set_hashtag_category(path, 'dogs', 'animals', False)
+    categories = get_hashtag_categories(path, True, 'animals')
+    assert sorted(categories['animals']) == ['cats', 'dogs']
+    swarm_str = html_hash_tag_swarm(path, 'https://x.net/users/alice', {})
+    assert '/tags/cats' in swarm_str
+    assert '/tags/dogs' in swarm_str
+    assert 'fossils' not in swarm_str
+
+    # the statistics are loaded again from the log
+    assert not hashtag_stats_top(base_dir + '/.testHashtagStats2', 10)
+    assert hashtag_stats_top(path, 10) == \
+        [('cats', 'animals'), ('dogs', 'animals')]
+
+    # the post is deleted
+    post_filename = path + '/accounts/alice@x.net/outbox/' + \
+        post_url.replace('/', '#') + '.json'
+    save_json(post_json_object, post_filename)
+    delete_post(path, 'https', 'alice', 'x.net', post_filename,
+                False, {}, True)
+    assert not os.path.isfile(path + '/tags/dogs.txt')
+    assert hashtag_stats_top(path, 10) == [('cats', 'animals')]
+
+    # the log is compacted while it is being appended to
+    for _ in range(2000):
+        hashtag_stats_add(path, 'cats', None, 1)
+    with open(path + '/accounts/hashtagstats.jsonl', 'r',
+              encoding='utf-8') as fp_stats:
+        assert len(fp_stats.readlines()) <= 1024
+    assert hashtag_stats_top(base_dir + '/.testHashtagStats2', 10) == []
+    assert hashtag_stats_top(path, 10) == [('cats', 'animals')]
+
+    shutil.rmtree(path, ignore_errors=False, onerror=None)
+
+
+def _test_skills_index(base_dir: str) -> None:
+    print('test_skills_index')
+    path = base_dir + '/.testSkillsIndex'
+    if os.path.isdir(path):
+        shutil.rmtree(path, ignore_errors=False, onerror=None)
+    os.mkdir(path)
+    os.mkdir(path + '/accounts')
+    os.mkdir(path + '/cache')
+    os.mkdir(path + '/cache/actors')
+
+    alice_json = {
+        'id': 'https://a.net/users/alice',
+        'name': 'Alice',
+        'icon': {'url': 'https://a.net/alice.png'},
+        'hasOccupation': [{
+            '@type': 'Occupation',
+            'name': '',
+            'skills': ['Python Programming:80', 'Gardening:30']
+        }]
+    }
+    save_json(alice_json, path + '/accounts/alice@a.net.json')
+    bob_json = {
+        'id': 'https://b.net/users/bob',
+        'name': 'Bob',
+        'icon': {'url': 'https://b.net/bob.png'},
+        'hasOccupation': [{
+            '@type': 'Occupation',
+            'name': '',
+            'skills': ['python:6']
+        }]
+    }
+    save_json(bob_json, path + '/cache/actors/' +
+              bob_json['id'].replace('/', '#') + '.json')
+
+    rebuild_skills_index(path, False)
+    assert os.path.isfile(path + '/accounts/skills_index.jsonl')
+    results = skills_index_search(path, 'pyth', False)
+    assert results == [
+        '080;https://a.net/users/alice;Alice;https://a.net/alice.png',
+        '006;https://b.net/users/bob;Bob;https://b.net/bob.png'
+    ]
+    assert len(skills_index_search(path, 'pyth', True)) == 1
+    assert len(skills_index_search(path, 'prog py', False)) == 1
+    assert len(skills_index_search(path, 'GARDEN', False)) == 1
+    assert not skills_index_search(path, 'ogramming', False)
+    assert not skills_index_search(path, 'python welding', False)
+    assert not skills_index_search(path, '', False)
+
+    # a remote actor arrives within the cache
+    carol_json = {
+        'id': 'https://c.net/users/carol',
+        'name': 'Carol',
+        'icon': {'url': 'https://c.net/carol.png'},
+        'hasOccupation': [{
+            '@type': 'Occupation',
+            'name': '',
+            'skills': ['python:95']
+        }]
+    }
+    person_cache = {}
+    store_person_in_cache(path, carol_json['id'], carol_json,
+                          person_cache, True)
+    results = skills_index_search(path, 'python', False)
+    assert len(results) == 3
+    assert results[0].startswith('095;https://c.net/users/carol;')
+
+    # skills of a local account change
+    assert set_skill_level(path, 'alice', 'a.net', 'welding', 40)
+    assert skills_index_search(path, 'weld', True) == [
+        '040;https://a.net/users/alice;Alice;https://a.net/alice.png'
+    ]
+    alice_json = load_json(path + '/accounts/alice@a.net.json')
+    assert actor_skill_value(alice_json, 'welding') == 40
+
+    # the actor no longer has any skills
+    carol_json['hasOccupation'][0]['skills'] = []
+    store_person_in_cache(path, carol_json['id'], carol_json,
+                          person_cache, True)
+    assert len(skills_index_search(path, 'python', False)) == 2
+
+    # the index is loaded again from its log
+    assert not skills_index_search(base_dir + '/.testSkillsIndex2',
+                                   'python', False)
+    assert len(skills_index_search(path, 'python', False)) == 2
+    assert len(skills_index_search(path, 'weld', False)) == 1
+
+    # search time for a large number of actors
+    no_of_actors = 5000
+    for ctr in range(no_of_actors):
+        actor_json = {
+            'id': 'https://d.net/users/user' + str(ctr),
+            'name': 'User ' + str(ctr),
+            'icon': {'url': 'https://d.net/user' + str(ctr) + '.png'},
+            'hasOccupation': [{
+                '@type': 'Occupation',
+                'name': '',
+                'skills': ['skill' + str(ctr % 500) + ' craft:' +
+                           str(ctr % 100)]
+            }]
+        }
+        skills_index_update(path, actor_json, False)
+    start_time = time.time()
+    for _ in range(100):
+        results = skills_index_search(path, 'skill12', False)
+    search_time_ms = (time.time() - start_time) * 1000 / 100
+    print('Skills index search: ' + str(len(results)) + ' results in ' +
+          str(search_time_ms) + 'mS')
+    assert len(results) == 110
+    assert search_time_ms < 10
+
+    shutil.rmtree(path, ignore_errors=False, onerror=None)
+
+
+def _static_file_receiver(sock, received: [], index: int) -> None:
+    """Counts the bytes arriving on a socket, in the manner of
+    a client downloading a file
+    """
+    total = 0
+    while True:
+        data = sock.recv(64 * 1024)
+        if not data:
+            break
+        total += len(data)
+    sock.close()
+    received[index] = total
+
+
+def _static_file_sender(sock, filename: str, use_sendfile: bool) -> None:
+    """Sends a file to a socket, either with sendfile or by reading
+    the whole file into memory as was done previously
+    """
+    file_size = os.path.getsize(filename)
+    if use_sendfile:
+        static_file_send(sock, filename, 0, file_size)
+    else:
+        with open(filename, 'rb') as fp_static:
+            media_binary = fp_static.read()
+        sock.sendall(media_binary)
+    sock.shutdown(socket.SHUT_WR)
+    sock.close()
+
+
+def _test_static_files(base_dir: str) -> None:
+    print('test_static_files')
+    static_dir = base_dir + '/.testStaticFiles'
+    if os.path.isdir(static_dir):
+        shutil.rmtree(static_dir, ignore_errors=False)
+    os.mkdir(static_dir)
+
+    # ranges
+    assert static_file_range(None, 1000) == []
+    assert static_file_range('bytes=0-', 1000) == [0, 999]
+    assert static_file_range('bytes=100-199', 1000) == [100, 199]
+    assert static_file_range('bytes=900-2000', 1000) == [900, 999]
+    assert static_file_range('bytes=-100', 1000) == [900, 999]
+    assert static_file_range('bytes=-5000', 1000) == [0, 999]
+    assert static_file_range('bytes=0-10,20-30', 1000) == []
+    assert static_file_range('bytes=200-100', 1000) == []
+    assert static_file_range('lines=1-2', 1000) == []
+    assert static_file_range('bytes=1000-', 1000) is None
+    assert static_file_range('bytes=-0', 1000) is None
+
+    # etags
+    filename = static_dir + '/video.mp4'
+    file_size = 16 * 1024 * 1024
+    with open(filename, 'wb') as fp_static:
+        fp_static.write(os.urandom(1024) * int(file_size / 1024))
+    assert not static_file_info(static_dir + '/missing.mp4')
+    info = static_file_info(filename)
+    assert info['size'] == file_size
+    assert info['lastModified'].endswith(' GMT')
+    assert static_file_info(filename) is info
+    assert static_etag_matches('"' + info['etag'] + '"', info['etag'])
+    assert static_etag_matches('W/"x", "' + info['etag'] + '"',
+                               info['etag'])
+    assert static_etag_matches('*', info['etag'])
+    assert not static_etag_matches('"x"', info['etag'])
+    assert not static_etag_matches(None, info['etag'])
+    small_filename = static_dir + '/emoji.png'
+    with open(small_filename, 'wb') as fp_static:
+        fp_static.write(b'0123456789')
+    small_info = static_file_info(small_filename)
+    assert small_info['etag'] != info['etag']
+    mtime = os.path.getmtime(small_filename)
+    os.utime(small_filename, (mtime + 10, mtime + 10))
+    assert static_file_info(small_filename)['etag'] != small_info['etag']
+
+    # sending part of a file
+    sock_send, sock_receive = socket.socketpair()
+    assert static_file_send(sock_send, small_filename, 2, 5)
+    sock_send.close()
+    assert sock_receive.recv(100) == b'23456'
+    sock_receive.close()
+
+    # concurrent downloads of a large file
+    no_of_clients = 8
+    peak_bytes = {}
+    seconds = {}
+    for use_sendfile in (False, True):
+        received = [0] * no_of_clients
+        threads = []
+        tracemalloc.start()
+        start_time = time.time()
+        for index in range(no_of_clients):
+            sock_send, sock_receive = socket.socketpair()
+            threads.append(threading.Thread(target=_static_file_receiver,
+                                            args=(sock_receive, received,
+                                                  index), daemon=True))
+            threads.append(threading.Thread(target=_static_file_sender,
+                                            args=(sock_send, filename,
+                                                  use_sendfile),
+                                            daemon=True))
+        for thr in threads:
+            thr.start()
+        for thr in threads:
+            thr.join()
+        seconds[use_sendfile] = max(time.time() - start_time, 0.001)
+        _, peak_bytes[use_sendfile] = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        assert received == [file_size] * no_of_clients
+    total_mb = int(no_of_clients * file_size / (1024 * 1024))
+    for use_sendfile in (False, True):
+        method_str = 'read into memory'
+        if use_sendfile:
+            method_str = 'sendfile'
+        print('Downloads of ' + str(total_mb) + 'MB using ' +
+              method_str + ': ' +
+              str(int(total_mb / seconds[use_sendfile])) + 'MB/sec, ' +
+              'peak memory ' +
+              str(int(peak_bytes[use_sendfile] / 1024)) + 'K')
+    assert peak_bytes[False] >= file_size
+    assert peak_bytes[True] < file_size / 4
+    assert peak_bytes[True] < peak_bytes[False] / 4
+
+    shutil.rmtree(static_dir, ignore_errors=False)
+
+
+def _test_routes() -> None:
+    print('test_routes')
+    routes = compile_routes([
+        ('GET', '/emoji/*', 'emoji', None),
+        ('GET', '/icons/*', 'icon', None),
+        ('GET', '/manual-*', 'manual image', None),
+        ('GET', '/logo72.png', 'logo', None),
+        ('GET', '*/inbox', 'inbox', {'accept': 'html'}),
+        ('GET', '/users/*', 'users', None),
+        ('POST', '*/profiledata', 'profile edit', {'authorized': True})
+    ])
+    request = {'authorized': False, 'accept': None}
+    assert match_route(routes, 'GET', '/emoji/1F600.png', request) == 'emoji'
+    assert match_route(routes, 'GET', '/emoji/', request) == 'emoji'
+    assert not match_route(routes, 'GET', '/emoji', request)
+    assert not match_route(routes, 'GET', '/emojis/1F600.png', request)
+    assert match_route(routes, 'GET', '/icons/like.png?v=2',
+                       request) == 'icon'
+    assert match_route(routes, 'GET', '/manual-post.png',
+                       request) == 'manual image'
+    assert match_route(routes, 'GET', '/logo72.png', request) == 'logo'
+    assert not match_route(routes, 'GET', '/logo72.png/x', request)
+    assert not match_route(routes, 'POST', '/logo72.png', request)
+
+    # filters for content negotiation
+    assert match_route(routes, 'GET', '/users/nick/inbox',
+                       request) == 'users'
+    request['accept'] = 'html'
+    assert match_route(routes, 'GET', '/users/nick/inbox',
+                       request) == 'inbox'
+    assert not match_route(routes, 'GET', '/inbox/page', request)
+
+    # filters for authorization
+    request = {'authorized': False}
+    assert not match_route(routes, 'POST', '/users/nick/profiledata',
+                           request)
+    request['authorized'] = True
+    assert match_route(routes, 'POST', '/users/nick/profiledata',
+                       request) == 'profile edit'
+    assert not match_route(routes, 'POST', '/users/nick/profiledata?x=1',
+                           request)
+
+    # routes of the web server
+    request = {'authorized': False, 'accept': 'html'}
+    assert match_route(PUBSERVER_ROUTES, 'GET',
+                       '/system/media_attachments/files/1/2.png',
+                       request) == 'media'
+    assert match_route(PUBSERVER_ROUTES, 'GET', '/avatars/a.png',
+                       request) == 'cached avatar'
+    assert not match_route(PUBSERVER_ROUTES, 'GET', '/users/nick',
+                           request)
+    request = {'authorized': True, 'users': False}
+    assert not match_route(PUBSERVER_ROUTES, 'POST',
+                           '/moderationaction', request)
+    request['users'] = True
+    assert match_route(PUBSERVER_ROUTES, 'POST',
+                       '/users/nick/moderationaction',
+                       request) == 'moderation action'
+    assert match_route(PUBSERVER_ROUTES, 'POST',
+                       '/users/nick/unblockconfirm',
+                       request) == 'unblock confirm'
+    assert match_route(PUBSERVER_ROUTES, 'POST',
+                       '/users/nick/blockconfirm',
+                       request) == 'block confirm'
+
+    # histograms of response times
+    fitness = {}
+    curr_time = time.time()
+    fitness_route_performance(curr_time, fitness,
+                              '_GET_ROUTES', 'emoji', False)
+    curr_time = time.time() - 0.03
+    fitness_route_performance(curr_time, fitness,
+                              '_GET_ROUTES', 'emoji', False)
+    curr_time = time.time() - 10
+    fitness_route_performance(curr_time, fitness,
+                              '_GET_ROUTES', 'emoji', False)
+    histograms = fitness_route_histograms(fitness)
+    histogram = histograms['_GET_ROUTES']['emoji']
+    assert len(histogram) == len(histograms['bucketsMs']) + 1
+    assert sum(histogram) == 3
+    assert histogram[0] == 1
+    assert histogram[-1] == 1
+    assert fitness['performance']['_GET_ROUTES']['emoji']['ctr'] == 3
+    for _ in range(2000):
+        curr_time = time.time()
+        fitness_route_performance(curr_time, fitness,
+                                  '_GET_ROUTES', 'emoji', False)
+    assert sum(histogram) < 1024
+
+
+def _test_jsonld_throughput() -> None:
+    print('test_jsonld_throughput')
+
+    # every valid context has a local copy
+    for context_url in VALID_CONTEXTS:
+        context_url = context_url.replace('*', 'https://some.site')
+        assert load_document(context_url)
+    assert not load_document('https://unknown.site/context.jsonld')
+
+    # a corpus of signed activities, similar to those sent by
+    # other instances
+    private_key_pem, public_key_pem = generate_rsa_key()
+    actor = 'https://somesite.net/users/gerbil'
+    mastodon_context = [
+        'https://www.w3.org/ns/activitystreams',
+        'https://w3id.org/security/v1',
+        {
+            'manuallyApprovesFollowers': 'as:manuallyApprovesFollowers',
+            'toot': 'http://joinmastodon.org/ns#',
+            'sensitive': 'as:sensitive',
+            'Hashtag': 'as:Hashtag',
+            'votersCount': 'toot:votersCount'
+        }
+    ]
+    pleroma_context = [
+        'https://www.w3.org/ns/activitystreams',
+        'https://somesite.net/schemas/litepub-0.1.jsonld',
+        {'@language': 'und'}
+    ]
+    corpus = []
+    no_of_activities = 40
+    for index in range(no_of_activities):
+        status_url = actor + '/statuses/' + str(index)
+        note = {
+            'id': status_url,
+            'type': 'Note',
+            'attributedTo': actor,
+            'content': '<p>Post number ' + str(index) +
+            ' about <a href="https://somesite.net/tags/test">#test</a></p>',
+            'published': '2022-03-01T12:00:00Z',
+            'sensitive': False,
+            'to': ['https://www.w3.org/ns/activitystreams#Public'],
+            'cc': [actor + '/followers'],
+            'tag': [{
+                'type': 'Hashtag',
+                'href': 'https://somesite.net/tags/test',
+                'name': '#test'
+            }]
+        }
+        activity_types = ('Create', 'Announce', 'Like', 'Delete', 'Update')
+        activity_type = activity_types[index % len(activity_types)]
+        context = mastodon_context
+        if index % 2 == 1:
+            context = pleroma_context
+        activity = {
+            '@context': context,
+            'id': status_url + '/activity',
+            'type': activity_type,
+            'actor': actor,
+            'to': ['https://www.w3.org/ns/activitystreams#Public'],
+            'object': note
+        }
+        if activity_type in ('Announce', 'Like', 'Delete'):
+            activity['object'] = status_url
+        elif activity_type == 'Update':
+            activity['object'] = {
+                'id': actor,
+                'type': 'Person',
+                'preferredUsername': 'gerbil',
+                'name': 'Gerbil ' + str(index),
+                'inbox': actor + '/inbox',
+                'manuallyApprovesFollowers': False,
+                'publicKey': {
+                    'id': actor + '#main-key',
+                    'owner': actor,
+                    'publicKeyPem': public_key_pem
+                }
+            }
+        generate_json_signature(activity, private_key_pem)
+        corpus.append(activity)
+
+    start_time = time.time()
+    for activity in corpus:
+        assert verify_json_signature(activity, public_key_pem)
+    time_taken = time.time() - start_time
+    print('Verified ' + str(no_of_activities) + ' signed activities in ' +
+          str(int(time_taken * 1000)) + 'mS, ' +
+          str(int(no_of_activities / max(time_taken, 0.001))) +
+          ' activities/sec')
+
+    # shared contexts are not altered by processing
+    assert load_document(pleroma_context[1])['document'] == getLitepubV0_1()
+    assert load_document(mastodon_context[0])['document'] == \
+        get_activitystreams_schema()
+
+
+def _test_feed_response(status_code: int, text: str, headers: {},
+                        bytes_read: []) -> SimpleNamespace:
+    """Returns a response to a request for a feed, which is read in
+    chunks and records the number of bytes read
+    """
+    text_bytes = text.encode('utf-8')
+    chunks = []
+    for pos in range(0, len(text_bytes), 4096):
+        chunks.append(text_bytes[pos:pos + 4096])
+
+    def _feed_response_iter(chunk_size: int):
+        for chunk in chunks:
+            bytes_read.append(len(chunk))
+            yield chunk
+
+    return SimpleNamespace(status_code=status_code, text=text,
+                           headers=headers, encoding='utf-8',
+                           content=text_bytes,
+                           iter_content=_feed_response_iter,
+                           close=lambda: None)
+
+
+def _test_newswire_stream(base_dir: str) -> None:
+    print('test_newswire_stream')
+    base_dir = base_dir + '/.testNewswireStream'
+    if os.path.isdir(base_dir):
+        shutil.rmtree(base_dir, ignore_errors=False, onerror=None)
+    os.mkdir(base_dir)
+    os.mkdir(base_dir + '/accounts')
+
+    # large feeds, with the most recent items first
+    no_of_items = 2000
+    curr_time = datetime.datetime.now(datetime.timezone.utc)
+    rss_items = ''
+    podcast_items = ''
+    atom_entries = ''
+    json_items = []
+    for item_index in range(no_of_items):
+        pub_date = curr_time - datetime.timedelta(minutes=item_index + 1)
+        rss_date = pub_date.strftime('%a, %d %b %Y %H:%M:%S +0000')
+        atom_date = pub_date.strftime('%Y-%m-%dT%H:%M:%SZ')
+        link = 'https://news.whatever/' + str(item_index)
+        description = 'Some news about item ' + str(item_index) + '. ' + \
+            'Lorem ipsum dolor sit amet, consectetur adipiscing elit. ' * 8
+        rss_items += \
+            '<item><title>Item ' + str(item_index) + '</title>' + \
+            '<link>' + link + '</link>' + \
+            '<description>' + description + '</description>' + \
+            '<pubDate>' + rss_date + '</pubDate></item>\n'
+        podcast_items += \
+            '<item><title>Episode ' + str(item_index) + '</title>' + \
+            '<link>' + link + '</link>' + \
+            '<description>' + description + '</description>' + \
+            '<itunes:duration>01:02:03</itunes:duration>' + \
+            '<itunes:explicit>no</itunes:explicit>' + \
+            '<enclosure url="' + link + '.mp3" length="1234" ' + \
+            'type="audio/mpeg"/>' + \
+            '<pubDate>' + rss_date + '</pubDate></item>\n'
+        atom_entries += \
+            '<entry><title>Entry ' + str(item_index) + '</title>' + \
+            '<link href="' + link + '"/>' + \
+            '<id>' + link + '</id>' + \
+            '<summary>' + description + '</summary>' + \
+            '<updated>' + atom_date + '</updated></entry>\n'
+        json_items.append({
+            "id": link,
+            "url": link,
+            "title": "Item " + str(item_index),
+            "content_text": description,
+            "date_published": atom_date
+        })
+    feeds = {
+        'https://feeds.whatever/rss.xml':
+        '<?xml version="1.0" encoding="UTF-8"?>' +
+        '<rss version="2.0"><channel><title>News</title>' +
+        rss_items + '</channel></rss>',
+        'https://feeds.whatever/podcast.xml':
+        '<?xml version="1.0" encoding="UTF-8"?>' +
+        '<rss version="2.0" ' +
+        'xmlns:itunes="http://www.itunes.com/dtds/podcast-1.0.dtd">' +
+        '<channel><title>Podcast</title>' +
+        '<itunes:category text="Technology"/>' +
+        podcast_items + '</channel></rss>',
+        'https://feeds.whatever/atom.xml':
+        '<feed xmlns="http://www.w3.org/2005/Atom"><title>News</title>' +
+        atom_entries + '</feed>',
+        'https://feeds.whatever/feed.json':
+        json.dumps({
+            "version": "https://jsonfeed.org/version/1.1",
+            "title": "News",
+            "items": json_items
+        })
+    }
+    bytes_read = []
+
+    def _newswire_stream_get(url: str, headers: {}, timeout: int,
+                             allow_redirects: bool, params: {} = None,
+                             stream: bool = False):
+        if url not in feeds:
+            return _test_feed_response(404, '', {}, [])
+        return _test_feed_response(200, feeds[url], {}, bytes_read)
+
+    session = SimpleNamespace(get=_newswire_stream_get)
+    max_posts_per_source = 5
+    for url, feed_str in feeds.items():
+        bytes_read.clear()
+        start_time = time.time()
+        items = get_rss(base_dir, 'localhost', session, url, False, False,
+                        max_posts_per_source, 10 * 1024, 256, 256, False,
+                        [], 10, 'en')
+        time_taken_ms = int((time.time() - start_time) * 1000)
+        print('Streamed ' + str(sum(bytes_read)) + ' of ' +
+              str(len(feed_str)) + ' bytes from ' + url + ' in ' +
+              str(time_taken_ms) + 'mS')
+        assert items
+        assert len(items.items()) == max_posts_per_source
+        # only the start of the feed was downloaded
+        assert sum(bytes_read) < len(feed_str) / 10
+
+    # a feed which is too large is rejected
+    bytes_read.clear()
+    items = get_rss(base_dir, 'localhost', session,
+                    'https://feeds.whatever/rss.xml', False, False,
+                    no_of_items, 64, 256, 256, False, [], 10, 'en')
+    assert items is None
+    assert sum(bytes_read) < 128 * 1024
+
+    shutil.rmtree(base_dir, ignore_errors=False, onerror=None)
+
+
+def _test_newswire_fetch(base_dir: str) -> None:
+    print('test_newswire_fetch')
+    base_dir = base_dir + '/.testNewswireFetch'
+    if os.path.isdir(base_dir):
+        shutil.rmtree(base_dir, ignore_errors=False, onerror=None)
+    os.mkdir(base_dir)
+    os.mkdir(base_dir + '/accounts')
+    feed_urls = (
+        'https://feeds.whatever/a.xml',
+        'https://feeds.whatever/b.xml',
+        'https://other.feeds/c.xml'
+    )
+    with open(base_dir + '/accounts/newswire.txt', 'w+',
+              encoding='utf-8') as fp_sub:
+        for url in feed_urls:
+            fp_sub.write(url + '\n')
+
+    curr_time = datetime.datetime.now(datetime.timezone.utc)
+    feeds = {}
+    for feed_index, url in enumerate(feed_urls):
+        pub_date = curr_time - datetime.timedelta(hours=feed_index + 1)
+        feeds[url] = \
+            '<?xml version="1.0" encoding="UTF-8"?>' + \
+            '<rss version="2.0"><channel><title>Feed</title>' + \
+            '<item><title>Item ' + str(feed_index) + '</title>' + \
+            '<link>https://news.whatever/' + str(feed_index) + '</link>' + \
+            '<description>Some news</description>' + \
+            '<pubDate>' + \
+            pub_date.strftime('%a, %d %b %Y %H:%M:%S +0000') + \
+            '</pubDate></item></channel></rss>'
+    requests_made = []
+
+    def _newswire_fetch_get(url: str, headers: {}, timeout: int,
+                            allow_redirects: bool, params: {} = None,
+                            stream: bool = False):
+        if url not in feeds:
+            return _test_feed_response(404, '', {}, [])
+        etag = '"' + str(len(feeds[url])) + '"'
+        requests_made.append(url)
+        if headers.get('If-None-Match') == etag:
+            return _test_feed_response(304, '', {}, [])
+        return _test_feed_response(200, feeds[url], {'ETag': etag}, [])
+
+    session = SimpleNamespace(get=_newswire_fetch_get)
+    fitness = {}
+    newswire = \
+        get_dict_from_newswire(session, base_dir, 'localhost', 5, 1024,
+                               32, 256, 20, 256, 'en', False, [], 10,
+                               fitness)
+    assert len(newswire.items()) == 3
+    assert len(requests_made) == 3
+    validators_filename = base_dir + '/accounts/.newswire_validators.json'
+    assert os.path.isfile(validators_filename)
+    validators = load_json(validators_filename)
+    assert validators[feed_urls[0]]['etag']
+    assert fitness['performance']['NEWSWIRE']
+
+    # unchanged feeds return not modified, and their items are kept
+    newswire2 = \
+        get_dict_from_newswire(session, base_dir, 'localhost', 5, 1024,
+                               32, 256, 20, 256, 'en', False, [], 10,
+                               fitness)
+    assert len(requests_made) == 6
+    assert list(newswire2.keys()) == list(newswire.keys())
+
+    # a changed feed is downloaded again
+    feeds[feed_urls[2]] = feeds[feed_urls[2]].replace('Item 2', 'Item 22')
+    newswire3 = \
+        get_dict_from_newswire(session, base_dir, 'localhost', 5, 1024,
+                               32, 256, 20, 256, 'en', False, [], 10,
+                               fitness)
+    titles = []
+    for item in newswire3.values():
+        titles.append(item[0])
+    assert 'Item 22' in titles
+    assert 'Item 2' not in titles
+
+    # items from unchanged feeds are filtered again
+    with open(base_dir + '/accounts/filters.txt', 'w+',
+              encoding='utf-8') as fp_filter:
+        fp_filter.write('Item 1+news\n')
+    requests_made.clear()
+    newswire4 = \
+        get_dict_from_newswire(session, base_dir, 'localhost', 5, 1024,
+                               32, 256, 20, 256, 'en', False, [], 10,
+                               fitness)
+    assert len(requests_made) == 3
+    titles = []
+    for item in newswire4.values():
+        titles.append(item[0])
+    assert 'Item 0' in titles
+    assert 'Item 1' not in titles
+
+    shutil.rmtree(base_dir, ignore_errors=False, onerror=None)
+
+
 def run_all_tests():
     base_dir = os.getcwd()
     print('Running tests...')
@@ -7982,6 +10462,31 @@ def run_all_tests():
     _test_checkbox_names()
     _test_thread_functions()
     _test_functions()
+    _test_post_html_viewer_settings(base_dir)
+    _test_post_html_viewers(base_dir)
+    _test_scheduler()
+    _test_box_events(base_dir)
+    _test_content_cache(base_dir)
+    _test_account_settings(base_dir)
+    _test_post_html_cache(base_dir)
+    _test_shares_index(base_dir)
+    _test_webfinger_cache(base_dir)
+    _test_actor_store(base_dir)
+    _test_calendar_index(base_dir)
+    _test_hashtag_stats(base_dir)
+    _test_skills_index(base_dir)
+    _test_static_files(base_dir)
+    _test_routes()
+    _test_jsonld_throughput()
+    _test_newswire_stream(base_dir)
+    _test_newswire_fetch(base_dir)
+    _test_search_index(base_dir)
+    _test_inbox_queue(base_dir)
+    _test_post_locations(base_dir)
+    _test_blocklist_engine(base_dir)
+    _test_delivery_queue()
+    _test_thread_throughput()
+    _test_box_index(base_dir)
     _test_xor_hashes()
     _test_convert_markdown()
     _test_remove_style()
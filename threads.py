@@ -8,22 +8,30 @@ __status__ = "Production"
 __module_group__ = "Core"
 
 import threading
-import sys
 import time
 import datetime
 from socket import error as SocketError
 
 
 class thread_with_trace(threading.Thread):
+    """A thread which can be killed.
+    Killing is cooperative. The thread's cancellation event is set and
+    the thread then exits the next time that it reaches a cancellation
+    point, such as check_thread_cancelled or thread_sleep, which are
+    typically called at I/O boundaries. An optional deadline can also
+    be set, after which the thread behaves as if it had been killed.
+    """
     def __init__(self, *args, **keywords):
         self.start_time = datetime.datetime.utcnow()
         self.is_started = False
+        self.killed = False
+        self.cancel_event = threading.Event()
+        self.deadline = None
         tries = 0
         while tries < 3:
             try:
                 self._args, self._keywords = args, keywords
                 threading.Thread.__init__(self, *self._args, **self._keywords)
-                self.killed = False
                 break
             except Exception as ex:
                 print('ERROR: threads.py/__init__ failed - ' + str(ex))
@@ -46,7 +54,6 @@ class thread_with_trace(threading.Thread):
         self.is_started = True
 
     def __run(self):
-        sys.settrace(self.globaltrace)
         if not callable(self.__run_backup):
             print('ERROR: threads.py/__run ' +
                   str(self.__run_backup) + 'is not callable')
@@ -57,25 +64,11 @@ class thread_with_trace(threading.Thread):
         except Exception as ex:
             print('ERROR: threads.py/__run failed - ' + str(ex))
 
-    def globaltrace(self, frame, event, arg):
-        """Trace the thread
-        """
-        if event == 'call':
-            return self.localtrace
-        return None
-
-    def localtrace(self, frame, event, arg):
-        """Trace the thread
-        """
-        if self.killed:
-            if event == 'line':
-                raise SystemExit()
-        return self.localtrace
-
     def kill(self):
         """Kill the thread
         """
         self.killed = True
+        self.cancel_event.set()
 
     def clone(self, func):
         """Create a clone
@@ -86,6 +79,63 @@ class thread_with_trace(threading.Thread):
                                  daemon=True)
 
 
+def _is_thread_killed() -> bool:
+    """Returns true if the current thread has been killed
+    or has passed its deadline
+    """
+    thrd = threading.current_thread()
+    if not isinstance(thrd, thread_with_trace):
+        return False
+    if thrd.killed:
+        return True
+    if thrd.deadline:
+        if datetime.datetime.utcnow() > thrd.deadline:
+            thrd.kill()
+            return True
+    return False
+
+
+def check_thread_cancelled() -> None:
+    """A cancellation point. If the current thread has been killed
+    then it exits here
+    """
+    if _is_thread_killed():
+        raise SystemExit()
+
+
+def thread_sleep(seconds: float) -> None:
+    """Sleeps for the given time, but wakes up and exits the
+    current thread if it is killed while sleeping
+    """
+    thrd = threading.current_thread()
+    if not isinstance(thrd, thread_with_trace):
+        time.sleep(seconds)
+        return
+    check_thread_cancelled()
+    if thrd.deadline:
+        remaining_secs = \
+            (thrd.deadline - datetime.datetime.utcnow()).total_seconds()
+        if remaining_secs < seconds:
+            seconds = max(remaining_secs, 0)
+    thrd.cancel_event.wait(seconds)
+    check_thread_cancelled()
+
+
+def thread_timeout_sec(timeout_sec: int) -> int:
+    """Returns a network timeout for the current thread which
+    does not extend beyond its deadline
+    """
+    check_thread_cancelled()
+    thrd = threading.current_thread()
+    if not isinstance(thrd, thread_with_trace):
+        return timeout_sec
+    if not thrd.deadline:
+        return timeout_sec
+    remaining_secs = \
+        int((thrd.deadline - datetime.datetime.utcnow()).total_seconds())
+    return max(min(timeout_sec, remaining_secs), 1)
+
+
 def remove_dormant_threads(base_dir: str, threads_list: [], debug: bool,
                            timeout_mins: int) -> None:
     """Removes threads whose execution has completed
@@ -102,6 +152,9 @@ def remove_dormant_threads(base_dir: str, threads_list: [], debug: bool,
     no_of_active_threads = 0
     for thrd in threads_list:
         remove_thread = False
+        if not thrd.deadline:
+            thrd.deadline = \
+                thrd.start_time + datetime.timedelta(seconds=timeout_secs)
 
         if thrd.is_started:
             if not thrd.is_alive():
@@ -15,11 +15,29 @@ import datetime
 import json
 import idna
 import locale
+from collections import OrderedDict
 from dateutil.tz import tz
 from pprint import pprint
 from cryptography.hazmat.backends import default_backend
 from cryptography.hazmat.primitives import hashes
 from followingCalendar import add_person_to_calendar
+from boxindex import box_index_page
+from hashtagstats import hashtag_stats_add
+from actorstore import actor_store_projection
+from actorstore import actor_store_full
+from actorstore import actor_store_locate
+from postlocation import get_post_location
+from postlocation import add_post_location
+from postlocation import remove_post_location
+from postlocation import is_post_missing
+from postlocation import add_missing_post
+from postlocation import remove_missing_post
+from accountsettings import get_account_settings
+from accountsettings import account_settings_changed
+from posthtmlcache import post_html_cache_filename
+from posthtmlcache import post_html_cache_invalidate
+from searchindex import search_index_query
+from searchindex import remove_post_from_search_index
 
 VALID_HASHTAG_CHARS = \
     set('_0123456789' +
@@ -45,6 +63,9 @@ INVALID_ACTOR_URL_CHARACTERS = (
     '+', ',', ';', '='
 )
 
+# default maximum size of the recent posts cache in memory
+RECENT_POSTS_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
 
 def _standardize_text_range(text: str,
                             range_start: int, range_end: int,
@@ -306,9 +327,8 @@ def is_featured_writer(base_dir: str, nickname: str, domain: str) -> bool:
     """Is the given account a featured writer, appearing in the features
     timeline on news instances?
     """
-    features_blocked_filename = \
-        acct_dir(base_dir, nickname, domain) + '/.nofeatures'
-    return not os.path.isfile(features_blocked_filename)
+    account_dir = acct_dir(base_dir, nickname, domain)
+    return not get_account_settings(account_dir)['nofeatures']
 
 
 def refresh_newswire(base_dir: str):
@@ -874,6 +894,10 @@ def remove_avatar_from_cache(base_dir: str, actor_str: str) -> None:
 def save_json(json_object: {}, filename: str) -> bool:
     """Saves json to a file
     """
+    if filename.endswith('.json'):
+        # a post which was not found may now exist
+        post_filename = os.path.basename(filename)
+        remove_missing_post(post_filename)
     tries = 0
     while tries < 5:
         try:
@@ -1221,19 +1245,7 @@ def get_display_name(base_dir: str, actor: str, person_cache: {}) -> str:
         actor = actor.split('/statuses/')[0]
     if not person_cache.get(actor):
         return None
-    name_found = None
-    if person_cache[actor].get('actor'):
-        if person_cache[actor]['actor'].get('name'):
-            name_found = person_cache[actor]['actor']['name']
-    else:
-        # Try to obtain from the cached actors
-        cached_actor_filename = \
-            base_dir + '/cache/actors/' + (actor.replace('/', '#')) + '.json'
-        if os.path.isfile(cached_actor_filename):
-            actor_json = load_json(cached_actor_filename, 1)
-            if actor_json:
-                if actor_json.get('name'):
-                    name_found = actor_json['name']
+    name_found = actor_store_projection(person_cache[actor]).get('name')
     if name_found:
         if dangerous_markup(name_found, False):
             name_found = "*ADVERSARY*"
@@ -1299,15 +1311,7 @@ def get_gender_from_bio(base_dir: str, actor: str, person_cache: {},
         pronoun_str = translate['pronoun'].lower()
     else:
         pronoun_str = 'pronoun'
-    actor_json = None
-    if person_cache[actor].get('actor'):
-        actor_json = person_cache[actor]['actor']
-    else:
-        # Try to obtain from the cached actors
-        cached_actor_filename = \
-            base_dir + '/cache/actors/' + (actor.replace('/', '#')) + '.json'
-        if os.path.isfile(cached_actor_filename):
-            actor_json = load_json(cached_actor_filename, 1)
+    actor_json = actor_store_full(base_dir, actor, person_cache[actor])
     if not actor_json:
         return default_gender
     # is gender defined as a profile tag?
@@ -1641,35 +1645,12 @@ def locate_news_arrival(base_dir: str, domain: str,
 
 def clear_from_post_caches(base_dir: str, recent_posts_cache: {},
                            post_id: str) -> None:
-    """Clears cached html for the given post, so that edits
-    to news will appear
+    """Clears cached html for the given post, and for any posts which
+    depend upon the given post or actor, so that edits will appear
     """
-    filename = '/postcache/' + post_id + '.html'
-    for _, dirs, _ in os.walk(base_dir + '/accounts'):
-        for acct in dirs:
-            if '@' not in acct:
-                continue
-            if acct.startswith('inbox@') or acct.startswith('Actor@'):
-                continue
-            cache_dir = os.path.join(base_dir + '/accounts', acct)
-            post_filename = cache_dir + filename
-            if os.path.isfile(post_filename):
-                try:
-                    os.remove(post_filename)
-                except OSError:
-                    print('EX: clear_from_post_caches file not removed ' +
-                          str(post_filename))
-            # if the post is in the recent posts cache then remove it
-            if recent_posts_cache.get('index'):
-                if post_id in recent_posts_cache['index']:
-                    recent_posts_cache['index'].remove(post_id)
-            if recent_posts_cache.get('json'):
-                if recent_posts_cache['json'].get(post_id):
-                    del recent_posts_cache['json'][post_id]
-            if recent_posts_cache.get('html'):
-                if recent_posts_cache['html'].get(post_id):
-                    del recent_posts_cache['html'][post_id]
-        break
+    for cached_post_id in post_html_cache_invalidate(base_dir, post_id):
+        # if the post is in the recent posts cache then remove it
+        remove_id_from_recent_posts_cache(recent_posts_cache, cached_post_id)
 
 
 def locate_post(base_dir: str, nickname: str, domain: str,
@@ -1687,12 +1668,30 @@ def locate_post(base_dir: str, nickname: str, domain: str,
     # add the extension
     post_url = post_url + '.' + extension
 
+    # is the location of the post known?
+    account_dir = acct_dir(base_dir, nickname, domain) + '/'
+    post_account_dir = account_dir
+    if not replies:
+        # was this post recently looked for and not found?
+        if is_post_missing(account_dir, post_url):
+            return None
+    post_id = post_url[:-len(extension) - 1]
+    box_name = get_post_location(account_dir, post_id)
+    if box_name:
+        post_filename = account_dir + box_name + '/' + post_url
+        if os.path.isfile(post_filename):
+            return post_filename
+        if not replies:
+            # the post has been removed
+            remove_post_location(account_dir, post_id)
+
     # search boxes
     boxes = ('inbox', 'outbox', 'tlblogs')
-    account_dir = acct_dir(base_dir, nickname, domain) + '/'
     for box_name in boxes:
         post_filename = account_dir + box_name + '/' + post_url
         if os.path.isfile(post_filename):
+            if not replies:
+                add_post_location(account_dir, post_id, box_name)
             return post_filename
 
     # check news posts
@@ -1706,6 +1705,8 @@ def locate_post(base_dir: str, nickname: str, domain: str,
     if os.path.isfile(post_filename):
         return post_filename
 
+    if not replies:
+        add_missing_post(post_account_dir, post_url)
     # print('WARN: unable to locate ' + nickname + ' ' + post_url)
     return None
 
@@ -1940,42 +1941,23 @@ def remove_post_from_cache(post_json_object: {},
     if not recent_posts_cache.get('index'):
         return
 
-    post_id = post_json_object['id']
-    if '#' in post_id:
-        post_id = post_id.split('#', 1)[0]
-    post_id = remove_id_ending(post_id).replace('/', '#')
+    post_id = _recent_posts_cache_id(post_json_object)
     if post_id not in recent_posts_cache['index']:
         return
 
-    if recent_posts_cache.get('index'):
-        if post_id in recent_posts_cache['index']:
-            recent_posts_cache['index'].remove(post_id)
-
-    if recent_posts_cache.get('json'):
-        if recent_posts_cache['json'].get(post_id):
-            del recent_posts_cache['json'][post_id]
-
-    if recent_posts_cache.get('html'):
-        if recent_posts_cache['html'].get(post_id):
-            del recent_posts_cache['html'][post_id]
+    remove_id_from_recent_posts_cache(recent_posts_cache, post_id)
 
 
 def delete_cached_html(base_dir: str, nickname: str, domain: str,
                        post_json_object: {}):
     """Removes cached html file for the given post
     """
+    if post_json_object.get('id'):
+        post_html_cache_invalidate(base_dir,
+                                   remove_id_ending(post_json_object['id']))
     cached_post_filename = \
-        get_cached_post_filename(base_dir, nickname, domain, post_json_object)
+        get_cached_ssml_filename(base_dir, nickname, domain, post_json_object)
     if cached_post_filename:
-        if os.path.isfile(cached_post_filename):
-            try:
-                os.remove(cached_post_filename)
-            except OSError:
-                print('EX: delete_cached_html ' +
-                      'unable to delete cached post file ' +
-                      str(cached_post_filename))
-
-        cached_post_filename = cached_post_filename.replace('.html', '.ssml')
         if os.path.isfile(cached_post_filename):
             try:
                 os.remove(cached_post_filename)
@@ -1996,18 +1978,23 @@ def delete_cached_html(base_dir: str, nickname: str, domain: str,
 
 
 def _remove_post_id_from_tag_index(tag_index_filename: str,
-                                   post_id: str) -> None:
+                                   post_id: str) -> []:
     """Remove post_id from the tag index file
+    Returns the days since epoch on which removed entries were added
     """
     lines = None
     with open(tag_index_filename, 'r', encoding='utf-8') as index_file:
         lines = index_file.readlines()
     if not lines:
-        return
+        return []
     newlines = ''
+    removed_days = []
     for file_line in lines:
         if post_id in file_line:
             # skip over the deleted post
+            day_str = file_line.split('  ')[0]
+            if day_str.isdigit():
+                removed_days.append(int(day_str))
             continue
         newlines += file_line
     if not newlines.strip():
@@ -2022,6 +2009,7 @@ def _remove_post_id_from_tag_index(tag_index_filename: str,
         with open(tag_index_filename, 'w+',
                   encoding='utf-8') as index_file:
             index_file.write(newlines)
+    return removed_days
 
 
 def _delete_hashtags_on_post(base_dir: str, post_json_object: {}) -> None:
@@ -2042,6 +2030,8 @@ def _delete_hashtags_on_post(base_dir: str, post_json_object: {}) -> None:
 
     # get the id of the post
     post_id = remove_id_ending(post_json_object['object']['id'])
+    # tag index files contain the id with slashes replaced
+    tag_post_id = post_id.replace('/', '#')
     for tag in post_json_object['object']['tag']:
         if not tag.get('type'):
             continue
@@ -2056,7 +2046,11 @@ def _delete_hashtags_on_post(base_dir: str, post_json_object: {}) -> None:
         # find the index file for this tag
         tag_index_filename = base_dir + '/tags/' + tag['name'][1:] + '.txt'
         if os.path.isfile(tag_index_filename):
-            _remove_post_id_from_tag_index(tag_index_filename, post_id)
+            removed_days = \
+                _remove_post_id_from_tag_index(tag_index_filename,
+                                               tag_post_id)
+            for day in removed_days:
+                hashtag_stats_add(base_dir, tag['name'][1:], day, -1)
 
 
 def _delete_conversation_post(base_dir: str, nickname: str, domain: str,
@@ -2173,6 +2167,24 @@ def _is_remote_dm(domain_full: str, post_json_object: {}) -> bool:
     return False
 
 
+def _unindex_deleted_post(post_filename: str,
+                          post_json_object: {}) -> None:
+    """Removes a post which is being deleted from the index
+    of post locations and the search index
+    """
+    if not post_filename.endswith('.json'):
+        return
+    path_sections = post_filename.split('/')
+    if len(path_sections) < 3:
+        return
+    account_dir = '/'.join(path_sections[:-2])
+    post_id = path_sections[-1][:-len('.json')]
+    remove_post_location(account_dir, post_id)
+    if post_json_object:
+        remove_post_from_search_index(account_dir, post_id,
+                                      post_json_object, False)
+
+
 def delete_post(base_dir: str, http_prefix: str,
                 nickname: str, domain: str, post_filename: str,
                 debug: bool, recent_posts_cache: {},
@@ -2186,6 +2198,7 @@ def delete_post(base_dir: str, http_prefix: str,
                                     http_prefix, post_filename,
                                     recent_posts_cache, debug, manual)
         # finally, remove the post itself
+        _unindex_deleted_post(post_filename, None)
         try:
             os.remove(post_filename)
         except OSError:
@@ -2263,6 +2276,7 @@ def delete_post(base_dir: str, http_prefix: str,
                                 http_prefix, post_filename,
                                 recent_posts_cache, debug, manual)
     # finally, remove the post itself
+    _unindex_deleted_post(post_filename, post_json_object)
     try:
         os.remove(post_filename)
     except OSError:
@@ -2533,54 +2547,166 @@ def get_cached_post_directory(base_dir: str,
     return html_post_cache_dir
 
 
-def get_cached_post_filename(base_dir: str, nickname: str, domain: str,
+def get_cached_post_filename(base_dir: str, post_json_object: {}) -> str:
+    """Returns the html cache filename for the given post.
+    The html for posts is shared by all accounts
+    """
+    cached_post_id = remove_id_ending(post_json_object['id'])
+    return post_html_cache_filename(base_dir, cached_post_id)
+
+
+def get_cached_ssml_filename(base_dir: str, nickname: str, domain: str,
                              post_json_object: {}) -> str:
-    """Returns the html cache filename for the given post
+    """Returns the ssml cache filename for the given post
     """
     cached_post_dir = get_cached_post_directory(base_dir, nickname, domain)
     if not os.path.isdir(cached_post_dir):
-        # print('ERROR: invalid html cache directory ' + cached_post_dir)
+        # print('ERROR: invalid ssml cache directory ' + cached_post_dir)
         return None
     if '@' not in cached_post_dir:
-        # print('ERROR: invalid html cache directory ' + cached_post_dir)
+        # print('ERROR: invalid ssml cache directory ' + cached_post_dir)
         return None
     cached_post_id = remove_id_ending(post_json_object['id'])
     cached_post_filename = \
         cached_post_dir + '/' + cached_post_id.replace('/', '#')
-    return cached_post_filename + '.html'
+    return cached_post_filename + '.ssml'
 
 
-def update_recent_posts_cache(recent_posts_cache: {}, max_recent_posts: int,
-                              post_json_object: {}, html_str: str) -> None:
-    """Store recent posts in memory so that they can be quickly recalled
+def _recent_posts_cache_id(post_json_object: {}) -> str:
+    """Returns the key used for a post within the recent posts cache
     """
-    if not post_json_object.get('id'):
-        return
     post_id = post_json_object['id']
     if '#' in post_id:
         post_id = post_id.split('#', 1)[0]
-    post_id = remove_id_ending(post_id).replace('/', '#')
-    if recent_posts_cache.get('index'):
-        if post_id in recent_posts_cache['index']:
-            return
-        recent_posts_cache['index'].append(post_id)
-        post_json_object['muted'] = False
-        recent_posts_cache['json'][post_id] = json.dumps(post_json_object)
-        recent_posts_cache['html'][post_id] = html_str
-
-        while len(recent_posts_cache['html'].items()) > max_recent_posts:
-            post_id = recent_posts_cache['index'][0]
-            recent_posts_cache['index'].pop(0)
-            if recent_posts_cache['json'].get(post_id):
-                del recent_posts_cache['json'][post_id]
-            if recent_posts_cache['html'].get(post_id):
-                del recent_posts_cache['html'][post_id]
-    else:
-        recent_posts_cache['index'] = [post_id]
+    return remove_id_ending(post_id).replace('/', '#')
+
+
+def _init_recent_posts_cache(recent_posts_cache: {}) -> None:
+    """Creates the fields of the recent posts cache if needed.
+    The index is ordered from least to most recently used, and holds
+    the size in bytes of each cached post
+    """
+    if not isinstance(recent_posts_cache.get('index'), OrderedDict):
+        index = OrderedDict()
+        if recent_posts_cache.get('index'):
+            for post_id in recent_posts_cache['index']:
+                index[post_id] = 0
+        recent_posts_cache['index'] = index
+    if not isinstance(recent_posts_cache.get('json'), dict):
         recent_posts_cache['json'] = {}
+    if not isinstance(recent_posts_cache.get('html'), dict):
         recent_posts_cache['html'] = {}
-        recent_posts_cache['json'][post_id] = json.dumps(post_json_object)
-        recent_posts_cache['html'][post_id] = html_str
+    for counter_name in ('bytes', 'hits', 'misses', 'evictions'):
+        if not recent_posts_cache.get(counter_name):
+            recent_posts_cache[counter_name] = 0
+    if not recent_posts_cache.get('max_bytes'):
+        recent_posts_cache['max_bytes'] = RECENT_POSTS_CACHE_MAX_BYTES
+
+
+def remove_id_from_recent_posts_cache(recent_posts_cache: {},
+                                      post_id: str) -> None:
+    """Removes a post from the recent posts cache
+    """
+    index = recent_posts_cache.get('index')
+    if index and post_id in index:
+        if isinstance(index, OrderedDict):
+            recent_posts_cache['bytes'] = \
+                max(recent_posts_cache.get('bytes', 0) -
+                    index.pop(post_id, 0), 0)
+        else:
+            index.remove(post_id)
+    if recent_posts_cache.get('json'):
+        if recent_posts_cache['json'].get(post_id):
+            del recent_posts_cache['json'][post_id]
+    if recent_posts_cache.get('html'):
+        if recent_posts_cache['html'].get(post_id):
+            del recent_posts_cache['html'][post_id]
+
+
+def get_from_recent_posts_cache(recent_posts_cache: {}, post_id: str,
+                                field: str) -> str:
+    """Returns the json or html for a post within the recent posts cache,
+    marking it as the most recently used, or None if it is not cached
+    """
+    if not recent_posts_cache.get('index'):
+        return None
+    _init_recent_posts_cache(recent_posts_cache)
+    value = recent_posts_cache[field].get(post_id)
+    if not value:
+        recent_posts_cache['misses'] += 1
+        return None
+    recent_posts_cache['hits'] += 1
+    try:
+        recent_posts_cache['index'].move_to_end(post_id)
+    except KeyError:
+        # removed by another thread
+        pass
+    return value
+
+
+def set_recent_posts_cache_budget(recent_posts_cache: {},
+                                  max_bytes: int) -> None:
+    """Sets the maximum number of bytes held within the recent posts cache
+    """
+    _init_recent_posts_cache(recent_posts_cache)
+    if max_bytes and max_bytes > 0:
+        recent_posts_cache['max_bytes'] = max_bytes
+
+
+def recent_posts_cache_metrics(recent_posts_cache: {}) -> {}:
+    """Returns the current state of the recent posts cache
+    """
+    _init_recent_posts_cache(recent_posts_cache)
+    return {
+        'posts': len(recent_posts_cache['index']),
+        'bytes': recent_posts_cache['bytes'],
+        'maxBytes': recent_posts_cache['max_bytes'],
+        'hits': recent_posts_cache['hits'],
+        'misses': recent_posts_cache['misses'],
+        'evictions': recent_posts_cache['evictions']
+    }
+
+
+def update_recent_posts_cache(recent_posts_cache: {}, max_recent_posts: int,
+                              post_json_object: {}, html_str: str) -> None:
+    """Store recent posts in memory so that they can be quickly recalled.
+    The least recently used posts are removed when the number of posts
+    or their total size exceeds the limits
+    """
+    if not post_json_object.get('id'):
+        return
+    post_id = _recent_posts_cache_id(post_json_object)
+    _init_recent_posts_cache(recent_posts_cache)
+    index = recent_posts_cache['index']
+    if post_id in index:
+        try:
+            index.move_to_end(post_id)
+        except KeyError:
+            pass
+        return
+    post_json_object['muted'] = False
+    json_str = json.dumps(post_json_object)
+    entry_bytes = len(json_str) + len(html_str)
+    recent_posts_cache['json'][post_id] = json_str
+    recent_posts_cache['html'][post_id] = html_str
+    index[post_id] = entry_bytes
+    recent_posts_cache['bytes'] += entry_bytes
+
+    # remove the least recently used posts
+    while len(index) > 1 and \
+            (len(index) > max_recent_posts or
+             recent_posts_cache['bytes'] > recent_posts_cache['max_bytes']):
+        try:
+            evict_id, evict_bytes = index.popitem(last=False)
+        except KeyError:
+            break
+        recent_posts_cache['bytes'] = \
+            max(recent_posts_cache['bytes'] - evict_bytes, 0)
+        recent_posts_cache['evictions'] += 1
+        if recent_posts_cache['json'].get(evict_id):
+            del recent_posts_cache['json'][evict_id]
+        if recent_posts_cache['html'].get(evict_id):
+            del recent_posts_cache['html'][evict_id]
 
 
 def file_last_modified(filename: str) -> str:
@@ -2651,15 +2777,17 @@ def _search_virtual_box_posts(base_dir: str, nickname: str, domain: str,
         search_words = [search_str]
 
     res = []
-    with open(index_filename, 'r', encoding='utf-8') as index_file:
-        post_filename = 'start'
-        while post_filename:
-            post_filename = index_file.readline()
-            if not post_filename:
-                break
+    index_position = 0
+    while True:
+        # read the index newest first, one chunk at a time
+        index_page = box_index_page(index_filename, index_position, 256)
+        if not index_page:
+            break
+        index_position += len(index_page)
+        for post_filename in index_page:
             if '.json' not in post_filename:
-                break
-            post_filename = path + '/' + post_filename.strip()
+                return res
+            post_filename = path + '/' + post_filename
             if not os.path.isfile(post_filename):
                 continue
             with open(post_filename, 'r', encoding='utf-8') as post_file:
@@ -2685,13 +2813,8 @@ def search_box_posts(base_dir: str, nickname: str, domain: str,
     """Search your posts and return a list of the filenames
     containing matching strings
     """
-    path = acct_dir(base_dir, nickname, domain) + '/' + box_name
-    # is this a virtual box, such as direct messages?
-    if not os.path.isdir(path):
-        if os.path.isfile(path + '.index'):
-            return _search_virtual_box_posts(base_dir, nickname, domain,
-                                             search_str, max_results, box_name)
-        return []
+    account_dir = acct_dir(base_dir, nickname, domain)
+    path = account_dir + '/' + box_name
     search_str = search_str.lower().strip()
 
     if '+' in search_str:
@@ -2702,6 +2825,19 @@ def search_box_posts(base_dir: str, nickname: str, domain: str,
     else:
         search_words = [search_str]
 
+    # search using the index if possible
+    res = search_index_query(account_dir, box_name,
+                             search_words, max_results)
+    if res is not None:
+        return res
+
+    # is this a virtual box, such as direct messages?
+    if not os.path.isdir(path):
+        if os.path.isfile(path + '.index'):
+            return _search_virtual_box_posts(base_dir, nickname, domain,
+                                             search_str, max_results, box_name)
+        return []
+
     res = []
     for root, _, fnames in os.walk(path):
         for fname in fnames:
@@ -2724,17 +2860,6 @@ def search_box_posts(base_dir: str, nickname: str, domain: str,
     return res
 
 
-def get_file_case_insensitive(path: str) -> str:
-    """Returns a case specific filename given a case insensitive version of it
-    """
-    if os.path.isfile(path):
-        return path
-    if path != path.lower():
-        if os.path.isfile(path.lower()):
-            return path.lower()
-    return None
-
-
 def undo_likes_collection_entry(recent_posts_cache: {},
                                 base_dir: str, post_filename: str,
                                 object_url: str,
@@ -2752,8 +2877,7 @@ def undo_likes_collection_entry(recent_posts_cache: {},
     if not nickname:
         return
     cached_post_filename = \
-        get_cached_post_filename(base_dir, nickname,
-                                 domain, post_json_object)
+        get_cached_post_filename(base_dir, post_json_object)
     if cached_post_filename:
         if os.path.isfile(cached_post_filename):
             try:
@@ -2820,8 +2944,7 @@ def undo_reaction_collection_entry(recent_posts_cache: {},
     if not nickname:
         return
     cached_post_filename = \
-        get_cached_post_filename(base_dir, nickname,
-                                 domain, post_json_object)
+        get_cached_post_filename(base_dir, post_json_object)
     if cached_post_filename:
         if os.path.isfile(cached_post_filename):
             try:
@@ -2889,8 +3012,7 @@ def undo_announce_collection_entry(recent_posts_cache: {},
     if not nickname:
         return
     cached_post_filename = \
-        get_cached_post_filename(base_dir, nickname, domain,
-                                 post_json_object)
+        get_cached_post_filename(base_dir, post_json_object)
     if cached_post_filename:
         if os.path.isfile(cached_post_filename):
             try:
@@ -2957,8 +3079,7 @@ def update_announce_collection(recent_posts_cache: {},
     # remove any cached version of this announce so that the announce
     # icon is changed
     cached_post_filename = \
-        get_cached_post_filename(base_dir, nickname, domain,
-                                 post_json_object)
+        get_cached_post_filename(base_dir, post_json_object)
     if cached_post_filename:
         if os.path.isfile(cached_post_filename):
             try:
@@ -3149,10 +3270,7 @@ def reject_post_id(base_dir: str, nickname: str, domain: str,
         post_url = post_url.replace('.json', '').strip()
 
         if post_url in recent_posts_cache['index']:
-            if recent_posts_cache['json'].get(post_url):
-                del recent_posts_cache['json'][post_url]
-            if recent_posts_cache['html'].get(post_url):
-                del recent_posts_cache['html'][post_url]
+            remove_id_from_recent_posts_cache(recent_posts_cache, post_url)
 
     with open(post_filename + '.reject', 'w+',
               encoding='utf-8') as reject_file:
@@ -3565,20 +3683,18 @@ def is_group_actor(base_dir: str, actor: str, person_cache: {},
     """
     if person_cache:
         if person_cache.get(actor):
-            if person_cache[actor].get('actor'):
-                if person_cache[actor]['actor'].get('type'):
-                    if person_cache[actor]['actor']['type'] == 'Group':
-                        if debug:
-                            print('Cached actor ' + actor + ' has Group type')
-                        return True
-                return False
+            compact = actor_store_projection(person_cache[actor])
+            if compact.get('type') == 'Group':
+                if debug:
+                    print('Cached actor ' + actor + ' has Group type')
+                return True
+            return False
     if debug:
         print('Actor ' + actor + ' not in cache')
-    cached_actor_filename = \
-        base_dir + '/cache/actors/' + (actor.replace('/', '#')) + '.json'
-    if not os.path.isfile(cached_actor_filename):
+    cached_actor_filename = actor_store_locate(base_dir, actor)
+    if not cached_actor_filename:
         if debug:
-            print('Cached actor file not found ' + cached_actor_filename)
+            print('Cached actor file not found for ' + actor)
         return False
     if text_in_file('"type": "Group"', cached_actor_filename):
         if debug:
@@ -3882,25 +3998,20 @@ def load_bold_reading(base_dir: str) -> {}:
 def get_account_timezone(base_dir: str, nickname: str, domain: str) -> str:
     """Returns the timezone for the given account
     """
-    tz_filename = \
-        acct_dir(base_dir, nickname, domain) + '/timezone.txt'
-    if not os.path.isfile(tz_filename):
-        return None
-    timezone = None
-    with open(tz_filename, 'r', encoding='utf-8') as fp_timezone:
-        timezone = fp_timezone.read().strip()
-    return timezone
+    account_dir = acct_dir(base_dir, nickname, domain)
+    return get_account_settings(account_dir)['timezone']
 
 
 def set_account_timezone(base_dir: str, nickname: str, domain: str,
                          timezone: str) -> None:
     """Sets the timezone for the given account
     """
-    tz_filename = \
-        acct_dir(base_dir, nickname, domain) + '/timezone.txt'
+    account_dir = acct_dir(base_dir, nickname, domain)
+    tz_filename = account_dir + '/timezone.txt'
     timezone = timezone.strip()
     with open(tz_filename, 'w+', encoding='utf-8') as fp_timezone:
         fp_timezone.write(timezone)
+    account_settings_changed(account_dir)
 
 
 def is_onion_request(calling_domain: str, referer_domain: str,
@@ -9,6 +9,8 @@ __module_group__ = "Timeline"
 
 import os
 from utils import acct_dir
+from accountsettings import get_account_settings
+from accountsettings import account_settings_changed
 
 
 def is_minimal(base_dir: str, domain: str, nickname: str) -> bool:
@@ -16,10 +18,7 @@ def is_minimal(base_dir: str, domain: str, nickname: str) -> bool:
        for the given account
     """
     account_dir = acct_dir(base_dir, nickname, domain)
-    if not os.path.isdir(account_dir):
-        return True
-    minimal_filename = account_dir + '/.notminimal'
-    if os.path.isfile(minimal_filename):
+    if get_account_settings(account_dir)['notminimal']:
         return False
     return True
 
@@ -44,3 +43,4 @@ def set_minimal(base_dir: str, domain: str, nickname: str,
                 fp_min.write('\n')
         except OSError:
             print('EX: unable to write minimal ' + minimal_filename)
+    account_settings_changed(account_dir)
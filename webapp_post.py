@@ -9,6 +9,7 @@ __module_group__ = "Web Interface"
 
 import os
 import time
+import hashlib
 import urllib.parse
 from dateutil.parser import parse
 from auth import create_password
@@ -21,6 +22,8 @@ from announce import no_of_announces
 from like import liked_by_person
 from like import no_of_likes
 from follow import is_following_actor
+from posthtmlcache import post_html_cache_save
+from posthtmlcache import post_html_cache_load
 from posts import post_is_muted
 from posts import get_person_box
 from posts import download_announce
@@ -52,8 +55,6 @@ from utils import get_full_domain
 from utils import is_editor
 from utils import locate_post
 from utils import load_json
-from utils import get_cached_post_directory
-from utils import get_cached_post_filename
 from utils import get_protocol_prefixes
 from utils import is_news_post
 from utils import is_blog_post
@@ -62,10 +63,13 @@ from utils import display_name_is_emoji
 from utils import is_public_post
 from utils import is_followers_post
 from utils import update_recent_posts_cache
+from utils import get_from_recent_posts_cache
 from utils import remove_id_ending
 from utils import get_nickname_from_actor
 from utils import get_domain_from_actor
 from utils import acct_dir
+from accountsettings import get_account_settings
+from accountsettings import get_account_settings_json
 from utils import local_actor_url
 from utils import is_unlisted_post
 from content import replace_remote_hashtags
@@ -87,7 +91,6 @@ from webapp_utils import language_right_to_left
 from webapp_utils import get_banner_file
 from webapp_utils import get_avatar_image_url
 from webapp_utils import update_avatar_image_cache
-from webapp_utils import load_individual_post_as_html_from_cache
 from webapp_utils import add_emoji_to_display_name
 from webapp_utils import post_contains_public
 from webapp_utils import get_content_warning_button
@@ -301,8 +304,9 @@ def replace_link_variable(link: str, variable_name: str, value: str,
     return result + curr_str
 
 
-def prepare_post_from_html_cache(nickname: str, post_html: str, box_name: str,
-                                 page_number: int, first_post_id: str) -> str:
+def _prepare_post_from_html_cache(nickname: str, post_html: str,
+                                  box_name: str, page_number: int,
+                                  first_post_id: str) -> str:
     """Sets the page number on a cached html post
     """
     # if on the bookmarks timeline then remain there
@@ -342,32 +346,41 @@ def prepare_post_from_html_cache(nickname: str, post_html: str, box_name: str,
     return prepare_html_post_nickname(nickname, with_page_number)
 
 
+def _post_html_dependencies(post_json_object: {}) -> []:
+    """Returns the posts and actors which the html for a post depends upon
+    """
+    dependencies = []
+    if isinstance(post_json_object.get('actor'), str):
+        dependencies.append(post_json_object['actor'])
+    if has_object_dict(post_json_object):
+        post_obj = post_json_object['object']
+        if isinstance(post_obj.get('attributedTo'), str):
+            dependencies.append(post_obj['attributedTo'])
+        if isinstance(post_obj.get('id'), str):
+            dependencies.append(remove_id_ending(post_obj['id']))
+    elif isinstance(post_json_object.get('object'), str):
+        # the post being announced
+        dependencies.append(remove_id_ending(post_json_object['object']))
+    return dependencies
+
+
 def _save_individual_post_as_html_to_cache(base_dir: str,
-                                           nickname: str, domain: str,
                                            post_json_object: {},
-                                           post_html: str) -> bool:
-    """Saves the given html for a post to a cache file
+                                           announced_json: {},
+                                           post_html: str,
+                                           variant: str) -> bool:
+    """Saves the given html for a post to the cache shared by all accounts
     This is so that it can be quickly reloaded on subsequent
     refresh of the timeline
     """
-    html_post_cache_dir = \
-        get_cached_post_directory(base_dir, nickname, domain)
-    cached_post_filename = \
-        get_cached_post_filename(base_dir, nickname, domain, post_json_object)
-    if not cached_post_filename:
+    if not post_json_object.get('id'):
         return False
-
-    # create the cache directory if needed
-    if not os.path.isdir(html_post_cache_dir):
-        os.mkdir(html_post_cache_dir)
-
-    try:
-        with open(cached_post_filename, 'w+', encoding='utf-8') as fp_cache:
-            fp_cache.write(post_html)
-            return True
-    except OSError as ex:
-        print('ERROR: saving post to cache, ' + str(ex))
-    return False
+    cached_post_id = remove_id_ending(post_json_object['id'])
+    dependencies = _post_html_dependencies(post_json_object)
+    if announced_json:
+        dependencies += _post_html_dependencies(announced_json)
+    return post_html_cache_save(base_dir, cached_post_id,
+                                variant + post_html, dependencies)
 
 
 def _get_post_from_recent_cache(session,
@@ -388,8 +401,13 @@ def _get_post_from_recent_cache(session,
                                 recent_posts_cache: {},
                                 max_recent_posts: int,
                                 signing_priv_key_pem: str,
-                                first_post_id: str) -> str:
+                                first_post_id: str,
+                                viewer_icons: {},
+                                variant: str) -> str:
     """Attempts to get the html post from the recent posts cache in memory
+    or the cache shared by all accounts, adding the icons for the
+    account viewing it. Cached html rendered with different settings
+    from those of the viewing account is not used
     """
     if box_name == 'tlmedia':
         return None
@@ -419,17 +437,40 @@ def _get_post_from_recent_cache(session,
 
     _log_post_timing(enable_timing_log, post_start_time, '2.2')
 
-    post_html = \
-        load_individual_post_as_html_from_cache(base_dir, nickname, domain,
-                                                post_json_object)
+    # is the post within the recent posts cache in memory?
+    post_html = None
+    if post_json_object.get('id'):
+        cached_post_id = remove_id_ending(post_json_object['id'])
+        cached_post_id = cached_post_id.replace('/', '#')
+        post_html = \
+            get_from_recent_posts_cache(recent_posts_cache,
+                                        cached_post_id, 'html')
+    if post_html and post_html.startswith(variant):
+        post_html = post_html[len(variant):]
+        post_html = _substitute_viewer_icons(post_html, viewer_icons)
+        post_html = \
+            _prepare_post_from_html_cache(nickname, post_html,
+                                          box_name, page_number,
+                                          first_post_id)
+        _log_post_timing(enable_timing_log, post_start_time, '3')
+        return post_html
+
+    if not post_json_object.get('id'):
+        return None
+    cached_post_id = remove_id_ending(post_json_object['id'])
+    post_html = post_html_cache_load(base_dir, cached_post_id)
     if not post_html:
         return None
+    if not post_html.startswith(variant):
+        return None
 
-    post_html = \
-        prepare_post_from_html_cache(nickname, post_html,
-                                     box_name, page_number, first_post_id)
     update_recent_posts_cache(recent_posts_cache, max_recent_posts,
                               post_json_object, post_html)
+    post_html = post_html[len(variant):]
+    post_html = _substitute_viewer_icons(post_html, viewer_icons)
+    post_html = \
+        _prepare_post_from_html_cache(nickname, post_html,
+                                      box_name, page_number, first_post_id)
     _log_post_timing(enable_timing_log, post_start_time, '3')
     return post_html
 
@@ -1120,6 +1161,239 @@ def _get_delete_icon_html(nickname: str, domain_full: str,
     return delete_str
 
 
+def _viewer_icon_placeholder(icon_name: str) -> str:
+    """Returns the placeholder used within cached html for a part of
+    a post which depends upon the account viewing it
+    """
+    return '<!--viewer:' + icon_name + '-->'
+
+
+def _substitute_viewer_icons(post_html: str, viewer_icons: {}) -> str:
+    """Replaces the placeholders within cached html with the icons
+    for the account viewing the post
+    """
+    if '<!--viewer:' not in post_html:
+        return post_html
+    for icon_name in ('edit', 'announce', 'like', 'bookmark', 'reaction',
+                      'mute', 'delete', 'reactions', 'edits'):
+        placeholder = _viewer_icon_placeholder(icon_name)
+        if placeholder not in post_html:
+            continue
+        icon_str = ''
+        if viewer_icons and viewer_icons.get(icon_name):
+            icon_str = viewer_icons[icon_name]
+        post_html = post_html.replace(placeholder, icon_str)
+    return post_html
+
+
+def _post_html_variant(base_dir: str, nickname: str, domain: str,
+                       show_published_date_only: bool, timezone: str,
+                       minimize_all_images: bool, bold_reading: bool,
+                       cw_lists: {}, lists_enabled: str) -> str:
+    """Returns a marker for the settings of the account viewing a post
+    which change the way that it is rendered. Cached html begins with
+    this, so that it is only shown to accounts with the same settings
+    """
+    settings_str = \
+        str(show_published_date_only) + ' ' + str(timezone) + ' ' + \
+        str(minimize_all_images) + ' ' + str(bold_reading) + ' ' + \
+        str(lists_enabled)
+    if cw_lists:
+        settings_str += ' ' + ','.join(sorted(cw_lists.keys()))
+    # word replacements and accounts whose images are minimized
+    account_dir = acct_dir(base_dir, nickname, domain)
+    for settings_filename in ('replacewords.txt',
+                              'followingMinimizeImages.txt'):
+        try:
+            settings_stat = os.stat(account_dir + '/' + settings_filename)
+        except OSError:
+            continue
+        if settings_stat.st_size > 0:
+            settings_str += ' ' + nickname + ' ' + settings_filename + \
+                ' ' + str(settings_stat.st_mtime)
+    variant = hashlib.sha1(settings_str.encode('utf-8')).hexdigest()[:16]
+    return '<!--variant:' + variant + '-->'
+
+
+def _get_edits_html(base_dir: str, nickname: str, domain: str,
+                    box_name: str, message_id: str,
+                    post_json_object: {}, translate: {},
+                    timezone: str, system_language: str,
+                    languages_understood: []) -> str:
+    """Returns the html for the edit history of a post, which is
+    stored within the timeline of the account viewing it
+    """
+    edits_post_url = \
+        remove_id_ending(message_id.strip()).replace('/', '#') + '.edits'
+    edits_filename = \
+        acct_dir(base_dir, nickname, domain) + '/' + box_name + '/' + \
+        edits_post_url
+    edits_json = get_account_settings_json(edits_filename)
+    if not edits_json:
+        return ''
+    return create_edits_html(edits_json, post_json_object,
+                             translate, timezone, system_language,
+                             languages_understood)
+
+
+def _get_viewer_icons_html(base_dir: str, http_prefix: str,
+                           nickname: str, domain: str, domain_full: str,
+                           post_json_object: {},
+                           announce_json_object: {},
+                           is_muted: bool, allow_deletion: bool,
+                           show_repeats: bool, show_icons: bool,
+                           translate: {}, page_number: int,
+                           box_name: str, max_like_count: int,
+                           first_post_id: str,
+                           enable_timing_log: bool,
+                           post_start_time) -> {}:
+    """Returns the html for the parts of a post which depend upon the
+    account viewing it, such as whether it was liked or bookmarked and
+    whether it can be edited or deleted. Cached html contains
+    placeholders for these, so that it can be shown to any account
+    """
+    viewer_icons = {}
+    if not has_object_dict(post_json_object):
+        return viewer_icons
+
+    # for announces this is the announce rather than the announced post
+    outer_json = post_json_object
+    is_announced = False
+    if announce_json_object:
+        outer_json = announce_json_object
+        is_announced = True
+    post_actor = outer_json['actor']
+    message_id = ''
+    if outer_json.get('id'):
+        message_id = remove_hash_from_post_id(outer_json['id'])
+        message_id = remove_id_ending(message_id)
+    page_number_param = ''
+    if page_number:
+        page_number_param = '?page=' + str(page_number)
+    timeline_post_bookmark = remove_id_ending(outer_json['id'])
+    timeline_post_bookmark = timeline_post_bookmark.replace('://', '-')
+    timeline_post_bookmark = timeline_post_bookmark.replace('/', '-')
+
+    show_repeat_icon = show_repeats
+    is_public_repeat = False
+    if show_repeats:
+        if is_dm(outer_json):
+            show_repeat_icon = False
+        else:
+            if not is_public_post(outer_json):
+                is_public_repeat = True
+
+    is_moderation_post = False
+    if post_json_object['object'].get('moderationStatus'):
+        is_moderation_post = True
+    actor_nickname = get_nickname_from_actor(post_actor)
+    if not actor_nickname:
+        # single user instance
+        actor_nickname = 'dev'
+
+    viewer_icons['edit'] = \
+        _get_edit_icon_html(base_dir, nickname, domain_full,
+                            post_json_object, actor_nickname,
+                            translate, False, first_post_id)
+
+    _log_post_timing(enable_timing_log, post_start_time, '11')
+
+    viewer_icons['announce'] = \
+        _get_announce_icon_html(is_announced,
+                                post_actor,
+                                nickname, domain_full,
+                                announce_json_object,
+                                post_json_object,
+                                is_public_repeat,
+                                is_moderation_post,
+                                show_repeat_icon,
+                                translate,
+                                page_number_param,
+                                timeline_post_bookmark,
+                                box_name, max_like_count,
+                                first_post_id)
+
+    _log_post_timing(enable_timing_log, post_start_time, '12')
+
+    # whether to show like and reaction buttons
+    settings_dir = acct_dir(base_dir, nickname, domain)
+    account_settings = get_account_settings(settings_dir)
+    show_like_button = not account_settings['hideLikeButton']
+    show_reaction_button = not account_settings['hideReactionButton']
+
+    viewer_icons['like'] = \
+        _get_like_icon_html(nickname, domain_full,
+                            is_moderation_post,
+                            show_like_button,
+                            outer_json,
+                            enable_timing_log,
+                            post_start_time,
+                            translate, page_number_param,
+                            timeline_post_bookmark,
+                            box_name, max_like_count,
+                            first_post_id)
+
+    _log_post_timing(enable_timing_log, post_start_time, '12.5')
+
+    viewer_icons['bookmark'] = \
+        _get_bookmark_icon_html(base_dir, nickname, domain,
+                                domain_full, post_json_object,
+                                is_moderation_post, translate,
+                                enable_timing_log,
+                                post_start_time, box_name,
+                                page_number_param,
+                                timeline_post_bookmark,
+                                first_post_id, message_id)
+
+    _log_post_timing(enable_timing_log, post_start_time, '12.9')
+
+    viewer_icons['reaction'] = \
+        _get_reaction_icon_html(nickname, post_json_object,
+                                is_moderation_post,
+                                show_reaction_button,
+                                translate,
+                                enable_timing_log,
+                                post_start_time, box_name,
+                                page_number_param,
+                                timeline_post_bookmark,
+                                first_post_id)
+
+    _log_post_timing(enable_timing_log, post_start_time, '12.10')
+
+    viewer_icons['mute'] = \
+        _get_mute_icon_html(is_muted,
+                            post_actor,
+                            message_id,
+                            nickname, domain_full,
+                            allow_deletion,
+                            page_number_param,
+                            box_name,
+                            timeline_post_bookmark,
+                            translate, first_post_id)
+
+    viewer_icons['delete'] = \
+        _get_delete_icon_html(nickname, domain_full,
+                              allow_deletion,
+                              post_actor,
+                              message_id,
+                              post_json_object,
+                              page_number_param,
+                              translate, first_post_id)
+
+    # the row of emoji reactions, showing those made by the viewer
+    viewer_icons['reactions'] = ''
+    if show_icons and box_name != 'tlmedia':
+        person_url = local_actor_url(http_prefix, nickname, domain_full)
+        max_reaction_types = 5
+        viewer_icons['reactions'] = \
+            html_emoji_reactions(post_json_object, True, person_url,
+                                 max_reaction_types,
+                                 box_name, page_number)
+
+    _log_post_timing(enable_timing_log, post_start_time, '13.1')
+    return viewer_icons
+
+
 def _get_published_date_str(post_json_object: {},
                             show_published_date_only: bool,
                             timezone: str) -> str:
@@ -1931,9 +2205,6 @@ def individual_post_as_html(signing_priv_key_pem: str,
     if not post_json_object:
         return ''
 
-    # maximum number of different emoji reactions which can be added to a post
-    max_reaction_types = 5
-
     # benchmark
     post_start_time = time.time()
 
@@ -1957,11 +2228,6 @@ def individual_post_as_html(signing_priv_key_pem: str,
 
     _log_post_timing(enable_timing_log, post_start_time, '2')
 
-    # does this post have edits?
-    edits_post_url = \
-        remove_id_ending(message_id.strip()).replace('/', '#') + '.edits'
-    account_dir = acct_dir(base_dir, nickname, domain) + '/'
-
     message_id_str = ''
     if message_id:
         message_id_str = ';' + message_id
@@ -1972,29 +2238,70 @@ def individual_post_as_html(signing_priv_key_pem: str,
     if page_number:
         page_number_param = '?page=' + str(page_number)
 
-    # get the html post from the recent posts cache if it exists there
-    post_html = \
-        _get_post_from_recent_cache(session, base_dir,
-                                    http_prefix, nickname, domain,
-                                    post_json_object,
-                                    post_actor,
-                                    person_cache,
-                                    allow_downloads,
-                                    show_public_only,
-                                    store_to_cache,
-                                    box_name,
-                                    avatar_url,
-                                    enable_timing_log,
-                                    post_start_time,
-                                    page_number,
-                                    recent_posts_cache,
-                                    max_recent_posts,
-                                    signing_priv_key_pem,
-                                    first_post_id)
-    if post_html:
-        return post_html
-    if use_cache_only and post_json_object['type'] != 'Announce':
-        return ''
+    person_url = local_actor_url(http_prefix, nickname, domain_full)
+    actor_json = \
+        get_person_from_cache(base_dir, person_url, person_cache)
+    languages_understood = []
+    if actor_json:
+        languages_understood = get_actor_languages_list(actor_json)
+
+    # settings of the viewing account which change how posts are rendered
+    variant = \
+        _post_html_variant(base_dir, nickname, domain,
+                           show_published_date_only, timezone,
+                           minimize_all_images, bold_reading,
+                           cw_lists, lists_enabled)
+
+    # icons which depend upon the account viewing the post.
+    # For announces these are known once the announced post is loaded
+    is_muted = False
+    viewer_icons = {}
+    if post_json_object['type'] != 'Announce':
+        # muted posts are shown differently, so are never
+        # taken from the cache
+        is_muted = post_is_muted(base_dir, nickname, domain,
+                                 post_json_object, message_id)
+        viewer_icons = \
+            _get_viewer_icons_html(base_dir, http_prefix,
+                                   nickname, domain, domain_full,
+                                   post_json_object, None,
+                                   is_muted, allow_deletion,
+                                   show_repeats, show_icons,
+                                   translate, page_number,
+                                   box_name, max_like_count,
+                                   first_post_id,
+                                   enable_timing_log, post_start_time)
+        viewer_icons['edits'] = \
+            _get_edits_html(base_dir, nickname, domain, box_name,
+                            message_id, post_json_object, translate,
+                            timezone, system_language,
+                            languages_understood)
+
+        # get the html post from the recent posts cache if it exists there
+        if not is_muted:
+            post_html = \
+                _get_post_from_recent_cache(session, base_dir,
+                                            http_prefix, nickname, domain,
+                                            post_json_object,
+                                            post_actor,
+                                            person_cache,
+                                            allow_downloads,
+                                            show_public_only,
+                                            store_to_cache,
+                                            box_name,
+                                            avatar_url,
+                                            enable_timing_log,
+                                            post_start_time,
+                                            page_number,
+                                            recent_posts_cache,
+                                            max_recent_posts,
+                                            signing_priv_key_pem,
+                                            first_post_id,
+                                            viewer_icons, variant)
+            if post_html:
+                return post_html
+        if use_cache_only:
+            return ''
 
     _log_post_timing(enable_timing_log, post_start_time, '4')
 
@@ -2070,14 +2377,10 @@ def individual_post_as_html(signing_priv_key_pem: str,
 
     # If this is the inbox timeline then don't show the repeat icon on any DMs
     show_repeat_icon = show_repeats
-    is_public_repeat = False
     post_is_dm = is_dm(post_json_object)
     if show_repeats:
         if post_is_dm:
             show_repeat_icon = False
-        else:
-            if not is_public_post(post_json_object):
-                is_public_repeat = True
 
     title_str = ''
     gallery_str = ''
@@ -2106,27 +2409,47 @@ def individual_post_as_html(signing_priv_key_pem: str,
             return ''
         post_json_object = post_json_announce
 
-        # is the announced post in the html cache?
-        post_html = \
-            _get_post_from_recent_cache(session, base_dir,
-                                        http_prefix, nickname, domain,
-                                        post_json_object,
-                                        post_actor,
-                                        person_cache,
-                                        allow_downloads,
-                                        show_public_only,
-                                        store_to_cache,
-                                        box_name,
-                                        avatar_url,
-                                        enable_timing_log,
-                                        post_start_time,
-                                        page_number,
-                                        recent_posts_cache,
-                                        max_recent_posts,
-                                        signing_priv_key_pem,
-                                        first_post_id)
-        if post_html:
-            return post_html
+        is_muted = post_is_muted(base_dir, nickname, domain,
+                                 post_json_object, message_id)
+        viewer_icons = \
+            _get_viewer_icons_html(base_dir, http_prefix,
+                                   nickname, domain, domain_full,
+                                   post_json_object, announce_json_object,
+                                   is_muted, allow_deletion,
+                                   show_repeats, show_icons,
+                                   translate, page_number,
+                                   box_name, max_like_count,
+                                   first_post_id,
+                                   enable_timing_log, post_start_time)
+        viewer_icons['edits'] = \
+            _get_edits_html(base_dir, nickname, domain, box_name,
+                            message_id, post_json_object, translate,
+                            timezone, system_language,
+                            languages_understood)
+
+        # is the announce in the html cache?
+        if not is_muted:
+            post_html = \
+                _get_post_from_recent_cache(session, base_dir,
+                                            http_prefix, nickname, domain,
+                                            announce_json_object,
+                                            post_actor,
+                                            person_cache,
+                                            allow_downloads,
+                                            show_public_only,
+                                            store_to_cache,
+                                            box_name,
+                                            avatar_url,
+                                            enable_timing_log,
+                                            post_start_time,
+                                            page_number,
+                                            recent_posts_cache,
+                                            max_recent_posts,
+                                            signing_priv_key_pem,
+                                            first_post_id,
+                                            viewer_icons, variant)
+            if post_html:
+                return post_html
 
         announce_filename = \
             locate_post(base_dir, nickname, domain, post_json_object['id'])
@@ -2278,110 +2601,15 @@ def individual_post_as_html(signing_priv_key_pem: str,
 
     _log_post_timing(enable_timing_log, post_start_time, '10')
 
-    edit_str = _get_edit_icon_html(base_dir, nickname, domain_full,
-                                   post_json_object, actor_nickname,
-                                   translate, False, first_post_id)
-
-    _log_post_timing(enable_timing_log, post_start_time, '11')
-
-    announce_str = \
-        _get_announce_icon_html(is_announced,
-                                post_actor,
-                                nickname, domain_full,
-                                announce_json_object,
-                                post_json_object,
-                                is_public_repeat,
-                                is_moderation_post,
-                                show_repeat_icon,
-                                translate,
-                                page_number_param,
-                                timeline_post_bookmark,
-                                box_name, max_like_count,
-                                first_post_id)
-
-    _log_post_timing(enable_timing_log, post_start_time, '12')
-
-    # whether to show a like button
-    hide_like_button_file = \
-        acct_dir(base_dir, nickname, domain) + '/.hideLikeButton'
-    show_like_button = True
-    if os.path.isfile(hide_like_button_file):
-        show_like_button = False
-
-    # whether to show a reaction button
-    hide_reaction_button_file = \
-        acct_dir(base_dir, nickname, domain) + '/.hideReactionButton'
-    show_reaction_button = True
-    if os.path.isfile(hide_reaction_button_file):
-        show_reaction_button = False
-
-    like_json_object = post_json_object
-    if announce_json_object:
-        like_json_object = announce_json_object
-    like_str = _get_like_icon_html(nickname, domain_full,
-                                   is_moderation_post,
-                                   show_like_button,
-                                   like_json_object,
-                                   enable_timing_log,
-                                   post_start_time,
-                                   translate, page_number_param,
-                                   timeline_post_bookmark,
-                                   box_name, max_like_count,
-                                   first_post_id)
-
-    _log_post_timing(enable_timing_log, post_start_time, '12.5')
-
-    bookmark_str = \
-        _get_bookmark_icon_html(base_dir, nickname, domain,
-                                domain_full, post_json_object,
-                                is_moderation_post, translate,
-                                enable_timing_log,
-                                post_start_time, box_name,
-                                page_number_param,
-                                timeline_post_bookmark,
-                                first_post_id, message_id)
-
-    _log_post_timing(enable_timing_log, post_start_time, '12.9')
-
-    reaction_str = \
-        _get_reaction_icon_html(nickname, post_json_object,
-                                is_moderation_post,
-                                show_reaction_button,
-                                translate,
-                                enable_timing_log,
-                                post_start_time, box_name,
-                                page_number_param,
-                                timeline_post_bookmark,
-                                first_post_id)
-
-    _log_post_timing(enable_timing_log, post_start_time, '12.10')
-
-    is_muted = post_is_muted(base_dir, nickname, domain,
-                             post_json_object, message_id)
-
-    _log_post_timing(enable_timing_log, post_start_time, '13')
-
-    mute_str = \
-        _get_mute_icon_html(is_muted,
-                            post_actor,
-                            message_id,
-                            nickname, domain_full,
-                            allow_deletion,
-                            page_number_param,
-                            box_name,
-                            timeline_post_bookmark,
-                            translate, first_post_id)
-
-    delete_str = \
-        _get_delete_icon_html(nickname, domain_full,
-                              allow_deletion,
-                              post_actor,
-                              message_id,
-                              post_json_object,
-                              page_number_param,
-                              translate, first_post_id)
-
-    _log_post_timing(enable_timing_log, post_start_time, '13.1')
+    # icons which depend upon the account viewing the post are
+    # added after the post is cached
+    edit_str = _viewer_icon_placeholder('edit')
+    announce_str = _viewer_icon_placeholder('announce')
+    like_str = _viewer_icon_placeholder('like')
+    bookmark_str = _viewer_icon_placeholder('bookmark')
+    reaction_str = _viewer_icon_placeholder('reaction')
+    mute_str = _viewer_icon_placeholder('mute')
+    delete_str = _viewer_icon_placeholder('delete')
 
     # get the title: x replies to y, x announces y, etc
     (title_str2,
@@ -2409,22 +2637,6 @@ def individual_post_as_html(signing_priv_key_pem: str,
 
     _log_post_timing(enable_timing_log, post_start_time, '14')
 
-    person_url = local_actor_url(http_prefix, nickname, domain_full)
-    actor_json = \
-        get_person_from_cache(base_dir, person_url, person_cache)
-    languages_understood = []
-    if actor_json:
-        languages_understood = get_actor_languages_list(actor_json)
-
-    edits_filename = account_dir + box_name + '/' + edits_post_url
-    edits_str = ''
-    if os.path.isfile(edits_filename):
-        edits_json = load_json(edits_filename, 0, 1)
-        if edits_json:
-            edits_str = create_edits_html(edits_json, post_json_object,
-                                          translate, timezone, system_language,
-                                          languages_understood)
-
     content_str = get_content_from_post(post_json_object, system_language,
                                         languages_understood)
 
@@ -2629,7 +2841,7 @@ def individual_post_as_html(signing_priv_key_pem: str,
             object_content = html_replace_email_quote(object_content)
             object_content = html_replace_quote_marks(object_content)
             # append any edits
-            object_content += edits_str
+            object_content += _viewer_icon_placeholder('edits')
         else:
             object_content = content_str
     else:
@@ -2754,12 +2966,9 @@ def individual_post_as_html(signing_priv_key_pem: str,
     post_html = ''
     if box_name != 'tlmedia':
         reaction_str = ''
-        if show_icons:
-            reaction_str = \
-                html_emoji_reactions(post_json_object, True, person_url,
-                                     max_reaction_types,
-                                     box_name, page_number)
-            if post_is_sensitive and reaction_str:
+        if viewer_icons.get('reactions'):
+            reaction_str = _viewer_icon_placeholder('reactions')
+            if post_is_sensitive:
                 reaction_str = '<br>' + reaction_str
         post_html = '    <div ' + \
             'itemprop="hasPart" ' + \
@@ -2784,16 +2993,21 @@ def individual_post_as_html(signing_priv_key_pem: str,
        box_name != 'tlmedia' and box_name != 'tlbookmarks' and \
        box_name != 'bookmarks':
         cached_json = post_json_object
+        announced_json = None
         if announce_json_object:
             cached_json = announce_json_object
-        _save_individual_post_as_html_to_cache(base_dir, nickname, domain,
-                                               cached_json, post_html)
-        update_recent_posts_cache(recent_posts_cache, max_recent_posts,
-                                  cached_json, post_html)
+            announced_json = post_json_object
+        # muted posts are shown differently, so are not cached
+        if not is_muted:
+            _save_individual_post_as_html_to_cache(base_dir, cached_json,
+                                                   announced_json, post_html,
+                                                   variant)
+            update_recent_posts_cache(recent_posts_cache, max_recent_posts,
+                                      cached_json, variant + post_html)
 
     _log_post_timing(enable_timing_log, post_start_time, '19')
 
-    return post_html
+    return _substitute_viewer_icons(post_html, viewer_icons)
 
 
 def html_individual_post(recent_posts_cache: {}, max_recent_posts: int,
@@ -14,9 +14,7 @@ from datetime import datetime
 from utils import harmless_markup
 from utils import remove_id_ending
 from utils import has_object_dict
-from utils import acct_handle_dir
 from utils import get_base_content_from_post
-from utils import is_account_dir
 from utils import get_config_param
 from utils import get_full_domain
 from utils import is_editor
@@ -30,8 +28,8 @@ from utils import get_alt_path
 from utils import acct_dir
 from utils import local_actor_url
 from utils import escape_text
-from skills import no_of_actor_skills
-from skills import get_skills_from_list
+from skillsindex import skills_index_search
+from sharesindex import shares_index_search
 from categories import get_hashtag_category
 from feeds import rss2tag_header
 from feeds import rss2tag_footer
@@ -143,24 +141,6 @@ def html_search_emoji(translate: {}, base_dir: str, search_str: str,
     return emoji_form
 
 
-def _match_shared_item(search_str_lower_list: [],
-                       shared_item: {}) -> bool:
-    """Returns true if the shared item matches search criteria
-    """
-    for search_substr in search_str_lower_list:
-        search_substr = search_substr.strip()
-        if shared_item.get('location'):
-            if search_substr in shared_item['location'].lower():
-                return True
-        if search_substr in shared_item['summary'].lower():
-            return True
-        if search_substr in shared_item['displayName'].lower():
-            return True
-        if search_substr in shared_item['category'].lower():
-            return True
-    return False
-
-
 def _html_search_result_share_page(actor: str, domain_full: str,
                                    calling_domain: str, page_number: int,
                                    search_str_lower: str, translate: {},
@@ -198,53 +178,17 @@ def _html_search_result_share_page(actor: str, domain_full: str,
     return shared_items_form
 
 
-def _html_shares_result(base_dir: str, shares_json: {}, page_number: int,
-                        results_per_page: int,
-                        search_str_lower_list: [], curr_page: int, ctr: int,
-                        calling_domain: str, http_prefix: str,
-                        domain_full: str, contact_nickname: str, actor: str,
-                        results_exist: bool, search_str_lower: str,
-                        translate: {},
-                        shares_file_type: str) -> (bool, int, int, str):
-    """Result for shared items search
+def _shared_item_owner_nickname(item_id: str) -> str:
+    """Returns the nickname of the owner of a federated shared item
     """
-    shared_items_form = ''
-    if curr_page > page_number:
-        return results_exist, curr_page, ctr, shared_items_form
-
-    for name, shared_item in shares_json.items():
-        if _match_shared_item(search_str_lower_list, shared_item):
-            if curr_page == page_number:
-                # show individual search result
-                shared_items_form += \
-                    html_search_result_share(base_dir, shared_item, translate,
-                                             http_prefix, domain_full,
-                                             contact_nickname,
-                                             name, actor, shares_file_type,
-                                             shared_item['category'])
-                if not results_exist and curr_page > 1:
-                    # show the previous page button
-                    shared_items_form += \
-                        _html_search_result_share_page(actor, domain_full,
-                                                       calling_domain,
-                                                       page_number,
-                                                       search_str_lower,
-                                                       translate, True)
-                results_exist = True
-            ctr += 1
-            if ctr >= results_per_page:
-                curr_page += 1
-                if curr_page > page_number:
-                    # show the next page button
-                    shared_items_form += \
-                        _html_search_result_share_page(actor, domain_full,
-                                                       calling_domain,
-                                                       page_number,
-                                                       search_str_lower,
-                                                       translate, False)
-                    return results_exist, curr_page, ctr, shared_items_form
-                ctr = 0
-    return results_exist, curr_page, ctr, shared_items_form
+    if '--shareditems--' not in item_id:
+        return ''
+    owner_actor = item_id.split('--shareditems--')[0]
+    owner_actor = owner_actor.replace('___', '://').replace('--', '/')
+    owner_nickname = get_nickname_from_actor(owner_actor)
+    if not owner_nickname:
+        return ''
+    return owner_nickname
 
 
 def html_search_shared_items(translate: {},
@@ -260,8 +204,6 @@ def html_search_shared_items(translate: {},
                              access_keys: {}) -> str:
     """Search results for shared items
     """
-    curr_page = 1
-    ctr = 0
     shared_items_form = ''
     search_str_lower = urllib.parse.unquote(search_str)
     search_str_lower = search_str_lower.lower().strip('\n').strip('\r')
@@ -300,75 +242,37 @@ def html_search_shared_items(translate: {},
         '<center><h1>' + \
         '<a href="' + actor + '/search">' + title_str + '</a></h1></center>'
     results_exist = False
-    for _, dirs, files in os.walk(base_dir + '/accounts'):
-        for handle in dirs:
-            if not is_account_dir(handle):
-                continue
-            contact_nickname = handle.split('@')[0]
-            shares_filename = acct_handle_dir(base_dir, handle) + \
-                '/' + shares_file_type + '.json'
-            if not os.path.isfile(shares_filename):
-                continue
-
-            shares_json = load_json(shares_filename)
-            if not shares_json:
-                continue
-
-            (results_exist, curr_page, ctr,
-             result_str) = _html_shares_result(base_dir, shares_json,
-                                               page_number,
-                                               results_per_page,
-                                               search_str_lower_list,
-                                               curr_page, ctr,
-                                               calling_domain, http_prefix,
-                                               domain_full,
-                                               contact_nickname,
-                                               actor, results_exist,
-                                               search_str_lower, translate,
-                                               shares_file_type)
-            shared_items_form += result_str
-
-            if curr_page > page_number:
-                break
-        break
-
-    # search federated shared items
-    if shares_file_type == 'shares':
-        catalogs_dir = base_dir + '/cache/catalogs'
-    else:
-        catalogs_dir = base_dir + '/cache/wantedItems'
-    if curr_page <= page_number and os.path.isdir(catalogs_dir):
-        for _, dirs, files in os.walk(catalogs_dir):
-            for fname in files:
-                if '#' in fname:
-                    continue
-                if not fname.endswith('.' + shares_file_type + '.json'):
-                    continue
-                federated_domain = fname.split('.')[0]
-                if federated_domain not in shared_items_federated_domains:
-                    continue
-                shares_filename = catalogs_dir + '/' + fname
-                shares_json = load_json(shares_filename)
-                if not shares_json:
-                    continue
-
-                (results_exist, curr_page, ctr,
-                 result_str) = _html_shares_result(base_dir, shares_json,
-                                                   page_number,
-                                                   results_per_page,
-                                                   search_str_lower_list,
-                                                   curr_page, ctr,
-                                                   calling_domain, http_prefix,
-                                                   domain_full,
-                                                   contact_nickname,
-                                                   actor, results_exist,
-                                                   search_str_lower, translate,
-                                                   shares_file_type)
-                shared_items_form += result_str
-
-                if curr_page > page_number:
-                    break
-            break
+    results = shares_index_search(base_dir, shares_file_type,
+                                  search_str_lower_list,
+                                  shared_items_federated_domains)
+    if page_number < 1:
+        page_number = 1
+    start_index = (page_number - 1) * results_per_page
+    page_results = results[start_index:start_index + results_per_page]
+    if page_results and page_number > 1:
+        # show the previous page button
+        shared_items_form += \
+            _html_search_result_share_page(actor, domain_full,
+                                           calling_domain, page_number,
+                                           search_str_lower, translate, True)
+    for item_id, owner, federated, shared_item in page_results:
+        if federated:
+            contact_nickname = _shared_item_owner_nickname(item_id)
+        else:
+            contact_nickname = owner.split('@')[0]
+        shared_items_form += \
+            html_search_result_share(base_dir, shared_item, translate,
+                                     http_prefix, domain_full,
+                                     contact_nickname,
+                                     item_id, actor, shares_file_type,
+                                     shared_item['category'])
+        results_exist = True
+    if len(results) > start_index + results_per_page:
+        # show the next page button
+        shared_items_form += \
+            _html_search_result_share_page(actor, domain_full,
+                                           calling_domain, page_number,
+                                           search_str_lower, translate, False)
 
     if not results_exist:
         shared_items_form += \
@@ -538,83 +442,8 @@ def html_skills_search(actor: str, translate: {}, base_dir: str,
 
     skillsearch = skillsearch.lower().strip('\n').strip('\r')
 
-    results = []
-    # search instance accounts
-    for subdir, _, files in os.walk(base_dir + '/accounts/'):
-        for fname in files:
-            if not fname.endswith('.json'):
-                continue
-            if not is_account_dir(fname):
-                continue
-            actor_filename = os.path.join(subdir, fname)
-            actor_json = load_json(actor_filename)
-            if not actor_json:
-                continue
-            if actor_json.get('id') and \
-               no_of_actor_skills(actor_json) > 0 and \
-               actor_json.get('name') and \
-               actor_json.get('icon'):
-                actor = actor_json['id']
-                actor_skills_list = actor_json['hasOccupation']['skills']
-                skills = get_skills_from_list(actor_skills_list)
-                for skill_name, skill_level in skills.items():
-                    skill_name = skill_name.lower()
-                    if not (skill_name in skillsearch or
-                            skillsearch in skill_name):
-                        continue
-                    skill_level_str = str(skill_level)
-                    if skill_level < 100:
-                        skill_level_str = '0' + skill_level_str
-                    if skill_level < 10:
-                        skill_level_str = '0' + skill_level_str
-                    index_str = \
-                        skill_level_str + ';' + actor + ';' + \
-                        actor_json['name'] + \
-                        ';' + actor_json['icon']['url']
-                    if index_str not in results:
-                        results.append(index_str)
-        break
-    if not instance_only:
-        # search actor cache
-        for subdir, _, files in os.walk(base_dir + '/cache/actors/'):
-            for fname in files:
-                if not fname.endswith('.json'):
-                    continue
-                if not is_account_dir(fname):
-                    continue
-                actor_filename = os.path.join(subdir, fname)
-                cached_actor_json = load_json(actor_filename)
-                if not cached_actor_json:
-                    continue
-                if cached_actor_json.get('actor'):
-                    actor_json = cached_actor_json['actor']
-                    if actor_json.get('id') and \
-                       no_of_actor_skills(actor_json) > 0 and \
-                       actor_json.get('name') and \
-                       actor_json.get('icon'):
-                        actor = actor_json['id']
-                        actor_skills_list = \
-                            actor_json['hasOccupation']['skills']
-                        skills = get_skills_from_list(actor_skills_list)
-                        for skill_name, skill_level in skills.items():
-                            skill_name = skill_name.lower()
-                            if not (skill_name in skillsearch or
-                                    skillsearch in skill_name):
-                                continue
-                            skill_level_str = str(skill_level)
-                            if skill_level < 100:
-                                skill_level_str = '0' + skill_level_str
-                            if skill_level < 10:
-                                skill_level_str = '0' + skill_level_str
-                            index_str = \
-                                skill_level_str + ';' + actor + ';' + \
-                                actor_json['name'] + \
-                                ';' + actor_json['icon']['url']
-                            if index_str not in results:
-                                results.append(index_str)
-            break
-
-    results.sort(reverse=True)
+    results = \
+        skills_index_search(base_dir, skillsearch, instance_only)
 
     css_filename = base_dir + '/epicyon-profile.css'
     if os.path.isfile(base_dir + '/epicyon.css'):
@@ -711,9 +540,17 @@ def html_history_search(translate: {}, base_dir: str,
 
     historysearch = historysearch.lower().strip('\n').strip('\r')
 
+    # ensure that the page number is in bounds
+    if not page_number:
+        page_number = 1
+    elif page_number < 1:
+        page_number = 1
+
+    # results are ranked, so obtain enough of them for the given page
     box_filenames = \
         search_box_posts(base_dir, nickname, domain,
-                         historysearch, posts_per_page, box_name)
+                         historysearch, posts_per_page * page_number,
+                         box_name)
 
     css_filename = base_dir + '/epicyon-profile.css'
     if os.path.isfile(base_dir + '/epicyon.css'):
@@ -760,15 +597,9 @@ def html_history_search(translate: {}, base_dir: str,
 
     separator_str = html_post_separator(base_dir, None)
 
-    # ensure that the page number is in bounds
-    if not page_number:
-        page_number = 1
-    elif page_number < 1:
-        page_number = 1
-
     # get the start end end within the index file
     start_index = int((page_number - 1) * posts_per_page)
-    end_index = start_index + posts_per_page
+    end_index = start_index + posts_per_page - 1
     no_of_box_filenames = len(box_filenames)
     if end_index >= no_of_box_filenames and no_of_box_filenames > 0:
         end_index = no_of_box_filenames - 1
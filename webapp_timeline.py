@@ -32,7 +32,6 @@ from webapp_utils import html_header_with_external_style
 from webapp_utils import html_footer
 from webapp_utils import shares_timeline_json
 from webapp_utils import html_highlight_label
-from webapp_post import prepare_post_from_html_cache
 from webapp_post import individual_post_as_html
 from webapp_column_left import get_left_column_content
 from webapp_column_right import get_right_column_content
@@ -982,65 +981,46 @@ def html_timeline(default_timeline: str,
                 if is_self_announce(item):
                     continue
 
-                # is the post in the memory cache of recent ones?
-                curr_tl_str = None
-                if box_name != 'tlmedia' and recent_posts_cache.get('html'):
-                    post_id = remove_id_ending(item['id']).replace('/', '#')
-                    if recent_posts_cache['html'].get(post_id):
-                        if not first_post_id:
-                            first_post_id = post_id
-                        last_post_id = post_id
-                        curr_tl_str = recent_posts_cache['html'][post_id]
-                        curr_tl_str = \
-                            prepare_post_from_html_cache(nickname,
-                                                         curr_tl_str,
-                                                         box_name,
-                                                         page_number,
-                                                         first_post_id)
-                        _log_timeline_timing(enable_timing_log,
-                                             timeline_start_time,
-                                             box_name, '10')
-
-                if not curr_tl_str:
-                    _log_timeline_timing(enable_timing_log,
-                                         timeline_start_time,
-                                         box_name, '11')
-
-                    mitm = False
-                    if item.get('mitm'):
-                        mitm = True
-                    # read the post from disk
-                    curr_tl_str = \
-                        individual_post_as_html(signing_priv_key_pem,
-                                                False, recent_posts_cache,
-                                                max_recent_posts,
-                                                translate, page_number,
-                                                base_dir, session,
-                                                cached_webfingers,
-                                                person_cache,
-                                                nickname, domain, port,
-                                                item, None, True,
-                                                allow_deletion,
-                                                http_prefix, project_version,
-                                                box_name,
-                                                yt_replace_domain,
-                                                twitter_replacement_domain,
-                                                show_published_date_only,
-                                                peertube_instances,
-                                                allow_local_network_access,
-                                                theme, system_language,
-                                                max_like_count,
-                                                box_name != 'dm',
-                                                show_individual_post_icons,
-                                                manually_approve_followers,
-                                                False, True, use_cache_only,
-                                                cw_lists, lists_enabled,
-                                                timezone, mitm,
-                                                bold_reading, dogwhistles,
-                                                minimize_all_images,
-                                                first_post_id, buy_sites)
-                    _log_timeline_timing(enable_timing_log,
-                                         timeline_start_time, box_name, '12')
+                _log_timeline_timing(enable_timing_log,
+                                     timeline_start_time,
+                                     box_name, '11')
+
+                mitm = False
+                if item.get('mitm'):
+                    mitm = True
+                # show the post, from the cache if possible, with the
+                # icons for this account
+                curr_tl_str = \
+                    individual_post_as_html(signing_priv_key_pem,
+                                            False, recent_posts_cache,
+                                            max_recent_posts,
+                                            translate, page_number,
+                                            base_dir, session,
+                                            cached_webfingers,
+                                            person_cache,
+                                            nickname, domain, port,
+                                            item, None, True,
+                                            allow_deletion,
+                                            http_prefix, project_version,
+                                            box_name,
+                                            yt_replace_domain,
+                                            twitter_replacement_domain,
+                                            show_published_date_only,
+                                            peertube_instances,
+                                            allow_local_network_access,
+                                            theme, system_language,
+                                            max_like_count,
+                                            box_name != 'dm',
+                                            show_individual_post_icons,
+                                            manually_approve_followers,
+                                            False, True, use_cache_only,
+                                            cw_lists, lists_enabled,
+                                            timezone, mitm,
+                                            bold_reading, dogwhistles,
+                                            minimize_all_images,
+                                            first_post_id, buy_sites)
+                _log_timeline_timing(enable_timing_log,
+                                     timeline_start_time, box_name, '12')
 
                 if curr_tl_str:
                     if curr_tl_str not in tl_items_str:
@@ -19,7 +19,6 @@ from utils import is_account_dir
 from utils import remove_html
 from utils import get_protocol_prefixes
 from utils import load_json
-from utils import get_cached_post_filename
 from utils import get_config_param
 from utils import acct_dir
 from utils import get_nickname_from_actor
@@ -39,6 +38,7 @@ from person import get_person_avatar_url
 from posts import is_moderator
 from blocking import is_blocked
 from blocking import allowed_announce
+from actorstore import actor_store_projection
 
 
 def minimizing_attached_images(base_dir: str, nickname: str, domain: str,
@@ -428,8 +428,9 @@ def update_avatar_image_cache(signing_priv_key_pem: str,
                 return None
             if not person_cache.get(actor):
                 return None
-            if person_cache[actor]['actor']['publicKey']['publicKeyPem'] != \
-               person_json['publicKey']['publicKeyPem']:
+            cached_key_pem = \
+                actor_store_projection(person_cache[actor]).get('publicKeyPem')
+            if cached_key_pem != person_json['publicKey']['publicKeyPem']:
                 print("ERROR: " +
                       "public keys don't match when downloading actor for " +
                       actor)
@@ -1043,38 +1044,6 @@ def html_footer() -> str:
     return html_str
 
 
-def load_individual_post_as_html_from_cache(base_dir: str,
-                                            nickname: str, domain: str,
-                                            post_json_object: {}) -> str:
-    """If a cached html version of the given post exists then load it and
-    return the html text
-    This is much quicker than generating the html from the json object
-    """
-    cached_post_filename = \
-        get_cached_post_filename(base_dir, nickname, domain, post_json_object)
-
-    post_html = ''
-    if not cached_post_filename:
-        return post_html
-
-    if not os.path.isfile(cached_post_filename):
-        return post_html
-
-    tries = 0
-    while tries < 3:
-        try:
-            with open(cached_post_filename, 'r', encoding='utf-8') as file:
-                post_html = file.read()
-                break
-        except OSError as ex:
-            print('ERROR: load_individual_post_as_html_from_cache ' +
-                  str(tries) + ' ' + str(ex))
-            # no sleep
-            tries += 1
-    if post_html:
-        return post_html
-
-
 def add_emoji_to_display_name(session, base_dir: str, http_prefix: str,
                               nickname: str, domain: str,
                               display_name: str, in_profile_name: bool,
@@ -12,6 +12,9 @@ import urllib.parse
 from session import get_json
 from cache import store_webfinger_in_cache
 from cache import get_webfinger_from_cache
+from webfingercache import webfinger_lookup_begin
+from webfingercache import webfinger_lookup_wait
+from webfingercache import webfinger_lookup_end
 from utils import acct_handle_dir
 from utils import get_attachment_property_value
 from utils import get_full_domain
@@ -92,6 +95,39 @@ def webfinger_handle(session, handle: str, http_prefix: str,
         if debug:
             print('Webfinger from cache: ' + str(wfg))
         return wfg
+    if wfg is not None:
+        if debug:
+            print('Webfinger recently failed for ' + wf_handle)
+        return None
+
+    # if another thread is already looking up this handle
+    # then wait for its result
+    inflight, leader = webfinger_lookup_begin(wf_handle)
+    if not leader:
+        if debug:
+            print('Waiting for webfinger of ' + wf_handle)
+        return webfinger_lookup_wait(inflight)
+
+    result = None
+    try:
+        result = \
+            _webfinger_request(session, handle, nickname, domain,
+                               http_prefix, from_domain, project_version,
+                               debug, signing_priv_key_pem)
+    finally:
+        webfinger_lookup_end(wf_handle, inflight, result)
+    store_webfinger_in_cache(wf_handle, result, cached_webfingers)
+    return result
+
+
+def _webfinger_request(session, handle: str, nickname: str, domain: str,
+                       http_prefix: str, from_domain: str,
+                       project_version: str, debug: bool,
+                       signing_priv_key_pem: str) -> {}:
+    """Sends a webfinger request for the given handle
+    """
+    wf_domain = remove_domain_port(domain)
+    wf_handle = nickname + '@' + wf_domain
     url = '{}://{}/.well-known/webfinger'.format(http_prefix, domain)
     hdr = {
         'Accept': 'application/jrd+json'
@@ -127,9 +163,7 @@ def webfinger_handle(session, handle: str, http_prefix: str,
             print('ERROR: webfinger_handle ' + wf_handle + ' ' + str(ex))
             return None
 
-    if result:
-        store_webfinger_in_cache(wf_handle, result, cached_webfingers)
-    else:
+    if not result:
         print("WARN: Unable to webfinger " + str(url) + ' ' +
               'from_domain: ' + str(from_domain) + ' ' +
               'nickname: ' + str(nickname) + ' ' +
@@ -0,0 +1,201 @@
+__filename__ = "webfingercache.py"
+__author__ = "Bob Mottram"
+__license__ = "AGPL3+"
+__version__ = "1.4.0"
+__maintainer__ = "Bob Mottram"
+__email__ = "bob@libreserver.org"
+__status__ = "Production"
+__module_group__ = "ActivityPub"
+
+# Persistence of webfinger results, and coalescing of lookups.
+# Each webfinger result held in memory expires after a time, and lookups
+# which failed are also remembered for a short time so that a domain
+# which is unreachable is not asked again for every recipient of a post.
+# The results held by the running instance are appended to a log within
+# the cache directory, which is loaded on startup so that a restart
+# doesn't need to look up every handle again. Expired entries are
+# removed when the log is loaded or when it becomes too long.
+# If several threads look up the same handle at the same time then only
+# the first sends a request, and the others wait for its result.
+
+import os
+import json
+import time
+import threading
+
+# number of seconds for which a webfinger result is kept
+WEBFINGER_CACHE_TTL_SEC = 3 * 24 * 60 * 60
+
+# number of seconds for which a failed lookup is remembered
+WEBFINGER_CACHE_FAILURE_SEC = 5 * 60
+
+# maximum number of seconds to wait for a lookup made by another thread
+WEBFINGER_LOOKUP_WAIT_SEC = 60
+
+_WEBFINGER_CACHE = {
+    'lock': threading.Lock(),
+    'base_dir': None,
+    # the webfinger cache of the running instance, which is saved to file
+    'cache': None,
+    'log_lines': 0,
+    # handle -> lookup which is in progress
+    'inflight': {},
+    'lookups': 0,
+    'coalesced': 0
+}
+
+
+def _webfinger_cache_filename(base_dir: str) -> str:
+    """Returns the filename of the webfinger cache log
+    """
+    return base_dir + '/cache/webfinger.jsonl'
+
+
+def _webfinger_cache_save(base_dir: str, cached_webfingers: {}) -> None:
+    """Rewrites the log with the entries which have not expired,
+    and removes expired entries from memory.
+    This must be called while holding the lock
+    """
+    curr_time = int(time.time())
+    for handle in list(cached_webfingers.keys()):
+        record = cached_webfingers.get(handle)
+        if record and record['expires'] < curr_time:
+            cached_webfingers.pop(handle, None)
+    cache_filename = _webfinger_cache_filename(base_dir)
+    log_lines = 0
+    try:
+        with open(cache_filename + '.new', 'w+',
+                  encoding='utf-8') as fp_cache:
+            for handle, record in list(cached_webfingers.items()):
+                line = {
+                    'handle': handle,
+                    'wf': record['wf'],
+                    'expires': record['expires']
+                }
+                fp_cache.write(json.dumps(line) + '\n')
+                log_lines += 1
+        os.replace(cache_filename + '.new', cache_filename)
+    except OSError:
+        print('EX: _webfinger_cache_save unable to save ' + cache_filename)
+        return
+    _WEBFINGER_CACHE['log_lines'] = log_lines
+
+
+def webfinger_cache_load(base_dir: str, cached_webfingers: {}) -> int:
+    """Loads webfinger results saved by the running instance into
+    its cache in memory, and saves any later results to file.
+    Returns the number of results loaded
+    """
+    curr_time = int(time.time())
+    cache_filename = _webfinger_cache_filename(base_dir)
+    with _WEBFINGER_CACHE['lock']:
+        _WEBFINGER_CACHE['base_dir'] = base_dir
+        _WEBFINGER_CACHE['cache'] = cached_webfingers
+        _WEBFINGER_CACHE['log_lines'] = 0
+        if not os.path.isfile(cache_filename):
+            return 0
+        try:
+            with open(cache_filename, 'r', encoding='utf-8') as fp_cache:
+                for line in fp_cache:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    if not isinstance(record, dict) or \
+                       not isinstance(record.get('handle'), str) or \
+                       not isinstance(record.get('expires'), int):
+                        continue
+                    if record['expires'] < curr_time:
+                        continue
+                    cached_webfingers[record['handle']] = {
+                        'wf': record.get('wf'),
+                        'expires': record['expires']
+                    }
+        except OSError:
+            print('EX: webfinger_cache_load unable to read ' +
+                  cache_filename)
+        _webfinger_cache_save(base_dir, cached_webfingers)
+        return len(cached_webfingers)
+
+
+def webfinger_cache_append(handle: str, record: {},
+                           cached_webfingers: {}) -> None:
+    """Saves an entry within the webfinger cache of the running instance
+    """
+    with _WEBFINGER_CACHE['lock']:
+        if cached_webfingers is not _WEBFINGER_CACHE['cache']:
+            return
+        base_dir = _WEBFINGER_CACHE['base_dir']
+        if not os.path.isdir(base_dir + '/cache'):
+            return
+        if _WEBFINGER_CACHE['log_lines'] > \
+           2 * len(cached_webfingers) + 1024:
+            _webfinger_cache_save(base_dir, cached_webfingers)
+            return
+        cache_filename = _webfinger_cache_filename(base_dir)
+        line = {
+            'handle': handle,
+            'wf': record['wf'],
+            'expires': record['expires']
+        }
+        try:
+            with open(cache_filename, 'a+', encoding='utf-8') as fp_cache:
+                fp_cache.write(json.dumps(line) + '\n')
+        except OSError:
+            print('EX: webfinger_cache_append unable to append ' +
+                  cache_filename)
+            return
+        _WEBFINGER_CACHE['log_lines'] += 1
+
+
+def webfinger_lookup_begin(handle: str) -> ({}, bool):
+    """Begins a lookup of a handle. Returns the lookup in progress and
+    whether this thread should send the request. If another thread is
+    already looking up the handle then its result can be obtained
+    with webfinger_lookup_wait
+    """
+    with _WEBFINGER_CACHE['lock']:
+        inflight = _WEBFINGER_CACHE['inflight'].get(handle)
+        if inflight:
+            _WEBFINGER_CACHE['coalesced'] += 1
+            return inflight, False
+        inflight = {
+            'event': threading.Event(),
+            'result': None
+        }
+        _WEBFINGER_CACHE['inflight'][handle] = inflight
+        _WEBFINGER_CACHE['lookups'] += 1
+    return inflight, True
+
+
+def webfinger_lookup_wait(inflight: {}) -> {}:
+    """Waits for a lookup made by another thread and returns its result
+    """
+    inflight['event'].wait(WEBFINGER_LOOKUP_WAIT_SEC)
+    return inflight['result']
+
+
+def webfinger_lookup_end(handle: str, inflight: {}, result: {}) -> None:
+    """Ends a lookup of a handle, passing its result to any threads
+    which are waiting for it
+    """
+    inflight['result'] = result
+    with _WEBFINGER_CACHE['lock']:
+        if _WEBFINGER_CACHE['inflight'].get(handle) is inflight:
+            del _WEBFINGER_CACHE['inflight'][handle]
+    inflight['event'].set()
+
+
+def webfinger_cache_metrics() -> {}:
+    """Returns the current state of webfinger lookups
+    """
+    with _WEBFINGER_CACHE['lock']:
+        cached = 0
+        if _WEBFINGER_CACHE['cache'] is not None:
+            cached = len(_WEBFINGER_CACHE['cache'])
+        return {
+            'cached': cached,
+            'inflight': len(_WEBFINGER_CACHE['inflight']),
+            'lookups': _WEBFINGER_CACHE['lookups'],
+            'coalesced': _WEBFINGER_CACHE['coalesced']
+        }